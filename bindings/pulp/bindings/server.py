@@ -1,8 +1,13 @@
 from types import NoneType
 import base64
+import errno
+import httplib
 import locale
 import logging
 import os
+import socket
+import threading
+import time
 import urllib
 try:
     import oauth2 as oauth
@@ -19,6 +24,19 @@ from pulp.common.constants import DEFAULT_CA_PATH
 from pulp.common.util import ensure_utf_8, encode_unicode
 
 
+# Maximum number of idle keep-alive connections kept for reuse by each PulpConnection
+DEFAULT_POOL_SIZE = 4
+
+# Seconds an idle connection is kept before it is discarded. This is deliberately shorter than
+# Apache's default KeepAliveTimeout (5 seconds) so we rarely pick up a connection the server has
+# already dropped.
+DEFAULT_IDLE_TIMEOUT = 4
+
+# Methods that are retried on a new connection whenever a pooled connection fails, because
+# sending them twice has no side effects
+RETRY_METHODS = ('GET', 'HEAD')
+
+
 class PulpConnection(object):
     """
     Stub for invoking methods against the Pulp server. By default, the
@@ -44,7 +62,9 @@ class PulpConnection(object):
                  cert_filename=None,
                  server_wrapper=None,
                  verify_ssl=True,
-                 ca_path=DEFAULT_CA_PATH):
+                 ca_path=DEFAULT_CA_PATH,
+                 pool_size=DEFAULT_POOL_SIZE,
+                 idle_timeout=DEFAULT_IDLE_TIMEOUT):
 
         self.host = host
         self.port = port
@@ -84,6 +104,10 @@ class PulpConnection(object):
         self.verify_ssl = verify_ssl
         self.ca_path = ca_path
 
+        # Connection pool settings; a pool_size of 0 disables connection reuse
+        self.pool_size = pool_size
+        self.idle_timeout = idle_timeout
+
     def DELETE(self, path, body=None, log_request_body=True, queries=(), ignore_prefix=False):
         return self._request('DELETE', path, queries, body=body, log_request_body=log_request_body,
                              ignore_prefix=ignore_prefix)
@@ -254,6 +278,11 @@ class HTTPSServerWrapper(object):
     This abstraction is used to simplify mocking. In this implementation, the
     intricacies (read: ugliness) of invoking and getting the response from
     the HTTPConnection class are hidden in favor of a simpler API to mock.
+
+    Connections are kept alive and pooled between requests, the SSL context is built once and
+    reused until the settings it was built from change, and the TLS session negotiated by the
+    first connection is resumed by the ones that follow. All of this state is shared across
+    threads using the same wrapper and is guarded by a lock.
     """
 
     def __init__(self, pulp_connection):
@@ -262,12 +291,19 @@ class HTTPSServerWrapper(object):
         :type pulp_connection: PulpConnection
         """
         self.pulp_connection = pulp_connection
+        self._lock = threading.Lock()
+        self._ssl_context = None
+        self._ssl_context_key = None
+        self._ssl_session = None
+        # list of (connection, time it was returned to the pool), most recently used last
+        self._idle_connections = []
 
     def request(self, method, url, body):
         """
         Make the request against the Pulp server, returning a tuple of (status_code, respose_body).
-        This method creates a new connection each time since HTTPSConnection has problems
-        reusing a connection for multiple calls (as claimed by a prior comment in this module).
+        An idle connection from the pool is used when one is available. If the server has closed
+        that connection in the meantime, the request is retried once on a new connection, as long
+        as the server cannot have processed it (see _can_retry).
 
         :param method: The HTTP method to be used for the request (GET, POST, etc.)
         :type  method: str
@@ -283,34 +319,12 @@ class HTTPSServerWrapper(object):
         """
         headers = dict(self.pulp_connection.headers)  # copy so we don't affect the calling method
 
-        # Despite the confusing name, 'sslv23' configures m2crypto to use any available protocol in
-        # the underlying openssl implementation.
-        ssl_context = SSL.Context('sslv23')
-        # This restricts the protocols we are willing to do by configuring m2 not to do SSLv2.0 or
-        # SSLv3.0. EL 5 does not have support for TLS > v1.0, so we have to leave support for
-        # TLSv1.0 enabled.
-        ssl_context.set_options(m2.SSL_OP_NO_SSLv2 | m2.SSL_OP_NO_SSLv3)
-
-        if self.pulp_connection.verify_ssl:
-            ssl_context.set_verify(SSL.verify_peer, depth=100)
-            # We need to stat the ca_path to see if it exists (error if it doesn't), and if so
-            # whether it is a file or a directory. m2crypto has different directives depending on
-            # which type it is.
-            if os.path.isfile(self.pulp_connection.ca_path):
-                ssl_context.load_verify_locations(cafile=self.pulp_connection.ca_path)
-            elif os.path.isdir(self.pulp_connection.ca_path):
-                ssl_context.load_verify_locations(capath=self.pulp_connection.ca_path)
-            else:
-                # If it's not a file and it's not a directory, it's not a valid setting
-                raise exceptions.MissingCAPathException(self.pulp_connection.ca_path)
-        ssl_context.set_session_timeout(self.pulp_connection.timeout)
+        ssl_context = self._get_ssl_context()
 
         if self.pulp_connection.username and self.pulp_connection.password:
             raw = ':'.join((self.pulp_connection.username, self.pulp_connection.password))
             encoded = base64.b64encode(raw)
             headers['Authorization'] = 'Basic ' + encoded
-        elif self.pulp_connection.cert_filename:
-            ssl_context.load_cert(self.pulp_connection.cert_filename)
 
         # oauth configuration. This block is only True if oauth is not None, so it won't run on RHEL
         # 5.
@@ -331,14 +345,27 @@ class HTTPSServerWrapper(object):
             headers.update(oauth_header)
             headers['pulp-user'] = self.pulp_connection.oauth_user
 
-        connection = httpslib.HTTPSConnection(
-            self.pulp_connection.host, self.pulp_connection.port, ssl_context=ssl_context)
+        connection = self._acquire_connection()
+        reused = connection is not None
+        if not reused:
+            connection = self._new_connection(ssl_context)
 
         try:
-            # Request against the server
-            connection.request(method, url, body=body, headers=headers)
-            response = connection.getresponse()
+            sent = False
+            try:
+                # Request against the server
+                connection.request(method, url, body=body, headers=headers)
+                sent = True
+                response = connection.getresponse()
+            except (SSL.SSLError, httplib.HTTPException, socket.error), err:
+                if not reused or not self._can_retry(method, sent, err):
+                    raise
+                # The server dropped the idle connection; try again on a new one
+                connection.close()
+                connection = self._new_connection(ssl_context)
+                response = self._send(connection, method, url, body, headers)
         except SSL.SSLError, err:
+            connection.close()
             # Translate stale login certificate to an auth exception
             if 'sslv3 alert certificate expired' == str(err):
                 raise exceptions.ClientCertificateExpiredException(
@@ -347,12 +374,215 @@ class HTTPSServerWrapper(object):
                 raise exceptions.CertificateVerificationException()
             else:
                 raise exceptions.ConnectionException(None, str(err), None)
+        except Exception:
+            connection.close()
+            raise
 
         # Attempt to deserialize the body (should pass unless the server is busted)
-        response_body = response.read()
+        try:
+            response_body = response.read()
+            self._release_connection(connection, response)
+        except Exception:
+            connection.close()
+            raise
 
         try:
             response_body = json.loads(response_body)
         except Exception:
             pass
         return response.status, response_body
+
+    def close(self):
+        """
+        Close all idle connections in the pool and forget the cached TLS session.
+        """
+        with self._lock:
+            idle = self._idle_connections
+            self._idle_connections = []
+            self._ssl_session = None
+        for connection, released in idle:
+            connection.close()
+
+    @staticmethod
+    def _can_retry(method, sent, err):
+        """
+        Decide whether a request that failed on a pooled connection may be sent again on a new
+        connection. That is only safe when the server cannot have processed the request: it was
+        not completely sent, or the connection was closed before any of the response arrived.
+        Otherwise only GET and HEAD requests, which have no side effects, are retried.
+
+        :param method: The HTTP method of the request
+        :type  method: str
+        :param sent:   True if the request was completely sent
+        :type  sent:   bool
+        :param err:    The error the request failed with
+        :type  err:    Exception
+        :return:       True if the request may be sent again
+        :rtype:        bool
+        """
+        if not sent or method.upper() in RETRY_METHODS:
+            return True
+        if isinstance(err, httplib.BadStatusLine):
+            return True
+        return isinstance(err, socket.error) and bool(err.args) and err.args[0] == errno.ECONNRESET
+
+    @staticmethod
+    def _send(connection, method, url, body, headers):
+        """
+        Send a request on the given connection and wait for the response.
+
+        :param connection: The connection to send the request on
+        :type  connection: M2Crypto.httpslib.HTTPSConnection
+        :param method:     The HTTP method to be used for the request
+        :type  method:     str
+        :param url:        The Pulp URL to make the request against
+        :type  url:        str
+        :param body:       The body to pass with the request
+        :type  body:       str
+        :param headers:    The headers to pass with the request
+        :type  headers:    dict
+        :return:           The server's response
+        :rtype:            httplib.HTTPResponse
+        """
+        connection.request(method, url, body=body, headers=headers)
+        return connection.getresponse()
+
+    def _get_ssl_context(self):
+        """
+        Return the SSL context for the current connection settings. The context is cached and only
+        rebuilt when a setting it depends on changes, including the client certificate being
+        rewritten on disk (for example by "pulp-admin login"). Rebuilding the context discards the
+        pooled connections and TLS session that were made with the old one.
+
+        :return: SSL context to make connections with
+        :rtype:  M2Crypto.SSL.Context
+
+        :raises exceptions.MissingCAPathException: if SSL verification is enabled and the
+                                                   configured ca_path does not exist
+        """
+        conn = self.pulp_connection
+        cert_filename = None
+        cert_mtime = None
+        if not (conn.username and conn.password) and conn.cert_filename:
+            cert_filename = conn.cert_filename
+            try:
+                cert_mtime = os.path.getmtime(cert_filename)
+            except OSError:
+                # load_cert() reports the problem when the context is built
+                pass
+        key = (conn.verify_ssl, conn.ca_path, conn.timeout, cert_filename, cert_mtime)
+
+        with self._lock:
+            if self._ssl_context is not None and self._ssl_context_key == key:
+                return self._ssl_context
+
+        ssl_context = self._build_ssl_context(cert_filename)
+
+        with self._lock:
+            idle = self._idle_connections
+            self._idle_connections = []
+            self._ssl_session = None
+            self._ssl_context = ssl_context
+            self._ssl_context_key = key
+        for connection, released in idle:
+            connection.close()
+        return ssl_context
+
+    def _build_ssl_context(self, cert_filename):
+        """
+        Build a new SSL context from the pulp connection's settings.
+
+        :param cert_filename: path to the client certificate to load, or None
+        :type  cert_filename: basestring
+        :return: new SSL context
+        :rtype:  M2Crypto.SSL.Context
+
+        :raises exceptions.MissingCAPathException: if SSL verification is enabled and the
+                                                   configured ca_path does not exist
+        """
+        # Despite the confusing name, 'sslv23' configures m2crypto to use any available protocol in
+        # the underlying openssl implementation.
+        ssl_context = SSL.Context('sslv23')
+        # This restricts the protocols we are willing to do by configuring m2 not to do SSLv2.0 or
+        # SSLv3.0. EL 5 does not have support for TLS > v1.0, so we have to leave support for
+        # TLSv1.0 enabled.
+        ssl_context.set_options(m2.SSL_OP_NO_SSLv2 | m2.SSL_OP_NO_SSLv3)
+
+        if self.pulp_connection.verify_ssl:
+            ssl_context.set_verify(SSL.verify_peer, depth=100)
+            # We need to stat the ca_path to see if it exists (error if it doesn't), and if so
+            # whether it is a file or a directory. m2crypto has different directives depending on
+            # which type it is.
+            if os.path.isfile(self.pulp_connection.ca_path):
+                ssl_context.load_verify_locations(cafile=self.pulp_connection.ca_path)
+            elif os.path.isdir(self.pulp_connection.ca_path):
+                ssl_context.load_verify_locations(capath=self.pulp_connection.ca_path)
+            else:
+                # If it's not a file and it's not a directory, it's not a valid setting
+                raise exceptions.MissingCAPathException(self.pulp_connection.ca_path)
+        ssl_context.set_session_timeout(self.pulp_connection.timeout)
+
+        if cert_filename:
+            ssl_context.load_cert(cert_filename)
+
+        return ssl_context
+
+    def _new_connection(self, ssl_context):
+        """
+        Create a new connection to the server. If a TLS session was negotiated by an earlier
+        connection it is handed to the new one so the handshake can be resumed.
+
+        :param ssl_context: SSL context to make the connection with
+        :type  ssl_context: M2Crypto.SSL.Context
+        :return: new, not yet connected, connection
+        :rtype:  M2Crypto.httpslib.HTTPSConnection
+        """
+        connection = httpslib.HTTPSConnection(
+            self.pulp_connection.host, self.pulp_connection.port, ssl_context=ssl_context)
+        with self._lock:
+            session = self._ssl_session
+        if session is not None:
+            connection.set_session(session)
+        return connection
+
+    def _acquire_connection(self):
+        """
+        Take the most recently used idle connection from the pool. Connections that have been
+        idle longer than the pulp connection's idle_timeout are closed and skipped.
+
+        :return: an idle connection, or None if there are none
+        :rtype:  M2Crypto.httpslib.HTTPSConnection
+        """
+        now = time.time()
+        idle_timeout = self.pulp_connection.idle_timeout
+        with self._lock:
+            expired = [c for c, released in self._idle_connections
+                       if now - released >= idle_timeout]
+            self._idle_connections = [(c, released) for c, released in self._idle_connections
+                                      if now - released < idle_timeout]
+            connection = None
+            if self._idle_connections:
+                connection = self._idle_connections.pop()[0]
+        for c in expired:
+            c.close()
+        return connection
+
+    def _release_connection(self, connection, response):
+        """
+        Return a connection to the pool after its response has been read. The connection is
+        closed instead if the server asked for it to be, or if the pool is already full.
+
+        :param connection: connection the response was read from
+        :type  connection: M2Crypto.httpslib.HTTPSConnection
+        :param response:   response that was fully read
+        :type  response:   httplib.HTTPResponse
+        """
+        keep = getattr(response, 'will_close', True) is False and \
+            self.pulp_connection.pool_size > 0
+        with self._lock:
+            if connection.sock is not None and self._ssl_session is None:
+                self._ssl_session = connection.get_session()
+            if keep and len(self._idle_connections) < self.pulp_connection.pool_size:
+                self._idle_connections.append((connection, time.time()))
+                return
+        connection.close()
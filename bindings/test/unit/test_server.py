@@ -1,8 +1,11 @@
 """
 This module contains tests for the pulp.bindings.server module.
 """
+import errno
+import httplib
 import locale
 import logging
+import socket
 import unittest
 
 from M2Crypto import m2, SSL
@@ -173,6 +176,228 @@ class TestHTTPSServerWrapper(unittest.TestCase):
         load_verify_locations.assert_called_once_with(cafile=ca_path)
 
 
+class TestHTTPSServerWrapperPooling(unittest.TestCase):
+    """
+    This class contains tests for the connection pooling done by HTTPSServerWrapper.
+    """
+    def setUp(self):
+        self.conn = server.PulpConnection('host', verify_ssl=False)
+        self.wrapper = server.HTTPSServerWrapper(self.conn)
+
+    @staticmethod
+    def _response(will_close=False, body='{}'):
+        response = mock.MagicMock(status=200, will_close=will_close)
+        response.read.return_value = body
+        return response
+
+    @mock.patch('pulp.bindings.server.SSL.Context')
+    @mock.patch('pulp.bindings.server.httpslib.HTTPSConnection')
+    def test_request_reuses_connection(self, HTTPSConnection, Context):
+        """
+        Assert that a kept-alive connection and the SSL context are reused for the next request.
+        """
+        connection = HTTPSConnection.return_value
+        connection.getresponse.return_value = self._response()
+
+        self.wrapper.request('GET', '/awesome/api/', '')
+        status, body = self.wrapper.request('GET', '/awesome/api/', '')
+
+        self.assertEqual(status, 200)
+        self.assertEqual(body, {})
+        self.assertEqual(HTTPSConnection.call_count, 1)
+        self.assertEqual(Context.call_count, 1)
+        self.assertEqual(connection.request.call_count, 2)
+        self.assertEqual(connection.close.call_count, 0)
+
+    @mock.patch('pulp.bindings.server.SSL.Context')
+    @mock.patch('pulp.bindings.server.httpslib.HTTPSConnection')
+    def test_request_will_close(self, HTTPSConnection, Context):
+        """
+        Assert that a connection the server is going to close is not returned to the pool.
+        """
+        connection = HTTPSConnection.return_value
+        connection.getresponse.return_value = self._response(will_close=True)
+
+        self.wrapper.request('GET', '/awesome/api/', '')
+
+        connection.close.assert_called_once_with()
+        self.assertEqual(self.wrapper._idle_connections, [])
+
+    @mock.patch('pulp.bindings.server.SSL.Context')
+    @mock.patch('pulp.bindings.server.httpslib.HTTPSConnection')
+    def test_request_pool_disabled(self, HTTPSConnection, Context):
+        """
+        Assert that connections are not kept when the pool size is 0.
+        """
+        self.conn.pool_size = 0
+        connection = HTTPSConnection.return_value
+        connection.getresponse.return_value = self._response()
+
+        self.wrapper.request('GET', '/awesome/api/', '')
+
+        connection.close.assert_called_once_with()
+        self.assertEqual(self.wrapper._idle_connections, [])
+
+    @mock.patch('pulp.bindings.server.time.time')
+    @mock.patch('pulp.bindings.server.SSL.Context')
+    @mock.patch('pulp.bindings.server.httpslib.HTTPSConnection')
+    def test_request_idle_timeout(self, HTTPSConnection, Context, time):
+        """
+        Assert that a connection idle for longer than idle_timeout is closed and not used.
+        """
+        first, second = mock.MagicMock(), mock.MagicMock()
+        HTTPSConnection.side_effect = [first, second]
+        first.getresponse.return_value = self._response()
+        second.getresponse.return_value = self._response()
+        time.side_effect = [100, 100, 100 + server.DEFAULT_IDLE_TIMEOUT, 200]
+
+        self.wrapper.request('GET', '/awesome/api/', '')
+        self.wrapper.request('GET', '/awesome/api/', '')
+
+        first.close.assert_called_once_with()
+        self.assertEqual(second.request.call_count, 1)
+        self.assertEqual(self.wrapper._idle_connections, [(second, 200)])
+
+    @mock.patch('pulp.bindings.server.SSL.Context')
+    @mock.patch('pulp.bindings.server.httpslib.HTTPSConnection')
+    def test_request_retries_stale_connection(self, HTTPSConnection, Context):
+        """
+        Assert that the request is retried on a new connection when a pooled one was dropped by
+        the server, and that the new connection resumes the TLS session.
+        """
+        first, second = mock.MagicMock(), mock.MagicMock()
+        HTTPSConnection.side_effect = [first, second]
+        first.getresponse.side_effect = [self._response(), httplib.BadStatusLine('')]
+        second.getresponse.return_value = self._response(body='{"it": "worked!"}')
+
+        self.wrapper.request('GET', '/awesome/api/', '')
+        status, body = self.wrapper.request('GET', '/awesome/api/', '')
+
+        self.assertEqual(body, {'it': 'worked!'})
+        first.close.assert_called_once_with()
+        second.set_session.assert_called_once_with(first.get_session.return_value)
+
+    @mock.patch('pulp.bindings.server.SSL.Context')
+    @mock.patch('pulp.bindings.server.httpslib.HTTPSConnection')
+    def test_request_retries_unsent_post(self, HTTPSConnection, Context):
+        """
+        Assert that a POST that could not be sent on a pooled connection is retried.
+        """
+        first, second = mock.MagicMock(), mock.MagicMock()
+        HTTPSConnection.side_effect = [first, second]
+        first.getresponse.return_value = self._response()
+        first.request.side_effect = [None, socket.error(errno.EPIPE, 'broken pipe')]
+        second.getresponse.return_value = self._response(body='{"it": "worked!"}')
+
+        self.wrapper.request('GET', '/awesome/api/', '')
+        status, body = self.wrapper.request('POST', '/awesome/api/', '{}')
+
+        self.assertEqual(body, {'it': 'worked!'})
+        first.close.assert_called_once_with()
+
+    @mock.patch('pulp.bindings.server.SSL.Context')
+    @mock.patch('pulp.bindings.server.httpslib.HTTPSConnection')
+    def test_request_retries_post_reset(self, HTTPSConnection, Context):
+        """
+        Assert that a POST is retried when the pooled connection was reset before any response.
+        """
+        first, second = mock.MagicMock(), mock.MagicMock()
+        HTTPSConnection.side_effect = [first, second]
+        first.getresponse.side_effect = [self._response(),
+                                         socket.error(errno.ECONNRESET, 'reset')]
+        second.getresponse.return_value = self._response(body='{"it": "worked!"}')
+
+        self.wrapper.request('GET', '/awesome/api/', '')
+        status, body = self.wrapper.request('POST', '/awesome/api/', '{}')
+
+        self.assertEqual(body, {'it': 'worked!'})
+        self.assertEqual(second.request.call_count, 1)
+
+    @mock.patch('pulp.bindings.server.SSL.Context')
+    @mock.patch('pulp.bindings.server.httpslib.HTTPSConnection')
+    def test_request_sent_post_not_retried(self, HTTPSConnection, Context):
+        """
+        Assert that a POST the server may have processed is not sent again.
+        """
+        first, second = mock.MagicMock(), mock.MagicMock()
+        HTTPSConnection.side_effect = [first, second]
+        first.getresponse.side_effect = [self._response(), SSL.SSLError('unexpected eof')]
+
+        self.wrapper.request('GET', '/awesome/api/', '')
+        self.assertRaises(exceptions.ConnectionException, self.wrapper.request,
+                          'POST', '/awesome/api/', '{}')
+
+        self.assertEqual(HTTPSConnection.call_count, 1)
+        first.close.assert_called_once_with()
+
+    @mock.patch('pulp.bindings.server.SSL.Context')
+    @mock.patch('pulp.bindings.server.httpslib.HTTPSConnection')
+    def test_request_read_error_closes(self, HTTPSConnection, Context):
+        """
+        Assert that a connection is closed and not pooled when reading the response fails.
+        """
+        connection = HTTPSConnection.return_value
+        response = self._response()
+        response.read.side_effect = socket.error('reset')
+        connection.getresponse.return_value = response
+
+        self.assertRaises(socket.error, self.wrapper.request, 'GET', '/awesome/api/', '')
+
+        connection.close.assert_called_once_with()
+        self.assertEqual(self.wrapper._idle_connections, [])
+
+    @mock.patch('pulp.bindings.server.SSL.Context')
+    @mock.patch('pulp.bindings.server.httpslib.HTTPSConnection')
+    def test_request_new_connection_error_not_retried(self, HTTPSConnection, Context):
+        """
+        Assert that errors on a new connection are not retried.
+        """
+        connection = HTTPSConnection.return_value
+        connection.getresponse.side_effect = socket.error('refused')
+
+        self.assertRaises(socket.error, self.wrapper.request, 'GET', '/awesome/api/', '')
+
+        self.assertEqual(HTTPSConnection.call_count, 1)
+        connection.close.assert_called_once_with()
+
+    @mock.patch('pulp.bindings.server.os.path.getmtime')
+    @mock.patch('pulp.bindings.server.SSL.Context')
+    @mock.patch('pulp.bindings.server.httpslib.HTTPSConnection')
+    def test_request_cert_changed(self, HTTPSConnection, Context, getmtime):
+        """
+        Assert that the SSL context is rebuilt and the pool emptied when the client certificate
+        is rewritten.
+        """
+        self.conn.cert_filename = '/path/to/cert'
+        getmtime.side_effect = [1, 2]
+        first, second = mock.MagicMock(), mock.MagicMock()
+        HTTPSConnection.side_effect = [first, second]
+        first.getresponse.return_value = self._response()
+        second.getresponse.return_value = self._response()
+
+        self.wrapper.request('GET', '/awesome/api/', '')
+        self.wrapper.request('GET', '/awesome/api/', '')
+
+        self.assertEqual(Context.call_count, 2)
+        self.assertEqual(Context.return_value.load_cert.call_count, 2)
+        first.close.assert_called_once_with()
+        self.assertEqual(second.set_session.call_count, 0)
+
+    def test_close(self):
+        """
+        Assert that close() closes the idle connections.
+        """
+        connection = mock.MagicMock()
+        self.wrapper._idle_connections = [(connection, 1)]
+        self.wrapper._ssl_session = mock.MagicMock()
+
+        self.wrapper.close()
+
+        connection.close.assert_called_once_with()
+        self.assertEqual(self.wrapper._idle_connections, [])
+        self.assertEqual(self.wrapper._ssl_session, None)
+
+
 class TestPulpConnection(unittest.TestCase):
     """
     This class contains tests for the PulpConnection object.
@@ -198,6 +423,8 @@ class TestPulpConnection(unittest.TestCase):
         self.assertEqual(connection.oauth_key, None)
         self.assertEqual(connection.oauth_secret, None)
         self.assertEqual(connection.oauth_user, 'admin')
+        self.assertEqual(connection.pool_size, server.DEFAULT_POOL_SIZE)
+        self.assertEqual(connection.idle_timeout, server.DEFAULT_IDLE_TIMEOUT)
 
         # Make sure the headers are right
         expected_locale = locale.getdefaultlocale()[0]
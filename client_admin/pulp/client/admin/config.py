@@ -13,6 +13,7 @@ DEFAULT = {
         'verify_ssl': 'true',
         'ca_path': DEFAULT_CA_PATH,
         'upload_chunk_size': '1048576',
+        'upload_concurrency': '1',
     },
     'client': {
         'role': 'admin'
@@ -41,6 +42,7 @@ SCHEMA = (
             ('verify_ssl', REQUIRED, BOOL),
             ('ca_path', REQUIRED, ANY),
             ('upload_chunk_size', REQUIRED, NUMBER),
+            ('upload_concurrency', REQUIRED, NUMBER),
         )
      ),
     ('client', REQUIRED,
@@ -9,11 +9,18 @@ import copy
 import errno
 import os
 import pickle
+from itertools import imap
+from multiprocessing import TimeoutError
+from multiprocessing.pool import ThreadPool
 
 from pulp.common.lock import LockFile
 
 
 DEFAULT_CHUNKSIZE = 1048576  # 1 MB per upload call
+DEFAULT_CONCURRENCY = 1  # upload calls in flight at once
+TRACKER_SAVE_FREQUENCY = 10  # uploaded chunks between saves of the tracker file
+# Seconds between checks for a KeyboardInterrupt while waiting on concurrent upload calls
+INTERRUPT_CHECK_INTERVAL = 1
 
 
 class ManagerUninitializedException(Exception):
@@ -71,7 +78,8 @@ class UploadManager(object):
     on disk state files.
     """
 
-    def __init__(self, upload_working_dir, bindings, chunk_size=DEFAULT_CHUNKSIZE):
+    def __init__(self, upload_working_dir, bindings, chunk_size=DEFAULT_CHUNKSIZE,
+                 concurrency=DEFAULT_CONCURRENCY):
         """
         @param upload_working_dir: directory in which to store client-side files
                to track upload requests; if it doesn't exist it will be created
@@ -84,10 +92,14 @@ class UploadManager(object):
         @param chunk_size: size in bytes of data to upload on each call to the
                server
         @type  chunk_size: int
+
+        @param concurrency: number of chunks to upload to the server at once
+        @type  concurrency: int
         """
         self.upload_working_dir = upload_working_dir
         self.bindings = bindings
         self.chunk_size = chunk_size
+        self.concurrency = concurrency
 
         # Internal state
         self.tracker_files = {}
@@ -111,7 +123,9 @@ class UploadManager(object):
         upload_working_dir = os.path.join(context.config['filesystem']['upload_working_dir'],
                                           'default')
         upload_working_dir = os.path.expanduser(upload_working_dir)
-        return cls(upload_working_dir, context.server)
+        concurrency = int(context.config.get('server', {}).get('upload_concurrency',
+                                                               DEFAULT_CONCURRENCY))
+        return cls(upload_working_dir, context.server, concurrency=concurrency)
 
     def initialize(self):
         """
@@ -184,13 +198,19 @@ class UploadManager(object):
         Begins or resumes the upload process for the given upload request.
         This call will not return until the upload is complete. The other
         expected exit point is a KeyboardError to kill the process. The
-        client-side on disk tracker files will store the current offset and
-        resume the upload from where it left off on the next call to this method.
+        client-side on disk tracker files will store the ranges of the file
+        already uploaded and resume the upload with the rest of the file on the
+        next call to this method.
+
+        When the concurrency of this instance is greater than one, that many
+        chunks are uploaded at once and may complete out of order. The tracker
+        file is saved after every TRACKER_SAVE_FREQUENCY chunks, so an
+        interrupted upload may upload a few chunks again when it is resumed.
 
         The callback_func is used to get feedback on the upload process. After
         each successful upload segment call to the server, this function
-        will be invoked with the new offset in the file and the file size
-        (intended to be fed into a progress indicator). As this is called
+        will be invoked with the number of bytes uploaded so far and the file
+        size (intended to be fed into a progress indicator). As this is called
         after each upload segment call, the granularity at which it is called
         depends on the chunk_size value for this instance.
 
@@ -234,23 +254,19 @@ class UploadManager(object):
             tracker_file.save()
 
             source_file_size = os.path.getsize(tracker_file.source_filename)
+            chunks = tracker_file.pending_chunks(source_file_size, self.chunk_size)
 
-            f = open(tracker_file.source_filename, 'r')
-            while True:
-                # Load the chunk to upload
-                f.seek(tracker_file.offset)
-                data = f.read(self.chunk_size)
-                if not data:
-                    break
-
-                # Server request
-                self.bindings.uploads.upload_segment(upload_id, tracker_file.offset, data)
-
+            unsaved_chunks = 0
+            for offset, length in self._upload_chunks(upload_id, tracker_file.source_filename,
+                                                      chunks):
                 # Status update and callback notification
-                tracker_file.offset = min(tracker_file.offset + self.chunk_size, source_file_size)
-                tracker_file.save()
+                tracker_file.add_completed_range(offset, offset + length)
+                unsaved_chunks += 1
+                if unsaved_chunks >= TRACKER_SAVE_FREQUENCY:
+                    tracker_file.save()
+                    unsaved_chunks = 0
 
-                callback_func(tracker_file.offset, source_file_size)
+                callback_func(tracker_file.completed_size(), source_file_size)
 
             tracker_file.is_finished_uploading = True
         finally:
@@ -259,6 +275,56 @@ class UploadManager(object):
             tracker_file.is_running = False
             tracker_file.save()
 
+    def _upload_chunks(self, upload_id, filename, chunks):
+        """
+        Uploads the given chunks of the file, keeping up to the concurrency of
+        this instance in flight at once.
+
+        @param upload_id: identifies the upload request
+        @type  upload_id: str
+
+        @param filename: full path to the file on disk to upload
+        @type  filename: str
+
+        @param chunks: (offset, length) of each chunk of the file to upload
+        @type  chunks: list
+
+        @return: generator of the (offset, length) of each chunk once it is
+                 uploaded, in order of completion
+        @rtype:  generator
+        """
+        def upload_chunk(chunk):
+            offset, length = chunk
+            f = open(filename, 'r')
+            try:
+                f.seek(offset)
+                data = f.read(length)
+            finally:
+                f.close()
+            self.bindings.uploads.upload_segment(upload_id, offset, data)
+            return chunk
+
+        if self.concurrency <= 1:
+            for chunk in imap(upload_chunk, chunks):
+                yield chunk
+            return
+
+        pool = ThreadPool(self.concurrency)
+        uploaded = pool.imap_unordered(upload_chunk, chunks)
+        try:
+            while True:
+                # a blocking next() cannot be interrupted, so wait with a timeout to let
+                # a KeyboardInterrupt reach this thread
+                try:
+                    chunk = uploaded.next(INTERRUPT_CHECK_INTERVAL)
+                except TimeoutError:
+                    continue
+                except StopIteration:
+                    break
+                yield chunk
+        finally:
+            pool.terminate()
+
     def import_upload(self, upload_id):
         """
         Once the file is finished uploading, this call will request the server
@@ -397,7 +463,8 @@ class UploadTracker(object):
         # Upload call information
         self.upload_id = None
         self.location = None  # URL to the upload request on the server
-        self.offset = None  # start of next chunk to upload
+        self.offset = None  # end of the data uploaded contiguously from the start of the file
+        self.completed_ranges = []  # [start, end) byte ranges of the file uploaded so far
         self.source_filename = None  # path on disk to the file to upload
 
         # Import call information
@@ -410,6 +477,70 @@ class UploadTracker(object):
         self.is_running = False
         self.is_finished_uploading = False
 
+    def _completed_ranges(self):
+        """
+        @return: [start, end) byte ranges of the file uploaded so far, sorted
+                 and not overlapping
+        @rtype:  list
+        """
+        if getattr(self, 'completed_ranges', None) is None:
+            # Tracker files saved before ranges were tracked only know the offset
+            self.completed_ranges = [[0, self.offset]] if self.offset else []
+        return self.completed_ranges
+
+    def add_completed_range(self, start, end):
+        """
+        Records that the given range of the file was uploaded.
+
+        @param start: offset of the first byte of the range
+        @type  start: int
+
+        @param end: offset just past the last byte of the range
+        @type  end: int
+        """
+        merged = []
+        for range_start, range_end in self._completed_ranges():
+            if range_end < start or range_start > end:
+                merged.append([range_start, range_end])
+            else:
+                start = min(start, range_start)
+                end = max(end, range_end)
+        merged.append([start, end])
+        merged.sort()
+        self.completed_ranges = merged
+        self.offset = merged[0][1] if merged[0][0] == 0 else 0
+
+    def completed_size(self):
+        """
+        @return: number of bytes of the file uploaded so far
+        @rtype:  int
+        """
+        return sum(end - start for start, end in self._completed_ranges())
+
+    def pending_chunks(self, size, chunk_size):
+        """
+        Splits the ranges of the file that are not uploaded yet into chunks.
+
+        @param size: size of the file in bytes
+        @type  size: int
+
+        @param chunk_size: maximum size in bytes of a chunk
+        @type  chunk_size: int
+
+        @return: (offset, length) of each chunk to upload, in file order
+        @rtype:  list
+        """
+        chunks = []
+        position = 0
+        for start, end in self._completed_ranges() + [[size, size]]:
+            start = min(start, size)
+            while position < start:
+                length = min(chunk_size, start - position)
+                chunks.append((position, length))
+                position += length
+            position = max(position, end)
+        return chunks
+
     def save(self):
         """
         Saves the current state of the tracker file. This will lock on the file
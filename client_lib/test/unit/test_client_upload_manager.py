@@ -54,6 +54,16 @@ class UploadManagerTests(unittest.TestCase):
 
         self.assertTrue(isinstance(manager, upload_util.UploadManager))
         self.assertEqual(manager.upload_working_dir, '/a/b/c/default')
+        self.assertEqual(manager.concurrency, upload_util.DEFAULT_CONCURRENCY)
+
+    def test_init_with_defaults_concurrency(self):
+        context = mock.MagicMock()
+        context.config = {'filesystem': {'upload_working_dir': '/a/b/c'},
+                          'server': {'upload_concurrency': '4'}}
+
+        manager = upload_util.UploadManager.init_with_defaults(context)
+
+        self.assertEqual(manager.concurrency, 4)
 
     def test_initialize_no_trackers(self):
         os.makedirs(self.upload_working_dir)
@@ -289,6 +299,124 @@ class UploadManagerTests(unittest.TestCase):
         tracker = self.upload_manager._get_tracker_file_by_id(upload_id)
         self.assertEqual(rpm_size, tracker.offset)
 
+    def test_upload_parallel(self):
+        # Setup
+        self.upload_manager.chunk_size = 100
+        self.upload_manager.concurrency = 4
+        self.upload_manager.initialize()
+        upload_id = self.upload_manager.initialize_upload(TEST_RPM_FILENAME, 'repo-1', 'type-1',
+                                                          {'k': 'v'}, 'm-1')
+
+        mock_callback = mock.Mock()
+
+        # Test
+        self.upload_manager.upload(upload_id, mock_callback.update_status)
+
+        # Verify
+        rpm_size = os.path.getsize(TEST_RPM_FILENAME)
+        num_upload_calls = int(math.ceil(float(rpm_size) / float(self.upload_manager.chunk_size)))
+        self.assertEqual(num_upload_calls, self.mock_upload_bindings.upload_segment.call_count)
+        self.assertEqual(num_upload_calls, mock_callback.update_status.call_count)
+        self.assertEqual((rpm_size, rpm_size), mock_callback.update_status.call_args[0])
+
+        # Every chunk was sent with the data at its offset
+        f = open(TEST_RPM_FILENAME, 'r')
+        expected_body = f.read()
+        f.close()
+        offsets = []
+        for single_call_args in self.mock_upload_bindings.upload_segment.call_args_list:
+            upload_args = single_call_args[0]
+            self.assertEqual(upload_id, upload_args[0])
+            offset = upload_args[1]
+            self.assertEqual(expected_body[offset:offset + 100], upload_args[2])
+            offsets.append(offset)
+        self.assertEqual(range(0, rpm_size, 100), sorted(offsets))
+
+        # Verify the state of the tracker file on disk
+        tf_filename = self.upload_manager._tracker_filename(upload_id)
+        tracker = upload_util.UploadTracker.load(tf_filename)
+        self.assertEqual(rpm_size, tracker.offset)
+        self.assertEqual([[0, rpm_size]], tracker.completed_ranges)
+        self.assertEqual(True, tracker.is_finished_uploading)
+
+    def test_upload_resume_ranges(self):
+        # Setup
+        self.upload_manager.chunk_size = 100
+        self.upload_manager.initialize()
+        upload_id = self.upload_manager.initialize_upload(TEST_RPM_FILENAME, 'repo-1', 'type-1',
+                                                          {'k': 'v'}, 'm-1')
+        tracker = self.upload_manager._get_tracker_file_by_id(upload_id)
+        tracker.add_completed_range(0, 250)
+        tracker.add_completed_range(300, 400)
+
+        # Test
+        self.upload_manager.upload(upload_id, mock.Mock())
+
+        # Verify
+        rpm_size = os.path.getsize(TEST_RPM_FILENAME)
+        offsets = [c[0][1] for c in self.mock_upload_bindings.upload_segment.call_args_list]
+        self.assertEqual([250] + range(400, rpm_size, 100), offsets)
+        self.assertEqual(50, len(self.mock_upload_bindings.upload_segment.call_args_list[0][0][2]))
+        self.assertEqual([[0, rpm_size]], tracker.completed_ranges)
+
+    @mock.patch('pulp.client.upload.manager.TRACKER_SAVE_FREQUENCY', 3)
+    @mock.patch('pulp.client.upload.manager.UploadTracker.save')
+    def test_upload_batches_tracker_saves(self, mock_save):
+        # Setup
+        self.upload_manager.chunk_size = 100
+        self.upload_manager.initialize()
+        upload_id = self.upload_manager.initialize_upload(TEST_RPM_FILENAME, 'repo-1', 'type-1',
+                                                          {'k': 'v'}, 'm-1')
+        mock_save.reset_mock()
+
+        # Test
+        self.upload_manager.upload(upload_id, mock.Mock())
+
+        # Verify
+        num_upload_calls = self.mock_upload_bindings.upload_segment.call_count
+        # once when started, every 3 chunks, and once when finished
+        self.assertEqual(2 + num_upload_calls // 3, mock_save.call_count)
+
+    def test_upload_parallel_failure(self):
+        # Setup
+        self.upload_manager.chunk_size = 100
+        self.upload_manager.concurrency = 2
+        self.upload_manager.initialize()
+        upload_id = self.upload_manager.initialize_upload(TEST_RPM_FILENAME, 'repo-1', 'type-1',
+                                                          {'k': 'v'}, 'm-1')
+        self.mock_upload_bindings.upload_segment.side_effect = ValueError()
+
+        # Test
+        self.assertRaises(ValueError, self.upload_manager.upload, upload_id, mock.Mock())
+
+        # Verify
+        tracker = self.upload_manager._get_tracker_file_by_id(upload_id)
+        self.assertEqual(False, tracker.is_running)
+        self.assertEqual(False, tracker.is_finished_uploading)
+        self.assertEqual([], tracker.completed_ranges)
+
+    @mock.patch('pulp.client.upload.manager.ThreadPool')
+    def test_upload_parallel_interrupted(self, mock_pool):
+        # Setup
+        self.upload_manager.chunk_size = 100
+        self.upload_manager.concurrency = 2
+        self.upload_manager.initialize()
+        upload_id = self.upload_manager.initialize_upload(TEST_RPM_FILENAME, 'repo-1', 'type-1',
+                                                          {'k': 'v'}, 'm-1')
+        uploaded = mock_pool.return_value.imap_unordered.return_value
+        uploaded.next.side_effect = [upload_util.TimeoutError(), (0, 100), KeyboardInterrupt()]
+
+        # Test
+        self.assertRaises(KeyboardInterrupt, self.upload_manager.upload, upload_id, mock.Mock())
+
+        # Verify
+        self.assertEqual([mock.call(upload_util.INTERRUPT_CHECK_INTERVAL)] * 3,
+                         uploaded.next.call_args_list)
+        mock_pool.return_value.terminate.assert_called_once_with()
+        tracker = self.upload_manager._get_tracker_file_by_id(upload_id)
+        self.assertEqual(False, tracker.is_running)
+        self.assertEqual([[0, 100]], tracker.completed_ranges)
+
     def test_upload_concurrent_upload(self):
         # Setup
         self.upload_manager.initialize()
@@ -444,3 +572,40 @@ class UploadManagerTests(unittest.TestCase):
         Configures the mock bindings to return a valid response on importing an upload.
         """
         self.mock_upload_bindings.import_upload.return_value = Response(200, {})
+
+
+class UploadTrackerTests(unittest.TestCase):
+
+    def setUp(self):
+        self.tracker = upload_util.UploadTracker('tracker')
+        self.tracker.offset = 0
+
+    def test_add_completed_range(self):
+        self.tracker.add_completed_range(100, 200)
+        self.assertEqual([[100, 200]], self.tracker.completed_ranges)
+        self.assertEqual(0, self.tracker.offset)
+        self.tracker.add_completed_range(300, 400)
+        self.tracker.add_completed_range(0, 100)
+        self.assertEqual([[0, 200], [300, 400]], self.tracker.completed_ranges)
+        self.assertEqual(200, self.tracker.offset)
+        self.tracker.add_completed_range(200, 300)
+        self.assertEqual([[0, 400]], self.tracker.completed_ranges)
+        self.assertEqual(400, self.tracker.offset)
+        self.assertEqual(400, self.tracker.completed_size())
+
+    def test_pending_chunks(self):
+        self.tracker.add_completed_range(100, 150)
+        self.tracker.add_completed_range(300, 400)
+        self.assertEqual([(0, 100), (150, 100), (250, 50), (400, 100), (500, 20)],
+                         self.tracker.pending_chunks(520, 100))
+
+    def test_pending_chunks_complete(self):
+        self.tracker.add_completed_range(0, 520)
+        self.assertEqual([], self.tracker.pending_chunks(520, 100))
+
+    def test_tracker_without_ranges(self):
+        # Tracker files saved by older versions only have the offset
+        del self.tracker.completed_ranges
+        self.tracker.offset = 200
+        self.assertEqual([(200, 100), (300, 20)], self.tracker.pending_chunks(320, 100))
+        self.assertEqual(200, self.tracker.completed_size())
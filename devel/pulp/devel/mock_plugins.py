@@ -218,6 +218,8 @@ def install():
             mock.Mock(side_effect=lambda i, u, o, c, x: sorted(u))
         profiler.calculate_applicable_units = \
             mock.Mock(side_effect=lambda t, p, r, c, x: ['mocked-unit1', 'mocked-unit2'])
+        profiler.calculate_applicable_units_batch = mock.Mock(side_effect=NotImplementedError())
+        profiler.calculate_applicable_units_delta = mock.Mock(side_effect=NotImplementedError())
 
 
 def reset():
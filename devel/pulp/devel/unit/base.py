@@ -22,6 +22,7 @@ DEFAULT_CONFIG = {
         'verify_ssl': 'true',
         'ca_path': DEFAULT_CA_PATH,
         'upload_chunk_size': '1048576',
+        'upload_concurrency': '1',
     },
     'client': {
         'role': 'admin'
@@ -0,0 +1,65 @@
+'''
+Loads the repo auth configuration. The file is read every time an HTTPS request for content is
+authorized, so it is parsed once per process and only parsed again after it is modified.
+'''
+
+import os
+from ConfigParser import SafeConfigParser
+from threading import RLock
+
+# This needs to be accessible on both Pulp and the CDS instances, so a
+# separate config file for repo auth purposes is used.
+CONFIG_FILENAME = '/etc/pulp/repo_auth.conf'
+
+# -- constants ----------------------------------------------------------------------
+
+LOAD_LOCK = RLock()
+
+# mapping of filename to the (stamp, config) it was last loaded with
+_loaded = {}
+
+
+def get_config(filename=CONFIG_FILENAME):
+    '''
+    Returns the parsed configuration file. The same object is returned until the file is
+    modified, so it must not be changed by the caller.
+
+    @param filename: absolute path to the configuration file
+    @type  filename: str
+
+    @return: the parsed configuration; empty if the file does not exist
+    @rtype:  SafeConfigParser
+    '''
+    stamp = _stamp(filename)
+    loaded = _loaded.get(filename)
+    if loaded is not None and loaded[0] == stamp:
+        return loaded[1]
+
+    LOAD_LOCK.acquire()
+    try:
+        loaded = _loaded.get(filename)
+        if loaded is not None and loaded[0] == stamp:
+            return loaded[1]
+        config = SafeConfigParser()
+        config.read(filename)
+        _loaded[filename] = (stamp, config)
+        return config
+    finally:
+        LOAD_LOCK.release()
+
+
+def _stamp(filename):
+    '''
+    Returns a value that changes when the file is modified or replaced.
+
+    @param filename: absolute path to the file
+    @type  filename: str
+
+    @return: modification time, size and inode of the file; None if it does not exist
+    @rtype:  tuple or None
+    '''
+    try:
+        st = os.stat(filename)
+    except OSError:
+        return None
+    return st.st_mtime, st.st_size, st.st_ino
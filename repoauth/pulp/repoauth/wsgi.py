@@ -1,10 +1,97 @@
-from ConfigParser import SafeConfigParser
+import calendar
+import hashlib
+import posixpath
+import time
+from collections import OrderedDict
+from threading import RLock
+
+from M2Crypto import X509
 from pkg_resources import iter_entry_points
 
 from pulp.repoauth import auth_enabled_validation
+from pulp.repoauth import config as repo_auth_config
 
 AUTH_ENTRY_POINT = 'pulp_content_authenticators'
-CONFIG_FILENAME = '/etc/pulp/repo_auth.conf'
+CONFIG_FILENAME = repo_auth_config.CONFIG_FILENAME
+
+# Seconds an access decision is cached, unless the client certificate expires sooner. Changes to
+# repo certificate bundles and protected repos are seen within this time; changes to the config
+# file are seen immediately.
+VERIFICATION_CACHE_TTL = 60
+
+# The maximum number of access decisions cached.
+VERIFICATION_CACHE_SIZE = 10000
+
+
+class VerificationCache(object):
+    """
+    Remembers whether the authenticators allowed a client certificate to access a path, so that
+    the certificate is not parsed and verified again for every request of the path. The least
+    recently used decisions are discarded first.
+    """
+
+    def __init__(self, ttl=VERIFICATION_CACHE_TTL, size=VERIFICATION_CACHE_SIZE):
+        """
+        :param ttl:  The maximum number of seconds a decision is cached
+        :type  ttl:  int
+        :param size: The maximum number of decisions cached
+        :type  size: int
+        """
+        self.ttl = ttl
+        self.size = size
+        self._decisions = OrderedDict()
+        self._lock = RLock()
+
+    def get(self, key):
+        """
+        :param key: The certificate fingerprint and path
+        :type  key: tuple
+
+        :return: True or False if the decision is cached, None otherwise
+        :rtype:  bool or None
+        """
+        with self._lock:
+            cached = self._decisions.pop(key, None)
+            if cached is None or time.time() >= cached[1]:
+                return None
+            # keep the most recently used decisions at the end
+            self._decisions[key] = cached
+            return cached[0]
+
+    def add(self, key, allowed, not_after):
+        """
+        :param key:       The certificate fingerprint and path
+        :type  key:       tuple
+        :param allowed:   Whether access was allowed
+        :type  allowed:   bool
+        :param not_after: The time the certificate expires
+        :type  not_after: float
+        """
+        expires = min(time.time() + self.ttl, not_after)
+        if expires <= time.time():
+            return
+        with self._lock:
+            self._decisions.pop(key, None)
+            self._decisions[key] = (allowed, expires)
+            while len(self._decisions) > self.size:
+                self._decisions.popitem(last=False)
+
+    def clear(self):
+        """
+        Forget all cached decisions.
+        """
+        with self._lock:
+            self._decisions.clear()
+
+
+# shared by the requests authorized in this process
+verification_cache = VerificationCache()
+
+# the authenticators, loaded once per process
+_authenticators = None
+
+# the config the cached decisions were made with
+_config = None
 
 
 def allow_access(environ, host):
@@ -13,6 +100,9 @@ def allow_access(environ, host):
     authentication.  If the authentication is successful, this method returns
     True.  If validation fails, False is returned.
 
+    Decisions for requests with a client certificate are cached for the requested path only, as
+    the authenticators may allow a certificate to access some paths of a repo but not others.
+
     :param environ: environ passed in from mod_wsgi
     :type  environ: dict of env vars
 
@@ -28,10 +118,41 @@ def allow_access(environ, host):
     if auth_enabled_validation.authenticate(environ):
         return True
 
+    # forget the decisions made with a config that has since been modified
+    global _config
+    config = repo_auth_config.get_config(CONFIG_FILENAME)
+    if config is not _config:
+        verification_cache.clear()
+        _config = config
+
+    cert_pem = _client_cert(environ)
+    key = _cache_key(environ, cert_pem)
+    if key is not None:
+        allowed = verification_cache.get(key)
+        if allowed is not None:
+            return allowed
+
+    allowed = _authenticate(environ)
+
+    if key is not None:
+        not_after = _not_after(cert_pem)
+        if not_after is not None:
+            verification_cache.add(key, allowed, not_after)
+    return allowed
+
+
+def _authenticate(environ):
+    """
+    Run the authenticators that are not disabled.
+
+    :param environ: environ passed in from mod_wsgi
+    :type  environ: dict of env vars
+
+    :return: True if all of the authenticators allow the request, otherwise False.
+    :rtype:  Boolean
+    """
     # find all of the authenticator methods we need to try
-    authenticators = {}
-    for ep in iter_entry_points(group=AUTH_ENTRY_POINT):
-        authenticators.update({ep.name: ep.load()})
+    authenticators = _get_authenticators()
 
     # load our list of disabled authenticators
     disabled_authenticators = _get_disabled_authenticators()
@@ -47,12 +168,74 @@ def allow_access(environ, host):
     return True
 
 
+def _get_authenticators():
+    """
+    Load the authenticators registered for the AUTH_ENTRY_POINT. They are loaded on first use
+    and kept for the life of the process.
+
+    :return: mapping of authenticator name to authenticator
+    :rtype:  dict
+    """
+    global _authenticators
+    if _authenticators is None:
+        authenticators = {}
+        for ep in iter_entry_points(group=AUTH_ENTRY_POINT):
+            authenticators.update({ep.name: ep.load()})
+        _authenticators = authenticators
+    return _authenticators
+
+
 def _get_disabled_authenticators():
     disabled_authenticators = []
-    config = SafeConfigParser()
-    config.read(CONFIG_FILENAME)
+    config = repo_auth_config.get_config(CONFIG_FILENAME)
 
     if config.has_option('main', 'disabled_authenticators'):
         disabled_authenticators = config.get('main', 'disabled_authenticators').split(',')
 
     return disabled_authenticators
+
+
+def _client_cert(environ):
+    """
+    :param environ: environ passed in from mod_wsgi
+    :type  environ: dict of env vars
+
+    :return: the PEM encoded client certificate, or None if there is not one
+    :rtype:  str or None
+    """
+    cert_pem = environ.get('SSL_CLIENT_CERT')
+    if not cert_pem and 'mod_ssl.var_lookup' in environ:
+        cert_pem = environ['mod_ssl.var_lookup']('SSL_CLIENT_CERT')
+    return cert_pem or None
+
+
+def _cache_key(environ, cert_pem):
+    """
+    :param environ:  environ passed in from mod_wsgi
+    :type  environ:  dict of env vars
+    :param cert_pem: the PEM encoded client certificate
+    :type  cert_pem: str or None
+
+    :return: the fingerprint of the certificate and the normalized requested path; None if the
+             decision should not be cached
+    :rtype:  tuple or None
+    """
+    uri = environ.get('REQUEST_URI')
+    if not cert_pem or not uri or '?' in uri:
+        return None
+    return hashlib.sha256(cert_pem).hexdigest(), posixpath.normpath(uri)
+
+
+def _not_after(cert_pem):
+    """
+    :param cert_pem: the PEM encoded client certificate
+    :type  cert_pem: str
+
+    :return: the time the certificate expires, or None if it cannot be parsed
+    :rtype:  float or None
+    """
+    try:
+        not_after = X509.load_cert_string(cert_pem).get_not_after().get_datetime()
+    except (X509.X509Error, ValueError):
+        return None
+    return calendar.timegm(not_after.utctimetuple())
@@ -2,11 +2,13 @@ import mock
 import unittest
 
 import pulp.repoauth.auth_enabled_validation as auth_enabled_validation
+from pulp.repoauth import config
 
 
 class TestAuthEnabledValiation(unittest.TestCase):
 
-    @mock.patch("pulp.repoauth.auth_enabled_validation.SafeConfigParser")
+    @mock.patch.dict(config._loaded, clear=True)
+    @mock.patch("pulp.repoauth.config.SafeConfigParser")
     def test_config_read(self, mock_parser):
         mock_parser_instance = mock.Mock()
         mock_parser.return_value = mock_parser_instance
@@ -0,0 +1,63 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import mock
+
+from pulp.repoauth import config
+
+
+class TestGetConfig(unittest.TestCase):
+
+    def setUp(self):
+        self.working_dir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.working_dir, 'repo_auth.conf')
+
+    def tearDown(self):
+        shutil.rmtree(self.working_dir)
+        config._loaded.pop(self.filename, None)
+
+    def _write(self, enabled):
+        with open(self.filename, 'w') as f:
+            f.write('[main]\nenabled: %s\n' % enabled)
+
+    def test_cached(self):
+        """
+        Test that the file is only parsed again after it is modified
+        """
+        self._write('true')
+        loaded = config.get_config(self.filename)
+
+        self.assertTrue(config.get_config(self.filename) is loaded)
+        self.assertEquals(loaded.get('main', 'enabled'), 'true')
+
+        self._write('false')
+        # make sure the modification time differs on file systems with coarse timestamps
+        st = os.stat(self.filename)
+        os.utime(self.filename, (st.st_atime, st.st_mtime + 10))
+        reloaded = config.get_config(self.filename)
+
+        self.assertTrue(reloaded is not loaded)
+        self.assertEquals(reloaded.get('main', 'enabled'), 'false')
+
+    def test_missing(self):
+        """
+        Test that an empty config is returned when the file does not exist
+        """
+        loaded = config.get_config(self.filename)
+
+        self.assertFalse(loaded.has_section('main'))
+        self.assertTrue(config.get_config(self.filename) is loaded)
+
+    @mock.patch('pulp.repoauth.config.SafeConfigParser')
+    def test_read_once(self, mock_parser):
+        """
+        Test that the parser reads the file only for the first call
+        """
+        self._write('true')
+
+        config.get_config(self.filename)
+        config.get_config(self.filename)
+
+        mock_parser.return_value.read.assert_called_once_with(self.filename)
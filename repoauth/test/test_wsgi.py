@@ -1,9 +1,16 @@
+import os
+import time
 import unittest
+
 import mock
 
+from pulp.repoauth import config, wsgi
 from pulp.repoauth.wsgi import allow_access, _get_disabled_authenticators
 
 
+DATA_DIR = os.path.join(os.path.dirname(__file__), 'data')
+
+
 class TestWsgi(unittest.TestCase):
 
     def setUp(self):
@@ -23,6 +30,11 @@ class TestWsgi(unittest.TestCase):
 
         self.entrypoint_list = [entrypoint_one, entrypoint_two]
 
+        # authenticators and decisions are kept for the life of the process
+        wsgi._authenticators = None
+        wsgi._config = None
+        wsgi.verification_cache.clear()
+
     @mock.patch('pulp.repoauth.auth_enabled_validation.authenticate')
     def test_auth_disabled(self, auth_enabled):
         """
@@ -30,7 +42,7 @@ class TestWsgi(unittest.TestCase):
         """
         # NB: 'True' means that auth is disabled
         auth_enabled.return_value = True
-        environ = mock.Mock()
+        environ = {}
 
         self.assertTrue(allow_access(environ, 'fake.host.name'))
 
@@ -43,7 +55,7 @@ class TestWsgi(unittest.TestCase):
         # NB: 'False' means that auth is enabled
         auth_enabled.return_value = False
 
-        environ = mock.Mock()
+        environ = {}
         iter_ep.return_value = self.entrypoint_list
 
         self.assertTrue(allow_access(environ, 'fake.host.name'))
@@ -59,7 +71,7 @@ class TestWsgi(unittest.TestCase):
         # NB: 'False' means that auth is enabled
         auth_enabled.return_value = False
 
-        environ = mock.Mock()
+        environ = {}
         self.auth_one.return_value = True
         self.auth_two.return_value = False
         iter_ep.return_value = self.entrypoint_list
@@ -74,7 +86,7 @@ class TestWsgi(unittest.TestCase):
         """
         # NB: 'False' means that auth is enabled
         auth_enabled.return_value = False
-        environ = mock.Mock()
+        environ = {}
 
         self.auth_one.return_value = False
         self.auth_two.return_value = False
@@ -93,7 +105,7 @@ class TestWsgi(unittest.TestCase):
         """
         # NB: 'False' means that auth is enabled
         auth_enabled.return_value = False
-        environ = mock.Mock()
+        environ = {}
 
         self.auth_one.return_value = True
         self.auth_two.return_value = True
@@ -110,7 +122,7 @@ class TestWsgi(unittest.TestCase):
         """
         # NB: 'False' means that auth is enabled
         auth_enabled.return_value = False
-        environ = mock.Mock()
+        environ = {}
 
         disabled_authenticators.return_value = ['auth_one', 'auth_two']
 
@@ -120,7 +132,8 @@ class TestWsgi(unittest.TestCase):
 
         self.assertTrue(allow_access(environ, 'fake.host.name'))
 
-    @mock.patch("pulp.repoauth.wsgi.SafeConfigParser")
+    @mock.patch.dict(config._loaded, clear=True)
+    @mock.patch("pulp.repoauth.config.SafeConfigParser")
     def test_config_read(self, mock_parser):
         """
         Test that we are reading the file we think we are reading
@@ -133,3 +146,144 @@ class TestWsgi(unittest.TestCase):
 
         mock_parser_instance.read.assert_called_once_with('/etc/pulp/repo_auth.conf')
         mock_parser_instance.has_option.assert_called_once_with('main', 'disabled_authenticators')
+
+    @mock.patch('pulp.repoauth.auth_enabled_validation.authenticate', return_value=False)
+    @mock.patch('pulp.repoauth.wsgi.iter_entry_points')
+    def test_authenticators_loaded_once(self, iter_ep, auth_enabled):
+        """
+        Test that the entry points are only loaded for the first request
+        """
+        iter_ep.return_value = self.entrypoint_list
+
+        self.assertTrue(allow_access({}, 'fake.host.name'))
+        self.assertTrue(allow_access({}, 'fake.host.name'))
+
+        self.assertEquals(iter_ep.call_count, 1)
+        self.assertEquals(self.auth_one.call_count, 2)
+
+    @mock.patch('pulp.repoauth.wsgi._not_after', return_value=time.time() + 3600)
+    @mock.patch('pulp.repoauth.auth_enabled_validation.authenticate', return_value=False)
+    @mock.patch('pulp.repoauth.wsgi.iter_entry_points')
+    def test_decision_cached(self, iter_ep, auth_enabled, not_after):
+        """
+        Test that the decision is cached for the certificate and normalized path
+        """
+        iter_ep.return_value = self.entrypoint_list
+        self.auth_one.return_value = False
+
+        environ = {'SSL_CLIENT_CERT': 'cert', 'REQUEST_URI': '/pulp/repos/zoo/bear.rpm'}
+        self.assertFalse(allow_access(environ, 'fake.host.name'))
+        environ = {'SSL_CLIENT_CERT': 'cert', 'REQUEST_URI': '/pulp/repos/zoo//bear.rpm'}
+        self.assertFalse(allow_access(environ, 'fake.host.name'))
+        self.assertEquals(self.auth_one.call_count, 1)
+        not_after.assert_called_once_with('cert')
+
+        environ = {'SSL_CLIENT_CERT': 'other', 'REQUEST_URI': '/pulp/repos/zoo/bear.rpm'}
+        self.assertFalse(allow_access(environ, 'fake.host.name'))
+        environ = {'SSL_CLIENT_CERT': 'cert', 'REQUEST_URI': '/pulp/repos/zoo2/bear.rpm'}
+        self.assertFalse(allow_access(environ, 'fake.host.name'))
+        self.assertEquals(self.auth_one.call_count, 3)
+
+    @mock.patch('pulp.repoauth.wsgi._not_after', return_value=time.time() + 3600)
+    @mock.patch('pulp.repoauth.auth_enabled_validation.authenticate', return_value=False)
+    @mock.patch('pulp.repoauth.wsgi.iter_entry_points')
+    def test_decision_per_path(self, iter_ep, auth_enabled, not_after):
+        """
+        Test that a decision for one path is not used for other paths of the same repo
+        """
+        iter_ep.return_value = self.entrypoint_list
+        self.auth_one.side_effect = [True, False, False]
+
+        for uri in ('/pulp/repos/zoo/bear.rpm', '/pulp/repos/zoo/wolf.rpm',
+                    '/pulp/repos/zoo/Packages/bear.rpm'):
+            environ = {'SSL_CLIENT_CERT': 'cert', 'REQUEST_URI': uri}
+            self.assertEquals(allow_access(environ, 'fake.host.name'), uri.endswith('zoo/bear.rpm'))
+
+        self.assertEquals(self.auth_one.call_count, 3)
+
+    @mock.patch('pulp.repoauth.wsgi._not_after', return_value=time.time() + 3600)
+    @mock.patch('pulp.repoauth.auth_enabled_validation.authenticate', return_value=False)
+    @mock.patch('pulp.repoauth.wsgi.iter_entry_points')
+    def test_decision_not_cached(self, iter_ep, auth_enabled, not_after):
+        """
+        Test that requests without a certificate or with a query are not cached
+        """
+        iter_ep.return_value = self.entrypoint_list
+
+        for environ in ({'REQUEST_URI': '/pulp/repos/zoo/bear.rpm'},
+                        {'SSL_CLIENT_CERT': 'cert', 'REQUEST_URI': '/pulp/repos/zoo/?a=/b'}):
+            self.assertTrue(allow_access(environ, 'fake.host.name'))
+            self.assertTrue(allow_access(environ, 'fake.host.name'))
+
+        self.assertEquals(self.auth_one.call_count, 4)
+        self.assertFalse(not_after.called)
+
+    @mock.patch('pulp.repoauth.wsgi._not_after', return_value=time.time() + 3600)
+    @mock.patch('pulp.repoauth.config.get_config')
+    @mock.patch('pulp.repoauth.auth_enabled_validation.authenticate', return_value=False)
+    @mock.patch('pulp.repoauth.wsgi.iter_entry_points')
+    def test_config_modified(self, iter_ep, auth_enabled, get_config, not_after):
+        """
+        Test that cached decisions are forgotten when the config file is modified
+        """
+        iter_ep.return_value = self.entrypoint_list
+        get_config.return_value.has_option.return_value = False
+        environ = {'SSL_CLIENT_CERT': 'cert', 'REQUEST_URI': '/pulp/repos/zoo/bear.rpm'}
+
+        self.assertTrue(allow_access(environ, 'fake.host.name'))
+        self.assertTrue(allow_access(environ, 'fake.host.name'))
+        get_config.return_value = mock.Mock()
+        get_config.return_value.has_option.return_value = False
+        self.assertTrue(allow_access(environ, 'fake.host.name'))
+
+        self.assertEquals(self.auth_one.call_count, 2)
+
+
+class TestVerificationCache(unittest.TestCase):
+
+    @mock.patch('pulp.repoauth.wsgi.time.time', return_value=1000)
+    def test_expires(self, mock_time):
+        """
+        Test that decisions expire after the ttl or when the certificate expires
+        """
+        cache = wsgi.VerificationCache(ttl=60)
+        cache.add(('a', '/zoo'), True, 2000)
+        cache.add(('b', '/zoo'), False, 1030)
+        cache.add(('c', '/zoo'), True, 1000)
+
+        mock_time.return_value = 1029
+        self.assertEquals(cache.get(('a', '/zoo')), True)
+        self.assertEquals(cache.get(('b', '/zoo')), False)
+        self.assertEquals(cache.get(('c', '/zoo')), None)
+
+        mock_time.return_value = 1030
+        self.assertEquals(cache.get(('a', '/zoo')), True)
+        self.assertEquals(cache.get(('b', '/zoo')), None)
+
+        mock_time.return_value = 1060
+        self.assertEquals(cache.get(('a', '/zoo')), None)
+
+    def test_size(self):
+        """
+        Test that the least recently used decisions are discarded
+        """
+        cache = wsgi.VerificationCache(size=2)
+        not_after = time.time() + 3600
+        cache.add('a', True, not_after)
+        cache.add('b', True, not_after)
+        cache.get('a')
+        cache.add('c', True, not_after)
+
+        self.assertEquals(cache.get('a'), True)
+        self.assertEquals(cache.get('b'), None)
+        self.assertEquals(cache.get('c'), True)
+
+    def test_not_after(self):
+        """
+        Test reading the expiration time of a certificate
+        """
+        with open(os.path.join(DATA_DIR, 'cert.crt')) as f:
+            cert_pem = f.read()
+
+        self.assertTrue(isinstance(wsgi._not_after(cert_pem), (int, long, float)))
+        self.assertEquals(wsgi._not_after('not a certificate'), None)
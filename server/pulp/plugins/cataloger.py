@@ -13,8 +13,15 @@
 class Cataloger(object):
     """
     Catalog content provided by content sources.
+
+    :cvar full_refresh: True when a refresh adds every entry provided by the content source.
+        The entries a successful refresh did not add are then removed from the catalog.
+        Otherwise, the cataloger deletes stale entries itself using the conduit.
+    :type full_refresh: bool
     """
 
+    full_refresh = False
+
     def get_downloader(self, conduit, config, url):
         """
         Get an object suitable for downloading content contributed
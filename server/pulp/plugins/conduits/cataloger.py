@@ -1,23 +1,44 @@
+from gettext import gettext as _
+import logging
+
 from pulp.server.managers import factory as managers
 
 
+_logger = logging.getLogger(__name__)
+
+
 class CatalogerConduit(object):
     """
     Provides access to pulp platform API.
+
+    When created with a batch_size, added entries are buffered and written to
+    the content catalog using bulk inserts.  The conduit is a context manager;
+    leaving the context flushes any entries still buffered, even when the
+    context raised.  A failed flush is then logged so that the exception
+    raised in the context is not replaced.  Buffered entries are also flushed
+    before entries are deleted.
     """
 
-    def __init__(self, source_id, expires):
+    def __init__(self, source_id, expires, batch_size=0, generation=None):
         """
         :param source_id: The content source ID.
         :type source_id: str
         :param expires: The content expiration in seconds.
         :type expires: int
+        :param batch_size: The number of added entries buffered before being
+            flushed.  Entries are added one at a time when 0.
+        :type batch_size: int
+        :param generation: Identifies the refresh adding entries.
+        :type generation: str
         :return:
         """
         self.source_id = source_id
         self.expires = expires
+        self.batch_size = batch_size
+        self.generation = generation
         self.added_count = 0
         self.deleted_count = 0
+        self._pending = []
 
     def add_entry(self, type_id, unit_key, url):
         """
@@ -29,8 +50,14 @@ class CatalogerConduit(object):
         :param url: The URL used to download content associated with the unit.
         :type url: str
         """
+        if self.batch_size > 0:
+            self._pending.append((type_id, unit_key, url))
+            if len(self._pending) >= self.batch_size:
+                self.flush()
+            return
         manager = managers.content_catalog_manager()
-        manager.add_entry(self.source_id, self.expires, type_id, unit_key, url)
+        manager.add_entry(
+            self.source_id, self.expires, type_id, unit_key, url, generation=self.generation)
         self.added_count += 1
 
     def delete_entry(self, type_id, unit_key):
@@ -41,13 +68,40 @@ class CatalogerConduit(object):
         :param unit_key: The content unit key.
         :type unit_key: dict
         """
+        self.flush()
         manager = managers.content_catalog_manager()
         manager.delete_entry(self.source_id, type_id, unit_key)
         self.deleted_count += 1
 
+    def flush(self):
+        """
+        Write buffered entries to the content catalog.
+        """
+        pending = self._pending
+        if not pending:
+            return
+        self._pending = []
+        manager = managers.content_catalog_manager()
+        self.added_count += manager.add_entries(
+            self.source_id, self.expires, pending, generation=self.generation)
+
     def reset(self):
         """
         Reset statistics.
         """
         self.added_count = 0
         self.deleted_count = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *unused):
+        if exc_type is None:
+            self.flush()
+            return
+        # the exception raised in the context must not be replaced by one raised by the flush
+        try:
+            self.flush()
+        except Exception:
+            _logger.exception(_('Failed to flush catalog entries for source: %(s)s'),
+                              {'s': self.source_id})
@@ -1,4 +1,5 @@
 from gettext import gettext as _
+import copy
 import logging
 import sys
 
@@ -587,6 +588,45 @@ class AddUnitMixin(object):
             raise ImporterConduitException(e), None, sys.exc_info()[2]
 
 
+def _is_path_key(key):
+    """
+    Return whether a key can be used in the dotted path of a mongo update.
+
+    :param key: a dictionary key
+    :type  key: object
+    :return:    True if the key can be used in a path
+    :rtype:     bool
+    """
+    return isinstance(key, basestring) and key != '' and '.' not in key and \
+        not key.startswith('$')
+
+
+def _progress_changes(path, old, new, changes):
+    """
+    Collect the $set operations that turn a stored progress report into a new one. Dictionaries
+    with the same keys and lists with the same length are compared item by item, so that only
+    the values that changed are set. Any other value that changed is set in full.
+
+    :param path:    the dotted path of the value in the document
+    :type  path:    str
+    :param old:     the stored value
+    :type  old:     object
+    :param new:     the new value
+    :type  new:     object
+    :param changes: the $set operations, keyed by path, to add to
+    :type  changes: dict
+    """
+    if isinstance(old, dict) and isinstance(new, dict) and set(old) == set(new) and \
+            all(_is_path_key(key) for key in new):
+        for key, value in new.iteritems():
+            _progress_changes('%s.%s' % (path, key), old[key], value, changes)
+    elif isinstance(old, list) and isinstance(new, list) and len(old) == len(new):
+        for index, (old_value, value) in enumerate(zip(old, new)):
+            _progress_changes('%s.%d' % (path, index), old_value, value, changes)
+    elif type(old) is not type(new) or old != new:
+        changes[path] = new
+
+
 class StatusMixin(object):
 
     def __init__(self, report_id, exception_class):
@@ -601,6 +641,9 @@ class StatusMixin(object):
         contents of the status is dependent on how the distributor
         implementation chooses to divide up the publish process.
 
+        Only the parts of the status that changed since it was last set are
+        written, and nothing is written if it is unchanged.
+
         @param status: contains arbitrary data to describe the state of the
                publish; the contents may contain whatever information is relevant
                to the distributor implementation so long as it is serializable
@@ -611,10 +654,24 @@ class StatusMixin(object):
             return
 
         try:
-            self.progress_report[self.report_id] = status
-            TaskStatus.objects(task_id=self.task_id).update_one(
-                set__progress_report=self.progress_report)
+            if not _is_path_key(self.report_id):
+                report = dict(self.progress_report)
+                report[self.report_id] = status
+                changes = {'progress_report': report}
+            elif self.report_id not in self.progress_report:
+                changes = {'progress_report.%s' % self.report_id: status}
+            else:
+                changes = {}
+                _progress_changes('progress_report.%s' % self.report_id,
+                                  self.progress_report[self.report_id], status, changes)
+            if not changes:
+                return
+            TaskStatus._get_collection().update({'task_id': self.task_id}, {'$set': changes})
+            # keep a copy, since the caller may change the status in place before the next call
+            self.progress_report[self.report_id] = copy.deepcopy(status)
         except Exception, e:
+            # the stored report is unknown, so the next call writes it in full
+            self.progress_report.pop(self.report_id, None)
             _logger.exception(
                 'Exception from server setting progress for report [%s]' % self.report_id)
             try:
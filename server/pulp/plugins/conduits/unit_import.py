@@ -11,6 +11,8 @@ from pulp.plugins.conduits import mixins
 from pulp.plugins.conduits.mixins import (
     ImporterConduitException, ImporterScratchPadMixin, RepoScratchPadMixin,
     SearchUnitsMixin, AddUnitMixin)
+from pulp.server.controllers import repository as repo_controller
+from pulp.server.db import model
 import pulp.server.managers.factory as manager_factory
 
 
@@ -81,6 +83,29 @@ class ImportUnitConduit(ImporterScratchPadMixin, RepoScratchPadMixin,
             _logger.exception(_('Content unit association failed [%s]' % str(unit)))
             raise ImporterConduitException(e), None, sys.exc_info()[2]
 
+    def associate_units(self, units):
+        """
+        Associates the given units with the destination repository for the import.
+
+        This is the batched form of associate_unit; the associations are written with bulk
+        upserts, so importers copying many units should prefer it. It is idempotent in the
+        same way.
+
+        :param units: unit objects returned from the init_unit call, or content unit models
+        :type  units: iterable of pulp.plugins.model.Unit or pulp.server.db.model.ContentUnit
+
+        :return: list of the provided units
+        :rtype:  list
+        """
+        units = list(units)
+        try:
+            dest_repo = model.Repository.objects.get_repo_or_missing_resource(self.dest_repo_id)
+            repo_controller.associate_units(dest_repo, units)
+            return units
+        except Exception, e:
+            _logger.exception(_('Content unit association failed'))
+            raise ImporterConduitException(e), None, sys.exc_info()[2]
+
     def get_source_units(self, criteria=None, as_generator=False):
         """
         Returns the collection of content units associated with the source
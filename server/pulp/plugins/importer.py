@@ -257,7 +257,9 @@ class Importer(object):
 
         The APIs for both approaches are similar to those in the sync conduit.
         In the case of a simple association, the init_unit step can be skipped
-        and save_unit simply called on each specified unit.
+        and save_unit simply called on each specified unit. Units that only need
+        to be associated should be passed to the conduit's associate_units in as
+        few calls as possible, which writes the associations in bulk.
 
         The units argument is optional. If None, all units in the source
         repository should be imported. The conduit is used to query for those
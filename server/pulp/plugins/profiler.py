@@ -241,3 +241,55 @@ class Profiler(object):
         :rtype:               list of str
         """
         raise NotImplementedError()
+
+    def calculate_applicable_units_batch(self, unit_profiles, bound_repo_id, config, conduit):
+        """
+        Calculate applicability for many unit profiles against the given bound repository in a
+        single call. Profilers should implement this to load the repository's content units once
+        and evaluate every profile against them, rather than reloading the repository for each
+        profile as calculate_applicable_units does. Profilers that do not implement it have
+        calculate_applicable_units called once per profile instead.
+
+        :param unit_profiles: consumer unit profiles keyed by profile hash
+        :type  unit_profiles: dict
+        :param bound_repo_id: repo id of a repository to be used to calculate applicability
+                              against the given consumer profiles
+        :type  bound_repo_id: str
+        :param config:        plugin configuration
+        :type  config:        pulp.server.plugins.config.PluginCallConfiguration
+        :param conduit:       provides access to relevant Pulp functionality
+        :type  conduit:       pulp.plugins.conduits.profile.ProfilerConduit
+        :return:              applicability keyed by profile hash, each in the format returned by
+                              calculate_applicable_units
+        :rtype:               dict
+        """
+        raise NotImplementedError()
+
+    def calculate_applicable_units_delta(self, unit_profiles, bound_repo_id, unit_ids, config,
+                                         conduit):
+        """
+        Calculate applicability for many unit profiles against only the given units of the bound
+        repository. Pulp uses this after units are added to a repository, to patch the existing
+        applicability of the profiles instead of calculating it again for every unit in the
+        repository.
+
+        Profilers should implement this only if the applicability of a unit does not depend on
+        the other units in the repository. Profilers that do not implement it have their
+        applicability calculated again from scratch.
+
+        :param unit_profiles: consumer unit profiles keyed by profile hash
+        :type  unit_profiles: dict
+        :param bound_repo_id: repo id of the repository the units belong to
+        :type  bound_repo_id: str
+        :param unit_ids:      ids of the units added to the repository, keyed by content type id;
+                              may be empty
+        :type  unit_ids:      dict
+        :param config:        plugin configuration
+        :type  config:        pulp.server.plugins.config.PluginCallConfiguration
+        :param conduit:       provides access to relevant Pulp functionality
+        :type  conduit:       pulp.plugins.conduits.profile.ProfilerConduit
+        :return:              applicability of the given units keyed by profile hash, each in the
+                              format returned by calculate_applicable_units
+        :rtype:               dict
+        """
+        raise NotImplementedError()
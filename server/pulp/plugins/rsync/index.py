@@ -0,0 +1,172 @@
+import os
+import shutil
+import sqlite3
+
+from pulp.server.config import config as pulp_config
+
+
+def get_publish_index_path(repo_id, distributor_id):
+    """
+    Returns the path to the publish index of a distributor.
+
+    :param repo_id: ID of the repository the distributor is associated with
+    :type repo_id: str
+    :param distributor_id: ID of the distributor
+    :type distributor_id: str
+
+    :return: path to the publish index
+    :rtype: str
+    """
+    return os.path.join(pulp_config.get('server', 'storage_dir'), 'rsync', repo_id,
+                        distributor_id, 'publish_index')
+
+
+def remove_publish_index(repo_id, distributor_id):
+    """
+    Removes the publish index of a distributor, if it has one, so that every unit is published
+    by its next publish.
+
+    :param repo_id: ID of the repository the distributor is associated with
+    :type repo_id: str
+    :param distributor_id: ID of the distributor
+    :type distributor_id: str
+    """
+    index_dir = os.path.dirname(get_publish_index_path(repo_id, distributor_id))
+    shutil.rmtree(index_dir, ignore_errors=True)
+    try:
+        # the repository's directory is removed with the index of its last distributor
+        os.rmdir(os.path.dirname(index_dir))
+    except OSError:
+        pass
+
+
+class PublishIndex(object):
+    """
+    Records the content units a distributor has published to a remote server. For each unit it
+    keeps the path of the unit's symlink in the published repository, the target of the symlink
+    and the path of the unit's file relative to the content directory. A unit whose entry has
+    not changed since the last successful publish does not need to be published again.
+
+    Entries added during a publish are written to a pending file and only recorded in the index
+    by commit(), which is called once the publish has succeeded.
+    """
+
+    # key of the entry identifying the remote location the index describes
+    REMOTE_KEY = '__remote__'
+
+    def __init__(self, path, remote, reuse=True):
+        """
+        :param path: path to the index database, in a directory used only by the index
+        :type path: str
+        :param remote: identifies the remote location published to. The index is discarded
+                       when the remote location changes.
+        :type remote: str
+        :param reuse: if False, the index is discarded and every unit is published
+        :type reuse: bool
+        """
+        self.path = path
+        self.remote = remote.encode('utf-8') if isinstance(remote, unicode) else remote
+        self.reuse = reuse
+        self._db = None
+        self._pending = None
+
+    def is_published(self, unit_id, entry):
+        """
+        Returns whether a unit was published with the same entry by an earlier publish.
+
+        :param unit_id: content unit ID
+        :type unit_id: str
+        :param entry: (symlink path, symlink target, content unit path)
+        :type entry: tuple
+
+        :return: True if the unit was published with the same entry
+        :rtype: bool
+        """
+        self._open()
+        return self._get(self._key(unit_id)) == self._value(entry)
+
+    def add(self, unit_id, entry):
+        """
+        Add a unit published by this publish.
+
+        :param unit_id: content unit ID
+        :type unit_id: str
+        :param entry: (symlink path, symlink target, content unit path)
+        :type entry: tuple
+        """
+        self._open()
+        self._pending.write('%s\0%s\n' % (self._key(unit_id), self._value(entry)))
+
+    def commit(self):
+        """
+        Record the units added by this publish in the index and close it.
+        """
+        if self._db is None:
+            return
+        self._pending.close()
+        with open(self._pending.name) as pending:
+            entries = (line.rstrip('\n').split('\0', 1) for line in pending)
+            self._db.executemany('INSERT OR REPLACE INTO entries VALUES (?, ?)',
+                                 ((key, sqlite3.Binary(value)) for key, value in entries))
+        self._db.commit()
+        self.close()
+
+    def close(self):
+        """
+        Close the index, discarding the units added by this publish if they were not committed.
+        """
+        if self._db is None:
+            return
+        self._db.close()
+        self._db = None
+        self._pending.close()
+        os.unlink(self._pending.name)
+        self._pending = None
+
+    def _open(self):
+        """
+        Open the index, creating it if it does not exist.
+        """
+        if self._db is not None:
+            return
+        index_dir = os.path.dirname(self.path)
+        if os.path.exists(index_dir):
+            self._db = sqlite3.connect(self.path)
+            try:
+                stale = not self.reuse or self._get(self.REMOTE_KEY) != self.remote
+            except sqlite3.DatabaseError:
+                # not an index, e.g. one written by an older release in a dbm format
+                stale = True
+            if stale:
+                self._db.close()
+                self._db = None
+                shutil.rmtree(index_dir)
+        if self._db is None:
+            os.makedirs(index_dir)
+            self._db = sqlite3.connect(self.path)
+            self._db.execute('CREATE TABLE entries (key TEXT PRIMARY KEY, value BLOB)')
+            self._db.execute('INSERT INTO entries VALUES (?, ?)',
+                             (self.REMOTE_KEY, sqlite3.Binary(self.remote)))
+            self._db.commit()
+        self._pending = open(self.path + '.pending', 'w')
+
+    def _get(self, key):
+        """
+        :param key: key of the entry
+        :type key: str
+
+        :return: value of the entry, or None if the index has no entry with the key
+        :rtype: str or None
+        """
+        row = self._db.execute('SELECT value FROM entries WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return None
+        return str(row[0])
+
+    @staticmethod
+    def _key(unit_id):
+        return str(unit_id)
+
+    @staticmethod
+    def _value(entry):
+        return '\0'.join(p.encode('utf-8') if isinstance(p, unicode) else p for p in entry)
@@ -1,14 +1,24 @@
 from gettext import gettext as _
+from multiprocessing.pool import ThreadPool
+import atexit
+import errno
+import hashlib
 import logging
 import os
+import random
+import re
+import shutil
+import subprocess
+import tempfile
+import threading
 import time
 import uuid
-import shutil
 
 import kobo.shortcuts
 import mongoengine
 
 from pulp.common import dateutils
+from pulp.plugins.rsync.index import PublishIndex, get_publish_index_path, remove_publish_index
 from pulp.plugins.util.publish_step import PublishStep
 from pulp.server.config import config as pulp_config
 from pulp.server.exceptions import PulpCodedException
@@ -20,8 +30,198 @@ ASSOCIATED_UNIT_DATE_KEYWORD = "created"
 START_DATE_KEYWORD = 'start_date'
 END_DATE_KEYWORD = 'end_date'
 
+# Seconds a shared ssh connection to a remote host is kept open after it was last used.
+CONTROL_PERSIST = 300
+
+# The maximum number of rsync processes run concurrently against one remote host.
+HOST_CONCURRENCY = 4
+
+# File lists longer than this are split into shards that are rsynced concurrently.
+SHARD_SIZE = 5000
+
+# The number of times an rsync that hit the remote host's connection limit is retried.
+RETRIES = 9
+
+# Seconds to wait before the first retry; doubled for each retry after that, up to
+# MAX_RETRY_BACKOFF.
+RETRY_BACKOFF = 2
+MAX_RETRY_BACKOFF = 60
+
+# The directories holding the control sockets of the shared ssh connections are named after the
+# process that created them.
+CONTROL_DIR_PREFIX = 'pulp-ssh-'
+_control_dir_re = re.compile(r'^%s(\d+)-' % re.escape(CONTROL_DIR_PREFIX))
+
 _logger = logging.getLogger(__name__)
 
+# Per-process state shared by the rsync steps: the directory holding the control sockets of the
+# shared ssh connections, the locks serializing the opening of each connection, and the slots
+# limiting concurrent rsync processes for each remote host.
+_remote_pid = None
+_control_dir = None
+_connection_locks = {}
+_host_slots = {}
+_remote_lock = threading.Lock()
+
+
+def _reset_remote_state():
+    """
+    Reset the shared remote state when first used, or in a process forked from one that used it.
+    Must be called holding _remote_lock.
+    """
+    global _remote_pid, _control_dir, _connection_locks, _host_slots
+    if _remote_pid != os.getpid():
+        _remote_pid = os.getpid()
+        _remove_stale_control_dirs()
+        _control_dir = tempfile.mkdtemp(prefix='%s%d-' % (CONTROL_DIR_PREFIX, _remote_pid))
+        atexit.register(_remove_control_dir, _remote_pid, _control_dir)
+        _connection_locks = {}
+        _host_slots = {}
+
+
+def _remove_control_dir(pid, path):
+    """
+    Remove the control directory of a process when it exits. Processes forked from it inherit
+    this exit handler, so it does nothing in them.
+
+    :param pid: id of the process the directory belongs to
+    :type pid: int
+    :param path: path to the control directory
+    :type path: str
+    """
+    if os.getpid() == pid:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def _remove_stale_control_dirs():
+    """
+    Remove the control directories of processes that are no longer running. Celery worker
+    processes exit without running exit handlers, so they leave their directory behind.
+    """
+    root = tempfile.gettempdir()
+    for name in os.listdir(root):
+        match = _control_dir_re.match(name)
+        if match is None:
+            continue
+        try:
+            os.kill(int(match.group(1)), 0)
+        except OSError, e:
+            if e.errno == errno.ESRCH:
+                shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+
+
+def get_control_path(ssh_cmd, host):
+    """
+    Returns the path to the control socket of a shared ssh connection to a remote host, opening
+    the connection if it is not open. The connection closes itself after it has not been used for
+    CONTROL_PERSIST seconds. If the connection cannot be opened, commands connect on their own.
+
+    :param ssh_cmd: ssh command, without the host, used to connect to the remote host
+    :type ssh_cmd: list
+    :param host: remote host
+    :type host: str
+
+    :return: path to the control socket, or None if the connection could not be opened
+    :rtype: str or None
+    """
+    with _remote_lock:
+        _reset_remote_state()
+        name = hashlib.sha1('\0'.join(ssh_cmd + [host])).hexdigest()
+        path = os.path.join(_control_dir, name)
+        lock = _connection_locks.get(name)
+        if lock is None:
+            lock = _connection_locks[name] = threading.Lock()
+    # Opening the connection blocks until ssh has connected, so only the threads that share this
+    # connection wait for it.
+    with lock:
+        if os.path.exists(path):
+            return path
+        args = ssh_cmd + ['-o', 'ControlMaster=yes',
+                          '-o', 'ControlPath=%s' % path,
+                          '-o', 'ControlPersist=%d' % CONTROL_PERSIST,
+                          '-f', '-N', host]
+        with open(os.devnull, 'r+') as devnull:
+            rv = subprocess.call(args, stdin=devnull, stdout=devnull, stderr=devnull)
+        if rv != 0:
+            _logger.warning(_('Cannot open a shared ssh connection to %(host)s.') % {'host': host})
+            return None
+        return path
+
+
+def get_host_slots(host):
+    """
+    Returns the semaphore limiting the number of concurrent rsync processes to a remote host.
+
+    :param host: remote host
+    :type host: str
+
+    :return: semaphore with HOST_CONCURRENCY slots
+    :rtype: threading.BoundedSemaphore
+    """
+    with _remote_lock:
+        _reset_remote_state()
+        slots = _host_slots.get(host)
+        if slots is None:
+            slots = _host_slots[host] = threading.BoundedSemaphore(HOST_CONCURRENCY)
+        return slots
+
+
+class FileList(object):
+    """
+    A list of file paths that is written to a file as it is built, so that long lists of files
+    to rsync are not held in memory. Iterating over it reads the paths back from the file.
+    """
+
+    def __init__(self, path):
+        """
+        :param path: path to the file the list is written to
+        :type path: str
+        """
+        self.path = path
+        self._count = 0
+        self._file = None
+
+    def append(self, file_path):
+        """
+        Add a path to the list.
+
+        :param file_path: path relative to the directory being rsynced
+        :type file_path: str
+        """
+        if self._file is None:
+            self._file = open(self.path, 'a' if self._count else 'w')
+        self._file.write('%s\n' % file_path)
+        self._count += 1
+
+    def extend(self, file_paths):
+        """
+        Add paths to the list.
+
+        :param file_paths: paths relative to the directory being rsynced
+        :type file_paths: iterable
+        """
+        for file_path in file_paths:
+            self.append(file_path)
+
+    def close(self):
+        """
+        Close the file the list is written to. It is reopened by the next append.
+        """
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __len__(self):
+        return self._count
+
+    def __iter__(self):
+        self.close()
+        if not self._count:
+            return
+        with open(self.path) as list_file:
+            for line in list_file:
+                yield line.rstrip('\n')
+
 
 class RSyncPublishStep(PublishStep):
 
@@ -117,8 +317,13 @@ class RSyncPublishStep(PublishStep):
                                                     '/ssh_identity_file', 'hostname']
         :rtype: list
         """
+        ssh_cmd = self.make_ssh_cmd()
+        control_path = get_control_path(ssh_cmd, self.get_config().flatten()["remote"]['host'])
+        if control_path:
+            ssh_cmd += ['-o', 'ControlMaster=no', '-o', 'ControlPath=%s' % control_path]
+
         ssh_parts = []
-        for arg in self.make_ssh_cmd():
+        for arg in ssh_cmd:
             if " " in arg:
                 ssh_parts.append('"%s"' % arg)
             else:
@@ -165,8 +370,10 @@ class RSyncPublishStep(PublishStep):
 
     def call(self, args, include_args_in_output=True):
         """
-        A wrapper around kobo.shortcuts.run. If ssh_exchange_identification or
-        max-concurrent-connections exceptions are thrown by ssh, up to 10 retries follows.
+        A wrapper around kobo.shortcuts.run. At most HOST_CONCURRENCY commands run against the
+        remote host at the same time. If ssh_exchange_identification or
+        max-concurrent-connections exceptions are thrown by ssh, up to RETRIES retries follow,
+        waiting a random, exponentially increasing time before each.
 
         :param args: list of args for rsync
         :type args: list
@@ -176,14 +383,21 @@ class RSyncPublishStep(PublishStep):
         :return: (boolean indicating success or failure, output from rsync command)
         :rtype: tuple of boolean and string
         """
-        for t in xrange(10):
-            rv, out = kobo.shortcuts.run(cmd=args, can_fail=True)
+        slots = get_host_slots(self.get_config().flatten()["remote"]['host'])
+        backoff = RETRY_BACKOFF
+        for attempt in xrange(RETRIES + 1):
+            with slots:
+                rv, out = kobo.shortcuts.run(cmd=args, can_fail=True)
             possible_known_exceptions = \
                 ("ssh_exchange_identification:" in out) or ("max-concurrent-connections=25" in out)
-            if not (rv and possible_known_exceptions):
+            if not (rv and possible_known_exceptions) or attempt == RETRIES:
                 break
-            _logger.info(_("Connections limit reached, trying once again in thirty seconds."))
-            time.sleep(30)
+            # spread the retries so that concurrent commands don't all come back at once
+            delay = random.uniform(backoff / 2.0, backoff)
+            _logger.info(_("Connections limit reached, trying once again in %(delay)d seconds.")
+                         % {'delay': delay})
+            time.sleep(delay)
+            backoff = min(backoff * 2, MAX_RETRY_BACKOFF)
         if include_args_in_output:
             message = "%s\n%s" % (args, out)
         else:
@@ -229,7 +443,8 @@ class RSyncPublishStep(PublishStep):
     def rsync(self):
         """
         This method formulates the rsync command based on parameters passed in to the __init__ and
-        then executes it.
+        then executes it. A file list longer than SHARD_SIZE is split into shards that are rsynced
+        concurrently.
 
         :return: (boolean indicating success or failure, str made up of stdout and stderr
                   generated by rsync command)
@@ -241,8 +456,7 @@ class RSyncPublishStep(PublishStep):
             os.makedirs(self.src_directory)
 
         output = ""
-        list_of_files = os.path.join(self.get_working_dir(), str(uuid.uuid4()))
-        open(list_of_files, 'w').write("\n".join(sorted(self.file_list)))
+        lists_of_files = self._write_file_lists()
 
         # copy files here, not symlinks
         (is_successful, this_output) = self.remote_mkdir(self.dest_directory)
@@ -251,15 +465,78 @@ class RSyncPublishStep(PublishStep):
             _logger.error(_("Cannot create directory %(directory)s: %(output)s") % params)
             return (is_successful, this_output)
         output += this_output
+
+        pool = None
+        if len(lists_of_files) > 1:
+            pool = ThreadPool(min(len(lists_of_files), HOST_CONCURRENCY))
+            results = pool.imap(self._rsync_shard, lists_of_files)
+        else:
+            results = (self._rsync_shard(path) for path in lists_of_files)
+        try:
+            for (is_successful, this_output) in results:
+                _logger.info(this_output)
+                if not is_successful:
+                    _logger.error(this_output)
+                    return (is_successful, this_output)
+                output += this_output
+        finally:
+            if pool is not None:
+                pool.terminate()
+        return (is_successful, output)
+
+    def _write_file_lists(self):
+        """
+        Write the file list to files used with --files-from. The list is split into files of
+        SHARD_SIZE paths, unless files are deleted, in which case it is written to one file. A
+        FileList is written in the order it was built, and is used as it is when it does not need
+        to be split; any other list is sorted.
+
+        :return: paths to the files
+        :rtype: list of str
+        """
+        if isinstance(self.file_list, FileList):
+            if self.delete or len(self.file_list) <= SHARD_SIZE:
+                self.file_list.close()
+                if len(self.file_list):
+                    return [self.file_list.path]
+            file_list = self.file_list
+        else:
+            file_list = sorted(self.file_list)
+
+        paths = []
+        list_file = None
+        try:
+            for i, file_path in enumerate(file_list):
+                if list_file is None or (not self.delete and i % SHARD_SIZE == 0):
+                    if list_file is not None:
+                        list_file.close()
+                    paths.append(os.path.join(self.get_working_dir(), str(uuid.uuid4())))
+                    list_file = open(paths[-1], 'w')
+                else:
+                    list_file.write("\n")
+                list_file.write(file_path)
+            if list_file is None:
+                paths.append(os.path.join(self.get_working_dir(), str(uuid.uuid4())))
+                list_file = open(paths[-1], 'w')
+        finally:
+            if list_file is not None:
+                list_file.close()
+        return paths
+
+    def _rsync_shard(self, list_of_files):
+        """
+        Rsync the files in one file list.
+
+        :param list_of_files: absolute path to a file with list of file paths to rsync
+        :type list_of_files: str
+
+        :return: (boolean indicating success or failure, str made up of stdout and stderr
+                  generated by rsync command)
+        :rtype: tuple
+        """
         rsync_args = self.make_rsync_args(list_of_files, self.src_directory,
                                           self.dest_directory, self.exclude)
-        (is_successful, this_output) = self.call(rsync_args)
-        _logger.info(this_output)
-        if not is_successful:
-            _logger.error(this_output)
-            return (is_successful, this_output)
-        output += this_output
-        return (is_successful, output)
+        return self.call(rsync_args)
 
     def process_main(self):
         """
@@ -315,6 +592,7 @@ class Publisher(PublishStep):
         :ivar symlink_list: list of symlinks to rsync
         :ivar content_unit_file_list: list of content units to rsync
         :ivar symlink_src: path to directory containing all symlinks
+        :ivar publish_index: index of the units already published to the remote server
         """
 
         super(Publisher, self).__init__("Repository publish", repo,
@@ -343,7 +621,8 @@ class Publisher(PublishStep):
             search_params = {'repo_id': repo.id,
                              'distributor_id': self.predistributor["distributor_id"],
                              'started': {"$gte": string_date}}
-            self.predist_history = RepoPublishResult.get_collection().find(search_params)
+            self.predist_history = list(
+                RepoPublishResult.get_collection().find(search_params))
         else:
             self.predist_history = []
 
@@ -364,12 +643,60 @@ class Publisher(PublishStep):
                 end_date = self.predistributor["last_publish"]
                 date_filter = self.create_date_range_filter(None, end_date=end_date)
 
-        self.symlink_list = []
-        self.content_unit_file_list = []
+        self.symlink_list = FileList(os.path.join(self.get_working_dir(), 'symlink_list'))
+        self.content_unit_file_list = FileList(os.path.join(self.get_working_dir(),
+                                                            'content_unit_file_list'))
         self.symlink_src = os.path.join(self.get_working_dir(), '.relative/')
+        self.publish_index = self.get_publish_index()
 
         self._add_necesary_steps(date_filter=date_filter, config=config)
 
+    def post_process(self):
+        """
+        Record the units published to the remote server once all steps have succeeded.
+        """
+        self.publish_index.commit()
+
+    def on_error(self):
+        """
+        Discard the units added to the publish index, since they may not have been published.
+        """
+        self.publish_index.close()
+
+    def get_publish_index(self):
+        """
+        Returns the index of the units this distributor has published to the remote server. The
+        index is removed and not used to skip units when a full publish is forced, when files on
+        the remote server are deleted, or when a publish of the predistributor failed, since every
+        unit's symlink needs to be present for that.
+
+        :return: publish index for this repository and distributor
+        :rtype: PublishIndex
+        """
+        repo_id = self.repo.id
+        distributor_id = self.distributor['distributor_id']
+        remote = self.get_config().flatten()['remote']
+        remote_location = '%s@%s:%s %s %s' % (remote['ssh_user'], remote['host'], remote['root'],
+                                              self.get_units_directory_dest_path(),
+                                              self.remote_path)
+        reuse = not (self.get_config().get("force_full", False) or
+                     self.get_config().get("delete", False) or
+                     self.predistributor_failed())
+        if not reuse:
+            remove_publish_index(repo_id, distributor_id)
+        return PublishIndex(get_publish_index_path(repo_id, distributor_id), remote_location,
+                            reuse=reuse)
+
+    def predistributor_failed(self):
+        """
+        Checks whether a publish of the predistributor failed since this distributor last
+        published.
+
+        :return: Whether or not a publish of the predistributor failed
+        :rtype: bool
+        """
+        return any(entry.get("result", "error") == "error" for entry in self.predist_history)
+
     def is_fastforward(self):
         """
         This method checks whether this publish should be a fastforward publish.
@@ -382,8 +709,7 @@ class Publisher(PublishStep):
             predistributor_force_full = entry.get("distributor_config", {}).get("force_full",
                                                                                 False)
             force_full |= predistributor_force_full
-            if entry.get("result", "error") == "error":
-                force_full = True
+        force_full |= self.predistributor_failed()
 
         if self.last_published:
             last_published = self.last_published.replace(tzinfo=None)
@@ -1,33 +1,130 @@
 import csv
 import hashlib
 import os
+import threading
+from collections import OrderedDict
+from itertools import imap
+from multiprocessing.pool import ThreadPool
 
 from pulp.common.plugins.distributor_constants import MANIFEST_FILENAME
 
 
-# not much science behind this
-CHUNK_SIZE = 2 ** 16
+# large reads keep the disk streaming; hashlib releases the GIL while hashing them
+CHUNK_SIZE = 2 ** 20
 
+# The number of files hashed concurrently.
+WORKERS = 4
 
-def make_manifest_for_dir(path):
+# The maximum number of checksums kept by a ChecksumCache.
+CACHE_SIZE = 10000
+
+
+class ChecksumCache(object):
+    """
+    Remembers the sha256 checksums of files, keyed by device, inode, modification time and size,
+    so that a file that has not changed since its checksum was calculated is not read again.
+    Published files are usually links to the same content, so the cache is effective across
+    publishes made by the same process.
+
+    :ivar size: The maximum number of checksums kept
+    :type size: int
+    """
+
+    def __init__(self, size=CACHE_SIZE):
+        """
+        :param size: The maximum number of checksums kept
+        :type  size: int
+        """
+        self.size = size
+        self._checksums = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_checksum(self, path):
+        """
+        Get the sha256 checksum of a file, calculating it if the file is not in the cache or has
+        changed since it was cached.
+
+        :param path:    full path to the file
+        :type  path:    basestring
+
+        :return:    sha256 checksum
+        :rtype:     basestring
+        """
+        st = os.stat(path)
+        key = (st.st_dev, st.st_ino, st.st_mtime, st.st_size)
+        with self._lock:
+            checksum = self._checksums.pop(key, None)
+            if checksum is not None:
+                # keep the most recently used checksums at the end
+                self._checksums[key] = checksum
+                return checksum
+        checksum = get_sha256_checksum(path)
+        with self._lock:
+            self._checksums[key] = checksum
+            while len(self._checksums) > self.size:
+                self._checksums.popitem(last=False)
+        return checksum
+
+    def clear(self):
+        """
+        Forget all cached checksums.
+        """
+        with self._lock:
+            self._checksums.clear()
+
+
+# shared by the manifests created in this process
+checksum_cache = ChecksumCache()
+
+
+def make_manifest_for_dir(path, workers=WORKERS, checksums=None, cache=None):
     """
     creates a PULP_MANIFEST file in the specified directory
 
     The file is CSV with three fields: filename, sha256 checksum value, and size in bytes
 
-    :param path:    full path to the directory where the manifest should be created
-    :type  path:    basestring
+    :param path:        full path to the directory where the manifest should be created
+    :type  path:        basestring
+    :param workers:     the number of files to hash concurrently
+    :type  workers:     int
+    :param checksums:   sha256 checksums that are already known, keyed by filename. These files
+                        are not read.
+    :type  checksums:   dict
+    :param cache:       cache used to look up and store the checksums of files that are read
+    :type  cache:       ChecksumCache
     """
+    if checksums is None:
+        checksums = {}
+
+    def make_row(fullpath):
+        size = os.path.getsize(fullpath)
+        filename = os.path.basename(fullpath)
+        checksum = checksums.get(filename)
+        if checksum is None:
+            if cache is not None:
+                checksum = cache.get_checksum(fullpath)
+            else:
+                checksum = get_sha256_checksum(fullpath)
+        return [filename, checksum, size]
+
     file_paths = [os.path.join(path, filename) for filename in os.listdir(path)
                   if filename != MANIFEST_FILENAME]
-    with open(os.path.join(path, MANIFEST_FILENAME), 'w') as open_file:
-        writer = csv.writer(open_file)
-        for fullpath in filter(os.path.isfile, file_paths):
-            size = os.path.getsize(fullpath)
-            filename = os.path.basename(fullpath)
-            checksum = get_sha256_checksum(fullpath)
+    file_paths = filter(os.path.isfile, file_paths)
 
-            writer.writerow([filename, checksum, size])
+    pool = None
+    if workers > 1 and len(file_paths) > 1:
+        pool = ThreadPool(min(workers, len(file_paths)))
+        rows = pool.imap(make_row, file_paths)
+    else:
+        rows = imap(make_row, file_paths)
+    try:
+        with open(os.path.join(path, MANIFEST_FILENAME), 'w') as open_file:
+            writer = csv.writer(open_file)
+            for row in rows:
+                writer.writerow(row)
+    finally:
+        if pool is not None:
+            pool.terminate()
 
 
 def get_sha256_checksum(path):
@@ -41,7 +138,7 @@ def get_sha256_checksum(path):
     :rtype:     basestring
     """
     hasher = hashlib.sha256()
-    with open(path) as open_file:
+    with open(path, 'rb') as open_file:
         chunk = open_file.read(CHUNK_SIZE)
         while chunk:
             hasher.update(chunk)
@@ -11,18 +11,62 @@ from xml.sax.saxutils import XMLGenerator
 
 from pulp.common import error_codes
 from pulp.server.exceptions import PulpCodedValidationException, PulpCodedException
-from pulp.server.util import CHECKSUM_FUNCTIONS
+from pulp.server.util import CHECKSUM_FUNCTIONS, TYPE_SHA256
 
 _LOG = logging.getLogger(__name__)
 BUFFER_SIZE = 1024
 
 
+class HashingFileWrapper(object):
+    """
+    Write-through wrapper for a file object that calculates the size and checksum of the data
+    as it is written. Any other attribute access is passed through to the wrapped file object.
+    """
+
+    def __init__(self, file_object, checksum_type):
+        """
+        :param file_object: the file object being written
+        :type  file_object: file
+        :param checksum_type: checksum type used to calculate the checksum
+        :type  checksum_type: str
+        """
+        self.file_object = file_object
+        self.checksum_type = checksum_type
+        self.size = 0
+        self._hasher = CHECKSUM_FUNCTIONS[checksum_type]()
+
+    def write(self, data):
+        """
+        Write data to the wrapped file object and add it to the checksum.
+
+        :param data: the data to write
+        :type  data: str
+        """
+        self.file_object.write(data)
+        self._hasher.update(data)
+        self.size += len(data)
+
+    def hexdigest(self):
+        """
+        :return: the checksum of the data written so far
+        :rtype:  str
+        """
+        return self._hasher.hexdigest()
+
+    @property
+    def closed(self):
+        return MetadataFileContext._is_closed(self.file_object)
+
+    def __getattr__(self, name):
+        return getattr(self.file_object, name)
+
+
 class MetadataFileContext(object):
     """
     Context manager class for metadata file generation.
     """
 
-    def __init__(self, metadata_file_path, checksum_type=None):
+    def __init__(self, metadata_file_path, checksum_type=None, calculate_open_checksum=False):
         """
         :param metadata_file_path: full path to metadata file to be generated
         :type  metadata_file_path: str
@@ -30,12 +74,21 @@ class MetadataFileContext(object):
                               to the file names of files. If checksum_type is None,
                               no checksum is added to the filename
         :type checksum_type: str or None
+        :param calculate_open_checksum: if True and the file is gzipped, the size and checksum
+                                        of the uncompressed content are calculated as well
+        :type calculate_open_checksum: bool
         """
 
         self.metadata_file_path = metadata_file_path
         self.metadata_file_handle = None
         self.checksum_type = checksum_type
         self.checksum = None
+        self.calculate_open_checksum = calculate_open_checksum
+        self.open_checksum = None
+        self.open_size = None
+        # the checksums are calculated as the file is written
+        self._checksum_file = None
+        self._open_checksum_file = None
         if self.checksum_type is not None:
             checksum_function = CHECKSUM_FUNCTIONS.get(checksum_type)
             if not checksum_function:
@@ -93,12 +146,17 @@ class MetadataFileContext(object):
         except Exception, e:
             _LOG.exception(e)
 
+        if self._open_checksum_file is not None:
+            self.open_checksum = self._open_checksum_file.hexdigest()
+            self.open_size = self._open_checksum_file.size
+
         # Add calculated checksum to the filename
         file_name = os.path.basename(self.metadata_file_path)
         if self.checksum_type is not None:
-            with open(self.metadata_file_path, 'rb') as file_handle:
-                content = file_handle.read()
-                checksum = self.checksum_constructor(content).hexdigest()
+            if self._checksum_file is not None:
+                checksum = self._checksum_file.hexdigest()
+            else:
+                checksum = self._calculate_checksum()
 
             self.checksum = checksum
             file_name_with_checksum = checksum + '-' + file_name
@@ -110,6 +168,22 @@ class MetadataFileContext(object):
         # Set the metadata_file_handle to None so we don't double call finalize
         self.metadata_file_handle = None
 
+    def _calculate_checksum(self):
+        """
+        Calculate the checksum of the metadata file by reading it back. This is only needed
+        when the file was not written through the handle opened by this context.
+
+        :return: the checksum of the metadata file
+        :rtype:  str
+        """
+        hasher = self.checksum_constructor()
+        with open(self.metadata_file_path, 'rb') as file_handle:
+            content = file_handle.read(BUFFER_SIZE)
+            while content:
+                hasher.update(content)
+                content = file_handle.read(BUFFER_SIZE)
+        return hasher.hexdigest()
+
     def _open_metadata_file_handle(self):
         """
         Open the metadata file handle, creating any missing parent directories.
@@ -142,11 +216,25 @@ class MetadataFileContext(object):
         msg = _('Opening metadata file handle for [%(p)s]')
         _LOG.debug(msg % {'p': self.metadata_file_path})
 
+        self._checksum_file = None
+        self._open_checksum_file = None
+
+        # The checksum of the file is calculated from the bytes written to disk, so for a gzip
+        # file the hashing wrapper goes underneath the compression.
+        file_handle = open(self.metadata_file_path, 'wb')
+        if self.checksum_type is not None:
+            file_handle = self._checksum_file = HashingFileWrapper(file_handle, self.checksum_type)
+
         if self.metadata_file_path.endswith('.gz'):
-            self.metadata_file_handle = gzip.open(self.metadata_file_path, 'w')
+            gzip_handle = gzip.GzipFile(fileobj=file_handle, mode='wb')
+            # have the gzip file close the underlying file the same way gzip.open() does
+            gzip_handle.myfileobj = file_handle
+            file_handle = gzip_handle
+            if self.calculate_open_checksum:
+                file_handle = self._open_checksum_file = HashingFileWrapper(
+                    file_handle, self.checksum_type or TYPE_SHA256)
 
-        else:
-            self.metadata_file_handle = open(self.metadata_file_path, 'w')
+        self.metadata_file_handle = file_handle
 
     def _write_file_header(self):
         """
@@ -347,25 +435,12 @@ class FastForwardXmlFileContext(XmlFileContext):
 
             self.existing_file = os.path.join(working_dir, self.existing_file)
 
-            # Open the file, unzip if necessary so that seek operations can be performed
-            self.original_file_handle = None
+            # The original file is only read forward, so a gzipped one is decompressed as it is
+            # read rather than to a temporary file.
             if self.existing_file.endswith('.gz'):
-                non_compressed_file = self.existing_file[:self.existing_file.rfind('.gz')]
-                with open(os.path.join(working_dir, non_compressed_file), 'wb') as plain_handle:
-                    gzip_handle = gzip.open(os.path.join(working_dir, self.existing_file), 'rb')
-                    try:
-                        content = gzip_handle.read(BUFFER_SIZE)
-                        while content:
-                            plain_handle.write(content)
-                            content = gzip_handle.read(BUFFER_SIZE)
-                    finally:
-                        if gzip_handle:
-                            gzip_handle.close()
-                # clean up the zipped file
-                os.unlink(self.existing_file)
-                self.existing_file = non_compressed_file
-
-            self.original_file_handle = open(os.path.join(working_dir, self.existing_file), 'r')
+                self.original_file_handle = gzip.open(self.existing_file, 'rb')
+            else:
+                self.original_file_handle = open(self.existing_file, 'r')
 
         super(FastForwardXmlFileContext, self)._open_metadata_file_handle()
 
@@ -394,36 +469,24 @@ class FastForwardXmlFileContext(XmlFileContext):
                     return
                 content += content_buffer
                 index = content.find(start_tag)
-            start_offset = index
 
-            # Find the end offset
-            content = ''
-            index = -1
-            self.original_file_handle.seek(0, os.SEEK_END)
-            while index < 0:
-                amount_to_read = min(BUFFER_SIZE, self.original_file_handle.tell())
-                self.original_file_handle.seek(-amount_to_read, os.SEEK_CUR)
-                content_buffer = self.original_file_handle.read(amount_to_read)
-                if not content_buffer:
-                    raise Exception(_('Error: %(tag)s not found in the xml file.')
-                                    % {'tag': end_tag})
-                bytes_read = len(content_buffer)
-                self.original_file_handle.seek(-bytes_read, os.SEEK_CUR)
-                content = content_buffer + content
+            # Stream out the content up to the last end tag. Anything from the last end tag
+            # found so far, or that could be the start of an end tag, is held back until more
+            # of the file has been read.
+            content = content[index:]
+            while True:
                 index = content.rfind(end_tag)
-            end_offset = self.original_file_handle.tell() + index
-
-            # stream out the content
-            self.original_file_handle.seek(start_offset)
-            bytes_to_read = end_offset - start_offset
-            content_buffer = self.original_file_handle.read(BUFFER_SIZE)
-            while bytes_to_read > 0:
-                buffer_size = len(content_buffer)
-                if buffer_size > bytes_to_read:
-                    content_buffer = content_buffer[:bytes_to_read]
-                self.metadata_file_handle.write(content_buffer)
-                bytes_to_read -= buffer_size
+                if index < 0:
+                    index = max(len(content) - len(end_tag) + 1, 0)
+                self.metadata_file_handle.write(content[:index])
+                content = content[index:]
                 content_buffer = self.original_file_handle.read(BUFFER_SIZE)
+                if not content_buffer:
+                    break
+                content += content_buffer
+
+            if not content.startswith(end_tag):
+                raise Exception(_('Error: %(tag)s not found in the xml file.') % {'tag': end_tag})
 
     def _close_metadata_file_handle(self):
         """
@@ -27,6 +27,7 @@ from nectar import listener
 from nectar.downloaders.local import LocalFileDownloader
 from nectar.downloaders.threaded import HTTPThreadedDownloader
 from pulp.server.config import config as pulp_config
+from pulp.server.content.web import cache as content_cache
 import pulp.server.managers.factory as manager_factory
 from pulp.server.managers.repo import _common as common_utils
 from pulp.server.util import copytree
@@ -34,6 +35,13 @@ from pulp.server.util import copytree
 
 _logger = logging.getLogger(__name__)
 
+# The longest time in seconds between progress report writes while a step is running.
+PROGRESS_REPORT_MAX_INTERVAL = 30
+
+# The interval between progress report writes grows by this fraction of the time the step has
+# been reporting, so long steps write less often.
+PROGRESS_REPORT_BACKOFF = 0.05
+
 
 def _post_order(step):
     """
@@ -104,6 +112,7 @@ class Step(object):
         self.total_units = 1
         self.children = []
         self.last_report_time = 0
+        self.first_report_time = None
         self.last_reported_state = self.state
         self.timestamp = str(time.time())
         self.non_halting_exceptions = non_halting_exceptions or []
@@ -338,14 +347,28 @@ class Step(object):
         if self.parent:
             self.parent.report_progress(force)
         else:
-            if force:
+            current_time = time.time()
+            if self.first_report_time is None:
+                self.first_report_time = current_time
+            if force or current_time - self.last_report_time >= \
+                    self.get_report_interval(current_time):
                 self.get_status_conduit().set_progress(self.get_progress_report())
-            else:
-                current_time = time.time()
-                if current_time != self.last_report_time:
-                    # Update at most once a second
-                    self.get_status_conduit().set_progress(self.get_progress_report())
-                    self.last_report_time = current_time
+                self.last_report_time = current_time
+
+    def get_report_interval(self, current_time):
+        """
+        Return the minimum time between progress report writes that are not forced. It starts at
+        the configured progress_report_interval and grows as the step runs, up to
+        PROGRESS_REPORT_MAX_INTERVAL.
+
+        :param current_time: the time of the report
+        :type  current_time: float
+        :return: the interval in seconds
+        :rtype: float
+        """
+        minimum = pulp_config.getfloat('tasks', 'progress_report_interval')
+        backoff = (current_time - self.first_report_time) * PROGRESS_REPORT_BACKOFF
+        return max(minimum, min(backoff, PROGRESS_REPORT_MAX_INTERVAL))
 
     def get_progress_report(self):
         """
@@ -952,6 +975,9 @@ class AtomicDirectoryPublishStep(PluginStep):
                     final_name = os.path.join(publish_location, file_name)
                     os.rename(tmp_link_name, final_name)
 
+        # Have the content app stop serving the paths it resolved to the previous masters
+        content_cache.touch_publish_stamp()
+
         # Clear out any previously published masters
         misc.clear_directory(self.master_publish_dir, skip_list=[self.parent.timestamp])
 
@@ -998,17 +1024,22 @@ class CreatePulpManifestStep(Step):
     the checksums of the files are not already known, because it will read and calculate new
     checksums for each one.
 
-    If you already know the SHA256 checksums of the files going in the manifest, see an example
-    in the FileDistributor that creates this file in a different way.
+    If you already know the SHA256 checksums of some of the files going in the manifest, for
+    example from the unit model, pass them as checksums and those files will not be read.
+    Checksums that are calculated are cached, so files that have not changed are not read again
+    the next time a manifest is created.
     """
-    def __init__(self, target_dir):
+    def __init__(self, target_dir, checksums=None):
         """
         :param target_dir:  full path to the directory where the PULP_MANIFEST file should
                             be created
         :type  target_dir:  basestring
+        :param checksums:   SHA256 checksums that are already known, keyed by filename
+        :type  checksums:   dict
         """
         super(CreatePulpManifestStep, self).__init__(reporting_constants.STEP_CREATE_PULP_MANIFEST)
         self.target_dir = target_dir
+        self.checksums = checksums
         self.description = _('Creating PULP_MANIFEST')
 
     def process_main(self, item=None):
@@ -1017,7 +1048,8 @@ class CreatePulpManifestStep(Step):
 
         :param item:    not used
         """
-        manifest_writer.make_manifest_for_dir(self.target_dir)
+        manifest_writer.make_manifest_for_dir(self.target_dir, checksums=self.checksums,
+                                              cache=manifest_writer.checksum_cache)
 
 
 class CopyDirectoryStep(PublishStep):
@@ -1211,11 +1243,11 @@ class GetLocalUnitsStep(SaveUnitsStep):
     available_units attribute, but can be overridden in the constructor.
     """
 
-    def __init__(self, importer_type, unit_pagination_size=50, available_units=None, **kwargs):
+    def __init__(self, importer_type, unit_pagination_size=1000, available_units=None, **kwargs):
         """
         :param importer_type:        unique identifier for the type of importer
         :type  importer_type:        basestring
-        :param unit_pagination_size: How many units should be queried at one time (default 50)
+        :param unit_pagination_size: How many units should be queried at one time (default 1000)
         :type  importer_type:        int
         :param available_units:      An iterable of Units available for retrieval. This defaults to
                                      this step's parent's available_units attribute if not provided.
@@ -1249,18 +1281,29 @@ class GetLocalUnitsStep(SaveUnitsStep):
         else:
             available_units = self.parent.available_units
 
+        # units that are already in pulp and still need to be associated with the repo; they
+        # are associated in batches to save round-trips to the database
+        units_to_associate = []
+
         for units_group in misc.paginate(available_units, self.unit_pagination_size):
             # Get this group of units
             query = units_controller.find_units(units_group)
 
             for found_unit in query:
                 units_we_already_had.add(hash(found_unit))
-                repo_controller.associate_single_unit(self.get_repo().repo_obj, found_unit)
+                units_to_associate.append(found_unit)
 
             for unit in units_group:
                 if hash(unit) not in units_we_already_had:
                     self.units_to_download.append(unit)
 
+            if len(units_to_associate) >= repo_controller.ASSOCIATE_BATCH_SIZE:
+                repo_controller.associate_units(self.get_repo().repo_obj, units_to_associate)
+                units_to_associate = []
+
+        if units_to_associate:
+            repo_controller.associate_units(self.get_repo().repo_obj, units_to_associate)
+
 
 class RSyncFastForwardUnitPublishStep(UnitModelPluginStep):
 
@@ -1291,6 +1334,8 @@ class RSyncFastForwardUnitPublishStep(UnitModelPluginStep):
         self.description = _('Generating relative symlinks')
         self.remote_repo_path = remote_repo_path
         self.published_unit_path = published_unit_path
+        # symlink directories known to exist in the working directory
+        self._link_dirs = set()
 
         super(RSyncFastForwardUnitPublishStep,
               self).__init__(step_type, model_classes, repo=repo, config=config,
@@ -1301,24 +1346,37 @@ class RSyncFastForwardUnitPublishStep(UnitModelPluginStep):
         Creates symlink for a unit and appends the symlink to a list used to perform rsync later.
         This also generates the list of actual content units that need to be rsynced later.
 
+        If the parent step has a publish_index, units that were already published with the
+        same symlink and content path are skipped, and the units that are not are added to it.
+
         :param unit: Content type unit
         :type unit: ContentUnit
         """
         storage_dir = os.path.join(pulp_config.get('server', 'storage_dir'), 'content', 'units')
         relative_content_unit_path = os.path.relpath(item.storage_path, storage_dir)
-        self.parent.content_unit_file_list.append(relative_content_unit_path)
         if self.published_unit_path:
             filename = item.get_symlink_name()
             published_unit_path = self.published_unit_path
         else:
             dirname, filename = os.path.split(item.get_symlink_name())
             published_unit_path = dirname.split('/')
+        remote_root = self.get_config().get("remote")["root"]
 
+        publish_index = getattr(self.parent, 'publish_index', None)
+        if publish_index is not None:
+            entry = (self.get_symlink_path(item, filename, published_unit_path),
+                     self.get_link_source(item, self.remote_repo_path, remote_root,
+                                          published_unit_path),
+                     relative_content_unit_path)
+            if publish_index.is_published(item.id, entry):
+                return
+
+        self.parent.content_unit_file_list.append(relative_content_unit_path)
         symlink = self.make_link_unit(item, filename, self.get_working_dir(),
-                                      self.remote_repo_path,
-                                      self.get_config().get("remote")["root"],
-                                      published_unit_path)
+                                      self.remote_repo_path, remote_root, published_unit_path)
         self.parent.symlink_list.append(symlink)
+        if publish_index is not None:
+            publish_index.add(item.id, entry)
 
     def make_link_unit(self, unit, filename, working_dir, remote_repo_path, remote_root,
                        published_unit_path):
@@ -1341,28 +1399,60 @@ class RSyncFastForwardUnitPublishStep(UnitModelPluginStep):
 
         """
         extra_src_path = ['.relative'] + published_unit_path
-        if not os.path.exists(os.path.join(working_dir, *extra_src_path)):
-            os.makedirs(os.path.join(working_dir, *extra_src_path))
+        link_dir = os.path.join(working_dir, *extra_src_path)
+        if link_dir not in self._link_dirs:
+            if not os.path.exists(link_dir):
+                os.makedirs(link_dir)
+            self._link_dirs.add(link_dir)
 
-        origin_path = self.get_origin_rel_path(unit)
-
-        dest = os.path.normpath(os.path.join(working_dir,
-                                             *(extra_src_path + [filename])))
-        full_remote_path = os.path.normpath(os.path.join(remote_root, origin_path))
-        abs_remote_path = os.path.normpath(os.path.join(remote_root,
-                                                        remote_repo_path.lstrip("/"),
-                                                        *published_unit_path))
-
-        link_source = os.path.relpath(full_remote_path, abs_remote_path)
+        dest = os.path.normpath(os.path.join(link_dir, filename))
+        link_source = self.get_link_source(unit, remote_repo_path, remote_root,
+                                           published_unit_path)
 
         _logger.debug("LN %s -> %s " % (link_source, dest))
         if os.path.islink(dest):
             os.remove(dest)
         os.symlink(link_source, dest)
+        return self.get_symlink_path(unit, filename, published_unit_path)
+
+    def get_symlink_path(self, unit, filename, published_unit_path):
+        """
+        Returns path of the symlink for the content unit relative to the published repo
+
+        :param unit: Pulp content unit
+        :type unit: Unit
+        :param filename: name that should be used for symlink
+        :type file: str
+        :param published_unit_path: directory name inside repo that the symlink should be in
+        :type published_unit_path: list of str
+        """
         if self.published_unit_path:
             return os.path.join(*(published_unit_path + [filename]))
         return unit.get_symlink_name()
 
+    def get_link_source(self, unit, remote_repo_path, remote_root, published_unit_path):
+        """
+        Returns the target of the symlink for the content unit, relative to the directory the
+        symlink is in on the remote server
+
+        :param unit: Pulp content unit
+        :type unit: Unit
+        :param remote_repo_path: relative repo destination path on remote server
+        :type remote_repo_path: str
+        :param remote_root: remote destination root directory
+        :type remote_root: str
+        :param published_unit_path: directory name inside repo that the symlink should be in
+        :type published_unit_path: list of str
+        """
+        origin_path = self.get_origin_rel_path(unit)
+
+        full_remote_path = os.path.normpath(os.path.join(remote_root, origin_path))
+        abs_remote_path = os.path.normpath(os.path.join(remote_root,
+                                                        remote_repo_path.lstrip("/"),
+                                                        *published_unit_path))
+
+        return os.path.relpath(full_remote_path, abs_remote_path)
+
     def get_origin_rel_path(self, unit):
         """
         Returns path relative to the remote root for the content unit
@@ -10,7 +10,8 @@ from datetime import datetime, timedelta
 from gettext import gettext as _
 
 from celery import bootsteps
-from celery.signals import celeryd_after_setup, worker_process_init
+from celery.signals import (celeryd_after_setup, task_postrun, worker_process_init,
+                            worker_process_shutdown)
 import mongoengine
 
 from pulp.common import constants, dateutils
@@ -19,6 +20,7 @@ from pulp.server.async import tasks, worker_watcher
 from pulp.server.constants import PULP_PROCESS_HEARTBEAT_INTERVAL, PULP_PROCESS_TIMEOUT_INTERVAL
 from pulp.server.db.model import Worker, ResourceManagerLock
 from pulp.server.db.connection import reconnect
+from pulp.server.event import dispatch
 from pulp.server.managers.repo import _common as common_utils
 
 # This import will load our configs
@@ -189,6 +191,30 @@ def reconnect_services(sender, **kwargs):
     reconnect()
 
 
+@task_postrun.connect
+def drain_event_notifications(**kwargs):
+    """
+    Deliver the event notifications fired by a task before the worker process runs another task.
+    Worker processes exit without running atexit handlers, so notifications still pending when
+    the process is recycled or stopped would be lost.
+
+    :param kwargs: The signal arguments (unused)
+    :type  kwargs: dict
+    """
+    dispatch.drain()
+
+
+@worker_process_shutdown.connect
+def drain_event_notifications_at_exit(**kwargs):
+    """
+    Deliver the event notifications still pending before the worker process exits.
+
+    :param kwargs: The signal arguments (unused)
+    :type  kwargs: dict
+    """
+    dispatch.drain(dispatch.EXIT_TIMEOUT)
+
+
 def get_resource_manager_lock(name):
     """
     Tries to acquire the resource manager lock.
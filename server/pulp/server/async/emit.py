@@ -1,18 +1,235 @@
+import atexit
+import itertools
 import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
 from kombu import Connection, Exchange, Producer
 
 from pulp.server.config import config
 
 DEFAULT_EXCHANGE_NAME = 'pulp.api.v2'
+
+# The maximum number of messages waiting to be published.
+OUTBOX_SIZE = 1000
+
+# Seconds to wait for queued messages to be published when the process exits.
+EXIT_TIMEOUT = 5
+
 _logger = logging.getLogger(__name__)
 
+_publisher = None
+_publisher_lock = threading.Lock()
+
+
+class Publisher(object):
+    """
+    Publishes event messages to the AMQP broker from a background thread, using a single
+    connection and channel that are kept open between messages.
+
+    Messages are queued in a bounded outbox. A message queued with the same routing key as one
+    that has not been published yet supersedes it; only the newest of them is published. When
+    the outbox is full, new messages are dropped rather than blocking the caller.
+
+    :ivar url:       The broker URL
+    :type url:       str
+    :ivar size:      The maximum number of messages in the outbox
+    :type size:      int
+    :ivar sent:      The number of messages published
+    :type sent:      int
+    :ivar dropped:   The number of messages dropped, because the outbox was full or publishing
+                     failed
+    :type dropped:   int
+    :ivar coalesced: The number of queued messages superseded by a newer message
+    :type coalesced: int
+    """
+
+    def __init__(self, url, size=OUTBOX_SIZE):
+        """
+        :param url:  The broker URL
+        :type  url:  str
+        :param size: The maximum number of messages in the outbox
+        :type  size: int
+        """
+        self.url = url
+        self.size = size
+        self.pid = os.getpid()
+        self.sent = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.exchange = Exchange(name=DEFAULT_EXCHANGE_NAME, type='topic')
+        self._outbox = OrderedDict()
+        self._sequence = itertools.count()
+        self._busy = False
+        self._full = False
+        self._condition = threading.Condition()
+        self._connection = None
+        self._producer = None
+        self._thread = None
+
+    def put(self, payload, routing_key=None):
+        """
+        Queue a message to be published.
+
+        :param payload:     The message body
+        :type  payload:     str
+        :param routing_key: The routing key for the message
+        :type  routing_key: str
+        :return:            True if the message was queued, False if it was dropped
+        :rtype:             bool
+        """
+        if routing_key is None:
+            key = next(self._sequence)
+        else:
+            key = routing_key
+        with self._condition:
+            if key in self._outbox:
+                self.coalesced += 1
+            elif len(self._outbox) >= self.size:
+                self.dropped += 1
+                if not self._full:
+                    _logger.warn('event message outbox is full; messages are being dropped')
+                    self._full = True
+                return False
+            self._outbox[key] = (payload, routing_key)
+            self._start()
+            self._condition.notify_all()
+        return True
+
+    def stats(self):
+        """
+        :return: The publisher counters
+        :rtype:  dict
+        """
+        with self._condition:
+            return {'sent': self.sent, 'dropped': self.dropped, 'coalesced': self.coalesced,
+                    'queued': len(self._outbox)}
+
+    def close(self, timeout=EXIT_TIMEOUT):
+        """
+        Wait up to timeout seconds for the outbox to be published, then close the connection.
+
+        :param timeout: The number of seconds to wait
+        :type  timeout: int
+        """
+        deadline = time.time() + timeout
+        with self._condition:
+            while self._outbox or self._busy:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+            self._disconnect()
+            _logger.debug('event messages sent: %(sent)d, dropped: %(dropped)d, '
+                          'coalesced: %(coalesced)d' % self.stats())
+
+    def _start(self):
+        """
+        Start the publishing thread, if it is not running. Must be called holding the condition.
+        """
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._run, name='event-publisher')
+        self._thread.setDaemon(True)
+        self._thread.start()
+
+    def _run(self):
+        """
+        The publishing thread main.
+        """
+        while True:
+            with self._condition:
+                self._busy = False
+                if not self._outbox:
+                    # let close() know the outbox has been published
+                    self._condition.notify_all()
+                while not self._outbox:
+                    self._condition.wait()
+                key, (payload, routing_key) = self._outbox.popitem(last=False)
+                self._busy = True
+                self._full = False
+            self._send(payload, routing_key)
+
+    def _send(self, payload, routing_key):
+        """
+        Publish a message. A failure on a connection that was opened earlier is retried once on a
+        new connection, since the broker may have closed it. Messages that still cannot be
+        published are dropped.
+
+        :param payload:     The message body
+        :type  payload:     str
+        :param routing_key: The routing key for the message
+        :type  routing_key: str
+        """
+        for attempt in range(2):
+            reconnected = self._producer is None
+            try:
+                self._publish(payload, routing_key)
+                with self._condition:
+                    self.sent += 1
+                return
+            except Exception:
+                self._disconnect()
+                if reconnected or attempt:
+                    _logger.exception('unable to publish event message; message dropped')
+                    with self._condition:
+                        self.dropped += 1
+                    return
+
+    def _publish(self, payload, routing_key):
+        """
+        Publish a message on the shared connection, which is opened when needed.
+
+        :param payload:     The message body
+        :type  payload:     str
+        :param routing_key: The routing key for the message
+        :type  routing_key: str
+        """
+        if self._producer is None:
+            self._connection = Connection(self.url)
+            self._producer = Producer(self._connection)
+            self._producer.maybe_declare(self.exchange)
+        self._producer.publish(payload, exchange=self.exchange, routing_key=routing_key)
+
+    def _disconnect(self):
+        """
+        Close the shared connection.
+        """
+        connection = self._connection
+        self._connection = None
+        self._producer = None
+        if connection is not None:
+            try:
+                connection.release()
+            except Exception:
+                _logger.debug('error closing event message connection', exc_info=True)
+
+
+def get_publisher():
+    """
+    Get the publisher for this process. A process forked from one that already had a publisher
+    gets its own, since the publishing thread and connection do not survive the fork.
+
+    :return: The publisher
+    :rtype:  Publisher
+    """
+    global _publisher
+    with _publisher_lock:
+        if _publisher is None or _publisher.pid != os.getpid():
+            broker_url = config.get('messaging', 'event_notification_url')
+            _publisher = Publisher(broker_url)
+            atexit.register(_publisher.close)
+        return _publisher
+
 
 def send(document, routing_key=None):
     """
     Attempt to send a message to the AMQP broker.
 
-    If we cannot obtain a new connection then the message will be dropped. Note
-    that we do not block when waiting for a connection.
+    The message is queued and published by the process's Publisher. If the publisher's outbox is
+    full the message will be dropped. Note that we do not block when waiting for a connection.
 
     :param document: the taskstatus Document we want to send
     :type  document: mongoengine.Document
@@ -31,11 +248,4 @@ def send(document, routing_key=None):
         _logger.warn("unable to convert document to JSON; event message not sent")
         return
 
-    broker_url = config.get('messaging', 'event_notification_url')
-
-    notification_topic = Exchange(name=DEFAULT_EXCHANGE_NAME, type='topic')
-
-    with Connection(broker_url) as connection:
-        producer = Producer(connection)
-        producer.maybe_declare(notification_topic)
-        producer.publish(payload, exchange=notification_topic, routing_key=routing_key)
+    get_publisher().put(payload, routing_key=routing_key)
@@ -4,6 +4,7 @@ import errno
 from gettext import gettext as _
 import logging
 import os
+from Queue import Empty
 import signal
 import time
 import traceback
@@ -15,6 +16,7 @@ from bson import ObjectId
 from celery import task, Task as CeleryTask, current_task, __version__ as celery_version
 from celery.app import control, defaults
 from celery.result import AsyncResult
+from kombu import Exchange, Queue
 from mongoengine.queryset import DoesNotExist
 
 from pulp.common.constants import RESOURCE_MANAGER_WORKER_NAME, SCHEDULER_WORKER_NAME
@@ -22,7 +24,7 @@ from pulp.common import constants, dateutils, tags
 from pulp.server.async.celery_instance import celery, RESOURCE_MANAGER_QUEUE, \
     DEDICATED_QUEUE_EXCHANGE
 from pulp.server.exceptions import PulpException, MissingResource, \
-    NoWorkers, PulpCodedException, error_codes
+    PulpCodedException, error_codes
 from pulp.server.config import config
 from pulp.server.db.model import Worker, ReservedResource, TaskStatus, \
     ResourceManagerLock, CeleryBeatLock
@@ -34,6 +36,23 @@ from pulp.server.managers.schedule import utils
 controller = control.Control(app=celery)
 _logger = logging.getLogger(__name__)
 
+# Seconds the resource manager trusts its index of workers and reservations before reading them
+# from the database again.
+DISPATCH_REFRESH_INTERVAL = 5
+
+# Seconds between database reads while the resource manager waits for a worker and cannot receive
+# release notifications.
+FALLBACK_POLL_INTERVAL = 0.25
+
+# Seconds between the dispatcher metrics the resource manager logs while it dispatches tasks.
+DISPATCH_STATS_INTERVAL = 60
+
+# Releases of reservations are announced to the resource manager on this exchange.
+RELEASE_EXCHANGE = Exchange('pulp.reservations', type='fanout', durable=False)
+RELEASE_QUEUE = '%s.releases' % RESOURCE_MANAGER_QUEUE
+
+_dispatcher = None
+
 
 class PulpTask(CeleryTask):
     """
@@ -118,7 +137,7 @@ def _queue_reserved_task(name, task_id, resource_id, inner_args, inner_kwargs):
 
     The inner task is dispatched into a dedicated queue for a worker that is decided at dispatch
     time. The logic deciding which queue receives a task is controlled through the
-    find_worker function.
+    ReservationDispatcher of the resource manager process.
 
     :param name:          The name of the task to be called
     :type name:           basestring
@@ -133,23 +152,7 @@ def _queue_reserved_task(name, task_id, resource_id, inner_args, inner_kwargs):
 
     :return: None
     """
-    while True:
-        try:
-            worker = get_worker_for_reservation(resource_id)
-        except NoWorkers:
-            pass
-        else:
-            break
-
-        try:
-            worker = _get_unreserved_worker()
-        except NoWorkers:
-            pass
-        else:
-            break
-
-        # No worker is ready for this work, so we need to wait
-        time.sleep(0.25)
+    worker = get_dispatcher().dispatch(task_id, resource_id)
 
     ReservedResource(task_id=task_id, worker_name=worker['name'], resource_id=resource_id).save()
 
@@ -176,56 +179,339 @@ def _is_worker(worker_name):
     return True
 
 
-def get_worker_for_reservation(resource_id):
+class ReservationDispatcher(object):
     """
-    Return the Worker instance that is associated with a reservation of type resource_id. If
-    there are no workers with that reservation_id type a pulp.server.exceptions.NoWorkers
-    exception is raised.
+    Chooses the worker for each reserved task queued with the resource manager.
+
+    The dispatcher keeps an in-process index of the online workers, the number of reservations
+    each of them holds and the worker each reserved resource is assigned to. A task is placed on
+    the worker that holds a reservation for its resource. Otherwise it is placed on a worker with
+    no reservations, choosing the one this dispatcher has given the fewest tasks. When no worker
+    is available, the dispatcher waits for a release notification rather than polling.
+
+    The index is read from the database when it is older than DISPATCH_REFRESH_INTERVAL seconds,
+    which picks up workers that came online. Between refreshes it is updated by the reservations
+    the dispatcher makes and by the notifications that _release_resource and _delete_worker
+    publish on the RELEASE_EXCHANGE. If the broker cannot be used for notifications, the
+    dispatcher falls back to polling the database every FALLBACK_POLL_INTERVAL seconds.
+
+    :ivar workers:      The online workers that can be assigned work, keyed by name
+    :type workers:      dict
+    :ivar loads:        The number of reservations held, keyed by worker name
+    :type loads:        dict
+    :ivar resources:    The name of the worker and the number of reservations for each reserved
+                        resource, keyed by resource id
+    :type resources:    dict
+    :ivar reservations: The name of the worker and the resource id of each reservation, keyed by
+                        task id
+    :type reservations: dict
+    :ivar assigned:     The number of tasks dispatched to each worker, keyed by worker name
+    :type assigned:     dict
+    """
+
+    def __init__(self):
+        self.pid = os.getpid()
+        self.workers = {}
+        self.loads = {}
+        self.resources = {}
+        self.reservations = {}
+        self.assigned = {}
+        self.refreshed = None
+        self.dispatched = 0
+        self.waited = 0
+        self.waiting = 0
+        self.latency_last = 0.0
+        self.latency_max = 0.0
+        self.latency_total = 0.0
+        self.stats_logged = time.time()
+        self._connection = None
+        self._queue = None
+
+    def dispatch(self, task_id, resource_id):
+        """
+        Reserve a resource for a task, waiting until a worker is available for it.
+
+        :param task_id:     The UUID of the task that requests the reservation
+        :type  task_id:     basestring
+        :param resource_id: The name of the resource to reserve
+        :type  resource_id: basestring
+        :return:            The worker the task is to be dispatched to
+        :rtype:             pulp.server.db.model.resources.Worker
+        """
+        start = time.time()
+        waited = False
+        self.waiting += 1
+        try:
+            self.poll()
+            while True:
+                if self.refreshed is None or \
+                        time.time() - self.refreshed >= DISPATCH_REFRESH_INTERVAL:
+                    self.refresh()
+                worker = self.find_worker(resource_id)
+                if worker is not None:
+                    break
+                waited = True
+                self.wait(self.refreshed + DISPATCH_REFRESH_INTERVAL - time.time())
+        finally:
+            self.waiting -= 1
+
+        self.reserve(task_id, worker['name'], resource_id)
+        self.assigned[worker['name']] = self.assigned.get(worker['name'], 0) + 1
+
+        latency = time.time() - start
+        self.dispatched += 1
+        self.latency_last = latency
+        self.latency_max = max(self.latency_max, latency)
+        self.latency_total += latency
+        if waited:
+            self.waited += 1
+            _logger.debug('reserved task %(task_id)s waited %(latency).2fs for worker %(worker)s'
+                          % {'task_id': task_id, 'latency': latency, 'worker': worker['name']})
+        if time.time() - self.stats_logged >= DISPATCH_STATS_INTERVAL:
+            self.log_stats()
+        return worker
+
+    def find_worker(self, resource_id):
+        """
+        Find the worker a task reserving a resource can be dispatched to.
 
-    :param resource_id:    The name of the resource you wish to reserve for your task.
+        :param resource_id: The name of the resource to reserve
+        :type  resource_id: basestring
+        :return:            The worker, or None if no worker is available
+        :rtype:             pulp.server.db.model.resources.Worker
+        """
+        reserved = self.resources.get(resource_id)
+        if reserved is not None:
+            # the reservation may be held by a worker that is no longer online, in which case
+            # the task waits until the reservation is cleaned up
+            return self.workers.get(reserved[0])
+
+        unreserved = [name for name in self.workers if not self.loads.get(name)]
+        if not unreserved:
+            return None
+        name = min(unreserved, key=lambda n: (self.assigned.get(n, 0), n))
+        return self.workers[name]
+
+    def refresh(self):
+        """
+        Read the online workers and the reservations from the database.
+        """
+        self.workers = dict((worker['name'], worker) for worker in Worker.objects.get_online()
+                            if _is_worker(worker['name']))
+        self.loads = {}
+        self.resources = {}
+        self.reservations = {}
+        for reservation in ReservedResource.objects.all():
+            self.reserve(reservation['task_id'], reservation['worker_name'],
+                         reservation['resource_id'])
+        self.refreshed = time.time()
+
+    def reserve(self, task_id, worker_name, resource_id):
+        """
+        Add a reservation to the index.
+
+        :param task_id:     The UUID of the task that holds the reservation
+        :type  task_id:     basestring
+        :param worker_name: The name of the worker the task is dispatched to
+        :type  worker_name: basestring
+        :param resource_id: The name of the reserved resource
+        :type  resource_id: basestring
+        """
+        self.reservations[task_id] = (worker_name, resource_id)
+        self.loads[worker_name] = self.loads.get(worker_name, 0) + 1
+        reserved = self.resources.setdefault(resource_id, [worker_name, 0])
+        reserved[1] += 1
 
-    :raises NoWorkers:     If all workers have reserved_resource entries associated with them.
+    def release(self, task_id):
+        """
+        Remove a reservation from the index.
 
-    :type resource_id:     basestring
-    :returns:              The Worker instance that has a reserved_resource entry of type
-                           `resource_id` associated with it.
-    :rtype:                pulp.server.db.model.resources.Worker
-    """
-    reservation = ReservedResource.objects(resource_id=resource_id).first()
-    if reservation:
-        return Worker.objects(name=reservation['worker_name']).first()
-    else:
-        raise NoWorkers()
+        :param task_id: The UUID of the task that held the reservation
+        :type  task_id: basestring
+        """
+        try:
+            worker_name, resource_id = self.reservations.pop(task_id)
+        except KeyError:
+            return
+        self.loads[worker_name] -= 1
+        if not self.loads[worker_name]:
+            del self.loads[worker_name]
+        reserved = self.resources[resource_id]
+        reserved[1] -= 1
+        if not reserved[1]:
+            del self.resources[resource_id]
+
+    def remove_worker(self, worker_name):
+        """
+        Remove a worker and its reservations from the index.
 
+        :param worker_name: The name of the worker
+        :type  worker_name: basestring
+        """
+        self.workers.pop(worker_name, None)
+        for task_id, reservation in self.reservations.items():
+            if reservation[0] == worker_name:
+                self.release(task_id)
 
-def _get_unreserved_worker():
-    """
-    Return the Worker instance that has no reserved_resource entries
-    associated with it. If there are no unreserved workers a
-    pulp.server.exceptions.NoWorkers exception is raised.
+    def poll(self):
+        """
+        Apply the release notifications received since the last call, without waiting. The
+        connection is opened if needed.
+        """
+        try:
+            if self._queue is None:
+                self._connect()
+            while True:
+                self._handle(self._queue.get_nowait())
+        except Empty:
+            pass
+        except Exception:
+            _logger.debug('error receiving reservation release notifications', exc_info=True)
+            self._disconnect()
+
+    def wait(self, timeout):
+        """
+        Wait up to timeout seconds for a release notification, and apply it along with any others
+        that were received. Without a connection, sleep instead and have the index refreshed.
+
+        :param timeout: The number of seconds to wait
+        :type  timeout: float
+        """
+        if timeout <= 0:
+            return
+        if self._queue is not None:
+            try:
+                self._handle(self._queue.get(timeout=timeout))
+            except Empty:
+                return
+            except Exception:
+                _logger.debug('error receiving reservation release notifications', exc_info=True)
+                self._disconnect()
+            else:
+                self.poll()
+                return
+        time.sleep(min(timeout, FALLBACK_POLL_INTERVAL))
+        # releases are not being received, so the database is the only way to see them
+        self.refreshed = None
+        self.poll()
+
+    def stats(self):
+        """
+        :return: The dispatcher metrics. waiting is the number of tasks waiting for a worker, and
+                 queue_depth the number of tasks in the resource manager queue, or None if the
+                 broker could not be asked. dispatched and waited count the tasks dispatched and
+                 the tasks that had to wait for a worker. The latencies are in seconds, from the
+                 start of dispatch until a worker was found.
+        :rtype:  dict
+        """
+        return {
+            'workers': len(self.workers),
+            'reserved_workers': len([name for name in self.loads if name in self.workers]),
+            'reservations': len(self.reservations),
+            'waiting': self.waiting,
+            'queue_depth': self.queue_depth(),
+            'dispatched': self.dispatched,
+            'waited': self.waited,
+            'latency_last': self.latency_last,
+            'latency_max': self.latency_max,
+            'latency_average': self.latency_total / self.dispatched if self.dispatched else 0.0,
+        }
+
+    def log_stats(self):
+        """
+        Log the dispatcher metrics.
+        """
+        self.stats_logged = time.time()
+        _logger.info(_('reserved task dispatch: %(dispatched)d dispatched, %(waited)d waited for '
+                       'a worker, %(waiting)d waiting, queue depth %(queue_depth)s, latency '
+                       'average %(latency_average).3fs max %(latency_max).3fs; %(reservations)d '
+                       'reservations on %(reserved_workers)d of %(workers)d workers')
+                     % self.stats())
+
+    def queue_depth(self):
+        """
+        :return: The number of tasks waiting in the resource manager queue, or None if the broker
+                 could not be asked. The broker is only asked when the dispatcher is already
+                 connected to it.
+        :rtype:  int
+        """
+        if self._connection is None:
+            return None
+        try:
+            result = self._connection.default_channel.queue_declare(
+                queue=RESOURCE_MANAGER_QUEUE, passive=True)
+            return result[1]
+        except Exception:
+            _logger.debug('unable to get the resource manager queue depth', exc_info=True)
+            return None
 
-    :raises NoWorkers: If all workers have reserved_resource entries associated with them.
+    def _handle(self, message):
+        """
+        Apply a release notification to the index.
+
+        :param message: The notification message
+        :type  message: kombu.message.Message
+        """
+        payload = message.payload
+        if payload.get('task_id'):
+            self.release(payload['task_id'])
+        if payload.get('worker_name'):
+            self.remove_worker(payload['worker_name'])
 
-    :returns:          The Worker instance that has no reserved_resource
-                       entries associated with it.
-    :rtype:            pulp.server.db.model.resources.Worker
+    def _connect(self):
+        """
+        Open the connection and start consuming release notifications. Notifications published
+        before the queue was bound are lost, so the index is refreshed afterwards.
+        """
+        self._connection = celery.connection()
+        queue = Queue(RELEASE_QUEUE, RELEASE_EXCHANGE, durable=False, auto_delete=True)
+        self._queue = self._connection.SimpleQueue(queue, no_ack=True)
+        self.refreshed = None
+
+    def _disconnect(self):
+        """
+        Close the connection.
+        """
+        connection = self._connection
+        self._connection = None
+        self._queue = None
+        if connection is not None:
+            try:
+                connection.release()
+            except Exception:
+                _logger.debug('error closing reservation release connection', exc_info=True)
+
+
+def get_dispatcher():
     """
+    Get the reservation dispatcher for this process. A process forked from one that already had a
+    dispatcher gets its own, since the connection does not survive the fork.
+
+    :return: The dispatcher
+    :rtype:  ReservationDispatcher
+    """
+    global _dispatcher
+    if _dispatcher is None or _dispatcher.pid != os.getpid():
+        _dispatcher = ReservationDispatcher()
+    return _dispatcher
 
-    # Build a mapping of queue names to Worker objects
-    workers_dict = dict((worker['name'], worker) for worker in Worker.objects.get_online())
-    worker_names = workers_dict.keys()
-    reserved_names = [r['worker_name'] for r in ReservedResource.objects.all()]
 
-    # Find an unreserved worker using set differences of the names, and filter
-    # out workers that should not be assigned work.
-    # NB: this is a little messy but set comprehensions are in python 2.7+
-    unreserved_workers = set(filter(_is_worker, worker_names)) - set(reserved_names)
+def _notify_release(**payload):
+    """
+    Tell the resource manager that reservations have been released. The notification is best
+    effort; if it cannot be published the resource manager sees the release when it next reads
+    the reservations from the database.
 
+    :param payload: Either the task_id of a released reservation, or the worker_name of a worker
+                    whose reservations were all released
+    :type  payload: dict
+    """
     try:
-        return workers_dict[unreserved_workers.pop()]
-    except KeyError:
-        # All workers are reserved
-        raise NoWorkers()
+        with celery.producer_or_acquire() as producer:
+            producer.publish(payload, exchange=RELEASE_EXCHANGE, routing_key=RELEASE_QUEUE,
+                             declare=[RELEASE_EXCHANGE], serializer='json', retry=False)
+    except Exception:
+        _logger.debug('unable to publish reservation release notification', exc_info=True)
 
 
 def _delete_worker(name, normal_shutdown=False):
@@ -258,6 +544,7 @@ def _delete_worker(name, normal_shutdown=False):
 
     # Delete all reserved_resource documents for the worker
     ReservedResource.objects(worker_name=name).delete()
+    _notify_release(worker_name=name)
 
     # If the worker is a resource manager, we also need to delete the associated lock
     if name.startswith(RESOURCE_MANAGER_WORKER_NAME):
@@ -295,6 +582,7 @@ def _release_resource(task_id):
 
         new_task.on_failure(exception, task_id, (), {}, MyEinfo)
     ReservedResource.objects(task_id=task_id).delete()
+    _notify_release(task_id=task_id)
 
 
 class TaskResult(object):
@@ -0,0 +1,202 @@
+"""
+Caches the users that recently authenticated with a password, so that repeated requests with the
+same credentials do not hash the password and look up the user again.
+"""
+
+import hashlib
+import hmac
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+# Seconds a successful authentication is cached. Changes to users, roles and permissions made in
+# this process are seen immediately. Changes made by other processes are seen when the permission
+# index applies them, within its refresh interval.
+PRINCIPAL_CACHE_TTL = 30
+
+# The maximum number of credentials cached.
+PRINCIPAL_CACHE_SIZE = 1000
+
+# The maximum number of authorization decisions cached for each principal.
+AUTHORIZATION_CACHE_SIZE = 1000
+
+
+class CachedPrincipal(object):
+    """
+    A user that authenticated with a password, and the authorization decisions made for them.
+
+    :ivar login:  The login of the user
+    :type login:  basestring
+    :ivar user:   The user, once it has been looked up
+    :type user:   pulp.server.db.model.User
+    :ivar expires: The time after which the principal is no longer valid
+    :type expires: float
+    """
+
+    def __init__(self, login, expires, user=None):
+        """
+        :param login:   The login of the user
+        :type  login:   basestring
+        :param expires: The time after which the principal is no longer valid
+        :type  expires: float
+        :param user:    The user, if it has already been looked up
+        :type  user:    pulp.server.db.model.User
+        """
+        self.login = login
+        self.user = user
+        self.expires = expires
+        self._authorizations = {}
+
+    def is_authorized(self, resource, operation):
+        """
+        Get a cached authorization decision.
+
+        :param resource:  pulp resource path
+        :type  resource:  basestring
+        :param operation: operation to be performed on the resource
+        :type  operation: int
+
+        :return: True or False if the decision is cached, None otherwise
+        :rtype:  bool or None
+        """
+        return self._authorizations.get((resource, operation))
+
+    def set_authorized(self, resource, operation, authorized):
+        """
+        Cache an authorization decision.
+
+        :param resource:   pulp resource path
+        :type  resource:   basestring
+        :param operation:  operation to be performed on the resource
+        :type  operation:  int
+        :param authorized: whether the user may perform the operation on the resource
+        :type  authorized: bool
+        """
+        if len(self._authorizations) >= AUTHORIZATION_CACHE_SIZE:
+            self._authorizations.clear()
+        self._authorizations[(resource, operation)] = authorized
+
+
+class PrincipalCache(object):
+    """
+    Maps a digest of a username and password to the principal that authenticated with them.
+    The digest is keyed with a secret generated by each process, so the cache does not hold
+    anything that could be used to recover the passwords.
+    """
+
+    def __init__(self, ttl=PRINCIPAL_CACHE_TTL, size=PRINCIPAL_CACHE_SIZE):
+        """
+        :param ttl:  The number of seconds a principal is cached
+        :type  ttl:  int
+        :param size: The maximum number of principals cached
+        :type  size: int
+        """
+        self.ttl = ttl
+        self.size = size
+        self.generation = 0
+        self._secret = os.urandom(32)
+        self._lock = threading.Lock()
+        self._principals = OrderedDict()
+
+    def _digest(self, username, password):
+        """
+        :param username: The username
+        :type  username: basestring
+        :param password: The password
+        :type  password: basestring
+
+        :return: digest identifying the credentials
+        :rtype:  str
+        """
+        mac = hmac.new(self._secret, digestmod=hashlib.sha256)
+        for value in (username, password):
+            if isinstance(value, unicode):
+                value = value.encode('utf-8')
+            mac.update('%d:%s' % (len(value), value))
+        return mac.digest()
+
+    def get(self, username, password):
+        """
+        Get the principal that authenticated with a username and password.
+
+        :param username: The username
+        :type  username: basestring
+        :param password: The password
+        :type  password: basestring
+
+        :return: the principal, or None if the credentials are not cached
+        :rtype:  CachedPrincipal or None
+        """
+        key = self._digest(username, password)
+        with self._lock:
+            principal = self._principals.get(key)
+            if principal is not None and time.time() >= principal.expires:
+                del self._principals[key]
+                principal = None
+        return principal
+
+    def add(self, username, password, login, generation):
+        """
+        Cache the principal that authenticated with a username and password.
+
+        :param username:   The username
+        :type  username:   basestring
+        :param password:   The password
+        :type  password:   basestring
+        :param login:      The login of the authenticated user
+        :type  login:      basestring
+        :param generation: The generation of the cache when the credentials were checked. The
+                           principal is not cached if the cache was invalidated since then.
+        :type  generation: int
+
+        :return: the principal, which is not cached if the cache was invalidated
+        :rtype:  CachedPrincipal
+        """
+        key = self._digest(username, password)
+        principal = CachedPrincipal(login, time.time() + self.ttl)
+        with self._lock:
+            if generation == self.generation:
+                self._principals.pop(key, None)
+                self._principals[key] = principal
+                while len(self._principals) > self.size:
+                    self._principals.popitem(last=False)
+        return principal
+
+    def invalidate(self, login=None):
+        """
+        Discard cached principals. Called when users or their roles change.
+
+        :param login: The login of the user whose principals are discarded, or None to discard
+                      all of them
+        :type  login: basestring or None
+        """
+        with self._lock:
+            self.generation += 1
+            if login is None:
+                self._principals.clear()
+                return
+            for key, principal in self._principals.items():
+                if principal.login == login:
+                    del self._principals[key]
+
+    def invalidate_authorizations(self, login=None):
+        """
+        Discard the authorization decisions cached for principals, but keep the principals.
+        Called when permissions change. A principal that is in use keeps its decisions until
+        the request is finished, but they are not used by later requests.
+
+        :param login: The login of the user whose decisions are discarded, or None to discard
+                      the decisions of all users
+        :type  login: basestring or None
+        """
+        with self._lock:
+            for key, principal in self._principals.items():
+                if login is None or principal.login == login:
+                    self._principals[key] = CachedPrincipal(principal.login, principal.expires,
+                                                            principal.user)
+
+
+# shared by the requests handled in this process
+principal_cache = PrincipalCache()
@@ -0,0 +1,273 @@
+"""
+Keeps the permissions of all users in memory, arranged by the segments of the resource paths they
+are granted on, so that authorizing a request does not query the database.
+
+Role permissions are granted to each member of the role when they join it, so the permissions
+collection holds everything needed besides which users are super users.
+
+The version of the permissions is also how changes to users made by other processes reach this
+one: the principals cached for the users named in a change are discarded when it is applied.
+"""
+
+import threading
+import time
+
+from pymongo import ASCENDING
+
+from pulp.server.auth.cache import principal_cache
+from pulp.server.constants import SUPER_USER_ROLE
+from pulp.server.db import model
+from pulp.server.db.model.auth import Permission, PermissionVersion
+
+
+# Seconds between checks of the version of the permissions. Changes made in this process are
+# applied immediately; changes made by other processes are seen within this time.
+PERMISSION_INDEX_REFRESH_INTERVAL = 1
+
+# The number of changes kept with the version. A process that falls further behind than this
+# rebuilds its index.
+PERMISSION_CHANGES_KEPT = 100
+
+# The _id of the PermissionVersion document.
+VERSION_ID = 'permissions'
+
+
+def _segments(resource):
+    """
+    :param resource: pulp resource path
+    :type  resource: basestring
+
+    :return: the segments of the path
+    :rtype:  list of basestring
+    """
+    return [p for p in resource.split('/') if p]
+
+
+def _mask(operations):
+    """
+    :param operations: operations granted on a resource
+    :type  operations: list of int
+
+    :return: bitmask with the bit for each operation set
+    :rtype:  int
+    """
+    mask = 0
+    for operation in operations:
+        mask |= 1 << operation
+    return mask
+
+
+def _set_grants(root, resource, users):
+    """
+    Replace the operations granted to users on a resource.
+
+    :param root:     root of the trie
+    :type  root:     _Node
+    :param resource: pulp resource path
+    :type  resource: basestring
+    :param users:    the users of a Permission, with the operations granted to each
+    :type  users:    list of dict
+    """
+    segments = _segments(resource)
+    if resource != ('/%s/' % '/'.join(segments) if segments else '/'):
+        # authorization only looks up resources with a leading and trailing slash
+        return
+    grants = dict((u['username'], _mask(u['permissions'])) for u in users)
+    node = root
+    for segment in segments:
+        child = node.children.get(segment)
+        if child is None:
+            if not grants:
+                return
+            child = node.children[segment] = _Node()
+        node = child
+    node.grants = grants
+
+
+class _Node(object):
+    """
+    A resource path segment, with the operations granted on the path ending at it.
+
+    :ivar children: nodes for the next segments of the path, keyed by segment
+    :type children: dict
+    :ivar grants:   bitmask of the operations granted on the path, keyed by login
+    :type grants:   dict
+    """
+
+    __slots__ = ('children', 'grants')
+
+    def __init__(self):
+        self.children = {}
+        self.grants = {}
+
+
+class PermissionIndex(object):
+    """
+    A trie of the permissions granted to users, and the sets of known users and super users.
+
+    :ivar version: The PermissionVersion the index was built from, or None if it is not built
+    :type version: int
+    """
+
+    def __init__(self, refresh_interval=PERMISSION_INDEX_REFRESH_INTERVAL):
+        """
+        :param refresh_interval: Seconds between checks of the version of the permissions
+        :type  refresh_interval: int
+        """
+        self.refresh_interval = refresh_interval
+        self.version = None
+        self._next_check = 0
+        self._lock = threading.Lock()
+        self._root = _Node()
+        self._logins = set()
+        self._superusers = set()
+
+    def is_authorized(self, resource, login, operation):
+        """
+        Check whether a user may perform an operation on a resource. A user may if they are a
+        super user, or if the operation was granted on the resource or any of its parents.
+
+        :param resource:  pulp resource path
+        :type  resource:  basestring
+        :param login:     login of the user
+        :type  login:     basestring
+        :param operation: operation to be performed on the resource
+        :type  operation: int
+
+        :return: True if the user is authorized, False if not, or None if the user is unknown
+        :rtype:  bool or None
+        """
+        self.refresh()
+        if login not in self._logins:
+            return None
+        if login in self._superusers:
+            return True
+
+        bit = 1 << operation
+        node = self._root
+        if node.grants.get(login, 0) & bit:
+            return True
+        for segment in _segments(resource):
+            node = node.children.get(segment)
+            if node is None:
+                return False
+            if node.grants.get(login, 0) & bit:
+                return True
+        return False
+
+    def refresh(self, force=False):
+        """
+        Bring the index up to date with the PermissionVersion. The version is only read once
+        per refresh interval unless the refresh is forced.
+
+        :param force: read the version even if it was read within the refresh interval
+        :type  force: bool
+        """
+        if not force and time.time() < self._next_check:
+            return
+        with self._lock:
+            now = time.time()
+            if not force and now < self._next_check:
+                return
+            self._next_check = now + self.refresh_interval
+
+            # the version is read before the permissions, so a change made while they are read
+            # is applied again by the next refresh
+            document = PermissionVersion.get_collection().find_one({'_id': VERSION_ID}) or {}
+            version = document.get('version', 0)
+            if version == self.version:
+                return
+
+            if self.version is not None:
+                changes = [c for c in document.get('changes', []) if c['version'] > self.version]
+                if changes and changes[0]['version'] == self.version + 1 and \
+                        changes[-1]['version'] == version:
+                    resources = set()
+                    logins = set()
+                    for change in changes:
+                        resources.update(change.get('resources', []))
+                        logins.update(change.get('logins', []))
+                    if resources:
+                        self._load_permissions(self._root,
+                                               {'resource': {'$in': list(resources)}}, resources)
+                    if logins:
+                        self._load_users({'login': {'$in': list(logins)}}, logins)
+                    # users that were changed or deleted must authenticate again
+                    for login in logins:
+                        principal_cache.invalidate(login)
+                    if resources:
+                        principal_cache.invalidate_authorizations()
+                    self.version = version
+                    return
+
+            # build a new trie, so that requests use the old one until it is complete
+            root = _Node()
+            self._load_permissions(root, {})
+            self._root = root
+            self._load_users({}, self._logins)
+            # the changes are not known, so no cached principal can be trusted
+            principal_cache.invalidate()
+            self.version = version
+
+    def changed(self, resources=(), logins=()):
+        """
+        Record that permissions on resources, or the roles of users, have changed, and apply
+        the change to this index. Call this after the change is saved.
+
+        :param resources: resources whose permissions changed
+        :type  resources: iterable of basestring
+        :param logins:    logins of the users that were created, deleted or changed roles
+        :type  logins:    iterable of basestring
+        """
+        collection = PermissionVersion.get_collection()
+        document = collection.find_and_modify(query={'_id': VERSION_ID},
+                                              update={'$inc': {'version': 1}},
+                                              upsert=True, new=True)
+        change = {'version': document['version'], 'resources': list(resources),
+                  'logins': list(logins)}
+        collection.update({'_id': VERSION_ID},
+                          {'$push': {'changes': {'$each': [change],
+                                                 '$sort': {'version': ASCENDING},
+                                                 '$slice': -PERMISSION_CHANGES_KEPT}}})
+        self.refresh(force=True)
+
+    def _load_permissions(self, root, spec, resources=()):
+        """
+        Replace the grants on resources with those in the permissions collection.
+
+        :param root:      root of the trie the permissions are loaded into
+        :type  root:      _Node
+        :param spec:      query for the permissions to load
+        :type  spec:      dict
+        :param resources: resources whose grants are removed if they are not found
+        :type  resources: iterable of basestring
+        """
+        missing = set(resources)
+        for permission in Permission.get_collection().find(spec):
+            missing.discard(permission['resource'])
+            _set_grants(root, permission['resource'], permission['users'])
+        for resource in missing:
+            _set_grants(root, resource, [])
+
+    def _load_users(self, spec, logins=()):
+        """
+        Replace the known and super users with those in the users collection.
+
+        :param spec:   query for the users to load
+        :type  spec:   dict
+        :param logins: logins that are forgotten if they are not found
+        :type  logins: iterable of basestring
+        """
+        # new sets are swapped in, so that requests never see a user half way through an update
+        known = self._logins.difference(logins)
+        superusers = self._superusers.difference(logins)
+        for user in model.User._get_collection().find(spec, {'login': 1, 'roles': 1}):
+            known.add(user['login'])
+            if SUPER_USER_ROLE in user.get('roles', []):
+                superusers.add(user['login'])
+        self._superusers = superusers
+        self._logins = known
+
+
+# shared by the requests handled in this process
+permission_index = PermissionIndex()
@@ -33,6 +33,39 @@ try:
 except ImportError:
     from pymongo.son import SON  # noqa
 
+try:
+    from hmac import compare_digest
+except ImportError:
+    def compare_digest(a, b):
+        # compare in time that does not depend on where the strings differ
+        if len(a) != len(b):
+            return False
+        result = 0
+        for x, y in zip(a, b):
+            result |= ord(x) ^ ord(y)
+        return result == 0
+try:
+    from hashlib import pbkdf2_hmac
+except ImportError:
+    def pbkdf2_hmac(hash_name, password, salt, iterations):
+        # RFC 2898 PBKDF2, deriving a single block the size of the digest
+        import hashlib
+        import hmac
+        digest = getattr(hashlib, hash_name)
+        prf = hmac.new(password, digestmod=digest)
+
+        def _prf(data):
+            mac = prf.copy()
+            mac.update(data)
+            return mac.digest()
+
+        block = _prf(salt + '\x00\x00\x00\x01')
+        result = [ord(c) for c in block]
+        for i in xrange(iterations - 1):
+            block = _prf(block)
+            result = [r ^ ord(c) for r, c in zip(result, block)]
+        return ''.join(chr(r) for r in result)
+
 
 def _update_wrapper(orig, wrapper):
     # adopt the original's metadata
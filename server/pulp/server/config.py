@@ -131,6 +131,7 @@ _default_values = {
         'certfile': '/etc/pki/pulp/qpid/client.crt',
         'login_method': '',
         'worker_timeout': '30',
+        'progress_report_interval': '1',
     },
     'lazy': {
         'redirect_host': socket.getfqdn(),
@@ -1,3 +1,5 @@
+import sys
+
 from collections import namedtuple
 from logging import getLogger
 from threading import Thread, RLock
@@ -7,6 +9,7 @@ from nectar.listener import DownloadEventListener
 from nectar.report import DownloadReport as NectarDownloadReport, DOWNLOAD_SUCCEEDED
 from nectar.request import DownloadRequest
 
+from pulp.plugins.util.misc import paginate
 from pulp.server.content.sources.event import Started, Succeeded, Failed
 from pulp.server.content.sources.model import ContentSource, PrimarySource, \
     DownloadReport, DownloadDetails, RefreshReport
@@ -16,6 +19,14 @@ from pulp.server.managers import factory as managers
 log = getLogger(__name__)
 
 
+# The number of download requests for which content sources are
+# resolved using a single content catalog query.
+RESOLVE_BATCH_SIZE = 500
+
+# The maximum number of resolved download requests waiting to be dispatched.
+RESOLVE_LOOKAHEAD = 2 * RESOLVE_BATCH_SIZE
+
+
 class DownloadFailed(Exception):
     """
     A serial download has failed.
@@ -248,10 +259,9 @@ class Serial(Batch):
         """
         report = DownloadReport()
         report.total_sources = len(self.sources)
-        for request in self.requests:
+        for request in resolve(self.primary, self.sources, self.requests):
             event = Started(request)
             event(self.listener)
-            request.find_sources(self.primary, self.sources)
             for source, url in request.sources:
                 details = report.downloads.setdefault(source.id, DownloadDetails())
                 try:
@@ -424,12 +434,15 @@ class Threaded(Batch):
         report = DownloadReport()
         report.total_sources = len(self.sources)
 
+        resolver = SourceResolver(self)
+        resolver.start()
+
         try:
-            for request in self.requests:
-                request.find_sources(self.primary, self.sources)
+            for request in resolver:
                 self.dispatch(request)
                 count += 1
         finally:
+            resolver.halt()
             self.in_progress.wait(count)
             for queue in self.queues.values():
                 queue.put(None)
@@ -445,6 +458,121 @@ class Threaded(Batch):
         return report
 
 
+def resolve(primary, sources, requests, batch_size=RESOLVE_BATCH_SIZE):
+    """
+    Find the content sources for each download request.
+    The content catalog is queried once for each batch of requests rather
+    than once for each request.  The catalog is not queried at all when there
+    are no alternate content sources.
+
+    :param primary: The primary content source.
+    :type primary: PrimarySource
+    :param sources: A dictionary of alternate content sources keyed by source ID.
+    :type sources: dict
+    :param requests: An iterable of: pulp.server.content.sources.model.Request.
+    :type requests: iterable
+    :param batch_size: The number of requests resolved using a single query.
+    :type batch_size: int
+    :return: A generator of resolved requests, in the order requested.
+    :rtype: generator
+    """
+    catalog = managers.content_catalog_manager()
+    for batch in paginate(requests, batch_size):
+        if sources:
+            found = catalog.find_all([(r.type_id, r.unit_key) for r in batch])
+        else:
+            found = [[] for r in batch]
+        for request, entries in zip(batch, found):
+            request.find_sources(primary, sources, entries=entries)
+            yield request
+
+
+class SourceResolver(Thread):
+    """
+    A thread that resolves the content sources for download requests ahead of
+    dispatch.  Resolved requests are queued, up to RESOLVE_LOOKAHEAD, so that
+    dispatching to the request queues does not wait on the content catalog.
+    Iterating the resolver yields the resolved requests in order and raises
+    any exception raised while resolving.
+
+    :ivar batch: The download batch.
+    :type batch: Threaded
+    :ivar queue: Resolved requests waiting to be dispatched.
+    :type queue: Queue
+    :ivar error: The exception info (sys.exc_info()) when resolving failed.
+    :type error: tuple
+    :ivar _halted: Flag indicating that a thread halt has been requested.
+    :type _halted: bool
+    """
+
+    def __init__(self, batch):
+        """
+        :param batch: The download batch.
+        :type batch: Threaded
+        """
+        super(SourceResolver, self).__init__(name='resolver')
+        self.batch = batch
+        self.queue = Queue(RESOLVE_LOOKAHEAD)
+        self.error = None
+        self._halted = False
+        self.setDaemon(True)
+
+    def put(self, request):
+        """
+        Add a resolved request to the queue.
+        A request of (None) is the end-of-queue marker.
+
+        :param request: A resolved request.
+        :type request: pulp.server.content.sources.model.Request
+        """
+        while not self._halted:
+            try:
+                self.queue.put(request, timeout=3)
+                break
+            except Full:
+                # ignored
+                pass
+
+    def run(self):
+        """
+        The thread main.
+        """
+        try:
+            for request in resolve(self.batch.primary, self.batch.sources, self.batch.requests):
+                self.put(request)
+                if self._halted:
+                    break
+        except Exception:
+            log.exception(self.getName())
+            self.error = sys.exc_info()
+        self.put(None)
+
+    def halt(self):
+        """
+        Halt the resolver thread.
+        """
+        self._halted = True
+
+    def __iter__(self):
+        """
+        Get resolved requests until reaching the end-of-queue marker.
+
+        :return: An iterable of: pulp.server.content.sources.model.Request.
+        :rtype: iterable
+        """
+        while True:
+            try:
+                request = self.queue.get(timeout=3)
+            except Empty:
+                # ignored
+                continue
+            if request is None:
+                break
+            yield request
+        if self.error:
+            raise self.error[0], self.error[1], self.error[2]
+
+
 # The object handled by the RequestQueue put() and get().
 Item = namedtuple('Item', ['request', 'url'])
 
@@ -15,6 +15,7 @@ import os
 import re
 
 from urlparse import urljoin
+from uuid import uuid4
 from logging import getLogger
 from ConfigParser import ConfigParser
 
@@ -35,6 +36,11 @@ PATHS_REGEX = re.compile(r'\s+')
 REFRESHING = 'Refreshing [%s] url:%s'
 REFRESH_SUCCEEDED = 'Refresh [%s] succeeded.  Added: %d, Deleted: %d'
 REFRESH_FAILED = 'Refresh [%s] url: %s, failed: %s'
+REFRESH_RETIRED = 'Refresh [%s] retired: %d'
+
+# The number of catalog entries buffered by the conduit during refresh
+# before being written using a bulk insert.
+REFRESH_BATCH_SIZE = 1000
 
 
 class Request(object):
@@ -81,7 +87,7 @@ class Request(object):
         self.errors = []
         self.data = None
 
-    def find_sources(self, primary, alternates):
+    def find_sources(self, primary, alternates, entries=None):
         """
         Find and set the list of content sources in the order they are to
         be used to satisfy the request.  The alternate sources are
@@ -90,10 +96,16 @@ class Request(object):
         :type primary: ContentSource
         :param alternates: A list of alternative sources.
         :type alternates: dict
+        :param entries: The content catalog entries for the requested unit
+            when already fetched by the caller.  The catalog is queried when
+            not specified.
+        :type entries: list
         """
         resolved = [(primary, self.url)]
-        catalog = managers.content_catalog_manager()
-        for entry in catalog.find(self.type_id, self.unit_key):
+        if entries is None:
+            catalog = managers.content_catalog_manager()
+            entries = catalog.find(self.type_id, self.unit_key)
+        for entry in entries:
             source_id = entry[constants.SOURCE_ID]
             source = alternates.get(source_id)
             if source is None:
@@ -258,13 +270,17 @@ class ContentSource(object):
             url_list.append(url)
         return url_list
 
-    def get_conduit(self):
+    def get_conduit(self, batch_size=0, generation=None):
         """
         Get a plugin conduit.
+        :param batch_size: The number of added entries buffered by the conduit.
+        :type batch_size: int
+        :param generation: Identifies the refresh adding entries.
+        :type generation: str
         :return: A plugin conduit.
         :rtype CatalogerConduit
         """
-        return CatalogerConduit(self.id, self.expires)
+        return CatalogerConduit(self.id, self.expires, batch_size, generation)
 
     def get_cataloger(self):
         """
@@ -296,19 +312,23 @@ class ContentSource(object):
     def refresh(self):
         """
         Refresh the content catalog using the cataloger plugin as
-        defined by the "type" descriptor property.
+        defined by the "type" descriptor property.  When the cataloger does
+        a full refresh, the entries it did not add are removed once every URL
+        has been refreshed.
         :return: The list of refresh reports.
         :rtype: list of: RefreshReport
         """
         reports = []
-        conduit = self.get_conduit()
+        generation = str(uuid4())
+        conduit = self.get_conduit(batch_size=REFRESH_BATCH_SIZE, generation=generation)
         plugin = self.get_cataloger()
         for url in self.urls:
             conduit.reset()
             report = RefreshReport(self.id, url)
             log.info(REFRESHING, self.id, url)
             try:
-                plugin.refresh(conduit, self.descriptor, url)
+                with conduit:
+                    plugin.refresh(conduit, self.descriptor, url)
                 log.info(REFRESH_SUCCEEDED, self.id, conduit.added_count, conduit.deleted_count)
                 report.succeeded = True
                 report.added_count = conduit.added_count
@@ -318,6 +338,11 @@ class ContentSource(object):
                 report.errors.append(str(e))
             finally:
                 reports.append(report)
+        if getattr(plugin, 'full_refresh', False) and all(r.succeeded for r in reports):
+            # The new generation is complete; swap it in.
+            catalog = managers.content_catalog_manager()
+            retired = catalog.retire(self.id, generation)
+            log.info(REFRESH_RETIRED, self.id, retired)
         return reports
 
     def dict(self):
@@ -0,0 +1,134 @@
+"""
+Caches used by the content view, so that repeated downloads of the same paths do not resolve
+them on the file system and sign redirects for them on every request.
+
+Resolved paths are tagged with the publish stamp, a file touched after a publish swaps in a new
+published directory, so that paths resolved before a publish are not used after it.
+"""
+
+import errno
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from pulp.server.config import config as pulp_conf
+
+
+_logger = logging.getLogger(__name__)
+
+# Name of the publish stamp in the storage directory. It must not be under one of the directories
+# content is served from.
+PUBLISH_STAMP_FILENAME = '.publish_stamp'
+
+# Seconds a resolved path is cached. Publishes made with the AtomicDirectoryPublishStep are seen
+# immediately; other changes to the published directories, and lazy content being downloaded,
+# are seen within this time.
+PATH_CACHE_TTL = 30
+
+# The maximum number of resolved paths cached.
+PATH_CACHE_SIZE = 10000
+
+# Seconds a signed redirect is cached. Signed URLs are valid for 90 seconds, so a cached URL is
+# always valid for at least another minute when it is handed out.
+REDIRECT_CACHE_TTL = 30
+
+# The maximum number of signed redirects cached.
+REDIRECT_CACHE_SIZE = 10000
+
+
+class ExpiringCache(object):
+    """
+    A bounded mapping of keys to values that expire. The least recently used values are
+    discarded first.
+    """
+
+    def __init__(self, size):
+        """
+        :param size: The maximum number of values cached
+        :type  size: int
+        """
+        self.size = size
+        self._values = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """
+        :param key: The key the value was added with
+        :type  key: hashable
+
+        :return: The value, or None if it is not cached or has expired
+        :rtype:  object
+        """
+        with self._lock:
+            cached = self._values.pop(key, None)
+            if cached is None or time.time() >= cached[0]:
+                return None
+            # keep the most recently used values at the end
+            self._values[key] = cached
+            return cached[1]
+
+    def add(self, key, value, ttl):
+        """
+        :param key:   The key the value is found with
+        :type  key:   hashable
+        :param value: The value to cache
+        :type  value: object
+        :param ttl:   The number of seconds the value is cached
+        :type  ttl:   int
+        """
+        with self._lock:
+            self._values.pop(key, None)
+            self._values[key] = (time.time() + ttl, value)
+            while len(self._values) > self.size:
+                self._values.popitem(last=False)
+
+    def clear(self):
+        """
+        Forget all cached values.
+        """
+        with self._lock:
+            self._values.clear()
+
+
+def publish_stamp_path():
+    """
+    :return: The absolute path to the publish stamp
+    :rtype:  str
+    """
+    return os.path.join(pulp_conf.get('server', 'storage_dir'), PUBLISH_STAMP_FILENAME)
+
+
+def publish_stamp():
+    """
+    :return: The modification time of the publish stamp, or None if it does not exist
+    :rtype:  float or None
+    """
+    try:
+        return os.stat(publish_stamp_path()).st_mtime
+    except OSError:
+        return None
+
+
+def touch_publish_stamp():
+    """
+    Update the modification time of the publish stamp, creating it if needed, so that the content
+    view stops using the paths it resolved before the publish. A failure is logged rather than
+    raised; the content view then sees the publish within PATH_CACHE_TTL seconds.
+    """
+    path = publish_stamp_path()
+    try:
+        try:
+            os.utime(path, None)
+        except OSError as e:
+            if e.errno != errno.ENOENT:
+                raise
+            open(path, 'a').close()
+    except (IOError, OSError) as e:
+        _logger.warning('Could not update the publish stamp %s: %s' % (path, e))
+
+
+# shared by the requests handled in this process
+path_cache = ExpiringCache(PATH_CACHE_SIZE)
+redirect_cache = ExpiringCache(REDIRECT_CACHE_SIZE)
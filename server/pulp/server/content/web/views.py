@@ -2,6 +2,7 @@ from gettext import gettext as _
 import logging
 import mimetypes
 import os
+from collections import namedtuple
 
 from django.http import \
     HttpResponse, HttpResponseRedirect, HttpResponseForbidden, Http404
@@ -10,6 +11,7 @@ from django.views.generic import View
 
 from pulp.repoauth.wsgi import allow_access
 from pulp.server.config import config as pulp_conf
+from pulp.server.content.web import cache
 from pulp.server.lazy import URL, Key
 
 
@@ -22,6 +24,23 @@ SAFE_STORAGE_SUBDIRS = ('published', 'content', 'static')
 mimetypes_noencoding = mimetypes.MimeTypes()
 mimetypes_noencoding.encodings_map.clear()
 
+# What a requested path resolves to.
+FILE = 'file'
+DIRECTORY = 'directory'
+MISSING = 'missing'
+LAZY = 'lazy'
+
+# A requested path resolved on the file system.
+#  path: The *real* path
+#  state: One of FILE, DIRECTORY, MISSING or LAZY
+#  content_type: The Content-Type of a readable FILE, otherwise None
+Resolved = namedtuple('Resolved', ('path', 'state', 'content_type'))
+
+# The views are created for each request, so the RSA keys and the real paths content is served
+# from are kept here for the life of the process, keyed by the configured paths.
+_keys = {}
+_safe_serving_paths = {}
+
 
 class ContentView(View):
     """
@@ -81,22 +100,85 @@ class ContentView(View):
         :rtype: django.http.HttpResponse
         """
         if os.access(path, os.R_OK):
-            content_type = mimetypes_noencoding.guess_type(path)[0]
-            # If the content type can't be detected by mimetypes, send it as arbitrary
-            # binary data. See https://tools.ietf.org/html/rfc2046#section-4.5.1 for
-            # more information.
-            if content_type is None:
-                content_type = 'application/octet-stream'
-            reply = HttpResponse(content_type=content_type)
-            reply['X-SENDFILE'] = path
+            reply = ContentView.send_file(path, ContentView.content_type(path))
         else:
             reply = HttpResponseForbidden()
         return reply
 
+    @staticmethod
+    def send_file(path, content_type):
+        """
+        Reply with the X-SENDFILE header, without checking that the file can be read.
+
+        :param path: The fully qualified *real* path to the requested content.
+        :type path: str
+        :param content_type: The Content-Type of the requested content.
+        :type content_type: str
+        :return: An HTTP response.
+        :rtype: django.http.HttpResponse
+        """
+        reply = HttpResponse(content_type=content_type)
+        reply['X-SENDFILE'] = path
+        return reply
+
+    @staticmethod
+    def content_type(path):
+        """
+        Guess the Content-Type of a file from its name.
+
+        :param path: The path to a file.
+        :type path: str
+        :return: The Content-Type.
+        :rtype: str
+        """
+        content_type = mimetypes_noencoding.guess_type(path)[0]
+        # If the content type can't be detected by mimetypes, send it as arbitrary
+        # binary data. See https://tools.ietf.org/html/rfc2046#section-4.5.1 for
+        # more information.
+        if content_type is None:
+            content_type = 'application/octet-stream'
+        return content_type
+
+    @staticmethod
+    def resolve(path_info):
+        """
+        Resolve a requested path on the file system. Paths are cached until the next publish,
+        or for at most cache.PATH_CACHE_TTL seconds.
+
+        :param path_info: The requested path.
+        :type path_info: str
+        :return: What the path resolves to.
+        :rtype: Resolved
+        """
+        # read the stamp first, so a publish made while the path is resolved is seen by the
+        # next request
+        stamp = cache.publish_stamp()
+        cached = cache.path_cache.get(path_info)
+        if cached is not None and cached[0] == stamp:
+            return cached[1]
+
+        path = os.path.realpath(path_info)
+        content_type = None
+        if not os.path.lexists(path_info):
+            state = MISSING
+        elif os.path.isdir(path):
+            state = DIRECTORY
+        elif os.path.exists(path):
+            state = FILE
+            if os.access(path, os.R_OK):
+                content_type = ContentView.content_type(path)
+        else:
+            state = LAZY
+        resolved = Resolved(path, state, content_type)
+
+        cache.path_cache.add(path_info, (stamp, resolved), cache.PATH_CACHE_TTL)
+        return resolved
+
     @staticmethod
     def redirect(request, key):
         """
-        Redirected GET request.
+        Redirected GET request. The signed URL is cached for cache.REDIRECT_CACHE_TTL seconds,
+        a part of the time it is valid for.
 
         :param request: The WSGI request object.
         :type request: django.core.handlers.wsgi.WSGIRequest
@@ -105,13 +187,18 @@ class ContentView(View):
         :return: A redirect or not-found reply.
         :rtype: django.http.HttpResponse
         """
-        path = os.path.realpath(request.path_info)
         scheme = request.environ['wsgi.url_scheme']
         host = request.environ['SERVER_NAME']
         port = request.environ['SERVER_PORT']
         query = request.environ['QUERY_STRING']
         remote_ip = request.environ['REMOTE_ADDR']
 
+        cache_key = (request.path_info, scheme, host, port, query, remote_ip)
+        signed = cache.redirect_cache.get(cache_key)
+        if signed is not None:
+            return HttpResponseRedirect(signed)
+
+        path = os.path.realpath(request.path_info)
         redirect_host = pulp_conf.get('lazy', 'redirect_host')
         redirect_port = pulp_conf.get('lazy', 'redirect_port')
         redirect_path = pulp_conf.get('lazy', 'redirect_path')
@@ -125,20 +212,27 @@ class ContentView(View):
             query)
 
         url = URL(redirect)
-        signed = url.sign(key, remote_ip=remote_ip)
-        return HttpResponseRedirect(str(signed))
+        signed = str(url.sign(key, remote_ip=remote_ip))
+        cache.redirect_cache.add(cache_key, signed, cache.REDIRECT_CACHE_TTL)
+        return HttpResponseRedirect(signed)
 
     def __init__(self, **kwargs):
         super(ContentView, self).__init__(**kwargs)
-        self.key = Key.load(pulp_conf.get('authentication', 'rsa_key'))
+        key_path = pulp_conf.get('authentication', 'rsa_key')
+        self.key = _keys.get(key_path)
+        if self.key is None:
+            self.key = _keys[key_path] = Key.load(key_path)
         # Make sure all requested paths fall under these sub-directories, otherwise
         # we might find ourselves serving private keys to all and sundry.
         local_storage = pulp_conf.get('server', 'storage_dir')
-        self.safe_serving_paths = [os.path.realpath(os.path.join(local_storage, subdir))
-                                   for subdir in SAFE_STORAGE_SUBDIRS]
-        logger.debug(_("Serving Pulp content from {paths}; ensure "
-                       "Apache's mod_xsendfile is configured to serve from "
-                       "these paths as well").format(paths=str(self.safe_serving_paths)))
+        self.safe_serving_paths = _safe_serving_paths.get(local_storage)
+        if self.safe_serving_paths is None:
+            self.safe_serving_paths = [os.path.realpath(os.path.join(local_storage, subdir))
+                                       for subdir in SAFE_STORAGE_SUBDIRS]
+            _safe_serving_paths[local_storage] = self.safe_serving_paths
+            logger.debug(_("Serving Pulp content from {paths}; ensure "
+                           "Apache's mod_xsendfile is configured to serve from "
+                           "these paths as well").format(paths=str(self.safe_serving_paths)))
 
     def get(self, request):
         """
@@ -150,7 +244,8 @@ class ContentView(View):
         :rtype: django.http.HttpResponse
         """
         host = request.get_host()
-        path = os.path.realpath(request.path_info)
+        resolved = self.resolve(request.path_info)
+        path = resolved.path
 
         # Check authorization if http isn't being used. This environ variable must
         # be available in all implementations so it is not dependant on Apache httpd:
@@ -169,18 +264,20 @@ class ContentView(View):
             return HttpResponseForbidden()
 
         # Immediately 404 if the symbolic link doesn't even exist
-        if not os.path.lexists(request.path_info):
+        if resolved.state == MISSING:
             logger.debug(_('Symbolic link to {path} does not exist.').format(path=path))
             raise Http404
 
-        if os.path.isdir(path):
+        if resolved.state == DIRECTORY:
             logger.debug(_('Rendering directory index for {path}.').format(path=path))
             return self.directory_index(path)
 
         # Already downloaded
-        if os.path.exists(path):
+        if resolved.state == FILE:
+            if resolved.content_type is None:
+                return HttpResponseForbidden()
             logger.debug(_('Serving {path} with mod_xsendfile.').format(path=path))
-            return self.x_send(path)
+            return self.send_file(path, resolved.content_type)
 
         logger.debug(_('Redirecting request for {path}.').format(path=path))
         return self.redirect(request, self.key)
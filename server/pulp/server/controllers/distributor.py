@@ -10,6 +10,7 @@ from pulp.common.error_codes import PLP0002, PLP0003
 from pulp.plugins.conduits.repo_config import RepoConfigConduit
 from pulp.plugins.config import PluginCallConfiguration
 from pulp.plugins.loader import api as plugin_api
+from pulp.plugins.rsync import index as rsync_index
 from pulp.server import exceptions
 from pulp.server.async.tasks import Task, TaskResult
 from pulp.server.db import model
@@ -131,6 +132,8 @@ def delete(repo_id, dist_id):
     call_config = PluginCallConfiguration(plugin_config, distributor.config)
     repo = model.Repository.objects.get_repo_or_missing_resource(repo_id)
     dist_instance.distributor_removed(repo.to_transfer_repo(), call_config)
+    # rsync distributors keep an index of the units they published outside of the working directory
+    rsync_index.remove_publish_index(repo_id, dist_id)
     distributor.delete()
 
     unbind_errors = []
@@ -11,6 +11,8 @@ import uuid
 from bson.objectid import ObjectId, InvalidId
 import celery
 from mongoengine import NotUniqueError, OperationError, ValidationError, DoesNotExist
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
 from nectar.config import DownloaderConfig
 from nectar.request import DownloadRequest
 from nectar.downloaders.threaded import HTTPThreadedDownloader
@@ -57,6 +59,16 @@ TYPE_ID = 'type_id'
 UNIT_FILES = 'unit_files'
 REQUEST = 'request'
 
+# Number of associations, along with the units they reference, that find_repo_content_units
+# loads into memory at once.
+FIND_UNITS_PAGE_SIZE = 1000
+
+# Number of associations written to the database in each bulk write by associate_units.
+ASSOCIATE_BATCH_SIZE = 1000
+
+# Error code of a write that violates a unique index
+DUPLICATE_KEY_ERROR = 11000
+
 
 def get_associated_unit_ids(repo_id, unit_type, repo_content_unit_q=None):
     """
@@ -182,6 +194,10 @@ def find_repo_content_units(
     ContentUnit. If yield_content_unit is set to true then the ContentUnit will be yielded instead
     of the RepoContentUnit.
 
+    Associations are read in pages of FIND_UNITS_PAGE_SIZE, and the units for each page are
+    fetched with one query per type in the page, so memory use does not grow with the size of
+    the repository. When no units_q is given, skip and limit are applied by the database.
+
     :param repository: The repository to search.
     :type repository: pulp.server.db.model.Repository
     :param repo_content_unit_q: Any query filters to apply to the RepoContentUnits.
@@ -206,26 +222,41 @@ def find_repo_content_units(
 
     qs = model.RepositoryContentUnit.objects(q_obj=repo_content_unit_q,
                                              repo_id=repository.repo_id)
-
-    type_map = {}
-    content_units = {}
-
-    yield_count = 1
+    # walking the (repo_id, unit_type_id, unit_id) index keeps each page to as few types as
+    # possible and gives skip a stable order to count against
+    qs = qs.order_by('unit_type_id', 'unit_id')
+
+    if units_q is None:
+        # every association yields its unit, so the paging can be done by the database
+        if skip:
+            qs = qs.skip(skip)
+        if limit:
+            qs = qs.limit(limit)
+        skip = None
+
+    yield_count = 0
     skip_count = 0
 
-    for repo_content_unit in qs:
-        id_set = type_map.setdefault(repo_content_unit.unit_type_id, set())
-        id_set.add(repo_content_unit.unit_id)
-        content_unit_set = content_units.setdefault(repo_content_unit.unit_type_id, dict())
-        content_unit_set[repo_content_unit.unit_id] = repo_content_unit
-
-    for unit_type, unit_ids in type_map.iteritems():
-        _model = plugin_api.get_unit_model_by_id(unit_type)
-        qs = _model.objects(q_obj=units_q, __raw__={'_id': {'$in': list(unit_ids)}})
-        if unit_fields:
-            qs = qs.only(*unit_fields)
+    for page in paginate(qs, FIND_UNITS_PAGE_SIZE):
+        page_types = {}
+        for repo_content_unit in page:
+            unit_ids = page_types.setdefault(repo_content_unit.unit_type_id, [])
+            unit_ids.append(repo_content_unit.unit_id)
+
+        page_units = {}
+        for unit_type, unit_ids in page_types.iteritems():
+            _model = plugin_api.get_unit_model_by_id(unit_type)
+            units_qs = _model.objects(q_obj=units_q, __raw__={'_id': {'$in': unit_ids}})
+            if unit_fields:
+                units_qs = units_qs.only(*unit_fields)
+            for unit in units_qs:
+                page_units[(unit_type, unit.id)] = unit
+
+        for repo_content_unit in page:
+            unit = page_units.get((repo_content_unit.unit_type_id, repo_content_unit.unit_id))
+            if unit is None:
+                continue
 
-        for unit in qs:
             if skip and skip_count < skip:
                 skip_count += 1
                 continue
@@ -233,15 +264,12 @@ def find_repo_content_units(
             if yield_content_unit:
                 yield unit
             else:
-                cu = content_units[unit_type][unit.id]
-                cu.unit = unit
-                yield cu
-
-            if limit:
-                if yield_count >= limit:
-                    return
+                repo_content_unit.unit = unit
+                yield repo_content_unit
 
             yield_count += 1
+            if limit and yield_count >= limit:
+                return
 
 
 def find_units_not_downloaded(repo_id):
@@ -334,6 +362,96 @@ def associate_single_unit(repository, unit):
         upsert=True)
 
 
+def associate_units(repository, units, batch_size=ASSOCIATE_BATCH_SIZE):
+    """
+    Associate many units to a repository.
+
+    The associations are upserted with unordered bulk writes of batch_size associations each,
+    so the units may be of different types and may come from a generator of any length.
+
+    :param repository: The repository to update.
+    :type repository: pulp.server.db.model.Repository
+    :param units: The units to associate to the repository.
+    :type units: iterable of pulp.server.db.model.ContentUnit or pulp.plugins.model.Unit
+    :param batch_size: The number of associations to write in each bulk write.
+    :type batch_size: int
+    :return: number of associations that were created, and number of existing associations
+             that were updated
+    :rtype: tuple of (int, int)
+    """
+    unit_refs = ((unit.type_id, unit.id) for unit in units)
+    return _bulk_associate(repository.repo_id, unit_refs, batch_size)
+
+
+def associate_unit_ids(repo_id, unit_type_id, unit_ids, batch_size=ASSOCIATE_BATCH_SIZE):
+    """
+    Associate many units of one type to a repository, by id.
+
+    See associate_units for semantics.
+
+    :param repo_id: ID of the repository to update.
+    :type repo_id: basestring
+    :param unit_type_id: The type of all of the units.
+    :type unit_type_id: basestring
+    :param unit_ids: IDs of the units to associate to the repository.
+    :type unit_ids: iterable of basestring
+    :param batch_size: The number of associations to write in each bulk write.
+    :type batch_size: int
+    :return: number of associations that were created, and number of existing associations
+             that were updated
+    :rtype: tuple of (int, int)
+    """
+    unit_refs = ((unit_type_id, unit_id) for unit_id in unit_ids)
+    return _bulk_associate(repo_id, unit_refs, batch_size)
+
+
+def _bulk_associate(repo_id, unit_refs, batch_size):
+    """
+    Upsert the associations between a repository and units with unordered bulk writes.
+
+    :param repo_id: ID of the repository to update.
+    :type repo_id: basestring
+    :param unit_refs: (unit type ID, unit ID) of each unit to associate to the repository.
+    :type unit_refs: iterable of tuple
+    :param batch_size: The number of associations to write in each bulk write.
+    :type batch_size: int
+    :return: number of associations that were created, and number of existing associations
+             that were updated
+    :rtype: tuple of (int, int)
+    """
+    collection = model.RepositoryContentUnit._get_collection()
+    inserted = 0
+    updated = 0
+
+    for page in paginate(unit_refs, batch_size):
+        current_timestamp = dateutils.now_utc_timestamp()
+        formatted_datetime = dateutils.format_iso8601_utc_timestamp(current_timestamp)
+        requests = [
+            UpdateOne({'repo_id': repo_id, 'unit_id': unit_id, 'unit_type_id': unit_type_id},
+                      {'$setOnInsert': {'created': formatted_datetime},
+                       '$set': {'updated': formatted_datetime}},
+                      upsert=True)
+            for unit_type_id, unit_id in page]
+
+        try:
+            result = collection.bulk_write(requests, ordered=False)
+        except BulkWriteError as e:
+            # An association upserted concurrently by another task makes the same upsert here
+            # fail on the unique index. The association exists either way, so it counts as an
+            # update; any other failure is a real error.
+            errors = e.details['writeErrors']
+            if e.details['writeConcernErrors'] or \
+                    any(error['code'] != DUPLICATE_KEY_ERROR for error in errors):
+                raise
+            inserted += e.details['nUpserted']
+            updated += e.details['nMatched'] + len(errors)
+        else:
+            inserted += result.upserted_count
+            updated += result.matched_count
+
+    return inserted, updated
+
+
 def disassociate_units(repository, unit_iterable):
     """
     Disassociate all units in the iterable from the repository.
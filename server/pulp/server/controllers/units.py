@@ -5,41 +5,55 @@ from pulp.plugins.types import database as types_db
 from pulp.plugins.util import misc
 
 
-def find_units(units, pagination_size=50):
+def find_units(units, pagination_size=1000):
     """
     Query for units matching the unit key fields of an iterable of ContentUnit objects.
 
     This requires that all the ContentUnit objects are of the same content type.
 
+    Units are looked up by the digest of their unit key, with a single indexed query per page.
+    Units saved before the digest was stored are matched on their unit key fields instead; once
+    the database has been migrated there are none, and that query is skipped.
+
     :param units: Iterable of content units with the unit key fields specified.
     :type units: iterable of pulp.server.db.model.ContentUnit
     :param pagination_size: How large a page size to use when querying units.
-    :type pagination_size: int (default 50)
+    :type pagination_size: int (default 1000)
 
     :returns: unit models that pulp already knows about.
     :rtype: Generator of pulp.server.db.model.ContentUnit
     """
     # get the class from the first unit
     model_class = None
+    has_units_without_digest = False
 
     for units_group in misc.paginate(units, pagination_size):
-        q_object = mongoengine.Q()
-        # Build a query for the units in this group
-        for unit in units_group:
-            if model_class is None:
-                model_class = unit.__class__
+        if model_class is None:
+            model_class = units_group[0].__class__
+            has_units_without_digest = \
+                model_class.objects(_unit_key_digest=None).only('id').first() is not None
 
-            # Build the query for all the units, the | operator here
-            # creates the equivalent of a mongo $or of all the unit keys
-            unit_q_obj = mongoengine.Q(**unit.unit_key)
-            q_object = q_object | unit_q_obj
+        units_by_digest = dict((unit.unit_key_lookup_digest(), unit) for unit in units_group)
 
         # Get this group of units
-        query = model_class.objects(q_object)
+        query = model_class.objects(_unit_key_digest__in=list(units_by_digest))
 
         for found_unit in query:
+            units_by_digest.pop(found_unit._unit_key_digest, None)
             yield found_unit
 
+        if has_units_without_digest and units_by_digest:
+            # Build the query for the remaining units, the | operator here
+            # creates the equivalent of a mongo $or of all the unit keys
+            q_object = mongoengine.Q()
+            for unit in units_by_digest.itervalues():
+                q_object = q_object | mongoengine.Q(**unit.unit_key)
+
+            query = model_class.objects(mongoengine.Q(_unit_key_digest=None) & q_object)
+
+            for found_unit in query:
+                yield found_unit
+
 
 def get_unit_key_fields_for_type(type_id):
     """
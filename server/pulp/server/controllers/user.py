@@ -3,9 +3,11 @@ from gettext import gettext as _
 from mongoengine import NotUniqueError, ValidationError
 
 from pulp.server import exceptions as pulp_exceptions
+from pulp.server.auth.cache import principal_cache
+from pulp.server.auth.permission_index import permission_index
 from pulp.server.constants import SUPER_USER_ROLE
 from pulp.server.db import model
-from pulp.server.db.model.auth import Permission, Role
+from pulp.server.db.model.auth import Role
 from pulp.server.managers import factory as manager_factory
 
 
@@ -37,6 +39,7 @@ def create_user(login, password=None, name=None, roles=None):
     # Grant default user permissions
     permission_manager = manager_factory.permission_manager()
     permission_manager.grant_automatic_permissions_for_user(user.login)
+    permission_index.changed(logins=[login])
     return user
 
 
@@ -85,6 +88,8 @@ def update_user(login, delta):
     except ValidationError, e:
         raise pulp_exceptions.InvalidValue(e.to_dict().keys())
 
+    principal_cache.invalidate(login)
+    permission_index.changed(logins=[login])
     return user
 
 
@@ -107,6 +112,8 @@ def delete_user(login):
     permission_manager = manager_factory.permission_manager()
     permission_manager.revoke_all_permissions_from_user(login)
     user.delete()
+    principal_cache.invalidate(login)
+    permission_index.changed(logins=[login])
 
 
 def is_last_super_user(login):
@@ -137,7 +144,8 @@ def is_last_super_user(login):
 
 def is_authorized(resource, login, operation):
     """
-    Check to see if a user is authorized to perform an operation on a resource.
+    Check to see if a user is authorized to perform an operation on a resource. The decision is
+    made from the permission index kept by this process.
 
     :param resource: pulp resource url
     :type  resource: str
@@ -148,26 +156,19 @@ def is_authorized(resource, login, operation):
 
     :return: True if the user is authorized for the operation on the resource, False otherwise
     :rtype: bool
+
+    :raise MissingResource: if the user does not exist
     """
-    user = model.User.objects.get_or_404(login=login)
-    if user.is_superuser():
-        return True
-
-    permission_query_manager = manager_factory.permission_query_manager()
-
-    # User is authorized if they have access to the resource or any of the its base resources.
-    parts = [p for p in resource.split('/') if p]
-    while parts:
-        current_resource = '/%s/' % '/'.join(parts)
-        permission = permission_query_manager.find_by_resource(current_resource)
-        if permission is not None:
-            if operation in permission_query_manager.find_user_permission(permission, login):
-                return True
-        parts = parts[:-1]
-
-    permission = Permission.get_collection().find_one({'resource': '/'})
-    return (permission is not None and
-            operation in permission_query_manager.find_user_permission(permission, login))
+    authorized = permission_index.is_authorized(resource, login, operation)
+    if not authorized:
+        if authorized is None:
+            # the user may have been created by another process since the index was refreshed
+            model.User.objects.get_or_404(login=login)
+        # the permission may have been granted by another process since the index was refreshed,
+        # so a denial is only given from an index that is known to be current
+        permission_index.refresh(force=True)
+        authorized = permission_index.is_authorized(resource, login, operation)
+    return bool(authorized)
 
 
 def find_users_belonging_to_role(role_id):
@@ -181,6 +181,10 @@ def ensure_database_indexes():
                                      "unit key. This is not allowed because the platform handles"
                                      "it for you." % unit_type)
         model_class._meta['indexes'].append(unit_key_index)
+        # used by units_controller.find_units to look up units by unit key in bulk
+        model_class._meta['indexes'].append({'fields': ['_unit_key_digest']})
+        # used by applicability regeneration to find the units updated since it was calculated
+        model_class._meta['indexes'].append({'fields': ['_last_updated']})
         model_class._meta['index_specs'] = \
             model_class._build_index_specs(model_class._meta['indexes'])
         model_class.ensure_indexes()
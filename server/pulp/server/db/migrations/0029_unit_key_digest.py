@@ -0,0 +1,55 @@
+"""
+This migration stores the digest of the unit key on every unit of the mongoengine based content
+types, so that units can be looked up by unit key with an indexed query on the digest.
+"""
+import logging
+
+from pymongo import UpdateOne
+
+from pulp.plugins.loader.manager import PluginManager
+from pulp.plugins.util import misc
+from pulp.server.db.migrations.lib import utils
+
+
+_logger = logging.getLogger(__name__)
+
+# Number of units updated by each bulk write
+BATCH_SIZE = 1000
+
+
+def migrate(*args, **kwargs):
+    """
+    Perform the migration as described in this module's docblock.
+
+    :param args:   unused
+    :type  args:   list
+    :param kwargs: unused
+    :type  kwargs: dict
+    """
+    plugin_manager = PluginManager()
+    for unit_type, model_class in plugin_manager.unit_models.items():
+        _migrate_units(unit_type, model_class)
+
+
+def _migrate_units(unit_type, model_class):
+    """
+    Store the unit key digest on each unit of the given type that does not have one.
+
+    :param unit_type: id of the content type
+    :type  unit_type: basestring
+    :param model_class: model class of the content type
+    :type  model_class: pulp.server.db.model.ContentUnit
+    """
+    collection = model_class._get_collection()
+    units = model_class.objects(_unit_key_digest=None).only(*model_class.unit_key_fields)
+    total_units = units.count()
+
+    with utils.MigrationProgressLog(unit_type, total_units) as migration_log:
+        for page in misc.paginate(units, BATCH_SIZE):
+            requests = [
+                UpdateOne({'_id': unit.id},
+                          {'$set': {'_unit_key_digest': unit.unit_key_lookup_digest()}})
+                for unit in page]
+            collection.bulk_write(requests, ordered=False)
+            for unit in page:
+                migration_log.progress()
@@ -1,4 +1,5 @@
 import copy
+import json
 import logging
 import os
 import random
@@ -23,7 +24,7 @@ from pulp.server.constants import LOCAL_STORAGE, SUPER_USER_ROLE
 from pulp.server.content.storage import FileStorage, SharedStorage
 from pulp.server.async.emit import send as send_taskstatus_message
 from pulp.server.db.connection import UnsafeRetry
-from pulp.server.compat import digestmod
+from pulp.server.compat import compare_digest, digestmod, pbkdf2_hmac
 from pulp.server.db.fields import ISO8601StringField, UTCDateTimeField
 from pulp.server.db.model.reaper_base import ReaperMixin
 from pulp.server.db.model import base
@@ -41,6 +42,9 @@ SYSTEM_ID = '00000000-0000-0000-0000-000000000000'
 SYSTEM_LOGIN = u'SYSTEM'
 PASSWORD_ITERATIONS = 5000
 
+# Prefix of passwords hashed with PBKDF2. Passwords without it use the original salted HMAC scheme.
+PASSWORD_ALGORITHM = 'pbkdf2_sha256'
+
 
 class AutoRetryDocument(Document):
     """
@@ -222,6 +226,10 @@ class RepositoryContentUnit(AutoRetryDocument):
                 {
                     # Used for reverse lookup of units to repositories
                     'fields': ['unit_id']
+                },
+                {
+                    # Used by the orphan scan to walk the associations of a type in unit_id order
+                    'fields': ['unit_type_id', 'unit_id']
                 }
             ],
             'queryset_class': RepositoryContentUnitQuerySet
@@ -613,12 +621,16 @@ class ContentUnit(AutoRetryDocument):
     :type _last_updated: mongoengine.IntField
     :ivar _storage_path: The absolute path to associated content files.
     :type _storage_path: mongoengine.StringField
+    :ivar _unit_key_digest: digest of the unit key, as computed by unit_key_lookup_digest. It
+                            is indexed so that units can be looked up by unit key in bulk.
+    :type _unit_key_digest: mongoengine.StringField
     """
 
     id = StringField(primary_key=True, default=lambda: str(uuid.uuid4()))
     pulp_user_metadata = DictField()
     _last_updated = IntField(required=True)
     _storage_path = StringField()
+    _unit_key_digest = StringField()
 
     meta = {
         'abstract': True,
@@ -704,7 +716,7 @@ class ContentUnit(AutoRetryDocument):
         """
         The signal that is triggered before a unit is saved, this is used to
         support the legacy behavior of generating the unit id and setting
-        the _last_updated timestamp
+        the _last_updated timestamp, and to store the digest of the unit key
 
         :param sender: sender class
         :type sender: object
@@ -712,6 +724,7 @@ class ContentUnit(AutoRetryDocument):
         :type document: ContentUnit
         """
         document._last_updated = dateutils.now_utc_timestamp()
+        document._unit_key_digest = document.unit_key_lookup_digest()
 
     def get_repositories(self):
         """
@@ -794,12 +807,27 @@ class ContentUnit(AutoRetryDocument):
         _hash = algorithm or sha256()
         for key, value in sorted(self.unit_key.items()):
             _hash.update(key)
-            if not isinstance(value, basestring):
+            if isinstance(value, unicode):
+                _hash.update(value.encode('utf-8'))
+            elif not isinstance(value, basestring):
                 _hash.update(str(value))
             else:
                 _hash.update(value)
         return _hash.hexdigest()
 
+    def unit_key_lookup_digest(self):
+        """
+        The digest of the unit key that units are looked up by.
+
+        Unlike unit_key_as_digest, which is not changed because content is stored at paths
+        derived from it, the unit key is JSON encoded before it is hashed so that different unit
+        keys never produce the same digest.
+
+        :return: The hex digest of the unit key.
+        :rtype: str
+        """
+        return sha256(json.dumps(self.unit_key, sort_keys=True, default=repr)).hexdigest()
+
     def list_files(self):
         """
         List absolute paths to files associated with this unit.
@@ -1203,28 +1231,48 @@ class User(AutoRetryDocument):
         :return: True if password is correct, False otherwise
         :rtype:  bool
         """
-        salt, hashed_password = self.password.split(",")
-        salt = salt.decode("base64")
-        hashed_password = hashed_password.decode("base64")
-        pbkdbf = self._pbkdf_sha256(plain_password, salt, PASSWORD_ITERATIONS)
-        return hashed_password == pbkdbf
+        if self.password.startswith(PASSWORD_ALGORITHM + '$'):
+            algorithm, iterations, salt, hashed_password = self.password.split('$')
+            pbkdf = pbkdf2_hmac('sha256', _encode_password(plain_password),
+                                salt.decode('base64'), int(iterations))
+        else:
+            salt, hashed_password = self.password.split(",")
+            pbkdf = self._pbkdf_sha256(plain_password, salt.decode("base64"),
+                                       PASSWORD_ITERATIONS)
+        return compare_digest(hashed_password.decode("base64"), pbkdf)
+
+    def password_needs_rehash(self):
+        """
+        Checks whether the stored password was hashed with an older scheme or iteration count.
+        Such a password should be hashed again the next time the plaintext password is known.
+
+        :return: True if the password should be hashed again, False otherwise
+        :rtype:  bool
+        """
+        return not self.password.startswith(
+            '%s$%d$' % (PASSWORD_ALGORITHM, PASSWORD_ITERATIONS))
 
     def _hash_password(self, plain_password):
         """
         Creates a hashed password from a plaintext password.
 
-        _hash_password, check_password, _random_bytes, and _pbkdf_sha256 were taken from this
-        stackoverflow.com : http://tinyurl.com/2f6gx7s
+        The original _hash_password, check_password, _random_bytes, and _pbkdf_sha256 were taken
+        from this stackoverflow.com : http://tinyurl.com/2f6gx7s
+
+        The password is hashed with PBKDF2-HMAC-SHA256 and stored with the algorithm, iteration
+        count and salt, separated by "$".
 
         :param plain_password: plaintext password to be hashed
         :type  plain_password: str
 
-        :return: salt concatenated with the hashed password
+        :return: algorithm, iterations, salt and the hashed password
         :rtype:  str
         """
         salt = self._random_bytes(8)  # 64 bits
-        hashed_password = self._pbkdf_sha256(str(plain_password), salt, PASSWORD_ITERATIONS)
-        return salt.encode("base64").strip() + "," + hashed_password.encode("base64").strip()
+        hashed_password = pbkdf2_hmac('sha256', _encode_password(plain_password), salt,
+                                      PASSWORD_ITERATIONS)
+        return '$'.join([PASSWORD_ALGORITHM, str(PASSWORD_ITERATIONS),
+                         salt.encode("base64").strip(), hashed_password.encode("base64").strip()])
 
     def _random_bytes(self, num_bytes):
         """
@@ -1240,7 +1288,8 @@ class User(AutoRetryDocument):
 
     def _pbkdf_sha256(self, password, salt, iterations):
         """
-        Apply the salt to the password some number of times to increase randomness.
+        Apply the salt to the password some number of times to increase randomness. This is the
+        original hashing scheme, which is only used to check passwords stored before PBKDF2.
 
         :param password: plaintext password
         :type  password: str
@@ -1258,6 +1307,21 @@ class User(AutoRetryDocument):
         return result
 
 
+def _encode_password(plain_password):
+    """
+    Convert a plaintext password to the bytes that are hashed.
+
+    :param plain_password: plaintext password
+    :type  plain_password: basestring
+
+    :return: the password, utf-8 encoded if it is unicode
+    :rtype:  str
+    """
+    if isinstance(plain_password, unicode):
+        return plain_password.encode('utf-8')
+    return str(plain_password)
+
+
 class Distributor(AutoRetryDocument):
     """
     Defines schema for a Distributor in the 'repo_distributors' collection.
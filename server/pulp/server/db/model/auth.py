@@ -53,3 +53,23 @@ class Permission(Model):
 
         self.resource = resource
         self.users = users or []
+
+
+class PermissionVersion(Model):
+    """
+    Counts the changes made to permissions and to the roles of users. Each process compares the
+    version with the one its permission index was built from, and reloads the resources and
+    users named in the recent changes when it is out of date.
+
+    The collection holds a single document, whose _id is "permissions".
+
+    @ivar version: the number of changes made
+    @type version: int
+
+    @ivar changes: the most recent changes, each a dict with the version, the permission
+                   resources that changed and the logins of the users whose roles changed
+    @type changes: list
+    """
+
+    collection_name = 'permission_versions'
+    unique_indices = ()
@@ -185,7 +185,8 @@ class RepoProfileApplicability(Model):
         ('repo_id',),
     )
 
-    def __init__(self, profile_hash, repo_id, profile, applicability, _id=None, **kwargs):
+    def __init__(self, profile_hash, repo_id, profile, applicability, _id=None, last_updated=None,
+                 **kwargs):
         """
         Construct a RepoProfileApplicability object.
 
@@ -200,6 +201,9 @@ class RepoProfileApplicability(Model):
         :type  applicability: dict
         :param _id:           The MongoDB ID for this object, if it exists in the database
         :type  _id:           bson.objectid.ObjectId
+        :param last_updated:  iso8601 time from which the repository's content is reflected in the
+                              applicability data, or None if it is not known
+        :type  last_updated:  basestring
         :param kwargs:        unused, but collected to allow instantiation from Mongo query results
         :type  kwargs:        dict
         """
@@ -209,6 +213,7 @@ class RepoProfileApplicability(Model):
         self.repo_id = repo_id
         self.profile = profile
         self.applicability = applicability
+        self.last_updated = last_updated
         self._id = _id
 
         # The superclass puts an unnecessary (and confusingly named) id attribute on this model.
@@ -229,7 +234,8 @@ class RepoProfileApplicability(Model):
         # If this object's _id attribute is not None, then it represents an existing DB object.
         # Else, we need to create an object with this object's attributes
         new_document = {'profile_hash': self.profile_hash, 'repo_id': self.repo_id,
-                        'profile': self.profile, 'applicability': self.applicability}
+                        'profile': self.profile, 'applicability': self.applicability,
+                        'last_updated': self.last_updated}
         if self._id is not None:
             self.get_collection().update({'_id': self._id}, new_document)
         else:
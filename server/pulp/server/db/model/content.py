@@ -92,6 +92,8 @@ class ContentCatalog(Model):
     :type locator: str
     :ivar url: The URL used to download the file associated with the unit.
     :type url: str
+    :ivar generation: Identifies the refresh that added the entry.
+    :type generation: str
     """
 
     collection_name = 'content_catalog'
@@ -128,7 +130,7 @@ class ContentCatalog(Model):
         dt = now + timedelta(seconds=duration)
         return dateutils.datetime_to_utc_timestamp(dt)
 
-    def __init__(self, source_id, expiration, type_id, unit_key, url):
+    def __init__(self, source_id, expiration, type_id, unit_key, url, generation=None):
         """
         :param source_id: The ID of the contributing content source.
         :type source_id: str
@@ -140,6 +142,8 @@ class ContentCatalog(Model):
         :type unit_key: dict
         :param url: The URL used to download the file associated with the unit.
         :type url: str
+        :param generation: Identifies the refresh that added the entry.
+        :type generation: str
         """
         Model.__init__(self)
         self.source_id = source_id
@@ -148,3 +152,4 @@ class ContentCatalog(Model):
         self.unit_key = unit_key
         self.locator = self.get_locator(type_id, unit_key)
         self.url = url
+        self.generation = generation
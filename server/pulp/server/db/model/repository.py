@@ -48,6 +48,8 @@ class RepoContentUnit(Model):
     search_indices = (('repo_id', 'unit_type_id'),
                       # default sort order on get_units query, do not remove
                       ('unit_type_id', 'created'),
+                      # walked by the orphan scan
+                      ('unit_type_id', 'unit_id'),
                       'unit_id')
 
     OWNER_TYPE_IMPORTER = 'importer'
@@ -0,0 +1,245 @@
+"""
+Delivers events to notifiers asynchronously. Each process has a Dispatcher that runs the
+notifiers on a small pool of worker threads, so a slow or unreachable notifier (for example an
+HTTP endpoint that times out) does not hold up the repository operation that fired the event.
+
+Deliveries are grouped by event listener. Events for one listener are delivered in the order
+they were fired, using at most LISTENER_CONCURRENCY workers at a time, so a single slow listener
+cannot occupy the whole pool. Failed deliveries are retried with an exponential backoff.
+
+Celery worker processes exit without running atexit handlers, so the worker drains the
+deliveries fired by each task when the task has run (see drain()).
+"""
+
+import atexit
+import logging
+import os
+import time
+from collections import deque
+from threading import Condition, Lock, Thread
+from Queue import Queue
+
+from pulp.server.event import notifiers
+
+
+# The number of worker threads delivering events.
+WORKERS = 4
+
+# The maximum number of deliveries waiting for a worker.  Events are dropped when exceeded.
+QUEUE_SIZE = 1000
+
+# The maximum number of concurrent deliveries to a single event listener.
+LISTENER_CONCURRENCY = 1
+
+# The number of times a failed delivery is retried.
+RETRIES = 3
+
+# The delay in seconds before the first retry; doubled for each retry after that.
+RETRY_BACKOFF = 2
+
+# Seconds to wait for pending deliveries when the process exits.
+EXIT_TIMEOUT = 10
+
+# Seconds to wait for pending deliveries when a celery task has run. Long enough for a delivery
+# to be retried with the default backoff.
+DRAIN_TIMEOUT = 60
+
+_logger = logging.getLogger(__name__)
+
+_dispatcher = None
+_dispatcher_lock = Lock()
+
+
+class Dispatcher(object):
+    """
+    Delivers events to event listener notifiers using a pool of worker threads.
+
+    :ivar workers:     The number of worker threads
+    :type workers:     int
+    :ivar size:        The maximum number of pending deliveries
+    :type size:        int
+    :ivar concurrency: The maximum number of concurrent deliveries to a single listener
+    :type concurrency: int
+    :ivar retries:     The number of times a failed delivery is retried
+    :type retries:     int
+    :ivar backoff:     The delay in seconds before the first retry
+    :type backoff:     int
+    :ivar dropped:     The number of deliveries dropped because too many were pending
+    :type dropped:     int
+    """
+
+    def __init__(self, workers=WORKERS, size=QUEUE_SIZE, concurrency=LISTENER_CONCURRENCY,
+                 retries=RETRIES, backoff=RETRY_BACKOFF):
+        """
+        :param workers:     The number of worker threads
+        :type  workers:     int
+        :param size:        The maximum number of pending deliveries
+        :type  size:        int
+        :param concurrency: The maximum number of concurrent deliveries to a single listener
+        :type  concurrency: int
+        :param retries:     The number of times a failed delivery is retried
+        :type  retries:     int
+        :param backoff:     The delay in seconds before the first retry
+        :type  backoff:     int
+        """
+        self.workers = workers
+        self.size = size
+        self.concurrency = concurrency
+        self.retries = retries
+        self.backoff = backoff
+        self.pid = os.getpid()
+        self.dropped = 0
+        self._condition = Condition()
+        # pending deliveries, keyed by listener ID
+        self._pending = {}
+        self._pending_count = 0
+        # number of workers delivering to each listener, keyed by listener ID
+        self._active = {}
+        # listener IDs with pending deliveries and a free slot
+        self._ready = Queue()
+        self._threads = []
+
+    def dispatch(self, listener, event):
+        """
+        Queue the delivery of an event to a listener's notifier.
+
+        :param listener: The event listener
+        :type  listener: dict
+        :param event:    The event to deliver
+        :type  event:    pulp.server.event.data.Event
+        :return:         True if queued, False if dropped
+        :rtype:          bool
+        """
+        key = str(listener['_id'])
+        with self._condition:
+            if self._pending_count >= self.size:
+                self.dropped += 1
+                _logger.error('Too many pending event notifications; [%s] to listener [%s] '
+                              'dropped' % (event.event_type, key))
+                return False
+            pending = self._pending.setdefault(key, deque())
+            pending.append((listener['notifier_type_id'], listener['notifier_config'], event))
+            self._pending_count += 1
+            active = self._active.get(key, 0)
+            if active < self.concurrency:
+                self._active[key] = active + 1
+                self._ready.put(key)
+            self._start()
+        return True
+
+    def join(self, timeout=None):
+        """
+        Wait for all pending deliveries to complete.
+
+        :param timeout: The maximum number of seconds to wait, or None to wait indefinitely
+        :type  timeout: int
+        :return:        True if all deliveries completed
+        :rtype:         bool
+        """
+        deadline = None
+        if timeout is not None:
+            deadline = time.time() + timeout
+        with self._condition:
+            while self._active:
+                if deadline is None:
+                    self._condition.wait()
+                    continue
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return False
+                self._condition.wait(remaining)
+        return True
+
+    def _start(self):
+        """
+        Start the worker threads that are not running. Must be called holding the condition.
+        """
+        self._threads = [t for t in self._threads if t.is_alive()]
+        while len(self._threads) < self.workers:
+            thread = Thread(target=self._run, name='event-dispatcher')
+            thread.setDaemon(True)
+            thread.start()
+            self._threads.append(thread)
+
+    def _run(self):
+        """
+        The worker thread main. Takes a listener with pending deliveries and delivers to it
+        until it has none left.
+        """
+        while True:
+            key = self._ready.get()
+            while True:
+                with self._condition:
+                    pending = self._pending.get(key)
+                    if not pending:
+                        self._pending.pop(key, None)
+                        self._active[key] -= 1
+                        if not self._active[key]:
+                            del self._active[key]
+                        self._condition.notify_all()
+                        break
+                    notifier_type_id, notifier_config, event = pending.popleft()
+                    self._pending_count -= 1
+                self._deliver(notifier_type_id, notifier_config, event)
+
+    def _deliver(self, notifier_type_id, notifier_config, event):
+        """
+        Invoke a notifier, retrying with an exponential backoff when it fails. This will log but
+        otherwise suppress any exception that comes out of the notifier.
+
+        :param notifier_type_id: The notifier type
+        :type  notifier_type_id: str
+        :param notifier_config:  The listener's notifier configuration
+        :type  notifier_config:  dict
+        :param event:            The event to deliver
+        :type  event:            pulp.server.event.data.Event
+        """
+        delay = self.backoff
+        for attempt in range(self.retries + 1):
+            try:
+                f = notifiers.get_notifier_function(notifier_type_id)
+                f(notifier_config, event)
+                return
+            except Exception:
+                if attempt == self.retries:
+                    _logger.exception('Exception from notifier of type [%s]' % notifier_type_id)
+                    return
+                _logger.warning('Exception from notifier of type [%s]; retrying in %d seconds' %
+                                (notifier_type_id, delay), exc_info=True)
+                time.sleep(delay)
+                delay *= 2
+
+
+def get_dispatcher():
+    """
+    Get the dispatcher for this process. A process forked from one that already had a
+    dispatcher gets its own, since the worker threads do not survive the fork.
+
+    :return: The dispatcher
+    :rtype:  Dispatcher
+    """
+    global _dispatcher
+    with _dispatcher_lock:
+        if _dispatcher is None or _dispatcher.pid != os.getpid():
+            _dispatcher = Dispatcher()
+            atexit.register(_dispatcher.join, EXIT_TIMEOUT)
+        return _dispatcher
+
+
+def drain(timeout=DRAIN_TIMEOUT):
+    """
+    Wait for the pending deliveries of this process, if it has a dispatcher.
+
+    :param timeout: The maximum number of seconds to wait, or None to wait indefinitely
+    :type  timeout: int
+    :return:        True if all deliveries completed
+    :rtype:         bool
+    """
+    with _dispatcher_lock:
+        dispatcher = _dispatcher
+    if dispatcher is None or dispatcher.pid != os.getpid():
+        return True
+    if dispatcher.join(timeout):
+        return True
+    _logger.warning('Event notifications still pending after %d seconds' % timeout)
+    return False
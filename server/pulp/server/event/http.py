@@ -10,10 +10,11 @@ Eventually this should be enhanced to support authentication credentials as well
 """
 from gettext import gettext as _
 import logging
+import threading
 
 from pulp.server.compat import json, json_util
 
-from requests import post
+from requests import Session
 from requests.auth import HTTPBasicAuth
 
 
@@ -21,15 +22,31 @@ TYPE_ID = 'http'
 
 _logger = logging.getLogger(__name__)
 
+# Each event dispatcher thread keeps its own session so connections to the
+# notifier urls are kept alive between events.
+_local = threading.local()
+
 
 def handle_event(notifier_config, event):
-    # fire the actual http push function off in a separate thread to keep
-    # pulp from blocking or deadlocking due to the tasking subsystem
     json_body = json.dumps(event.data(), default=json_util.default)
     _logger.info(json_body)
     _send_post(notifier_config, json_body)
 
 
+def _get_session():
+    """
+    Get the calling thread's HTTP session.
+
+    :return: The session
+    :rtype:  requests.Session
+    """
+    session = getattr(_local, 'session', None)
+    if session is None:
+        session = Session()
+        _local.session = session
+    return session
+
+
 def _send_post(notifier_config, json_body):
     """
     Sends a POST request with the given data to the configured notifier url.
@@ -40,6 +57,10 @@ def _send_post(notifier_config, json_body):
     :type notifier_config:  dict
     :param json_body:       The POST data that has been serialized to JSON.
     :param json_body:       dict
+
+    :raises requests.RequestException: if the request could not be made or the
+                                       server responded with a 5xx error, so the
+                                       event dispatcher will retry it.
     """
     if 'url' not in notifier_config or not notifier_config['url']:
         _logger.error(_('HTTP notifier configured without a URL; cannot fire event'))
@@ -52,13 +73,11 @@ def _send_post(notifier_config, json_body):
     else:
         auth = None
 
-    try:
-        response = post(url, data=json_body, auth=auth,
-                        headers={'Content-Type': 'application/json'}, timeout=15)
-    except Exception:
-        _logger.exception("HTTP Notification Failed")
-        return
+    response = _get_session().post(url, data=json_body, auth=auth,
+                                   headers={'Content-Type': 'application/json'}, timeout=15)
 
+    if response.status_code >= 500:
+        response.raise_for_status()
     if response.status_code != 200:
         _logger.error(_('Received HTTP {code} from HTTP notifier to {url}.').format(
             code=response.status_code, url=url))
@@ -46,6 +46,10 @@ class AuthenticationManager(object):
             if not user.check_password(password):
                 _logger.debug('Password for user [%s] was incorrect' % username)
                 return None
+            if user.password_needs_rehash():
+                # upgrade the stored hash while the plaintext password is known
+                user.set_password(password)
+                user.save()
 
         return user
 
@@ -9,6 +9,8 @@ from celery import task
 
 from pulp.server.async.tasks import Task
 from pulp.server.auth import authorization
+from pulp.server.auth.cache import principal_cache
+from pulp.server.auth.permission_index import permission_index
 from pulp.server.db import model
 from pulp.server.db.model.auth import Permission
 from pulp.server.exceptions import (
@@ -76,6 +78,8 @@ class PermissionManager(object):
             raise PulpDataException(_("Update Keyword [%s] is not supported" % key))
 
         Permission.get_collection().save(found)
+        principal_cache.invalidate_authorizations()
+        permission_index.changed(resources=[resource_uri])
 
     @staticmethod
     def delete_permission(resource_uri):
@@ -98,6 +102,8 @@ class PermissionManager(object):
             raise MissingResource(resource_uri)
 
         Permission.get_collection().remove({'resource': resource_uri})
+        principal_cache.invalidate_authorizations()
+        permission_index.changed(resources=[resource_uri])
 
     @staticmethod
     def grant(resource, login, operations):
@@ -139,6 +145,8 @@ class PermissionManager(object):
             current_ops.append(o)
 
         Permission.get_collection().save(permission)
+        principal_cache.invalidate_authorizations(login)
+        permission_index.changed(resources=[resource])
 
     @staticmethod
     def revoke(resource, login, operations):
@@ -186,6 +194,8 @@ class PermissionManager(object):
             return
 
         Permission.get_collection().save(permission)
+        principal_cache.invalidate_authorizations(login)
+        permission_index.changed(resources=[resource])
 
     def grant_automatic_permissions_for_resource(self, resource):
         """
@@ -245,15 +255,20 @@ class PermissionManager(object):
         :type login: str
         """
         permission_query_manager = factory.permission_query_manager()
+        resources = []
         for permission in permission_query_manager.find_all():
             if permission_query_manager.get_user_permission(permission, login) is None:
                 continue
+            resources.append(permission['resource'])
             permission_query_manager.delete_user_permission(permission, login)
             if len(permission['users']) > 0:
                 Permission.get_collection().save(permission)
             else:
                 # Delete entire permission if there are no more users
                 Permission.get_collection().remove({'resource': permission['resource']})
+        principal_cache.invalidate_authorizations(login)
+        if resources:
+            permission_index.changed(resources=resources)
 
     def operation_name_to_value(self, name):
         """
@@ -9,6 +9,8 @@ from celery import task
 
 from pulp.server.constants import SUPER_USER_ROLE
 from pulp.server.async.tasks import Task
+from pulp.server.auth.cache import principal_cache
+from pulp.server.auth.permission_index import permission_index
 from pulp.server.auth.authorization import CREATE, READ, UPDATE, DELETE, EXECUTE, \
     _operations_not_granted_by_roles
 from pulp.server.controllers import user as user_controller
@@ -141,6 +143,8 @@ class RoleManager(object):
             user.save()
 
         Role.get_collection().remove({'id': role_id})
+        principal_cache.invalidate()
+        permission_index.changed(logins=[user.login for user in users_with_role])
 
     @staticmethod
     def add_permissions_to_role(role_id, resource, operations):
@@ -262,6 +266,8 @@ class RoleManager(object):
 
         user.roles.append(role_id)
         user.save()
+        principal_cache.invalidate(login)
+        permission_index.changed(logins=[login])
         for item in role['permissions']:
             factory.permission_manager().grant(item['resource'], login,
                                                item.get('permission', []))
@@ -295,6 +301,8 @@ class RoleManager(object):
 
         user.roles.remove(role_id)
         user.save()
+        principal_cache.invalidate(login)
+        permission_index.changed(logins=[login])
 
         for item in role['permissions']:
             other_roles = factory.role_query_manager().get_other_roles(role, user.roles)
@@ -7,12 +7,15 @@ from logging import getLogger
 from uuid import uuid4
 
 from celery import task
-from pymongo.errors import DuplicateKeyError
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
 
+from pulp.common import dateutils
 from pulp.plugins.conduits.profiler import ProfilerConduit
 from pulp.plugins.config import PluginCallConfiguration
 from pulp.plugins.loader import api as plugin_api, exceptions as plugin_exceptions
 from pulp.plugins.profiler import Profiler
+from pulp.plugins.types import database as types_db
 from pulp.server.async.tasks import Task
 from pulp.server.db import model
 from pulp.server.db.model.consumer import Bind, RepoProfileApplicability, UnitProfile
@@ -24,6 +27,16 @@ from pulp.plugins.util.misc import paginate
 
 _logger = getLogger(__name__)
 
+# Number of profiles whose applicability is regenerated together against a repository
+APPLICABILITY_BATCH_SIZE = 100
+
+# Largest number of units added to a repository since its applicability was calculated for which
+# the existing applicability is patched, rather than calculated again from scratch
+INCREMENTAL_APPLICABILITY_MAX_UNITS = 1000
+
+# MongoDB error code reported when a write violates a unique index
+DUPLICATE_KEY_ERROR = 11000
+
 
 class ApplicabilityRegenerationManager(object):
     @staticmethod
@@ -108,12 +121,15 @@ class ApplicabilityRegenerationManager(object):
             manager.regenerate_applicability(profile_hash, content_type, profile_id, repo_id)
 
     @staticmethod
-    def regenerate_applicability_for_repos(repo_criteria):
+    def regenerate_applicability_for_repos(repo_criteria, full=False):
         """
         Regenerate and save applicability data affected by given updated repositories.
 
         :param repo_criteria: The repo selection criteria
         :type repo_criteria: dict
+        :param full: calculate the applicability from scratch, rather than patching the existing
+                     applicability with the units changed since it was calculated
+        :type full: bool
         """
         repo_criteria = Criteria.from_dict(repo_criteria)
 
@@ -122,37 +138,26 @@ class ApplicabilityRegenerationManager(object):
         repo_ids = [r.repo_id for r in model.Repository.objects.find_by_criteria(repo_criteria)]
 
         for repo_id in repo_ids:
-            # Find all existing applicabilities for given repo_id. Setting batch size of 5 ensures
-            # the MongoDB cursor does not time out. See https://pulp.plan.io/issues/998#note-6 for
+            # Read all the profile hashes up front, so the cursor can not time out while
+            # applicability is calculated. See https://pulp.plan.io/issues/998#note-6 for
             # more details.
-            existing_applicabilities = RepoProfileApplicability.get_collection().find(
-                {'repo_id': repo_id}).batch_size(5)
-            for existing_applicability in existing_applicabilities:
-                existing_applicability = RepoProfileApplicability(**dict(existing_applicability))
-                profile_hash = existing_applicability['profile_hash']
-                unit_profile = UnitProfile.get_collection().find_one({'profile_hash': profile_hash},
-                                                                     projection=['id',
-                                                                                 'content_type'])
-                if unit_profile is None:
-                    # Unit profiles change whenever packages are installed or removed on consumers,
-                    # and it is possible that existing_applicability references a UnitProfile
-                    # that no longer exists. This is harmless, as Pulp has a monthly cleanup task
-                    # that will identify these dangling references and remove them.
-                    continue
-
-                # Regenerate applicability data for given unit_profile and repo id
-                ApplicabilityRegenerationManager.regenerate_applicability(
-                    profile_hash, unit_profile['content_type'], unit_profile['id'], repo_id,
-                    existing_applicability)
+            profile_hashes = list(RepoProfileApplicability.get_collection().find(
+                {'repo_id': repo_id}, {'profile_hash': 1}))
+            for batch in paginate(profile_hashes, APPLICABILITY_BATCH_SIZE):
+                ApplicabilityRegenerationManager.batch_regenerate_applicability(
+                    repo_id, batch, full)
 
     @staticmethod
-    def queue_regenerate_applicability_for_repos(repo_criteria):
+    def queue_regenerate_applicability_for_repos(repo_criteria, full=False):
         """
         Queue a group of tasks to generate and save applicability data affected by given updated
         repositories.
 
         :param repo_criteria: The repo selection criteria
         :type repo_criteria: dict
+        :param full: calculate the applicability from scratch, rather than patching the existing
+                     applicability with the units changed since it was calculated
+        :type full: bool
         """
         repo_criteria = Criteria.from_dict(repo_criteria)
 
@@ -165,13 +170,13 @@ class ApplicabilityRegenerationManager(object):
         for repo_id in repo_ids:
             profile_hashes = RepoProfileApplicability.get_collection().find(
                 {'repo_id': repo_id}, {'profile_hash': 1})
-            for batch in paginate(profile_hashes, 10):
-                batch_regenerate_applicability_task.apply_async((repo_id, batch),
+            for batch in paginate(profile_hashes, APPLICABILITY_BATCH_SIZE):
+                batch_regenerate_applicability_task.apply_async((repo_id, batch, full),
                                                                 **{'group_id': task_group_id})
         return task_group_id
 
     @staticmethod
-    def batch_regenerate_applicability(repo_id, profile_hashes):
+    def batch_regenerate_applicability(repo_id, profile_hashes, full=False):
         """
         Regenerate and save applicability data for a batch of existing applicabilities
 
@@ -181,27 +186,291 @@ class ApplicabilityRegenerationManager(object):
                                Don't pass too much of these, all the profile data
                                associated with these hashes is loaded into the memory.
         :type profile_hashes: tuple of dicts in form of {'profile_hash': str}
+        :param full: calculate the applicability from scratch, rather than patching the existing
+                     applicability with the units changed since it was calculated
+        :type full: bool
         """
         profile_hash_list = [phash['profile_hash'] for phash in profile_hashes]
         existing_applicabilities = RepoProfileApplicability.get_collection().find(
             {"repo_id": repo_id, "profile_hash": {"$in": profile_hash_list}})
-        for existing_applicability in list(existing_applicabilities):
-                # Convert cursor to RepoProfileApplicability object
-            existing_applicability = RepoProfileApplicability(**dict(existing_applicability))
-            profile_hash = existing_applicability['profile_hash']
-            unit_profile = UnitProfile.get_collection().find_one({'profile_hash': profile_hash},
-                                                                 projection=['id', 'content_type'])
-            if unit_profile is None:
-                # Unit profiles change whenever packages are installed or removed on consumers,
-                # and it is possible that existing_applicability references a UnitProfile
-                # that no longer exists. This is harmless, as Pulp has a monthly cleanup task
-                # that will identify these dangling references and remove them.
+        existing_applicabilities = dict((applicability['profile_hash'], applicability)
+                                        for applicability in existing_applicabilities)
+        profiles = dict((profile_hash, applicability['profile'])
+                        for profile_hash, applicability in existing_applicabilities.items())
+        if full:
+            existing_applicabilities = None
+        ApplicabilityRegenerationManager.regenerate_applicability_for_profiles(
+            repo_id, profiles, existing_applicabilities)
+
+    @staticmethod
+    def regenerate_applicability_for_profiles(bound_repo_id, profiles,
+                                              existing_applicabilities=None):
+        """
+        Regenerate and save applicability data for many profiles against one bound repo.
+
+        The profiles are grouped by content type, and each group is calculated by the type's
+        profiler in a single pass, so the repository's units are loaded once per group rather
+        than once per profile. The results are saved with one bulk upsert.
+
+        When the existing applicability of every profile is given, and only a few units were added
+        to the repo since it was calculated, the existing applicability is patched with the units
+        added and removed since then instead. It is calculated from scratch if a unit that was
+        already in the repo has been updated since then.
+
+        :param bound_repo_id: repo id to be used to calculate applicability
+                              against the given unit profiles
+        :type bound_repo_id: str
+        :param profiles: unit profiles keyed by profile hash
+        :type profiles: dict
+        :param existing_applicabilities: existing RepoProfileApplicability documents keyed by
+                                         profile hash
+        :type existing_applicabilities: dict
+        """
+        if not profiles:
+            return
+
+        # Units associated with the repo from this point on are picked up by the next regeneration
+        last_updated = dateutils.format_iso8601_utc_timestamp(dateutils.now_utc_timestamp())
+        unit_delta = None
+        if existing_applicabilities:
+            unit_delta = ApplicabilityRegenerationManager._get_unit_delta(
+                bound_repo_id, existing_applicabilities.values())
+
+        # Many consumers usually share a profile, so each profile hash is calculated just once.
+        # Unit profiles change whenever packages are installed or removed on consumers, and a
+        # profile hash may no longer have any UnitProfile. This is harmless, as Pulp has a monthly
+        # cleanup task that will identify these dangling references and remove them.
+        unit_profiles = UnitProfile.get_collection().find(
+            {'profile_hash': {'$in': profiles.keys()}},
+            projection=['profile_hash', 'content_type'])
+        type_profiles_map = {}
+        for unit_profile in unit_profiles:
+            profile_hash = unit_profile['profile_hash']
+            type_profiles_map.setdefault(unit_profile['content_type'], {})[profile_hash] = \
+                profiles[profile_hash]
+        if not type_profiles_map:
+            return
+
+        repo_content_types = set(
+            ApplicabilityRegenerationManager._get_existing_repo_content_types(bound_repo_id))
+        requests = []
+        for content_type, type_profiles in type_profiles_map.items():
+            profiler, profiler_cfg = ApplicabilityRegenerationManager._profiler(content_type)
+            if not repo_content_types & set(profiler.metadata()['types']):
                 continue
+            call_config = PluginCallConfiguration(plugin_config=profiler_cfg,
+                                                  repo_plugin_config=None)
+            try:
+                applicabilities = None
+                if unit_delta is not None:
+                    applicabilities = ApplicabilityRegenerationManager._patch_applicability(
+                        profiler, type_profiles, bound_repo_id, call_config, unit_delta,
+                        existing_applicabilities)
+                if applicabilities is None:
+                    applicabilities = ApplicabilityRegenerationManager._calculate_applicability(
+                        profiler, type_profiles, bound_repo_id, call_config)
+            except NotImplementedError:
+                msg = "Profiler for content type [%s] does not support applicability" % content_type
+                _logger.debug(msg)
+                continue
+
+            for profile_hash, applicability in applicabilities.items():
+                requests.append(
+                    UpdateOne({'repo_id': bound_repo_id, 'profile_hash': profile_hash},
+                              {'$set': {'profile': type_profiles[profile_hash],
+                                        'applicability': applicability,
+                                        'last_updated': last_updated}},
+                              upsert=True))
+
+        ApplicabilityRegenerationManager._save_applicabilities(requests)
+
+    @staticmethod
+    def _calculate_applicability(profiler, profiles, bound_repo_id, call_config):
+        """
+        Calculate applicability for the given profiles with the profiler's batch method, falling
+        back to calculating each profile on its own for profilers that only support that.
+
+        :param profiler: profiler for the content type of the profiles
+        :type profiler: pulp.plugins.profiler.Profiler
+        :param profiles: unit profiles keyed by profile hash
+        :type profiles: dict
+        :param bound_repo_id: repo id to be used to calculate applicability
+                              against the given unit profiles
+        :type bound_repo_id: str
+        :param call_config: plugin configuration
+        :type call_config: pulp.plugins.config.PluginCallConfiguration
+
+        :return: applicability keyed by profile hash
+        :rtype: dict
+
+        :raise NotImplementedError: if the profiler does not support applicability
+        """
+        profiler_conduit = ProfilerConduit()
+        try:
+            return profiler.calculate_applicable_units_batch(profiles, bound_repo_id, call_config,
+                                                             profiler_conduit)
+        except NotImplementedError:
+            pass
+        applicabilities = {}
+        for profile_hash, profile in profiles.items():
+            applicabilities[profile_hash] = profiler.calculate_applicable_units(
+                profile, bound_repo_id, call_config, profiler_conduit)
+        return applicabilities
+
+    @staticmethod
+    def _get_unit_delta(repo_id, applicabilities):
+        """
+        Find the units added to and removed from the repo since the given applicability data was
+        calculated.
+
+        :param repo_id: repo id the applicability data was calculated against
+        :type repo_id: str
+        :param applicabilities: RepoProfileApplicability documents
+        :type applicabilities: list of dict
+
+        :return: ids of the added units keyed by unit type id, and whether any unit was removed;
+                 or None when the delta is unknown, too large, or includes updated units, so the
+                 applicability can not be patched with it
+        :rtype: tuple of (dict, bool) or None
+        """
+        timestamps = [applicability.get('last_updated') for applicability in applicabilities]
+        if not timestamps or None in timestamps:
+            return None
+        since = min(timestamps)
+
+        associations = model.RepositoryContentUnit.objects(
+            repo_id=repo_id, created__gte=since).only('unit_type_id', 'unit_id').limit(
+            INCREMENTAL_APPLICABILITY_MAX_UNITS + 1)
+        added_unit_ids = {}
+        for count, association in enumerate(associations, 1):
+            if count > INCREMENTAL_APPLICABILITY_MAX_UNITS:
+                return None
+            added_unit_ids.setdefault(association.unit_type_id, []).append(association.unit_id)
+
+        repo_obj = model.Repository.objects.only('last_unit_removed', 'content_unit_counts').get(
+            repo_id=repo_id)
+        if ApplicabilityRegenerationManager._units_updated(
+                repo_id, repo_obj.content_unit_counts.keys(), since):
+            return None
+        last_removed = repo_obj.last_unit_removed
+        units_removed = last_removed is not None and \
+            last_removed >= dateutils.parse_iso8601_datetime(since)
+        return added_unit_ids, units_removed
+
+    @staticmethod
+    def _units_updated(repo_id, type_ids, since):
+        """
+        Check whether a unit that was already in the repo at the given time has been updated
+        since then. Its applicability may have changed, which patching does not account for.
+
+        :param repo_id: repo id the applicability data was calculated against
+        :type repo_id: str
+        :param type_ids: ids of the unit types in the repo
+        :type type_ids: list of str
+        :param since: when the applicability data was calculated, as an iso8601 timestamp
+        :type since: str
+
+        :return: True if such a unit was updated, False otherwise
+        :rtype: bool
+        """
+        timestamp = dateutils.datetime_to_utc_timestamp(dateutils.parse_iso8601_datetime(since))
+        for type_id in type_ids:
+            units = types_db.type_units_collection(type_id).find(
+                {'_last_updated': {'$gte': timestamp}}, projection=['_id'])
+            for batch in paginate(units, INCREMENTAL_APPLICABILITY_MAX_UNITS):
+                unit_ids = [unit['_id'] for unit in batch]
+                if model.RepositoryContentUnit.objects(
+                        repo_id=repo_id, unit_id__in=unit_ids, created__lt=since).count():
+                    return True
+        return False
 
-            # Regenerate applicability data for given unit_profile and repo id
-            ApplicabilityRegenerationManager.regenerate_applicability(
-                profile_hash, unit_profile['content_type'], unit_profile['id'], repo_id,
-                existing_applicability)
+    @staticmethod
+    def _patch_applicability(profiler, profiles, bound_repo_id, call_config, unit_delta,
+                             existing_applicabilities):
+        """
+        Patch the existing applicability of the given profiles with the units added to and removed
+        from the repo since it was calculated.
+
+        :param profiler: profiler for the content type of the profiles
+        :type profiler: pulp.plugins.profiler.Profiler
+        :param profiles: unit profiles keyed by profile hash
+        :type profiles: dict
+        :param bound_repo_id: repo id to be used to calculate applicability
+                              against the given unit profiles
+        :type bound_repo_id: str
+        :param call_config: plugin configuration
+        :type call_config: pulp.plugins.config.PluginCallConfiguration
+        :param unit_delta: ids of the added units keyed by unit type id, and whether any unit was
+                           removed, as returned by _get_unit_delta
+        :type unit_delta: tuple of (dict, bool)
+        :param existing_applicabilities: existing RepoProfileApplicability documents keyed by
+                                         profile hash
+        :type existing_applicabilities: dict
+
+        :return: applicability keyed by profile hash, or None if the profiler can not calculate
+                 applicability for just the added units
+        :rtype: dict or None
+        """
+        added_unit_ids, units_removed = unit_delta
+        profiler_types = profiler.metadata()['types']
+        added_unit_ids = dict((type_id, unit_ids) for type_id, unit_ids in added_unit_ids.items()
+                              if type_id in profiler_types)
+        added_applicabilities = {}
+        if added_unit_ids:
+            try:
+                added_applicabilities = profiler.calculate_applicable_units_delta(
+                    profiles, bound_repo_id, added_unit_ids, call_config, ProfilerConduit())
+            except NotImplementedError:
+                return None
+
+        current_applicabilities = dict(
+            (profile_hash, existing_applicabilities[profile_hash]['applicability'])
+            for profile_hash in profiles)
+        associated_unit_ids = None
+        if units_removed:
+            # Keep only the applicable units that are still in the repo
+            unit_ids = set()
+            for applicability in current_applicabilities.values():
+                for type_unit_ids in applicability.values():
+                    unit_ids.update(type_unit_ids)
+            associated_unit_ids = set(model.RepositoryContentUnit.objects(
+                repo_id=bound_repo_id, unit_id__in=list(unit_ids)).distinct('unit_id'))
+
+        applicabilities = {}
+        for profile_hash, applicability in current_applicabilities.items():
+            added_applicability = added_applicabilities.get(profile_hash, {})
+            patched = {}
+            for type_id in set(applicability) | set(added_applicability):
+                unit_ids = [unit_id for unit_id in applicability.get(type_id, [])
+                            if associated_unit_ids is None or unit_id in associated_unit_ids]
+                known_unit_ids = set(unit_ids)
+                unit_ids.extend(unit_id for unit_id in added_applicability.get(type_id, [])
+                                if unit_id not in known_unit_ids)
+                patched[type_id] = unit_ids
+            applicabilities[profile_hash] = patched
+        return applicabilities
+
+    @staticmethod
+    def _save_applicabilities(requests):
+        """
+        Upsert applicability data with an unordered bulk write.
+
+        :param requests: upserts of RepoProfileApplicability documents
+        :type requests: list of pymongo.UpdateOne
+        """
+        if not requests:
+            return
+        collection = RepoProfileApplicability.get_collection()
+        try:
+            collection.bulk_write(requests, ordered=False)
+        except BulkWriteError as e:
+            # A document inserted concurrently by another task makes the same upsert here fail on
+            # the unique index. The document exists now, so repeating those upserts updates it.
+            errors = e.details['writeErrors']
+            if e.details['writeConcernErrors'] or \
+                    any(error['code'] != DUPLICATE_KEY_ERROR for error in errors):
+                raise
+            collection.bulk_write([requests[error['index']] for error in errors], ordered=False)
 
     @staticmethod
     def regenerate_applicability(profile_hash, content_type, profile_id,
@@ -251,6 +520,7 @@ class ApplicabilityRegenerationManager(object):
                 profile = unit_profile['profile']
             call_config = PluginCallConfiguration(plugin_config=profiler_cfg,
                                                   repo_plugin_config=None)
+            last_updated = dateutils.format_iso8601_utc_timestamp(dateutils.now_utc_timestamp())
             try:
                 applicability = profiler.calculate_applicable_units(profile,
                                                                     bound_repo_id,
@@ -266,7 +536,8 @@ class ApplicabilityRegenerationManager(object):
                 RepoProfileApplicability.objects.create(profile_hash,
                                                         bound_repo_id,
                                                         profile,
-                                                        applicability)
+                                                        applicability,
+                                                        last_updated)
             except DuplicateKeyError:
                 # Update existing applicability
                 if not existing_applicability:
@@ -274,6 +545,7 @@ class ApplicabilityRegenerationManager(object):
                         {'repo_id': bound_repo_id, 'profile_hash': profile_hash})
                     existing_applicability = RepoProfileApplicability(**applicability_dict)
                 existing_applicability.applicability = applicability
+                existing_applicability.last_updated = last_updated
                 existing_applicability.save()
 
     @staticmethod
@@ -366,7 +638,7 @@ class RepoProfileApplicabilityManager(object):
     """
     This class is useful for querying for RepoProfileApplicability objects in the database.
     """
-    def create(self, profile_hash, repo_id, profile, applicability):
+    def create(self, profile_hash, repo_id, profile, applicability, last_updated=None):
         """
         Create and return a RepoProfileApplicability object.
 
@@ -380,12 +652,15 @@ class RepoProfileApplicabilityManager(object):
         :param applicability: A dictionary structure mapping unit type IDs to lists of applicable
                               Unit IDs.
         :type  applicability: dict
+        :param last_updated:  iso8601 time from which the repository's content is reflected in the
+                              applicability data
+        :type  last_updated:  basestring
         :return:              A new RepoProfileApplicability object
         :rtype:               pulp.server.db.model.consumer.RepoProfileApplicability
         """
         applicability = RepoProfileApplicability(
             profile_hash=profile_hash, repo_id=repo_id, profile=profile,
-            applicability=applicability)
+            applicability=applicability, last_updated=last_updated)
         applicability.save()
         return applicability
 
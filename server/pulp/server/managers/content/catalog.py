@@ -42,7 +42,7 @@ class ContentCatalogManager(object):
          included for each source in the result set.
     """
 
-    def add_entry(self, source_id, expires, type_id, unit_key, url):
+    def add_entry(self, source_id, expires, type_id, unit_key, url, generation=None):
         """
         Add an entry to the content catalog.
         :param source_id: A content source ID.
@@ -55,11 +55,37 @@ class ContentCatalogManager(object):
         :type unit_key: dict
         :param url: The download URL.
         :type url: str
+        :param generation: Identifies the refresh adding the entry.
+        :type generation: str
         """
         collection = ContentCatalog.get_collection()
-        entry = ContentCatalog(source_id, expires, type_id, unit_key, url)
+        entry = ContentCatalog(source_id, expires, type_id, unit_key, url, generation)
         collection.insert(entry)
 
+    def add_entries(self, source_id, expires, entries, generation=None):
+        """
+        Add entries to the content catalog using a single unordered bulk insert.
+        :param source_id: A content source ID.
+        :type source_id: str
+        :param expires: The entry expiration in seconds.
+        :type expires: int
+        :param entries: A list of: (type_id, unit_key, url).
+        :type entries: list
+        :param generation: Identifies the refresh adding the entries.
+        :type generation: str
+        :return: The number of entries added.
+        :rtype: int
+        """
+        if not entries:
+            return 0
+        collection = ContentCatalog.get_collection()
+        documents = [
+            ContentCatalog(source_id, expires, type_id, unit_key, url, generation)
+            for type_id, unit_key, url in entries
+        ]
+        result = collection.insert_many(documents, ordered=False)
+        return len(result.inserted_ids)
+
     def delete_entry(self, source_id, type_id, unit_key):
         """
         Delete an entry from the content catalog.
@@ -89,6 +115,24 @@ class ContentCatalogManager(object):
         result = collection.remove(query)
         return result['n']
 
+    def retire(self, source_id, generation):
+        """
+        Retire (delete) entries from the content catalog belonging to the
+        specified content source that were not added by the specified
+        generation.  This is used to swap in a newly refreshed generation
+        of entries with a single operation rather than purging row by row.
+        :param source_id: A content source ID.
+        :type source_id: str
+        :param generation: The current generation.
+        :type generation: str
+        :return: The number of entries retired.
+        :rtype: int
+        """
+        collection = ContentCatalog.get_collection()
+        query = {'source_id': source_id, 'generation': {'$ne': generation}}
+        result = collection.remove(query)
+        return result['n']
+
     def purge_expired(self, grace_period=GRACE_PERIOD):
         """
         Purge (delete) expired entries from the content catalog belonging
@@ -148,6 +192,29 @@ class ContentCatalogManager(object):
             newest_by_source[entry['source_id']] = entry
         return newest_by_source.values()
 
+    def find_all(self, units):
+        """
+        Find entries in the content catalog for many units using a single query.
+        As with find(), only the newest entry for each source is included for
+        a given unit.
+        :param units: A list of: (type_id, unit_key).
+        :type units: list
+        :return: A list of matching entries for each unit, in the same order
+            as the units were specified.
+        :rtype: list
+        """
+        collection = ContentCatalog.get_collection()
+        locators = [ContentCatalog.get_locator(type_id, unit_key) for type_id, unit_key in units]
+        query = {
+            'locator': {'$in': list(set(locators))},
+            'expiration': {'$gte': ContentCatalog.get_expiration(0)}
+        }
+        newest_by_locator = {}
+        for entry in collection.find(query, sort=[('_id', ASCENDING)]):
+            newest_by_source = newest_by_locator.setdefault(entry['locator'], {})
+            newest_by_source[entry['source_id']] = entry
+        return [newest_by_locator.get(locator, {}).values() for locator in locators]
+
     def has_entries(self, source_id):
         """
         Get whether the specified content source has entries in the catalog.
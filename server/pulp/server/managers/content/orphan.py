@@ -4,14 +4,17 @@ import logging
 import os
 import re
 import shutil
+import time
 
 from celery import task
+from pymongo import ASCENDING
 
+from pulp.common.plugins import reporting_constants
 from pulp.plugins.types import database as content_types_db
 from pulp.plugins.loader import api as plugin_api
 from pulp.plugins.util import misc as plugin_misc
 from pulp.server import config as pulp_config, exceptions as pulp_exceptions
-from pulp.server.async.tasks import Task
+from pulp.server.async.tasks import Task, get_current_task_id
 from pulp.server.controllers import units as units_controller
 from pulp.server.db.model.repository import RepoContentUnit
 from pulp.server.db import model
@@ -20,6 +23,91 @@ from pulp.server.exceptions import MissingResource
 
 _logger = logging.getLogger(__name__)
 
+# Number of documents fetched per round-trip from each side of the orphan merge. This also bounds
+# the number of orphans held in memory at once while they are being deleted.
+ORPHAN_SCAN_BATCH_SIZE = 1000
+
+# Key under which orphan scan progress is stored in the task's progress report.
+ORPHAN_SCAN_STEP = u'orphan_scan'
+
+
+class OrphanScanProgress(object):
+    """
+    Tracks the progress of an orphan scan for each content type and writes it under the
+    ORPHAN_SCAN_STEP key of the progress report of the task the scan is running in, if any. Other
+    keys of the progress report are left alone.
+
+    The report is written at most once a second, unless the state of a content type changed.
+
+    :ivar task_id: id of the task the scan is running in; None if not running in a task
+    :type task_id: basestring or None
+    :ivar types: progress of each content type, keyed by content type id
+    :type types: dict
+    """
+
+    def __init__(self):
+        self.task_id = get_current_task_id()
+        self.types = {}
+        self.last_report_time = 0
+
+    def started(self, content_type_id):
+        """
+        Record that the scan of a content type has started.
+
+        :param content_type_id: id of the content type being scanned
+        :type  content_type_id: basestring
+        """
+        self.types[content_type_id] = {
+            reporting_constants.PROGRESS_STATE_KEY: reporting_constants.STATE_RUNNING,
+            'units_scanned': 0,
+            'orphans_found': 0,
+        }
+        self.report(force=True)
+
+    def scanned(self, content_type_id, orphan):
+        """
+        Record that a unit of the given content type has been scanned.
+
+        :param content_type_id: id of the content type being scanned
+        :type  content_type_id: basestring
+        :param orphan: True if the unit is an orphan
+        :type  orphan: bool
+        """
+        progress = self.types[content_type_id]
+        progress['units_scanned'] += 1
+        if orphan:
+            progress['orphans_found'] += 1
+        self.report()
+
+    def finished(self, content_type_id):
+        """
+        Record that the scan of a content type has completed.
+
+        :param content_type_id: id of the content type being scanned
+        :type  content_type_id: basestring
+        """
+        progress = self.types[content_type_id]
+        progress[reporting_constants.PROGRESS_STATE_KEY] = reporting_constants.STATE_COMPLETE
+        self.report(force=True)
+        _logger.debug(_('Orphan scan of %(t)s: %(o)d orphans in %(u)d units') % {
+            't': content_type_id, 'o': progress['orphans_found'], 'u': progress['units_scanned']})
+
+    def report(self, force=False):
+        """
+        Write the progress to the current task's status.
+
+        :param force: write the progress even if it was written less than a second ago
+        :type  force: bool
+        """
+        if self.task_id is None:
+            return
+        now = int(time.time())
+        if not force and now == self.last_report_time:
+            return
+        self.last_report_time = now
+        update = {'set__progress_report__%s' % ORPHAN_SCAN_STEP: self.types}
+        model.TaskStatus.objects(task_id=self.task_id).update_one(**update)
+
 
 class OrphanManager(object):
 
@@ -32,23 +120,26 @@ class OrphanManager(object):
         :rtype: dict
         """
         summary = {}
-        for content_type_id in content_types_db.all_type_ids():
-            summary[content_type_id] = self.orphans_count_by_type(content_type_id)
-        for content_type_id in plugin_api.list_unit_models():
-            summary[content_type_id] = self.orphans_count_by_type(content_type_id)
+        progress = OrphanScanProgress()
+        content_type_ids = set(content_types_db.all_type_ids())
+        content_type_ids.update(plugin_api.list_unit_models())
+        for content_type_id in content_type_ids:
+            summary[content_type_id] = self.orphans_count_by_type(content_type_id, progress)
         return summary
 
-    def orphans_count_by_type(self, content_type_id):
+    def orphans_count_by_type(self, content_type_id, progress=None):
         """
         Generate a count of the orphans of a given content type.
 
         :param content_type_id: unique id of the content type to count orphans of
         :type content_type_id: basestring
+        :param progress: tracker the scan reports its progress to
+        :type progress: OrphanScanProgress or None
         :return: count of orphaned units of the given type
         :rtype: int
         """
         count = 0
-        for unit in OrphanManager.generate_orphans_by_type(content_type_id):
+        for unit in OrphanManager.generate_orphans_by_type(content_type_id, progress=progress):
             count += 1
         return count
 
@@ -85,16 +176,24 @@ class OrphanManager(object):
                 yield content_unit
 
     @staticmethod
-    def generate_orphans_by_type(content_type_id, fields=None):
+    def generate_orphans_by_type(content_type_id, fields=None, progress=None):
         """
         Return an generator of all orphaned content units of the given content type.
 
         If fields is not specified, only the `_id` field will be present.
 
+        The units of the type and the ids of the units associated with a repository are each
+        streamed in `_id` order, and the two streams are merged to find the units that are not
+        associated. This takes two queries per content type regardless of the number of units,
+        and only holds one batch of each stream in memory.
+
         :param content_type_id: id of the content type
         :type content_type_id: basestring
         :param fields: list of fields to include in each content unit
         :type fields: list or None
+        :param progress: tracker the scan reports its progress to; progress is not reported if
+                         this is None
+        :type progress: OrphanScanProgress or None
         :return: generator of orphaned content units for the given content type
         :rtype: generator
         """
@@ -103,15 +202,49 @@ class OrphanManager(object):
         content_units_collection = content_types_db.type_units_collection(content_type_id)
         repo_content_units_collection = RepoContentUnit.get_collection()
 
-        for content_unit in content_units_collection.find({}, projection=fields).batch_size(100):
+        content_units = content_units_collection.find({}, projection=fields)\
+            .sort('_id', ASCENDING).batch_size(ORPHAN_SCAN_BATCH_SIZE)
+        # the hint makes mongo walk the associations of the type in unit_id order on the
+        # (unit_type_id, unit_id) index, instead of scanning or sorting in memory
+        associated_ids = (
+            association['unit_id'] for association in repo_content_units_collection.find(
+                {'unit_type_id': content_type_id}, projection={'unit_id': 1, '_id': 0})
+            .sort('unit_id', ASCENDING)
+            .hint([('unit_type_id', ASCENDING), ('unit_id', ASCENDING)])
+            .batch_size(ORPHAN_SCAN_BATCH_SIZE))
+
+        if progress is not None:
+            progress.started(content_type_id)
+        associated_id = next(associated_ids, None)
+        for content_unit in content_units:
+            # skip the associations of units that sort before this one, including
+            # associations whose unit no longer exists
+            while associated_id is not None and associated_id < content_unit['_id']:
+                associated_id = next(associated_ids, None)
+
+            orphan = associated_id != content_unit['_id']
+            if progress is not None:
+                progress.scanned(content_type_id, orphan)
+            if orphan:
+                yield content_unit
+        if progress is not None:
+            progress.finished(content_type_id)
 
-            repo_content_units_cursor = repo_content_units_collection.find(
-                {'unit_id': content_unit['_id']})
+    @staticmethod
+    def _associated_unit_ids(unit_ids):
+        """
+        Return the subset of the given unit ids that are associated with at least one repository.
 
-            if repo_content_units_cursor.count() > 0:
-                continue
+        This is used to confirm a page of orphans just before it is deleted, so that units
+        associated while a long scan was running are not removed.
 
-            yield content_unit
+        :param unit_ids: ids of the content units to check
+        :type  unit_ids: iterable of basestring
+        :return: ids of the units that are associated with a repository
+        :rtype: set
+        """
+        return set(model.RepositoryContentUnit.objects(unit_id__in=list(unit_ids))
+                   .distinct('unit_id'))
 
     @staticmethod
     def generate_orphans_by_type_with_unit_keys(content_type_id):
@@ -150,15 +283,15 @@ class OrphanManager(object):
                                  given content type and unit id
         """
 
-        for content_unit in OrphanManager.generate_orphans_by_type(content_type_id):
-
-            if content_unit['_id'] != content_unit_id:
-                continue
+        content_units_collection = content_types_db.type_units_collection(content_type_id)
+        content_unit = content_units_collection.find_one({'_id': content_unit_id},
+                                                         projection=['_id'])
 
-            return content_unit
+        if content_unit is None or OrphanManager._associated_unit_ids([content_unit_id]):
+            raise pulp_exceptions.MissingResource(content_type=content_type_id,
+                                                  content_unit=content_unit_id)
 
-        raise pulp_exceptions.MissingResource(content_type=content_type_id,
-                                              content_unit=content_unit_id)
+        return content_unit
 
     @staticmethod
     def delete_all_orphans():
@@ -169,13 +302,15 @@ class OrphanManager(object):
         :rtype: dict
         """
         ret = {}
+        progress = OrphanScanProgress()
         for content_type_id in content_types_db.all_type_ids():
-            count = OrphanManager.delete_orphans_by_type(content_type_id)
+            count = OrphanManager.delete_orphans_by_type(content_type_id, progress=progress)
             if count > 0:
                 ret[content_type_id] = count
 
         for content_type_id in plugin_api.list_unit_models():
-            count = OrphanManager.delete_orphan_content_units_by_type(content_type_id)
+            count = OrphanManager.delete_orphan_content_units_by_type(content_type_id,
+                                                                      progress=progress)
             if count > 0:
                 ret[content_type_id] = count
         return ret
@@ -206,7 +341,7 @@ class OrphanManager(object):
             OrphanManager.delete_orphans_by_type(content_type_id, content_unit_id_list)
 
     @staticmethod
-    def delete_orphans_by_type(content_type_id, content_unit_ids=None):
+    def delete_orphans_by_type(content_type_id, content_unit_ids=None, progress=None):
         """
         Delete the orphaned content units for the given content type.
 
@@ -219,6 +354,8 @@ class OrphanManager(object):
         :type content_type_id: basestring
         :param content_unit_ids: list of content unit ids to delete; None means delete them all
         :type content_unit_ids: iterable or None
+        :param progress: tracker the orphan scan reports its progress to
+        :type progress: OrphanScanProgress or None
         :return: count of units deleted
         :rtype: int
         """
@@ -232,29 +369,41 @@ class OrphanManager(object):
             raise MissingResource(content_type_id=content_type_id)
 
         fields = ('_id', '_storage_path') + unit_key_fields
+        if content_unit_ids is None:
+            candidates = OrphanManager.generate_orphans_by_type(content_type_id, fields=fields,
+                                                                progress=progress)
+        else:
+            # only the given units need to be looked at, each page is checked for associations
+            # below so there is no need to scan the whole type
+            candidates = itertools.chain.from_iterable(
+                content_units_collection.find({'_id': {'$in': page}}, projection=fields)
+                for page in plugin_misc.paginate(content_unit_ids, ORPHAN_SCAN_BATCH_SIZE))
+
         count = 0
-        for content_unit in OrphanManager.generate_orphans_by_type(content_type_id, fields=fields):
+        for page in plugin_misc.paginate(candidates, ORPHAN_SCAN_BATCH_SIZE):
+            associated_ids = OrphanManager._associated_unit_ids(unit['_id'] for unit in page)
 
-            if content_unit_ids is not None and content_unit['_id'] not in content_unit_ids:
-                continue
+            for content_unit in page:
+                if content_unit['_id'] in associated_ids:
+                    continue
 
-            model.LazyCatalogEntry.objects(
-                unit_id=content_unit['_id'],
-                unit_type_id=content_type_id
-            ).delete()
-            content_units_collection.remove(content_unit['_id'])
+                model.LazyCatalogEntry.objects(
+                    unit_id=content_unit['_id'],
+                    unit_type_id=content_type_id
+                ).delete()
+                content_units_collection.remove(content_unit['_id'])
 
-            if hasattr(content_model, 'do_post_delete_actions'):
-                content_model.do_post_delete_actions(content_unit)
+                if hasattr(content_model, 'do_post_delete_actions'):
+                    content_model.do_post_delete_actions(content_unit)
 
-            storage_path = content_unit.get('_storage_path', None)
-            if storage_path is not None:
-                OrphanManager.delete_orphaned_file(storage_path)
-            count += 1
+                storage_path = content_unit.get('_storage_path', None)
+                if storage_path is not None:
+                    OrphanManager.delete_orphaned_file(storage_path)
+                count += 1
         return count
 
     @staticmethod
-    def delete_orphan_content_units_by_type(type_id, content_unit_ids=None):
+    def delete_orphan_content_units_by_type(type_id, content_unit_ids=None, progress=None):
         """
         Delete the orphaned content units for the given content type.
         This method only applies to new style content units that are loaded via entry points
@@ -265,6 +414,8 @@ class OrphanManager(object):
         :type type_id: basestring
         :param content_unit_ids: list of content unit ids to delete; None means delete them all
         :type content_unit_ids: iterable or None
+        :param progress: tracker the orphan scan reports its progress to
+        :type progress: OrphanScanProgress or None
         :return: count of units deleted
         :rtype: int
         """
@@ -277,33 +428,23 @@ class OrphanManager(object):
 
         fields = ('id', '_storage_path') + unit_key_fields
         if content_unit_ids:
-            query_sets = []
-            for page in plugin_misc.paginate(content_unit_ids):
-                qs = content_model.objects(id__in=page).only(*fields)
-                query_sets.append(qs)
-            content_units = itertools.chain(*query_sets)
+            candidate_ids = content_unit_ids
         else:
-            content_units = content_model.objects.only(*fields)
+            candidate_ids = (unit['_id'] for unit in
+                             OrphanManager.generate_orphans_by_type(type_id, progress=progress))
 
         count = 0
 
-        # Paginate the content units
-        for units_group in plugin_misc.paginate(content_units):
-            # Build the list of ids to search for an easier way to access units in the group by id
-            unit_dict = dict()
-            for unit in units_group:
-                unit_dict[unit.id] = unit
-
-            id_list = list(unit_dict.iterkeys())
-
-            # Clear the units that are currently associated from unit_dict
-            non_orphan = model.RepositoryContentUnit.objects(unit_id__in=id_list)\
-                .distinct('unit_id')
-            for non_orphan_id in non_orphan:
-                unit_dict.pop(non_orphan_id)
+        # Paginate the candidate ids
+        for page in plugin_misc.paginate(candidate_ids, ORPHAN_SCAN_BATCH_SIZE):
+            # Skip the units that are currently associated
+            associated_ids = OrphanManager._associated_unit_ids(page)
+            page = tuple(unit_id for unit_id in page if unit_id not in associated_ids)
+            if not page:
+                continue
 
             # Remove the unit, lazy catalog entries, and any content in storage.
-            for unit_to_delete in unit_dict.itervalues():
+            for unit_to_delete in content_model.objects(id__in=page).only(*fields):
                 model.LazyCatalogEntry.objects(
                     unit_id=str(unit_to_delete.id),
                     unit_type_id=str(type_id)
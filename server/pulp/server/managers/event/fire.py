@@ -6,14 +6,65 @@ in a consistent event format for that type.
 """
 
 import logging
+import threading
+import time
 
 from pulp.server.db.model.event import EventListener
-from pulp.server.event import data as e, notifiers
+from pulp.server.event import data as e, dispatch
 
 
+# Seconds the event listeners are cached. Changes made through the EventListenerManager in this
+# process are seen immediately; changes made by other processes are seen within this time.
+LISTENER_CACHE_TTL = 30
+
 _logger = logging.getLogger(__name__)
 
 
+class ListenerCache(object):
+    """
+    Caches the event listener table so firing an event does not query the database.
+    """
+
+    def __init__(self, ttl=LISTENER_CACHE_TTL):
+        """
+        :param ttl: The number of seconds the listeners are cached
+        :type  ttl: int
+        """
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._listeners = None
+        self._expires = 0
+
+    def get(self, event_type):
+        """
+        Get the listeners for an event type.
+
+        :param event_type: The event type
+        :type  event_type: str
+        :return: The listeners registered for the event type or for all events
+        :rtype:  list
+        """
+        now = time.time()
+        with self._lock:
+            listeners = self._listeners
+            if listeners is None or now >= self._expires:
+                listeners = list(EventListener.get_collection().find())
+                self._listeners = listeners
+                self._expires = now + self.ttl
+        return [l for l in listeners
+                if event_type in l['event_types'] or '*' in l['event_types']]
+
+    def invalidate(self):
+        """
+        Discard the cached listeners. Called when listeners are created, updated or deleted.
+        """
+        with self._lock:
+            self._listeners = None
+
+
+listener_cache = ListenerCache()
+
+
 class EventFireManager(object):
 
     def fire_repo_sync_started(self, repo_id):
@@ -55,24 +106,18 @@ class EventFireManager(object):
     def _do_fire(self, event):
         """
         Performs the actual act of firing an event to all appropriate
-        listeners. This call will log but otherwise suppress any exception
-        that comes out of a notifier.
+        listeners. The notifiers are invoked asynchronously by the process's
+        event dispatcher; any exception that comes out of a notifier is logged
+        there and does not bubble up.
 
         @param event: event object to fire
         @type  event: pulp.server.event.data.Event
         """
         # Determine which listeners should be notified
-        listeners = list(EventListener.get_collection().find(
-            {'$or': ({'event_types': event.event_type}, {'event_types': '*'})}))
+        listeners = listener_cache.get(event.event_type)
+        if not listeners:
+            return
 
-        # For each listener, retrieve the notifier and invoke it. Be sure that
-        # an exception from a notifier is logged but does not interrupt the
-        # remainder of the firing, nor bubble up.
+        dispatcher = dispatch.get_dispatcher()
         for listener in listeners:
-            notifier_type_id = listener['notifier_type_id']
-            f = notifiers.get_notifier_function(notifier_type_id)
-
-            try:
-                f(listener['notifier_config'], event)
-            except Exception:
-                _logger.exception('Exception from notifier of type [%s]' % notifier_type_id)
+            dispatcher.dispatch(listener, event)
@@ -8,6 +8,7 @@ from pulp.common import tags
 from pulp.common.tags import (ACTION_REFRESH_ALL_CONTENT_SOURCES,
                               ACTION_REFRESH_CONTENT_SOURCE,
                               RESOURCE_CONTENT_SOURCE)
+from pulp.plugins.util.misc import paginate
 from pulp.server import constants
 from pulp.server.auth import authorization
 from pulp.server.content.sources.container import ContentContainer
@@ -280,10 +281,20 @@ class ContentUnitSearch(search.SearchView):
             unit['repository_memberships'] = list(association_map.get(unit['_id'], []))
         return units
 
+    @classmethod
+    def _search(cls, search_method, query, *args, **kwargs):
+        """
+        Overrides the base class to search the collection of the requested content type.
+        """
+        return search_method(kwargs['type_id'], query)
+
     @classmethod
     def get_results(cls, query, search_method, options, *args, **kwargs):
         """
         Overrides the base class so additional information can optionally be added.
+
+        The units are processed in batches as they are read, and returned as an iterator so that
+        large results are streamed.
         """
 
         type_id = kwargs['type_id']
@@ -291,11 +302,13 @@ class ContentUnitSearch(search.SearchView):
         if serializer and query.get('filters') is not None:
             # if we have a model serializer, translate the filter for this content unit type
             query['filters'] = serializer.translate_filters(serializer.model, query['filters'])
-        units = list(search_method(type_id, query))
-        units = [_process_content_unit(unit, type_id) for unit in units]
-        if options.get('include_repos') is True:
-            cls._add_repo_memberships(units, type_id)
-        return units
+        units = cls._search(search_method, query, *args, **kwargs)
+        for batch in paginate(units, search.STREAM_BATCH_SIZE):
+            batch = [_process_content_unit(unit, type_id) for unit in batch]
+            if options.get('include_repos') is True:
+                cls._add_repo_memberships(batch, type_id)
+            for unit in batch:
+                yield unit
 
 
 class ContentUnitResourceView(View):
@@ -6,6 +6,8 @@ import logging
 
 from pulp.common import error_codes
 from pulp.server.auth.authorization import CREATE, READ, UPDATE, DELETE, EXECUTE, OPERATION_NAMES
+from pulp.server.auth.cache import principal_cache
+from pulp.server.auth.permission_index import permission_index
 from pulp.server.config import config
 from pulp.server.compat import wraps
 from pulp.server.controllers import user as user_controller
@@ -39,11 +41,22 @@ def check_preauthenticated():
 def password_authentication():
     username, password = http.username_password()
     if username is not None:
+        if password is not None:
+            # apply the changes to users made by other processes before trusting the cache
+            permission_index.refresh()
+            principal = principal_cache.get(username, password)
+            if principal is not None:
+                _logger.debug("User [%s] authenticated with cached password" % username)
+                return principal.login
+        # changes made while the password is checked must not be hidden by the cache
+        generation = principal_cache.generation
         userid = factory.authentication_manager().check_username_password(username, password)
         if userid is None:
             raise PulpCodedAuthenticationException(error_code=error_codes.PLP0030, user=username)
         else:
             _logger.debug("User [%s] authenticated with password" % username)
+            if password is not None:
+                principal_cache.add(username, password, userid, generation)
             return userid
 
 
@@ -117,6 +130,50 @@ def is_consumer_authorized(resource, consumerid, operation):
     return False
 
 
+def _get_user(login, principal=None):
+    """
+    Get the user with the given login, from the cached principal if it has already been looked up.
+
+    :param login:     login of the user
+    :type  login:     str
+    :param principal: principal cached for the credentials the user authenticated with, if any
+    :type  principal: pulp.server.auth.cache.CachedPrincipal or None
+
+    :return: the user
+    :rtype:  pulp.server.db.model.User
+    """
+    if principal is None:
+        return model.User.objects.get(login=login)
+    if principal.user is None:
+        principal.user = model.User.objects.get(login=login)
+    return principal.user
+
+
+def _is_authorized(login, operation, principal=None):
+    """
+    Check whether the user may perform an operation on the requested resource, using the
+    decision cached on the principal if there is one.
+
+    :param login:     login of the user
+    :type  login:     str
+    :param operation: operation to be performed on the resource
+    :type  operation: int
+    :param principal: principal cached for the credentials the user authenticated with, if any
+    :type  principal: pulp.server.auth.cache.CachedPrincipal or None
+
+    :return: True if the user is authorized, False otherwise
+    :rtype:  bool
+    """
+    resource = http.resource_path()
+    if principal is None:
+        return user_controller.is_authorized(resource, login, operation)
+    authorized = principal.is_authorized(resource, operation)
+    if authorized is None:
+        authorized = user_controller.is_authorized(resource, login, operation)
+        principal.set_authorized(resource, operation, authorized)
+    return authorized
+
+
 def _verify_auth(self, operation, super_user_only, method, *args, **kwargs):
     """
     Internal method for checking authentication and authorization. This code
@@ -147,6 +204,7 @@ def _verify_auth(self, operation, super_user_only, method, *args, **kwargs):
                                  oauth_authentication]
 
     user_authenticated = False
+    principal = None
     for authenticate_user in registered_auth_functions:
         if authenticate_user == oauth_authentication:
             login, is_consumer = authenticate_user()
@@ -157,6 +215,10 @@ def _verify_auth(self, operation, super_user_only, method, *args, **kwargs):
             user_authenticated = True
             if authenticate_user == consumer_cert_authentication:
                 is_consumer = True
+            elif authenticate_user == password_authentication:
+                username, password = http.username_password()
+                if password is not None:
+                    principal = principal_cache.get(username, password)
             break
 
     if not user_authenticated:
@@ -168,7 +230,7 @@ def _verify_auth(self, operation, super_user_only, method, *args, **kwargs):
 
     # Consumers are not part of the User collection
     if not is_consumer:
-        user = model.User.objects.get(login=login)
+        user = _get_user(login, principal)
         if super_user_only and not user.is_superuser():
             raise PulpCodedAuthenticationException(error_code=error_codes.PLP0026, user=login,
                                                    operation=OPERATION_NAMES[operation])
@@ -183,8 +245,7 @@ def _verify_auth(self, operation, super_user_only, method, *args, **kwargs):
                 raise PulpCodedAuthenticationException(error_code=error_codes.PLP0026,
                                                        user=login,
                                                        operation=OPERATION_NAMES[operation])
-        elif user_controller.is_authorized(http.resource_path(), login, operation):
-            user = model.User.objects.get(login=login)
+        elif _is_authorized(login, operation, principal):
             principal_manager.set_principal(user)
         else:
             raise PulpCodedAuthenticationException(error_code=error_codes.PLP0026,
@@ -1,3 +1,5 @@
+import itertools
+
 import isodate
 
 from django.core.urlresolvers import reverse
@@ -51,6 +53,20 @@ def _merge_related_objects(name, model, repos):
         repo_dict[item['repo_id']][name].append(serialized)
 
 
+def _serialize_unit_metadata(unit):
+    """
+    Serialize the unit metadata of a unit association in place.
+
+    :param unit: unit association, with the unit under the "metadata" key
+    :type  unit: dict
+
+    :return: the same unit association, for convenience
+    :rtype:  dict
+    """
+    content.serialize_unit_with_serializer(unit['metadata'])
+    return unit
+
+
 def _process_repos(repo_objs, details, importers, distributors):
     """
     Serialize repository objects and add related importers and distributors if requested.
@@ -270,7 +286,8 @@ class RepoUnitSearch(search.SearchView):
         serialized HttpReponse object.
 
         This overrides the base class so we can validate repo existance and to choose the search
-        method depending on how many unit types we are dealing with.
+        method depending on how many unit types we are dealing with. Large results are streamed.
+        Unit associations cannot be paged with a continuation token.
 
         :param query: The criteria that should be used to search for objects
         :type  query: dict
@@ -278,20 +295,24 @@ class RepoUnitSearch(search.SearchView):
         :type  options: dict
 
         :return:      The serialized search results in an HttpReponse
-        :rtype:       django.http.HttpResponse
+        :rtype:       django.http.HttpResponse or django.http.StreamingHttpResponse
+
+        :raises exceptions.InvalidValue: if a continuation is given
         """
+        if 'continuation' in options:
+            raise exceptions.InvalidValue(['continuation'])
         repo_id = kwargs.get('repo_id')
         model.Repository.objects.get_repo_or_missing_resource(repo_id)
         criteria = UnitAssociationCriteria.from_client_input(query)
         manager = manager_factory.repo_unit_association_query_manager()
         if criteria.type_ids is not None and len(criteria.type_ids) == 1:
             type_id = criteria.type_ids[0]
-            units = manager.get_units_by_type(repo_id, type_id, criteria=criteria)
+            units = manager.get_units_by_type(repo_id, type_id, criteria=criteria,
+                                              as_generator=True)
         else:
-            units = manager.get_units(repo_id, criteria=criteria)
-        for unit in units:
-            content.serialize_unit_with_serializer(unit['metadata'])
-        return generate_json_response_with_pulp_encoder(units)
+            units = manager.get_units(repo_id, criteria=criteria, as_generator=True)
+        return search.build_response(itertools.imap(_serialize_unit_metadata, units),
+                                     generate_json_response_with_pulp_encoder)
 
 
 class RepoImportersView(View):
@@ -895,6 +916,7 @@ class ContentApplicabilityRegenerationView(View):
 
         repo_criteria_body = request.body_as_json.get('repo_criteria', None)
         parallel = request.body_as_json.get('parallel', False)
+        full = request.body_as_json.get('full', False)
 
         if repo_criteria_body is None:
             raise exceptions.MissingValue('repo_criteria')
@@ -905,12 +927,15 @@ class ContentApplicabilityRegenerationView(View):
             invalid_criteria.add_child_exception(e)
             raise invalid_criteria
 
+        if type(full) is not bool:
+            raise exceptions.InvalidValue('full')
+
         if parallel:
             if type(parallel) is not bool:
                 raise exceptions.InvalidValue('parallel')
 
             async_result = ApplicabilityRegenerationManager.\
-                queue_regenerate_applicability_for_repos(repo_criteria.as_dict())
+                queue_regenerate_applicability_for_repos(repo_criteria.as_dict(), full)
             ret = GroupCallReport()
             ret['group_id'] = str(async_result)
             ret['_href'] = reverse('task_group', kwargs={'group_id': str(async_result)})
@@ -919,7 +944,7 @@ class ContentApplicabilityRegenerationView(View):
         regeneration_tag = tags.action_tag('content_applicability_regeneration')
         async_result = regenerate_applicability_for_repos.apply_async_with_reservation(
             tags.RESOURCE_REPOSITORY_PROFILE_APPLICABILITY_TYPE, tags.RESOURCE_ANY_ID,
-            (repo_criteria.as_dict(),), tags=[regeneration_tag])
+            (repo_criteria.as_dict(), full), tags=[regeneration_tag])
         raise exceptions.OperationPostponed(async_result)
 
 
@@ -2,18 +2,70 @@
 This module contains the SearchView superclass. Your view code should subclass this to create a
 search view for a specific model.
 """
+import base64
+import itertools
 import json
 
 from django.views import generic
+from pymongo import ASCENDING
 from pymongo.errors import OperationFailure
 
+from pulp.plugins.util.misc import paginate
 from pulp.server import exceptions
 from pulp.server.auth import authorization
+from pulp.server.compat import json_util, ObjectId
 from pulp.server.db.model import criteria
 from pulp.server.webservices.views import util
 from pulp.server.webservices.views.decorators import auth_required
 
 
+# Results are serialized this many at a time. A search with more results than this is streamed.
+STREAM_BATCH_SIZE = 500
+
+# The response header that carries the continuation token for the next page of a keyset search.
+CONTINUATION_HEADER = 'X-Pulp-Continuation'
+
+
+class KeysetPage(object):
+    """
+    Wraps the search method of a keyset search, and remembers the _id of the last result it
+    returned, so the continuation token for the next page can be made from the page itself.
+    """
+
+    def __init__(self, search_method):
+        """
+        :param search_method: function that should be used to search
+        :type  search_method: func
+        """
+        self.search_method = search_method
+        self.count = 0
+        self.last_id = None
+
+    def __call__(self, *args, **kwargs):
+        """
+        Search, recording the results as they are read.
+
+        :return: search results
+        :rtype:  generator
+        """
+        for result in self.search_method(*args, **kwargs):
+            self.count += 1
+            self.last_id = result['_id'] if isinstance(result, dict) else result.pk
+            yield result
+
+    def continuation(self, limit):
+        """
+        :param limit: the number of results in a full page
+        :type  limit: int
+
+        :return: the continuation token for the next page, or None if the page is not full
+        :rtype:  str or None
+        """
+        if self.count < limit:
+            return None
+        return base64.urlsafe_b64encode(json_util.dumps(self.last_id))
+
+
 class SearchView(generic.View):
     """
     This class is meant to be subclassed by views that need to provide search functionality on a
@@ -46,6 +98,15 @@ class SearchView(generic.View):
                                model instance, sane serializers are used by default, and this
                                method should not be defined.
     :vartype serializer:       staticmethod
+
+    When get_results returns an iterator rather than a list, results are serialized in batches
+    of STREAM_BATCH_SIZE, and a search with more results than that is streamed to the client
+    instead of being built in memory.
+
+    A search may include a "continuation" option to page through results by _id instead of with
+    skip. The first page is requested with an empty continuation. When the criteria has a limit
+    and there may be more results, the response includes a CONTINUATION_HEADER whose value is
+    passed as the continuation to get the next page.
     """
 
     response_builder = staticmethod(util.generate_json_response_with_pulp_encoder)
@@ -74,6 +135,9 @@ class SearchView(generic.View):
         for field in filter(args.__contains__, cls.optional_string_fields):
             options[field] = args.pop(field)
 
+        if 'continuation' in args:
+            options['continuation'] = args.pop('continuation')
+
         return args, options
 
     @auth_required(authorization.READ)
@@ -137,7 +201,7 @@ class SearchView(generic.View):
         The default behavior can be overridden by implementing the serializer staticmethod
         on your SearchView implementation.
 
-        :param results: A list of search results from a search query
+        :param results: A list of search results from a search query, or a batch of them
         :type  results: list
 
         :return: serialized search results
@@ -164,7 +228,7 @@ class SearchView(generic.View):
         :param options: Extra options that individual views can use to optionally modify the data.
         :type  options: dict
         :return:      The serialized search results in an HttpReponse
-        :rtype:       django.http.HttpResponse
+        :rtype:       django.http.HttpResponse or django.http.StreamingHttpResponse
 
         :raises exceptions.InvalidValue: if pymongo is unable to use the criteria object
         """
@@ -188,15 +252,82 @@ class SearchView(generic.View):
                 query.fields.append('id')
             search_method = cls.manager.find_by_criteria
 
+        page = None
+        continuation = options.pop('continuation', None)
+        if continuation is not None:
+            cls._apply_continuation(query, continuation)
+            if query.limit:
+                search_method = page = KeysetPage(search_method)
+
         # We do not validate all aspects of the criteria object, so if pymongo has a problem we
         # raise an InvalidValue.
         try:
-            return cls.response_builder(cls.get_results(query, search_method, options,
-                                                        *args, **kwargs))
+            results = cls.get_results(query, search_method, options, *args, **kwargs)
+            if page is not None:
+                # The token is taken from the last result of the page, so the page is read before
+                # the response is built. A keyset page is never larger than its limit.
+                results = list(results)
+            response = build_response(results, cls.response_builder)
+            if page is not None:
+                token = page.continuation(query.limit)
+                if token is not None:
+                    response[CONTINUATION_HEADER] = token
         except OperationFailure, e:
             invalid = exceptions.InvalidValue('criteria')
             invalid.add_child_exception(e)
             raise invalid
+        return response
+
+    @classmethod
+    def _search(cls, search_method, query, *args, **kwargs):
+        """
+        Call the search method. Views whose search method takes other arguments override this.
+
+        :param search_method: function that should be used to search
+        :type  search_method: func
+        :param query:         The criteria that should be used to search for objects
+        :type  query:         pulp.server.db.model.criteria.Criteria
+
+        :return: search results
+        :rtype:  iterable
+        """
+        return search_method(query)
+
+    @classmethod
+    def _apply_continuation(cls, query, continuation):
+        """
+        Restrict a search to the page after the one a continuation token was returned for. The
+        results are ordered by _id, and the page starts after the _id in the token.
+
+        :param query:        The criteria that should be used to search for objects
+        :type  query:        pulp.server.db.model.criteria.Criteria
+        :param continuation: a continuation token, or an empty string for the first page
+        :type  continuation: basestring
+
+        :raises exceptions.InvalidValue: if the token is not valid, or the criteria skips
+                                         results or sorts them by another field
+        """
+        if query.skip:
+            raise exceptions.InvalidValue(['skip'])
+        if query.sort and query.sort != [('_id', ASCENDING)]:
+            raise exceptions.InvalidValue(['sort'])
+        query.sort = [('_id', ASCENDING)]
+        if not continuation:
+            return
+
+        try:
+            last_id = json_util.loads(base64.urlsafe_b64decode(str(continuation)))
+        except (TypeError, ValueError):
+            raise exceptions.InvalidValue(['continuation'])
+        if isinstance(last_id, ObjectId) and hasattr(cls, 'model') and \
+                hasattr(cls.model, 'SERIALIZER'):
+            # the model serializers translate the string form of an _id into an ObjectId
+            last_id = str(last_id)
+        after = {'_id': {'$gt': last_id}}
+        if query.filters:
+            query.filters = {'$and': [query.filters, after]}
+        else:
+            query.filters = after
 
     @classmethod
     def get_results(cls, query, search_method, options, *args, **kwargs):
@@ -204,6 +335,8 @@ class SearchView(generic.View):
         This is designed to search using the class's search method and serialize the results. This
         method can be overriden to account for the need to modify all results post search.
 
+        Overriding methods may return a list, or an iterator to have the results streamed.
+
         :param query: The criteria that should be used to search for objects
         :type  query: dict
         :param search_method: function that should be used to search
@@ -211,12 +344,39 @@ class SearchView(generic.View):
         :param options: additional options for including extra data
         :type  options: dict
 
-        :return: search results
-        :rtype:  list
+        :return: serialized search results
+        :rtype:  iterator
         """
         only = query.get('fields')
-        results = list(search_method(query))
-        return cls._serialize_results(results, only=only)
+        results = cls._search(search_method, query, *args, **kwargs)
+        return itertools.chain.from_iterable(
+            cls._serialize_results(list(batch), only=only)
+            for batch in paginate(results, STREAM_BATCH_SIZE))
+
+
+def build_response(results, response_builder=util.generate_json_response_with_pulp_encoder):
+    """
+    Build the response for a list or an iterator of serialized search results. An iterator with
+    more than STREAM_BATCH_SIZE results is streamed, so the results are never all in memory.
+
+    The first batch of an iterator is read before the response is returned, so that invalid
+    criteria are reported with an error status rather than in the middle of the response.
+
+    :param results:          serialized search results
+    :type  results:          list or iterator
+    :param response_builder: the function that builds the response for a list of results
+    :type  response_builder: function
+
+    :return: response containing the serialized results
+    :rtype:  django.http.HttpResponse or django.http.StreamingHttpResponse
+    """
+    if isinstance(results, list):
+        return response_builder(results)
+    first = list(itertools.islice(results, STREAM_BATCH_SIZE))
+    if len(first) < STREAM_BATCH_SIZE:
+        return response_builder(first)
+    return util.generate_streaming_json_response_with_pulp_encoder(
+        itertools.chain(first, results))
 
 
 def _trim_results(model, results, only):
@@ -127,7 +127,7 @@ class UserResourceView(View):
         # Delete any existing user permissions given to the creator of the user
         link = reverse('user_resource', kwargs={'login': login})
         if Permission.get_collection().find_one({'resource': link}):
-            Permission.get_collection().remove({'resource': link})
+            factory.permission_manager().delete_permission(link)
         return generate_json_response()
 
     @auth_required(authorization.UPDATE)
@@ -6,7 +6,7 @@ import httplib
 import json
 import sys
 
-from django.http import HttpResponse
+from django.http import HttpResponse, StreamingHttpResponse
 from django.utils.encoding import iri_to_uri
 
 from pulp.common import dateutils, error_codes
@@ -15,6 +15,10 @@ from pulp.server.compat import json_util
 from pulp.server.exceptions import PulpCodedValidationException, InputEncodingError
 
 
+# The minimum number of bytes sent at a time by streaming JSON responses.
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
 def pulp_json_encoder(obj):
     """
     Specialized json encoding.
@@ -65,6 +69,68 @@ generate_json_response_with_pulp_encoder = functools.partial(
 )
 
 
+def generate_streaming_json_response(content, default=None,
+                                     content_type='application/json; charset=utf-8'):
+    """
+    Serialize the items of an iterable as a JSON list and return a streaming django response. The
+    items are serialized one at a time as the response is sent, so the whole list is never held
+    in memory.
+
+    :param content      : items to be serialized
+    :type  content      : iterable of objects that are serializable by json.dumps
+    :param default      : function used by json.dumps to serialize content (also called default)
+    :type  default      : function or None
+    :param content_type : type of returned content
+    :type  content_type : str
+
+    :return             : response that streams the serialized content
+    :rtype              : django.http.StreamingHttpResponse
+    """
+    return StreamingHttpResponse(_json_list_chunks(content, default), content_type=content_type)
+
+
+def _json_list_chunks(content, default):
+    """
+    Serialize the items of an iterable as a JSON list, in chunks of at least STREAM_CHUNK_SIZE
+    bytes.
+
+    :param content : items to be serialized
+    :type  content : iterable
+    :param default : function used by json.dumps to serialize content (also called default)
+    :type  default : function or None
+
+    :return        : the serialized list
+    :rtype         : generator of str
+    """
+    encoder = json.JSONEncoder(default=default)
+    chunk = ['[']
+    size = 1
+    for index, item in enumerate(content):
+        if index:
+            chunk.append(', ')
+        encoded = encoder.encode(item)
+        chunk.append(encoded)
+        size += len(encoded)
+        if size >= STREAM_CHUNK_SIZE:
+            yield ''.join(chunk)
+            chunk = []
+            size = 0
+    chunk.append(']')
+    yield ''.join(chunk)
+
+
+"""
+Shortcut function to generate a streaming json response using the in house json_encoder.
+
+This function is equivalent to:
+generate_streaming_json_response(content, default=pulp_json_encoder)
+"""
+generate_streaming_json_response_with_pulp_encoder = functools.partial(
+    generate_streaming_json_response,
+    default=pulp_json_encoder,
+)
+
+
 def generate_redirect_response(response, href):
     response['Location'] = iri_to_uri(href)
     response.status_code = httplib.CREATED
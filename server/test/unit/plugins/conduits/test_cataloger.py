@@ -1,5 +1,7 @@
 from uuid import uuid4
 
+from mock import patch
+
 from ... import base
 from pulp.plugins.conduits.cataloger import CatalogerConduit
 from pulp.server.db.model.content import ContentCatalog
@@ -51,6 +53,63 @@ class TestCatalogerConduit(base.PulpServerTests):
             self.assertEqual(entry['unit_key'], unit_key)
             self.assertEqual(entry['url'], url)
 
+    def test_add_buffered(self):
+        units = self.units(0, 10)
+        conduit = CatalogerConduit(SOURCE_ID, EXPIRES, batch_size=4, generation='gen-1')
+        collection = ContentCatalog.get_collection()
+        with conduit:
+            for unit_key, url in units:
+                conduit.add_entry(TYPE_ID, unit_key, url)
+            # two full batches flushed; two entries still buffered
+            self.assertEqual(collection.find().count(), 8)
+            self.assertEqual(conduit.added_count, 8)
+        self.assertEqual(len(units), collection.find().count())
+        self.assertEqual(conduit.added_count, len(units))
+        for unit_key, url in units:
+            locator = ContentCatalog.get_locator(TYPE_ID, unit_key)
+            entry = collection.find_one({'locator': locator})
+            self.assertEqual(entry['unit_key'], unit_key)
+            self.assertEqual(entry['url'], url)
+            self.assertEqual(entry['generation'], 'gen-1')
+
+    def test_add_buffered_raised(self):
+        units = self.units(0, 3)
+        conduit = CatalogerConduit(SOURCE_ID, EXPIRES, batch_size=100)
+        try:
+            with conduit:
+                for unit_key, url in units:
+                    conduit.add_entry(TYPE_ID, unit_key, url)
+                raise ValueError()
+        except ValueError:
+            pass
+        collection = ContentCatalog.get_collection()
+        self.assertEqual(len(units), collection.find().count())
+        self.assertEqual(conduit.added_count, len(units))
+
+    @patch('pulp.plugins.conduits.cataloger.managers.content_catalog_manager')
+    def test_add_buffered_raised_flush_failed(self, manager):
+        manager.return_value.add_entries.side_effect = IOError()
+        units = self.units(0, 3)
+        conduit = CatalogerConduit(SOURCE_ID, EXPIRES, batch_size=100)
+        with self.assertRaises(ValueError):
+            with conduit:
+                for unit_key, url in units:
+                    conduit.add_entry(TYPE_ID, unit_key, url)
+                raise ValueError()
+        self.assertEqual(manager.return_value.add_entries.call_count, 1)
+        self.assertEqual(conduit.added_count, 0)
+
+    def test_delete_buffered(self):
+        units = self.units(0, 3)
+        conduit = CatalogerConduit(SOURCE_ID, EXPIRES, batch_size=100)
+        for unit_key, url in units:
+            conduit.add_entry(TYPE_ID, unit_key, url)
+        conduit.delete_entry(TYPE_ID, units[0][0])
+        collection = ContentCatalog.get_collection()
+        self.assertEqual(len(units) - 1, collection.find().count())
+        self.assertEqual(conduit.added_count, len(units))
+        self.assertEqual(conduit.deleted_count, 1)
+
     def test_delete(self):
         units = self.units(0, 10)
         conduit = CatalogerConduit(SOURCE_ID, EXPIRES)
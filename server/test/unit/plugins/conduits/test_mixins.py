@@ -678,15 +678,13 @@ class StatusMixinTests(unittest.TestCase):
     def setUp(self):
         manager_factory.initialize()
 
-    @mock.patch('pulp.server.db.model.TaskStatus.objects')
+    @mock.patch('pulp.plugins.conduits.mixins.TaskStatus._get_collection')
     @mock.patch('pulp.plugins.conduits.mixins.get_current_task_id')
-    def test_set_progress(self, mock_get_task_id, mock_task_status_objects):
+    def test_set_progress(self, mock_get_task_id, mock_get_collection):
         # Setup
         self.report_id = 'test-report'
         task_id = 'test-id'
         mock_get_task_id.return_value = task_id
-        test_task_documents = mock.Mock()
-        mock_task_status_objects.return_value = test_task_documents
         self.mixin = mixins.StatusMixin(self.report_id, mixins.ImporterConduitException)
 
         # Test
@@ -694,10 +692,49 @@ class StatusMixinTests(unittest.TestCase):
         self.mixin.set_progress(status)
 
         # Verify
-        mock_task_status_objects.assert_called_with(task_id=task_id)
-        self.assertEqual(1, test_task_documents.update_one.call_count)
-        test_task_documents.update_one.assert_called_with(
-            set__progress_report={'test-report': 'status'})
+        mock_get_collection.return_value.update.assert_called_once_with(
+            {'task_id': task_id}, {'$set': {'progress_report.test-report': 'status'}})
+
+    @mock.patch('pulp.plugins.conduits.mixins.TaskStatus._get_collection')
+    @mock.patch('pulp.plugins.conduits.mixins.get_current_task_id')
+    def test_set_progress_changes(self, mock_get_task_id, mock_get_collection):
+        mock_get_task_id.return_value = 'test-id'
+        self.mixin = mixins.StatusMixin('test-report', mixins.ImporterConduitException)
+        status = [{'state': 'running', 'num_success': 1, 'error_details': []},
+                  {'state': 'not_started', 'num_success': 0, 'error_details': []}]
+        self.mixin.set_progress(status)
+        update = mock_get_collection.return_value.update
+        update.reset_mock()
+
+        # changed in place, as steps do with their error details
+        status[0]['num_success'] = 2
+        status[0]['error_details'].append({'error': 'boom'})
+        self.mixin.set_progress(status)
+
+        update.assert_called_once_with(
+            {'task_id': 'test-id'},
+            {'$set': {'progress_report.test-report.0.num_success': 2,
+                      'progress_report.test-report.0.error_details': [{'error': 'boom'}]}})
+
+    @mock.patch('pulp.plugins.conduits.mixins.TaskStatus._get_collection')
+    @mock.patch('pulp.plugins.conduits.mixins.get_current_task_id')
+    def test_set_progress_unchanged(self, mock_get_task_id, mock_get_collection):
+        mock_get_task_id.return_value = 'test-id'
+        self.mixin = mixins.StatusMixin('test-report', mixins.ImporterConduitException)
+        self.mixin.set_progress({'state': 'running'})
+        self.mixin.set_progress({'state': 'running'})
+
+        self.assertEqual(1, mock_get_collection.return_value.update.call_count)
+
+    @mock.patch('pulp.plugins.conduits.mixins.TaskStatus._get_collection')
+    @mock.patch('pulp.plugins.conduits.mixins.get_current_task_id')
+    def test_set_progress_report_id_not_a_path(self, mock_get_task_id, mock_get_collection):
+        mock_get_task_id.return_value = 'test-id'
+        self.mixin = mixins.StatusMixin('test.report', mixins.ImporterConduitException)
+        self.mixin.set_progress('status')
+
+        mock_get_collection.return_value.update.assert_called_once_with(
+            {'task_id': 'test-id'}, {'$set': {'progress_report': {'test.report': 'status'}}})
 
     @mock.patch('pulp.server.db.model.TaskStatus.objects')
     @mock.patch('pulp.plugins.conduits.mixins.get_current_task_id')
@@ -713,7 +750,7 @@ class StatusMixinTests(unittest.TestCase):
         # Verify
         self.assertFalse(mock_task_status_objects.called)
 
-    @mock.patch('pulp.server.db.model.TaskStatus.objects')
+    @mock.patch('pulp.plugins.conduits.mixins.TaskStatus._get_collection')
     def test_set_progress_with_exception(self, mock_call):
         # Setup
         self.report_id = 'test-report'
@@ -723,6 +760,7 @@ class StatusMixinTests(unittest.TestCase):
 
         # Test
         self.assertRaises(mixins.ImporterConduitException, self.mixin.set_progress, 'foo')
+        self.assertEqual(self.mixin.progress_report, {})
 
 
 class PublishReportMixinTests(unittest.TestCase):
@@ -46,3 +46,22 @@ class ImportUnitConduitTests(base.PulpServerTests):
 
         # Verify the correct propagation to the mixin method
         mock_get.assert_called_once_with(self.dest_repo_id, criteria, ImporterConduitException)
+
+    @mock.patch('pulp.plugins.conduits.unit_import.repo_controller.associate_units')
+    @mock.patch('pulp.plugins.conduits.unit_import.model.Repository.objects')
+    def test_associate_units(self, mock_repo_objects, mock_associate):
+        units = [mock.Mock(), mock.Mock()]
+
+        result = self.conduit.associate_units(iter(units))
+
+        self.assertEqual(result, units)
+        mock_repo_objects.get_repo_or_missing_resource.assert_called_once_with(self.dest_repo_id)
+        mock_associate.assert_called_once_with(
+            mock_repo_objects.get_repo_or_missing_resource.return_value, units)
+
+    @mock.patch('pulp.plugins.conduits.unit_import.repo_controller.associate_units')
+    @mock.patch('pulp.plugins.conduits.unit_import.model.Repository.objects')
+    def test_associate_units_error(self, mock_repo_objects, mock_associate):
+        mock_associate.side_effect = Exception()
+
+        self.assertRaises(ImporterConduitException, self.conduit.associate_units, [mock.Mock()])
@@ -0,0 +1,109 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import mock
+
+from pulp.plugins.rsync import index
+from pulp.plugins.rsync.index import PublishIndex
+
+
+class TestRemovePublishIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.storage_dir = tempfile.mkdtemp(prefix='storage_')
+        patcher = mock.patch('pulp.plugins.rsync.index.pulp_config.get',
+                             return_value=self.storage_dir)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        shutil.rmtree(self.storage_dir)
+
+    def _publish(self, repo_id, distributor_id):
+        publish_index = PublishIndex(index.get_publish_index_path(repo_id, distributor_id),
+                                     'user@host:/remote')
+        publish_index.add('unit-1', ('foo.rpm', '../foo.rpm', 'rpm/foo.rpm'))
+        publish_index.commit()
+
+    def test_path(self):
+        self.assertEqual(index.get_publish_index_path('repo-1', 'dist-1'),
+                         os.path.join(self.storage_dir, 'rsync', 'repo-1', 'dist-1',
+                                      'publish_index'))
+
+    def test_remove(self):
+        self._publish('repo-1', 'dist-1')
+        self._publish('repo-1', 'dist-2')
+
+        index.remove_publish_index('repo-1', 'dist-1')
+
+        self.assertFalse(os.path.exists(os.path.join(self.storage_dir, 'rsync', 'repo-1',
+                                                     'dist-1')))
+        self.assertTrue(os.path.exists(index.get_publish_index_path('repo-1', 'dist-2')))
+
+        index.remove_publish_index('repo-1', 'dist-2')
+
+        self.assertFalse(os.path.exists(os.path.join(self.storage_dir, 'rsync', 'repo-1')))
+
+    def test_remove_missing(self):
+        index.remove_publish_index('repo-1', 'dist-1')
+
+        self.assertEqual(os.listdir(self.storage_dir), [])
+
+
+class TestPublishIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.working_dir = tempfile.mkdtemp(prefix='working_')
+        self.path = os.path.join(self.working_dir, 'index', 'publish_index')
+        self.entry = (u'pkgs/f\xf6o.rpm', '../../content/units/rpm/aa/foo.rpm', 'rpm/aa/foo.rpm')
+
+    def tearDown(self):
+        shutil.rmtree(self.working_dir)
+
+    def _publish(self, remote=u'user@host:/remote', reuse=True):
+        index = PublishIndex(self.path, remote, reuse=reuse)
+        index.add('unit-1', self.entry)
+        index.commit()
+
+    def test_is_published(self):
+        self._publish()
+
+        index = PublishIndex(self.path, u'user@host:/remote')
+        self.assertTrue(index.is_published('unit-1', self.entry))
+        self.assertFalse(index.is_published('unit-1', ('pkgs/bar.rpm',) + self.entry[1:]))
+        self.assertFalse(index.is_published('unit-2', self.entry))
+        index.close()
+
+    def test_not_committed(self):
+        index = PublishIndex(self.path, 'user@host:/remote')
+        index.add('unit-1', self.entry)
+        index.close()
+
+        index = PublishIndex(self.path, 'user@host:/remote')
+        self.assertFalse(index.is_published('unit-1', self.entry))
+        index.close()
+
+    def test_remote_changed(self):
+        self._publish()
+
+        index = PublishIndex(self.path, 'user@other:/remote')
+        self.assertFalse(index.is_published('unit-1', self.entry))
+        index.close()
+
+    def test_not_reused(self):
+        self._publish()
+
+        index = PublishIndex(self.path, 'user@host:/remote', reuse=False)
+        self.assertFalse(index.is_published('unit-1', self.entry))
+        index.close()
+
+    def test_other_format_discarded(self):
+        os.makedirs(os.path.dirname(self.path))
+        with open(self.path, 'w') as index_file:
+            index_file.write('not an index')
+
+        index = PublishIndex(self.path, 'user@host:/remote')
+        self.assertFalse(index.is_published('unit-1', self.entry))
+        index.close()
@@ -0,0 +1,107 @@
+import errno
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+import mock
+
+from pulp.plugins.rsync import publish
+
+
+def open_connection(args, **kwargs):
+    """
+    Stands in for ssh opening a shared connection, by creating its control socket.
+    """
+    control_path = [arg for arg in args if arg.startswith('ControlPath=')][0]
+    open(control_path.split('=', 1)[1], 'w').close()
+    return 0
+
+
+class TestControlPath(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp(prefix='tmp_')
+        patcher = mock.patch('pulp.plugins.rsync.publish.tempfile.tempdir', self.tmp_dir)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        publish._remote_pid = None
+
+    def tearDown(self):
+        publish._remote_pid = None
+        shutil.rmtree(self.tmp_dir)
+
+    @mock.patch('pulp.plugins.rsync.publish.subprocess.call')
+    def test_connections_opened_concurrently(self, mock_call):
+        """
+        Test that opening a connection to one host does not hold up the connections to others.
+        """
+        opening = threading.Event()
+        opened = threading.Event()
+        hosts = []
+
+        def call(args, **kwargs):
+            if args[-1] == 'slow-host':
+                opening.set()
+                opened.wait(5)
+            hosts.append(args[-1])
+            return open_connection(args)
+        mock_call.side_effect = call
+
+        slow = threading.Thread(target=publish.get_control_path, args=(['ssh'], 'slow-host'))
+        slow.start()
+        opening.wait(5)
+        try:
+            path = publish.get_control_path(['ssh'], 'host')
+        finally:
+            opened.set()
+            slow.join()
+
+        self.assertTrue(os.path.exists(path))
+        self.assertEqual(hosts, ['host', 'slow-host'])
+
+    @mock.patch('pulp.plugins.rsync.publish.subprocess.call')
+    def test_connection_opened_once(self, mock_call):
+        """
+        Test that an open connection is reused.
+        """
+        mock_call.side_effect = open_connection
+
+        path = publish.get_control_path(['ssh'], 'host')
+
+        self.assertEqual(publish.get_control_path(['ssh'], 'host'), path)
+        self.assertEqual(mock_call.call_count, 1)
+        self.assertTrue(os.path.basename(os.path.dirname(path)).startswith(
+            'pulp-ssh-%d-' % os.getpid()))
+
+    def test_remove_stale_control_dirs(self):
+        """
+        Test that only the control directories of processes that are not running are removed.
+        """
+        live = tempfile.mkdtemp(prefix='pulp-ssh-%d-' % os.getpid(), dir=self.tmp_dir)
+        other = tempfile.mkdtemp(prefix='other-', dir=self.tmp_dir)
+        stale = tempfile.mkdtemp(prefix='pulp-ssh-12345-', dir=self.tmp_dir)
+
+        def kill(pid, signal):
+            if pid != os.getpid():
+                raise OSError(errno.ESRCH, 'No such process')
+
+        with mock.patch('pulp.plugins.rsync.publish.os.kill', side_effect=kill):
+            publish._remove_stale_control_dirs()
+
+        self.assertTrue(os.path.exists(live))
+        self.assertTrue(os.path.exists(other))
+        self.assertFalse(os.path.exists(stale))
+
+    def test_remove_control_dir_forked(self):
+        """
+        Test that a forked process does not remove the control directory of its parent.
+        """
+        path = tempfile.mkdtemp(dir=self.tmp_dir)
+
+        publish._remove_control_dir(os.getpid() + 1, path)
+        self.assertTrue(os.path.exists(path))
+
+        publish._remove_control_dir(os.getpid(), path)
+        self.assertFalse(os.path.exists(path))
@@ -1,5 +1,8 @@
 from cStringIO import StringIO
 import contextlib
+import os
+import shutil
+import tempfile
 import unittest
 
 import mock
@@ -92,3 +95,133 @@ class TestMakeManifestForDir(unittest.TestCase):
         expected = 'b,greatchecksum,17'
 
         self.assertEqual(fake_file.getvalue().strip(), expected)
+
+    @mock.patch('os.path.isfile', return_value=True)
+    @mock.patch('os.path.getsize', return_value=17)
+    @mock.patch('os.listdir', spec_set=True)
+    @mock.patch('__builtin__.open', spec_set=True)
+    @mock.patch.object(manifest_writer, 'get_sha256_checksum', spec_set=True)
+    def test_known_checksums(self, mock_checksum, mock_open, mock_listdir, mock_getsize,
+                             mock_isfile):
+        mock_listdir.return_value = ['a', 'b']
+        mock_checksum.return_value = 'greatchecksum'
+        fake_file = StringIO()
+        mock_open.return_value = giveitback(fake_file)
+
+        manifest_writer.make_manifest_for_dir('/foo/', checksums={'a': 'knownchecksum'})
+
+        mock_checksum.assert_called_once_with('/foo/b')
+
+        expected = 'a,knownchecksum,17\r\nb,greatchecksum,17\r\n'
+
+        self.assertEqual(fake_file.getvalue(), expected)
+
+    @mock.patch('os.path.isfile', return_value=True)
+    @mock.patch('os.path.getsize', return_value=17)
+    @mock.patch('os.listdir', spec_set=True)
+    @mock.patch('__builtin__.open', spec_set=True)
+    @mock.patch.object(manifest_writer, 'get_sha256_checksum', spec_set=True)
+    def test_cache(self, mock_checksum, mock_open, mock_listdir, mock_getsize, mock_isfile):
+        mock_listdir.return_value = ['a', 'b']
+        fake_file = StringIO()
+        mock_open.return_value = giveitback(fake_file)
+        cache = mock.Mock()
+        cache.get_checksum.side_effect = lambda path: 'cached' + os.path.basename(path)
+
+        manifest_writer.make_manifest_for_dir('/foo/', cache=cache)
+
+        self.assertEqual(mock_checksum.call_count, 0)
+
+        expected = 'a,cacheda,17\r\nb,cachedb,17\r\n'
+
+        self.assertEqual(fake_file.getvalue(), expected)
+
+    @mock.patch('os.path.isfile', return_value=True)
+    @mock.patch('os.path.getsize', return_value=17)
+    @mock.patch('os.listdir', spec_set=True)
+    @mock.patch('__builtin__.open', spec_set=True)
+    @mock.patch.object(manifest_writer, 'get_sha256_checksum', spec_set=True)
+    @mock.patch.object(manifest_writer, 'ThreadPool', spec_set=True)
+    def test_single_worker(self, mock_pool, mock_checksum, mock_open, mock_listdir, mock_getsize,
+                           mock_isfile):
+        mock_listdir.return_value = ['a', 'b']
+        mock_checksum.return_value = 'greatchecksum'
+        fake_file = StringIO()
+        mock_open.return_value = giveitback(fake_file)
+
+        manifest_writer.make_manifest_for_dir('/foo/', workers=1)
+
+        self.assertEqual(mock_pool.call_count, 0)
+
+        expected = 'a,greatchecksum,17\r\nb,greatchecksum,17\r\n'
+
+        self.assertEqual(fake_file.getvalue(), expected)
+
+
+class TestChecksumCache(unittest.TestCase):
+    def setUp(self):
+        self.working_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.working_dir, 'a')
+        with open(self.path, 'w') as open_file:
+            open_file.write('hi there\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.working_dir)
+
+    @mock.patch.object(manifest_writer, 'get_sha256_checksum', spec_set=True)
+    def test_unchanged_file_not_read(self, mock_checksum):
+        mock_checksum.return_value = 'greatchecksum'
+        cache = manifest_writer.ChecksumCache()
+
+        self.assertEqual(cache.get_checksum(self.path), 'greatchecksum')
+        self.assertEqual(cache.get_checksum(self.path), 'greatchecksum')
+
+        mock_checksum.assert_called_once_with(self.path)
+
+    @mock.patch.object(manifest_writer, 'get_sha256_checksum', spec_set=True)
+    def test_changed_file_read(self, mock_checksum):
+        mock_checksum.side_effect = ['greatchecksum', 'newchecksum']
+        cache = manifest_writer.ChecksumCache()
+
+        cache.get_checksum(self.path)
+        with open(self.path, 'a') as open_file:
+            open_file.write('more\n')
+
+        self.assertEqual(cache.get_checksum(self.path), 'newchecksum')
+        self.assertEqual(mock_checksum.call_count, 2)
+
+    @mock.patch.object(manifest_writer, 'get_sha256_checksum', spec_set=True)
+    def test_size(self, mock_checksum):
+        mock_checksum.return_value = 'greatchecksum'
+        other_path = os.path.join(self.working_dir, 'b')
+        shutil.copy(self.path, other_path)
+        cache = manifest_writer.ChecksumCache(size=1)
+
+        cache.get_checksum(self.path)
+        cache.get_checksum(other_path)
+        cache.get_checksum(self.path)
+
+        self.assertEqual(mock_checksum.call_count, 3)
+
+    @mock.patch.object(manifest_writer, 'get_sha256_checksum', spec_set=True)
+    def test_clear(self, mock_checksum):
+        mock_checksum.return_value = 'greatchecksum'
+        cache = manifest_writer.ChecksumCache()
+
+        cache.get_checksum(self.path)
+        cache.clear()
+        cache.get_checksum(self.path)
+
+        self.assertEqual(mock_checksum.call_count, 2)
+
+    def test_manifest(self):
+        cache = manifest_writer.ChecksumCache()
+        for name in ('b', 'c'):
+            shutil.copy(self.path, os.path.join(self.working_dir, name))
+
+        manifest_writer.make_manifest_for_dir(self.working_dir, cache=cache)
+
+        with open(os.path.join(self.working_dir, 'PULP_MANIFEST')) as open_file:
+            rows = sorted(open_file.read().splitlines())
+        checksum = 'c641344867e9806fadfd219f25b62b97c94db0eed04a1d79e93676533cfb782b'
+        self.assertEqual(rows, ['%s,%s,9' % (name, checksum) for name in ('a', 'b', 'c')])
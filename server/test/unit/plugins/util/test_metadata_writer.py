@@ -5,6 +5,8 @@ import os
 import tempfile
 import shutil
 import sys
+from contextlib import closing
+from cStringIO import StringIO
 from time import sleep
 
 from mock import Mock, patch
@@ -14,6 +16,7 @@ from pulp.devel.unit.server.util import assert_validation_exception
 from pulp.plugins.util.metadata_writer import MetadataFileContext, JSONArrayFileContext
 from pulp.plugins.util.metadata_writer import XmlFileContext
 from pulp.plugins.util.metadata_writer import FastForwardXmlFileContext
+from pulp.plugins.util.metadata_writer import HashingFileWrapper
 from pulp.server.util import TYPE_SHA1
 
 
@@ -247,6 +250,45 @@ class MetadataWriterTests(unittest.TestCase):
                                                    expected_metadata_file_name)
         self.assertEquals(expected_metadata_file_path, context.metadata_file_path)
 
+    def test_finalize_checksum_streamed(self):
+        path = os.path.join(self.metadata_file_dir, 'test.xml.gz')
+        context = MetadataFileContext(path, TYPE_SHA1, calculate_open_checksum=True)
+
+        context.initialize()
+        context.metadata_file_handle.write('content')
+        context.finalize()
+
+        with open(context.metadata_file_path, 'rb') as file_handle:
+            expected_checksum = hashlib.sha1(file_handle.read()).hexdigest()
+        self.assertEqual(context.checksum, expected_checksum)
+        self.assertEqual(context.open_checksum, hashlib.sha1('content').hexdigest())
+        self.assertEqual(context.open_size, len('content'))
+        with closing(gzip.open(context.metadata_file_path)) as file_handle:
+            self.assertEqual(file_handle.read(), 'content')
+
+    def test_finalize_open_checksum_not_requested(self):
+        path = os.path.join(self.metadata_file_dir, 'test.xml.gz')
+        context = MetadataFileContext(path, TYPE_SHA1)
+
+        context.initialize()
+        context.metadata_file_handle.write('content')
+        context.finalize()
+
+        self.assertNotEqual(context.checksum, None)
+        self.assertEqual(context.open_checksum, None)
+        self.assertEqual(context.open_size, None)
+
+    def test_finalize_checksum_handle_replaced(self):
+        path = os.path.join(self.metadata_file_dir, 'test.xml')
+        with open(path, 'w') as file_handle:
+            file_handle.write('content')
+        context = MetadataFileContext(path, TYPE_SHA1)
+        context.metadata_file_handle = open(path, 'a')
+
+        context.finalize()
+
+        self.assertEqual(context.checksum, hashlib.sha1('content').hexdigest())
+
     @patch('pulp.plugins.util.metadata_writer._LOG.exception')
     def test_finalize_error_on_footer(self, mock_logger):
 
@@ -294,6 +336,29 @@ class MetadataWriterTests(unittest.TestCase):
         context.initialize.assert_called_once_with()
 
 
+class TestHashingFileWrapper(unittest.TestCase):
+
+    def test_write(self):
+        file_object = StringIO()
+        wrapper = HashingFileWrapper(file_object, TYPE_SHA1)
+
+        wrapper.write('con')
+        wrapper.write('tent')
+
+        self.assertEqual(file_object.getvalue(), 'content')
+        self.assertEqual(wrapper.size, 7)
+        self.assertEqual(wrapper.hexdigest(), hashlib.sha1('content').hexdigest())
+
+    def test_passes_through(self):
+        file_object = Mock(closed=False)
+        wrapper = HashingFileWrapper(file_object, TYPE_SHA1)
+
+        wrapper.close()
+
+        file_object.close.assert_called_once_with()
+        self.assertFalse(wrapper.closed)
+
+
 class TestJSONArrayFileContext(unittest.TestCase):
 
     def setUp(self):
@@ -402,7 +467,7 @@ class FastForwardXmlFileContextTests(unittest.TestCase):
         context._open_metadata_file_handle()
         self.assertTrue(context.fast_forward)
         self.assertEquals(context.existing_file,
-                          os.path.join(self.working_dir, 'original.test.xml'))
+                          os.path.join(self.working_dir, 'original.test.xml.gz'))
 
     @patch('pulp.plugins.util.metadata_writer.XMLGenerator')
     def test_open_metadata_file_handle_existing_checksum_file(self, mock_generator):
@@ -434,7 +499,7 @@ class FastForwardXmlFileContextTests(unittest.TestCase):
         context._open_metadata_file_handle()
         self.assertTrue(context.fast_forward)
         self.assertEquals(context.existing_file,
-                          os.path.join(self.working_dir, 'original.bb-test.xml'))
+                          os.path.join(self.working_dir, 'original.bb-test.xml.gz'))
 
     @patch('pulp.plugins.util.metadata_writer.BUFFER_SIZE', new=8)
     def test_write_file_header_fast_forward_small_buffer(self):
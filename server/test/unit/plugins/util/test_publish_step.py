@@ -9,7 +9,7 @@ import traceback
 import unittest
 
 import mongoengine
-from mock import Mock, patch, MagicMock
+from mock import call, Mock, patch, MagicMock
 from nectar.downloaders.local import LocalFileDownloader
 from nectar.request import DownloadRequest
 
@@ -199,6 +199,46 @@ class StepTests(PublisherBase):
         step.report_progress()
         self.assertFalse(step.status_conduit.report_progress.called)
 
+    @patch('pulp.plugins.util.publish_step.time')
+    @patch('pulp.plugins.util.publish_step.pulp_config')
+    def test_report_progress_throttled(self, mock_config, mock_time):
+        """
+        Test that unforced progress reports are written at most once per interval
+        """
+        mock_config.getfloat.return_value = 1.0
+        step = publish_step.Step('foo_step', status_conduit=Mock())
+        for current_time in (100.0, 100.5, 101.0):
+            mock_time.time.return_value = current_time
+            step.report_progress()
+        self.assertEquals(2, step.status_conduit.set_progress.call_count)
+        mock_config.getfloat.assert_called_with('tasks', 'progress_report_interval')
+
+    @patch('pulp.plugins.util.publish_step.time')
+    def test_report_progress_forced(self, mock_time):
+        """
+        Test that forced progress reports and state changes are always written
+        """
+        mock_time.time.return_value = 100.0
+        step = publish_step.Step('foo_step', status_conduit=Mock())
+        step.report_progress()
+        step.report_progress(force=True)
+        step.state = reporting_constants.STATE_RUNNING
+        step.report_progress()
+        self.assertEquals(3, step.status_conduit.set_progress.call_count)
+
+    @patch('pulp.plugins.util.publish_step.pulp_config')
+    def test_get_report_interval_backoff(self, mock_config):
+        """
+        Test that the report interval grows for long steps, up to the maximum
+        """
+        mock_config.getfloat.return_value = 1.0
+        step = publish_step.Step('foo_step')
+        step.first_report_time = 0
+        self.assertEquals(1.0, step.get_report_interval(10))
+        self.assertEquals(5.0, step.get_report_interval(100))
+        self.assertEquals(publish_step.PROGRESS_REPORT_MAX_INTERVAL,
+                          step.get_report_interval(100000))
+
 
 class TestStepProcessBlock(unittest.TestCase):
     def test_increments_progress(self):
@@ -677,8 +717,9 @@ class TestAtomicDirectoryPublishStep(unittest.TestCase):
         step = publish_step.AtomicDirectoryPublishStep('foo', 'bar', 'baz')
         self.assertEquals(step.step_id, reporting_constants.PUBLISH_STEP_DIRECTORY)
 
+    @patch('pulp.plugins.util.publish_step.content_cache.touch_publish_stamp')
     @patch('selinux.restorecon')
-    def test_process_main(self, restorecon):
+    def test_process_main(self, restorecon, touch_stamp):
         source_dir = os.path.join(self.working_directory, 'source')
         master_dir = os.path.join(self.working_directory, 'master')
         publish_dir = os.path.join(self.working_directory, 'publish', 'bar')
@@ -700,9 +741,11 @@ class TestAtomicDirectoryPublishStep(unittest.TestCase):
         target_file = os.path.join(publish_dir, 'foo', 'bar.html')
         self.assertEquals(True, os.path.exists(target_file))
         self.assertEquals(1, len(os.listdir(master_dir)))
+        touch_stamp.assert_called_once_with()
 
+    @patch('pulp.plugins.util.publish_step.content_cache.touch_publish_stamp')
     @patch('selinux.restorecon')
-    def test_process_main_multiple_targets(self, restorecon):
+    def test_process_main_multiple_targets(self, restorecon, touch_stamp):
         source_dir = os.path.join(self.working_directory, 'source')
         master_dir = os.path.join(self.working_directory, 'master')
         publish_dir = os.path.join(self.working_directory, 'publish', 'bar')
@@ -727,8 +770,9 @@ class TestAtomicDirectoryPublishStep(unittest.TestCase):
         self.assertEquals(True, os.path.exists(target_file))
         self.assertEquals(True, os.path.exists(target_qux))
 
+    @patch('pulp.plugins.util.publish_step.content_cache.touch_publish_stamp')
     @patch('selinux.restorecon')
-    def test_process_main_only_publish_directory_contents(self, restorecon):
+    def test_process_main_only_publish_directory_contents(self, restorecon, touch_stamp):
         source_dir = os.path.join(self.working_directory, 'source')
         master_dir = os.path.join(self.working_directory, 'master')
         publish_dir = os.path.join(self.working_directory, 'publish', 'bar')
@@ -1063,7 +1107,7 @@ class DownloadStepTests(unittest.TestCase):
         dlstep.cancel()
 
 
-@patch('pulp.plugins.util.publish_step.repo_controller.associate_single_unit')
+@patch('pulp.plugins.util.publish_step.repo_controller.associate_units')
 @patch('pulp.plugins.util.publish_step.units_controller.find_units')
 class TestGetLocalUnitsStep(unittest.TestCase):
 
@@ -1121,7 +1165,7 @@ class TestGetLocalUnitsStep(unittest.TestCase):
 
         self.step.process_main()
 
-        mock_paginate.assert_called_once_with(self.step.parent.available_units, 50)
+        mock_paginate.assert_called_once_with(self.step.parent.available_units, 1000)
 
     def test_saves_unit(self, mock_find_units, mock_associate):
         """
@@ -1133,7 +1177,7 @@ class TestGetLocalUnitsStep(unittest.TestCase):
         mock_find_units.return_value = [existing_demo]
 
         self.step.process_main()
-        mock_associate.assert_called_once_with('fake_repo', existing_demo)
+        mock_associate.assert_called_once_with('fake_repo', [existing_demo])
         mock_find_units.assert_called_once_with((demo, ))
 
         # Ensure that the unit was not marked for download
@@ -1155,7 +1199,7 @@ class TestGetLocalUnitsStep(unittest.TestCase):
         mock_find_units.assert_called_once_with((demo_1, demo_2))
 
         # the one that exists is associated
-        mock_associate.assert_called_once_with('fake_repo', existing_demo)
+        mock_associate.assert_called_once_with('fake_repo', [existing_demo])
         # the one that does not exist yet is added to the download list
         self.assertEqual(self.step.units_to_download, [demo_1])
 
@@ -1183,10 +1227,32 @@ class TestGetLocalUnitsStep(unittest.TestCase):
         # being ignored and the correct available_units is being used instead.
         mock_find_units.assert_called_once_with((demo_1, demo_2, demo_3))
         # the one that exists is associated
-        mock_associate.assert_called_once_with('fake_repo', existing_demo)
+        mock_associate.assert_called_once_with('fake_repo', [existing_demo])
         # the two that do not exist yet are added to the download list
         self.assertEqual(step.units_to_download, [demo_1, demo_3])
 
+    @patch('pulp.plugins.util.publish_step.repo_controller.ASSOCIATE_BATCH_SIZE', 2)
+    def test_associates_in_batches(self, mock_find_units, mock_associate):
+        """
+        Test that existing units are associated in batches that span the find_units pages
+        """
+        available = [self.DemoModel(key_field=str(i)) for i in range(5)]
+        existing = [self.DemoModel(key_field=str(i), id=str(i)) for i in range(5)]
+        fake_repo = Repository(id='fake-repo', repo_obj='fake_repo')
+        step = publish_step.GetLocalUnitsStep('fake_importer_type', repo=fake_repo,
+                                              unit_pagination_size=1, available_units=available)
+        step.parent = self.parent
+        step.conduit = MagicMock()
+        mock_find_units.side_effect = lambda group: [existing[int(group[0].key_field)]]
+
+        step.process_main()
+
+        self.assertEqual(mock_find_units.call_count, 5)
+        self.assertEqual(mock_associate.call_args_list,
+                         [call('fake_repo', existing[0:2]), call('fake_repo', existing[2:4]),
+                          call('fake_repo', existing[4:5])])
+        self.assertEqual(step.units_to_download, [])
+
     def test_empty_available_units(self, mock_find_units, mock_associate):
         """
         Assert that if the step is constructed with the an empty available_units passed in, the
@@ -1233,4 +1299,79 @@ class TestCreateManifestStep(unittest.TestCase):
 
         step.process_main()
 
-        mock_make_manifest.assert_called_once_with('/foo/')
+        mock_make_manifest.assert_called_once_with(
+            '/foo/', checksums=None, cache=publish_step.manifest_writer.checksum_cache)
+
+    @patch('pulp.plugins.util.manifest_writer.make_manifest_for_dir', spec_set=True)
+    def test_process_main_known_checksums(self, mock_make_manifest):
+        step = publish_step.CreatePulpManifestStep('/foo/', checksums={'a': 'abc'})
+
+        step.process_main()
+
+        mock_make_manifest.assert_called_once_with(
+            '/foo/', checksums={'a': 'abc'}, cache=publish_step.manifest_writer.checksum_cache)
+
+
+class TestRSyncFastForwardUnitPublishStep(unittest.TestCase):
+    def setUp(self):
+        self.working_dir = tempfile.mkdtemp(prefix='working_')
+        self.parent = Mock(content_unit_file_list=[], symlink_list=[])
+        self.parent.get_units_directory_dest_path.return_value = 'content/units'
+        config = PluginCallConfiguration(None, {'remote': {'root': '/remote'}})
+        self.step = publish_step.RSyncFastForwardUnitPublishStep(
+            'step', [], config=config, remote_repo_path='repo', published_unit_path=['pkgs'])
+        self.step.parent = self.parent
+        self.step.get_working_dir = Mock(return_value=self.working_dir)
+        self.unit = Mock(id='unit-1', type_id='rpm',
+                         storage_path='/var/lib/pulp/content/units/rpm/aa/foo.rpm')
+        self.unit.get_symlink_name.return_value = 'foo.rpm'
+        self.entry = ('pkgs/foo.rpm', '../../content/units/rpm/aa/foo.rpm', 'rpm/aa/foo.rpm')
+
+    def tearDown(self):
+        shutil.rmtree(self.working_dir)
+
+    @patch('pulp.plugins.util.publish_step.pulp_config.get', return_value='/var/lib/pulp')
+    def test_process_main(self, mock_get):
+        self.parent.publish_index.is_published.return_value = False
+
+        self.step.process_main(item=self.unit)
+
+        self.assertEqual(self.parent.content_unit_file_list, ['rpm/aa/foo.rpm'])
+        self.assertEqual(self.parent.symlink_list, ['pkgs/foo.rpm'])
+        link = os.path.join(self.working_dir, '.relative', 'pkgs', 'foo.rpm')
+        self.assertEqual(os.readlink(link), '../../content/units/rpm/aa/foo.rpm')
+        self.parent.publish_index.is_published.assert_called_once_with('unit-1', self.entry)
+        self.parent.publish_index.add.assert_called_once_with('unit-1', self.entry)
+
+    @patch('pulp.plugins.util.publish_step.pulp_config.get', return_value='/var/lib/pulp')
+    def test_process_main_published(self, mock_get):
+        self.parent.publish_index.is_published.return_value = True
+
+        self.step.process_main(item=self.unit)
+
+        self.assertEqual(self.parent.content_unit_file_list, [])
+        self.assertEqual(self.parent.symlink_list, [])
+        self.assertFalse(os.path.exists(os.path.join(self.working_dir, '.relative')))
+        self.assertEqual(self.parent.publish_index.add.call_count, 0)
+
+    @patch('pulp.plugins.util.publish_step.pulp_config.get', return_value='/var/lib/pulp')
+    def test_process_main_no_index(self, mock_get):
+        del self.parent.publish_index
+
+        self.step.process_main(item=self.unit)
+
+        self.assertEqual(self.parent.content_unit_file_list, ['rpm/aa/foo.rpm'])
+        self.assertEqual(self.parent.symlink_list, ['pkgs/foo.rpm'])
+
+    @patch('pulp.plugins.util.publish_step.pulp_config.get', return_value='/var/lib/pulp')
+    def test_link_dir_checked_once(self, mock_get):
+        os.makedirs(os.path.join(self.working_dir, '.relative', 'pkgs'))
+
+        with patch('os.path.exists', side_effect=os.path.exists) as mock_exists:
+            for name in ('foo.rpm', 'bar.rpm'):
+                self.step.make_link_unit(self.unit, name, self.working_dir, 'repo', '/remote',
+                                         ['pkgs'])
+
+        self.assertEqual(mock_exists.call_count, 1)
+        self.assertEqual(sorted(os.listdir(os.path.join(self.working_dir, '.relative', 'pkgs'))),
+                         ['bar.rpm', 'foo.rpm'])
@@ -88,3 +88,20 @@ class InitializeWorkerTestCase(unittest.TestCase):
 
         self.assertEquals(2, len(mock_rm_lock().save.mock_calls))
         mock_time.sleep.assert_called_once_with(PULP_PROCESS_HEARTBEAT_INTERVAL)
+
+
+class DrainEventNotificationsTestCase(unittest.TestCase):
+    """
+    This class contains tests for draining event notifications in worker processes.
+    """
+    @mock.patch('pulp.server.async.app.dispatch.drain')
+    def test_task_postrun(self, mock_drain):
+        app.drain_event_notifications(sender=mock.Mock(), task_id='1')
+
+        mock_drain.assert_called_once_with()
+
+    @mock.patch('pulp.server.async.app.dispatch.drain')
+    def test_worker_process_shutdown(self, mock_drain):
+        app.drain_event_notifications_at_exit(sender=None, pid=1, exitcode=0)
+
+        mock_drain.assert_called_once_with(app.dispatch.EXIT_TIMEOUT)
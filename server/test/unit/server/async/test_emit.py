@@ -1,9 +1,11 @@
 """
 This module contains tests for the pulp.server.async.emit module.
 """
+import os
 import unittest
 
 import mock
+from pulp.server.async import emit
 from pulp.server.async.emit import send
 
 
@@ -38,42 +40,166 @@ class TestEmit(unittest.TestCase):
         mock_logger.warn.assert_called_once_with('unable to convert document to JSON; '
                                                  'event message not sent')
 
+    @mock.patch('pulp.server.async.emit.get_publisher')
     @mock.patch('pulp.server.async.emit.config')
-    @mock.patch('pulp.server.async.emit.Connection')
-    @mock.patch('pulp.server.async.emit.Producer')
-    def test_send_other_exception(self, mock_producer, mock_conn, mock_config):
+    def test_send(self, mock_config, mock_get_publisher):
         """
-        Raise an exception if we get an Exception when sending a message
+        Test a successful send
         """
         doc = mock.Mock()
         doc.to_json.return_value = '{"a": "B"}'
         mock_config.getboolean.return_value = True
-        mock_config.get.return_value = "amqp://some.amqp.url/"
-        mock_producer.side_effect = Exception("boom!")
 
-        self.assertRaises(Exception, send, doc)
+        send(doc, routing_key='tasks.1')
+
+        mock_get_publisher.return_value.put.assert_called_once_with('{"a": "B"}',
+                                                                    routing_key='tasks.1')
+
+
+class TestGetPublisher(unittest.TestCase):
+
+    def setUp(self):
+        emit._publisher = None
+
+    def tearDown(self):
+        emit._publisher = None
 
+    @mock.patch('pulp.server.async.emit.atexit')
+    @mock.patch('pulp.server.async.emit.Publisher')
     @mock.patch('pulp.server.async.emit.config')
+    def test_reused(self, mock_config, mock_publisher, mock_atexit):
+        """
+        Test that a process reuses its publisher
+        """
+        mock_config.get.return_value = 'amqp://some.amqp.url/'
+        mock_publisher.return_value.pid = os.getpid()
+
+        publisher = emit.get_publisher()
+
+        self.assertEqual(emit.get_publisher(), publisher)
+        mock_publisher.assert_called_once_with('amqp://some.amqp.url/')
+        mock_atexit.register.assert_called_once_with(publisher.close)
+
+    @mock.patch('pulp.server.async.emit.atexit')
+    @mock.patch('pulp.server.async.emit.Publisher')
+    @mock.patch('pulp.server.async.emit.config')
+    def test_forked(self, mock_config, mock_publisher, mock_atexit):
+        """
+        Test that a forked process gets its own publisher
+        """
+        emit._publisher = mock.Mock(pid=os.getpid() + 1)
+
+        publisher = emit.get_publisher()
+
+        self.assertEqual(publisher, mock_publisher.return_value)
+
+
+class TestPublisher(unittest.TestCase):
+
+    def setUp(self):
+        self.publisher = emit.Publisher('amqp://some.amqp.url/', size=2)
+        self.publisher._start = mock.Mock()
+
+    def test_put(self):
+        """
+        Test that messages are queued in order and the publishing thread is started
+        """
+        self.assertTrue(self.publisher.put('a', routing_key='tasks.1'))
+        self.assertTrue(self.publisher.put('b'))
+
+        self.assertEqual(self.publisher._outbox.values(), [('a', 'tasks.1'), ('b', None)])
+        self.assertEqual(self.publisher._start.call_count, 2)
+
+    def test_put_coalesced(self):
+        """
+        Test that a queued message is superseded by a newer one with the same routing key
+        """
+        self.publisher.put('a', routing_key='tasks.1')
+        self.publisher.put('b', routing_key='tasks.2')
+        self.publisher.put('c', routing_key='tasks.1')
+
+        self.assertEqual(self.publisher._outbox.values(), [('c', 'tasks.1'), ('b', 'tasks.2')])
+        self.assertEqual(self.publisher.coalesced, 1)
+        self.assertEqual(self.publisher.dropped, 0)
+
+    def test_put_full(self):
+        """
+        Test that messages are dropped when the outbox is full
+        """
+        self.publisher.put('a')
+        self.publisher.put('b', routing_key='tasks.1')
+
+        self.assertFalse(self.publisher.put('c'))
+        # superseding a queued message still works
+        self.assertTrue(self.publisher.put('d', routing_key='tasks.1'))
+
+        self.assertEqual(self.publisher._outbox.values(), [('a', None), ('d', 'tasks.1')])
+        self.assertEqual(self.publisher.stats(),
+                         {'sent': 0, 'dropped': 1, 'coalesced': 1, 'queued': 2})
+
     @mock.patch('pulp.server.async.emit.Producer')
     @mock.patch('pulp.server.async.emit.Connection')
-    @mock.patch('pulp.server.async.emit.Exchange')
-    def test_send(self, mock_exchange, mock_conn, mock_producer, mock_config):
+    def test_send_reuses_connection(self, mock_conn, mock_producer):
         """
-        Test a successful send
+        Test that the connection and producer are reused and the exchange declared once
         """
-        doc = mock.Mock()
-        doc.to_json.return_value = '{"a": "B"}'
-        mock_config.getboolean.return_value = True
-        mock_config.get.return_value = "amqp://some.amqp.url/"
+        self.publisher._send('a', 'tasks.1')
+        self.publisher._send('b', 'tasks.2')
 
-        mock_exchange_instance = mock.Mock()
-        mock_exchange.return_value = mock_exchange_instance
+        mock_conn.assert_called_once_with('amqp://some.amqp.url/')
+        producer = mock_producer.return_value
+        producer.maybe_declare.assert_called_once_with(self.publisher.exchange)
+        self.assertEqual(producer.publish.call_args_list, [
+            mock.call('a', exchange=self.publisher.exchange, routing_key='tasks.1'),
+            mock.call('b', exchange=self.publisher.exchange, routing_key='tasks.2')])
+        self.assertEqual(self.publisher.sent, 2)
 
-        mock_producer_instance = mock.Mock()
-        mock_producer.return_value = mock_producer_instance
+    @mock.patch('pulp.server.async.emit.Producer')
+    @mock.patch('pulp.server.async.emit.Connection')
+    def test_send_stale_connection(self, mock_conn, mock_producer):
+        """
+        Test that a failure on an existing connection is retried on a new connection
+        """
+        self.publisher._send('a', 'tasks.1')
+        mock_producer.return_value.publish.side_effect = [Exception('closed'), None]
 
-        send(doc)
+        self.publisher._send('b', 'tasks.2')
+
+        self.assertEqual(mock_conn.call_count, 2)
+        mock_conn.return_value.release.assert_called_once_with()
+        self.assertEqual(self.publisher.sent, 2)
+        self.assertEqual(self.publisher.dropped, 0)
+
+    @mock.patch('pulp.server.async.emit._logger')
+    @mock.patch('pulp.server.async.emit.Producer')
+    @mock.patch('pulp.server.async.emit.Connection')
+    def test_send_failed(self, mock_conn, mock_producer, mock_logger):
+        """
+        Test that a message that cannot be published on a new connection is dropped
+        """
+        mock_producer.side_effect = Exception('boom!')
+
+        self.publisher._send('a', 'tasks.1')
+
+        self.assertEqual(mock_conn.call_count, 1)
+        self.assertEqual(self.publisher.sent, 0)
+        self.assertEqual(self.publisher.dropped, 1)
+        self.assertTrue(mock_logger.exception.called)
+        self.assertEqual(self.publisher._producer, None)
+
+    @mock.patch('pulp.server.async.emit.Producer')
+    @mock.patch('pulp.server.async.emit.Connection')
+    def test_thread(self, mock_conn, mock_producer):
+        """
+        Test that queued messages are published by the thread and close() waits for them
+        """
+        publisher = emit.Publisher('amqp://some.amqp.url/')
+        publisher.put('a', routing_key='tasks.1')
+        publisher.put('b', routing_key='tasks.2')
+
+        publisher.close()
 
-        mock_producer_instance.maybe_declare.assert_called_once_with(mock_exchange_instance)
-        mock_producer_instance.publish.assert_called_once_with('{"a": "B"}', routing_key=None,
-                                                               exchange=mock_exchange_instance)
+        self.assertEqual(mock_producer.return_value.publish.call_count, 2)
+        self.assertEqual(publisher.stats(),
+                         {'sent': 2, 'dropped': 0, 'coalesced': 0, 'queued': 0})
+        mock_conn.return_value.release.assert_called_once_with()
@@ -2,7 +2,10 @@
 This module contains tests for the pulp.server.async.tasks module.
 """
 from datetime import datetime
+import os
+from Queue import Empty
 import signal
+import time
 import unittest
 import uuid
 
@@ -22,7 +25,7 @@ from pulp.devel.unit.util import compare_dict
 from pulp.server.async import app, tasks
 from pulp.server.db.model import Worker, TaskStatus
 from pulp.server.db.reaper import queue_reap_expired_documents
-from pulp.server.exceptions import NoWorkers, PulpException, PulpCodedException
+from pulp.server.exceptions import PulpException, PulpCodedException
 from pulp.server.maintenance.monthly import queue_monthly_maintenance
 
 celery_version = celery.__version__
@@ -38,14 +41,11 @@ WORKER_3 = 'worker-3'
 class TestQueueReservedTask(ResourceReservationTests):
 
     def setUp(self):
-        self.patch_a = mock.patch('pulp.server.async.tasks.get_worker_for_reservation')
-        self.mock_get_worker_for_reservation = self.patch_a.start()
-
-        self.patch_b = mock.patch('pulp.server.async.tasks._get_unreserved_worker')
-        self.mock_get_unreserved_worker = self.patch_b.start()
-
-        self.patch_c = mock.patch('pulp.server.async.tasks.time', autospec=True)
-        self.mock_time = self.patch_c.start()
+        self.patch_a = mock.patch('pulp.server.async.tasks.get_dispatcher')
+        self.mock_get_dispatcher = self.patch_a.start()
+        self.mock_dispatch = self.mock_get_dispatcher.return_value.dispatch
+        self.mock_dispatch.return_value = Worker(name='worker1',
+                                                 last_heartbeat=datetime.utcnow())
 
         self.patch_d = mock.patch('pulp.server.async.tasks.ReservedResource', autospec=True)
         self.mock_reserved_resource = self.patch_d.start()
@@ -61,16 +61,12 @@ class TestQueueReservedTask(ResourceReservationTests):
 
     def tearDown(self):
         self.patch_a.stop()
-        self.patch_b.stop()
-        self.patch_c.stop()
         self.patch_d.stop()
         self.patch_e.stop()
         self.patch_f.stop()
         super(TestQueueReservedTask, self).tearDown()
 
     def test_creates_and_saves_reserved_resource(self):
-        self.mock_get_worker_for_reservation.return_value = Worker(
-            name='worker1', last_heartbeat=datetime.utcnow())
         tasks._queue_reserved_task('task_name', 'my_task_id', 'my_resource_id', [1, 2], {'a': 2})
         self.mock_reserved_resource.assert_called_once_with(task_id='my_task_id',
                                                             worker_name='worker1',
@@ -78,8 +74,6 @@ class TestQueueReservedTask(ResourceReservationTests):
         self.mock_reserved_resource.return_value.save.assert_called_once_with()
 
     def test_dispatches_inner_task(self):
-        self.mock_get_worker_for_reservation.return_value = Worker(
-            name='worker1', last_heartbeat=datetime.utcnow())
         tasks._queue_reserved_task('task_name', 'my_task_id', 'my_resource_id', [1, 2], {'a': 2})
         apply_async = self.mock_celery.tasks['task_name'].apply_async
         if is_celery_4:
@@ -92,8 +86,6 @@ class TestQueueReservedTask(ResourceReservationTests):
                                                 exchange='C.dq')
 
     def test_dispatches__release_resource(self):
-        self.mock_get_worker_for_reservation.return_value = Worker(
-            name='worker1', last_heartbeat=datetime.utcnow())
         tasks._queue_reserved_task('task_name', 'my_task_id', 'my_resource_id', [1, 2], {'a': 2})
         if is_celery_4:
             self.mock__release_resource.apply_async.assert_called_once_with(('my_task_id',),
@@ -104,44 +96,9 @@ class TestQueueReservedTask(ResourceReservationTests):
                                                                             routing_key='worker1',
                                                                             exchange='C.dq')
 
-    def test_get_worker_for_reservation_breaks_out_of_loop(self):
-        self.mock_get_worker_for_reservation.return_value = Worker(
-            name='worker1', last_heartbeat=datetime.utcnow())
-        tasks._queue_reserved_task('task_name', 'my_task_id', 'my_resource_id', [1, 2], {'a': 2})
-        self.assertTrue(not self.mock_get_unreserved_worker.called)
-        self.assertTrue(not self.mock_time.sleep.called)
-
-    def test_get_unreserved_worker_breaks_out_of_loop(self):
-        self.mock_get_worker_for_reservation.side_effect = NoWorkers()
-        self.mock_get_unreserved_worker.return_value = Worker(name='worker1',
-                                                              last_heartbeat=datetime.utcnow())
+    def test_dispatches_to_worker_for_reservation(self):
         tasks._queue_reserved_task('task_name', 'my_task_id', 'my_resource_id', [1, 2], {'a': 2})
-        self.assertTrue(not self.mock_time.sleep.called)
-
-    def test_loops_and_sleeps_waiting_for_available_worker(self):
-        self.mock_get_worker_for_reservation.side_effect = NoWorkers()
-        self.mock_get_unreserved_worker.side_effect = NoWorkers()
-
-        class BreakOutException(Exception):
-            pass
-
-        def side_effect(*args):
-            def second_call(*args):
-                raise BreakOutException()
-            self.mock_time.sleep.side_effect = second_call
-            return None
-
-        self.mock_time.sleep.side_effect = side_effect
-
-        try:
-            tasks._queue_reserved_task('task_name', 'my_task_id', 'my_resource_id', [1, 2],
-                                       {'a': 2})
-        except BreakOutException:
-            pass
-        else:
-            self.fail('_queue_reserved_task should have raised a BreakOutException')
-
-        self.mock_time.sleep.assert_has_calls([mock.call(0.25), mock.call(0.25)])
+        self.mock_dispatch.assert_called_once_with('my_task_id', 'my_resource_id')
 
 
 class TestDeleteWorker(ResourceReservationTests):
@@ -168,6 +125,9 @@ class TestDeleteWorker(ResourceReservationTests):
         self.patch_i = mock.patch('pulp.server.async.tasks.constants', autospec=True)
         self.mock_constants = self.patch_i.start()
 
+        self.patch_j = mock.patch('pulp.server.async.tasks._notify_release', autospec=True)
+        self.mock_notify_release = self.patch_j.start()
+
         super(TestDeleteWorker, self).setUp()
 
     def tearDown(self):
@@ -178,6 +138,7 @@ class TestDeleteWorker(ResourceReservationTests):
         self.patch_f.stop()
         self.patch_g.stop()
         self.patch_i.stop()
+        self.patch_j.stop()
         super(TestDeleteWorker, self).tearDown()
 
     def test_normal_shutdown_true_logs_correctly(self):
@@ -198,6 +159,10 @@ class TestDeleteWorker(ResourceReservationTests):
         remove = self.mock_reserved_resource.objects.return_value.delete
         remove.assert_called_once_with()
 
+    def test_notifies_release(self):
+        tasks._delete_worker('worker1')
+        self.mock_notify_release.assert_called_once_with(worker_name='worker1')
+
     @mock.patch('pulp.server.async.tasks.Worker.objects')
     def test_removes_the_worker(self, mock_worker_objects):
         mock_document = mock.Mock()
@@ -244,6 +209,9 @@ class TestReleaseResource(unittest.TestCase):
         self.patch_d = mock.patch('pulp.server.async.tasks.constants', autospec=True)
         self.mock_constants = self.patch_d.start()
 
+        self.patch_e = mock.patch('pulp.server.async.tasks._notify_release', autospec=True)
+        self.mock_notify_release = self.patch_e.start()
+
         super(TestReleaseResource, self).setUp()
 
     def tearDown(self):
@@ -251,8 +219,13 @@ class TestReleaseResource(unittest.TestCase):
         self.patch_b.stop()
         self.patch_c.stop()
         self.patch_d.stop()
+        self.patch_e.stop()
         super(TestReleaseResource, self).tearDown()
 
+    def test_notifies_release(self):
+        tasks._release_resource('task1')
+        self.mock_notify_release.assert_called_once_with(task_id='task1')
+
     def test_deletes_reserved_resource(self):
         mock_task_id = mock.Mock()
         tasks._release_resource(mock_task_id)
@@ -987,87 +960,219 @@ class TestScheduledTasks(unittest.TestCase):
         mock_monthly_apply_async.assert_called_once_with(tags=[action_tag('monthly')])
 
 
-class TestGetWorkerForReservation(ResourceReservationTests):
+class TestReservationDispatcher(unittest.TestCase):
 
-    @mock.patch('pulp.server.async.tasks.Worker.objects')
-    @mock.patch('pulp.server.async.tasks.ReservedResource')
-    def test_existing_reservation_correctly_found(self, mock_reserved_resource,
-                                                  mock_worker_objects):
-        get_objects = mock_reserved_resource.objects
-        tasks.get_worker_for_reservation('resource1')
-        get_objects.assert_called_once_with(resource_id='resource1')
-        get_objects.return_value.first.assert_called_once_with()
+    def setUp(self):
+        self.dispatcher = tasks.ReservationDispatcher()
+        self.dispatcher._connect = mock.Mock()
+        self.dispatcher._queue = mock.Mock()
+        self.dispatcher._queue.get_nowait.side_effect = Empty()
+        self.worker_1 = Worker(name=WORKER_1, last_heartbeat=datetime.utcnow())
+        self.worker_2 = Worker(name=WORKER_2, last_heartbeat=datetime.utcnow())
 
-    @mock.patch('pulp.server.async.tasks.Worker.objects')
     @mock.patch('pulp.server.async.tasks.ReservedResource')
-    def test_correct_worker_returned(self, mock_reserved_resource, mock_worker_objects):
-        find_one = mock_reserved_resource.objects.return_value.first
-        find_one.return_value = {'worker_name': 'worker1'}
-        mock_worker_objects.return_value.first.return_value = find_one.return_value
-        result = tasks.get_worker_for_reservation('resource1')
-        self.assertTrue(result is find_one.return_value)
+    @mock.patch('pulp.server.async.tasks.Worker.objects')
+    def test_refresh(self, mock_worker_objects, mock_reserved_resource):
+        mock_worker_objects.get_online.return_value = [
+            self.worker_1, self.worker_2,
+            Worker(name=RESOURCE_MANAGER_WORKER_NAME + '@host', last_heartbeat=datetime.utcnow())]
+        mock_reserved_resource.objects.all.return_value = [
+            {'task_id': 'a', 'worker_name': WORKER_1, 'resource_id': 'repo1'},
+            {'task_id': 'b', 'worker_name': WORKER_1, 'resource_id': 'repo1'}]
 
-    @mock.patch('pulp.server.async.tasks.ReservedResource')
-    def test_no_workers_raised_if_no_reservations(self, mock_reserved_resource):
-        find_one = mock_reserved_resource.objects.return_value.first
-        find_one.return_value = False
-        try:
-            tasks.get_worker_for_reservation('resource1')
-        except NoWorkers:
-            pass
-        else:
-            self.fail("NoWorkers() Exception should have been raised.")
+        self.dispatcher.refresh()
 
+        self.assertEqual(self.dispatcher.workers, {WORKER_1: self.worker_1,
+                                                   WORKER_2: self.worker_2})
+        self.assertEqual(self.dispatcher.loads, {WORKER_1: 2})
+        self.assertEqual(self.dispatcher.resources, {'repo1': [WORKER_1, 2]})
+        self.assertTrue(self.dispatcher.refreshed is not None)
 
-class TestGetUnreservedWorker(ResourceReservationTests):
+    def test_find_worker_for_reservation(self):
+        self.dispatcher.workers = {WORKER_1: self.worker_1, WORKER_2: self.worker_2}
+        self.dispatcher.reserve('a', WORKER_2, 'repo1')
 
-    @mock.patch('pulp.server.async.tasks.ReservedResource')
-    def test_reserved_resources_queried_correctly(self, mock_reserved_resource):
-        find = mock_reserved_resource.objects.all
-        find.return_value = [{'worker_name': 'a'}, {'worker_name': 'b'}]
-        try:
-            tasks._get_unreserved_worker()
-        except NoWorkers:
-            pass
-        else:
-            self.fail("NoWorkers() Exception should have been raised.")
-        find.assert_called_once_with()
+        self.assertTrue(self.dispatcher.find_worker('repo1') is self.worker_2)
 
-    @mock.patch('pulp.server.async.tasks.Worker.objects')
-    @mock.patch('pulp.server.async.tasks.ReservedResource')
-    def test_worker_returned_when_one_worker_is_not_reserved(self, mock_reserved_resource,
-                                                             mock_worker_objects):
-        get_online = mock_worker_objects.get_online
-        get_online.return_value = [{'name': 'a'}, {'name': 'b'}]
-        mock_reserved_resource.objects.all.return_value = [{'worker_name': 'a'}]
-        result = tasks._get_unreserved_worker()
-        self.assertEqual(result, {'name': 'b'})
+    def test_find_worker_reservation_held_by_offline_worker(self):
+        self.dispatcher.workers = {WORKER_1: self.worker_1}
+        self.dispatcher.reserve('a', WORKER_2, 'repo1')
 
-    @mock.patch('pulp.server.async.tasks.Worker.objects')
-    @mock.patch('pulp.server.async.tasks.ReservedResource')
-    def test_no_workers_raised_when_all_workers_reserved(self, mock_reserved_resource, mock_worker):
-        mock_worker.objects.return_value = [{'name': 'a'}, {'name': 'b'}]
-        find = mock_reserved_resource.objects
-        find.return_value = [{'worker_name': 'a'}, {'worker_name': 'b'}]
-        try:
-            tasks._get_unreserved_worker()
-        except NoWorkers:
-            pass
-        else:
-            self.fail("NoWorkers() Exception should have been raised.")
+        self.assertTrue(self.dispatcher.find_worker('repo1') is None)
 
-    @mock.patch('pulp.server.async.tasks.Worker.objects')
-    @mock.patch('pulp.server.async.tasks.ReservedResource')
-    def test_no_workers_raised_when_there_are_no_workers(self, mock_reserved_resource, mock_worker):
-        mock_worker.objects.return_value = []
-        find = mock_reserved_resource.objects
-        find.return_value = [{'worker_name': 'a'}, {'worker_name': 'b'}]
-        try:
-            tasks._get_unreserved_worker()
-        except NoWorkers:
-            pass
-        else:
-            self.fail("NoWorkers() Exception should have been raised.")
+    def test_find_worker_least_assigned_unreserved(self):
+        worker_3 = Worker(name=WORKER_3, last_heartbeat=datetime.utcnow())
+        self.dispatcher.workers = {WORKER_1: self.worker_1, WORKER_2: self.worker_2,
+                                   WORKER_3: worker_3}
+        self.dispatcher.reserve('a', WORKER_1, 'repo1')
+        self.dispatcher.assigned = {WORKER_1: 0, WORKER_2: 5, WORKER_3: 2}
+
+        self.assertTrue(self.dispatcher.find_worker('repo2') is worker_3)
+
+    def test_find_worker_all_reserved(self):
+        self.dispatcher.workers = {WORKER_1: self.worker_1}
+        self.dispatcher.reserve('a', WORKER_1, 'repo1')
+
+        self.assertTrue(self.dispatcher.find_worker('repo2') is None)
+
+    def test_release(self):
+        self.dispatcher.reserve('a', WORKER_1, 'repo1')
+        self.dispatcher.reserve('b', WORKER_1, 'repo1')
+
+        self.dispatcher.release('a')
+        self.assertEqual(self.dispatcher.resources, {'repo1': [WORKER_1, 1]})
+        self.dispatcher.release('b')
+        self.dispatcher.release('unknown')
+
+        self.assertEqual(self.dispatcher.loads, {})
+        self.assertEqual(self.dispatcher.resources, {})
+        self.assertEqual(self.dispatcher.reservations, {})
+
+    def test_remove_worker(self):
+        self.dispatcher.workers = {WORKER_1: self.worker_1, WORKER_2: self.worker_2}
+        self.dispatcher.reserve('a', WORKER_1, 'repo1')
+        self.dispatcher.reserve('b', WORKER_2, 'repo2')
+
+        self.dispatcher.remove_worker(WORKER_1)
+
+        self.assertEqual(self.dispatcher.workers, {WORKER_2: self.worker_2})
+        self.assertEqual(self.dispatcher.resources, {'repo2': [WORKER_2, 1]})
+
+    def test_dispatch(self):
+        self.dispatcher.refreshed = time.time()
+        self.dispatcher.workers = {WORKER_1: self.worker_1}
+
+        worker = self.dispatcher.dispatch('a', 'repo1')
+
+        self.assertTrue(worker is self.worker_1)
+        self.assertEqual(self.dispatcher.reservations, {'a': (WORKER_1, 'repo1')})
+        self.assertEqual(self.dispatcher.assigned, {WORKER_1: 1})
+        self.assertEqual(self.dispatcher.dispatched, 1)
+        self.assertEqual(self.dispatcher.waited, 0)
+
+    def test_dispatch_waits_for_release(self):
+        self.dispatcher.refreshed = time.time()
+        self.dispatcher.workers = {WORKER_1: self.worker_1}
+        self.dispatcher.reserve('a', WORKER_1, 'repo1')
+        self.dispatcher._queue.get.return_value = mock.Mock(payload={'task_id': 'a'})
+
+        worker = self.dispatcher.dispatch('b', 'repo2')
+
+        self.assertTrue(worker is self.worker_1)
+        self.assertEqual(self.dispatcher.reservations, {'b': (WORKER_1, 'repo2')})
+        self.assertEqual(self.dispatcher.waited, 1)
+        self.assertEqual(self.dispatcher.waiting, 0)
+
+    def test_dispatch_refreshes_stale_index(self):
+        self.dispatcher.refresh = mock.Mock()
+
+        def refresh():
+            self.dispatcher.workers = {WORKER_1: self.worker_1}
+            self.dispatcher.refreshed = time.time()
+        self.dispatcher.refresh.side_effect = refresh
+
+        self.dispatcher.dispatch('a', 'repo1')
+
+        self.dispatcher.refresh.assert_called_once_with()
+
+    @mock.patch('pulp.server.async.tasks.time')
+    def test_wait_without_connection(self, mock_time):
+        self.dispatcher._queue = None
+        self.dispatcher.refreshed = 1
+
+        self.dispatcher.wait(3)
+
+        mock_time.sleep.assert_called_once_with(tasks.FALLBACK_POLL_INTERVAL)
+        self.assertTrue(self.dispatcher.refreshed is None)
+
+    def test_poll_worker_notification(self):
+        self.dispatcher.workers = {WORKER_1: self.worker_1}
+        self.dispatcher.reserve('a', WORKER_1, 'repo1')
+        self.dispatcher._queue.get_nowait.side_effect = [
+            mock.Mock(payload={'worker_name': WORKER_1}), Empty()]
+
+        self.dispatcher.poll()
+
+        self.assertEqual(self.dispatcher.workers, {})
+        self.assertEqual(self.dispatcher.reservations, {})
+
+    def test_stats(self):
+        self.dispatcher.queue_depth = mock.Mock(return_value=4)
+        self.dispatcher.workers = {WORKER_1: self.worker_1}
+        self.dispatcher.dispatched = 2
+        self.dispatcher.latency_total = 3.0
+
+        stats = self.dispatcher.stats()
+
+        self.assertEqual(stats['queue_depth'], 4)
+        self.assertEqual(stats['workers'], 1)
+        self.assertEqual(stats['latency_average'], 1.5)
+
+    def test_queue_depth(self):
+        self.dispatcher._connection = mock.Mock()
+        self.dispatcher._connection.default_channel.queue_declare.return_value = ('q', 3, 1)
+
+        self.assertEqual(self.dispatcher.queue_depth(), 3)
+        self.dispatcher._connection.default_channel.queue_declare.assert_called_once_with(
+            queue=tasks.RESOURCE_MANAGER_QUEUE, passive=True)
+
+    def test_queue_depth_not_connected(self):
+        self.assertTrue(self.dispatcher.queue_depth() is None)
+        self.assertEqual(self.dispatcher._connect.call_count, 0)
+
+    @mock.patch('pulp.server.async.tasks._logger')
+    def test_dispatch_logs_stats(self, mock_logger):
+        self.dispatcher.refreshed = time.time()
+        self.dispatcher.workers = {WORKER_1: self.worker_1, WORKER_2: self.worker_2}
+
+        self.dispatcher.dispatch('a', 'repo1')
+        self.assertEqual(mock_logger.info.call_count, 0)
+
+        self.dispatcher.stats_logged -= tasks.DISPATCH_STATS_INTERVAL
+        self.dispatcher.dispatch('b', 'repo2')
+
+        self.assertEqual(mock_logger.info.call_count, 1)
+        message = mock_logger.info.call_args[0][0]
+        self.assertTrue('2 dispatched' in message)
+        self.assertTrue('queue depth None' in message)
+        self.assertTrue(time.time() - self.dispatcher.stats_logged < 1)
+
+
+class TestGetDispatcher(unittest.TestCase):
+
+    def tearDown(self):
+        tasks._dispatcher = None
+
+    def test_reused(self):
+        tasks._dispatcher = None
+        dispatcher = tasks.get_dispatcher()
+        self.assertTrue(tasks.get_dispatcher() is dispatcher)
+
+    def test_forked(self):
+        tasks._dispatcher = mock.Mock(pid=os.getpid() + 1)
+        self.assertTrue(isinstance(tasks.get_dispatcher(), tasks.ReservationDispatcher))
+
+
+class TestNotifyRelease(unittest.TestCase):
+
+    @mock.patch('pulp.server.async.tasks.celery')
+    def test_publish(self, mock_celery):
+        producer = mock_celery.producer_or_acquire.return_value.__enter__.return_value
+
+        tasks._notify_release(task_id='a')
+
+        producer.publish.assert_called_once_with(
+            {'task_id': 'a'}, exchange=tasks.RELEASE_EXCHANGE, routing_key=tasks.RELEASE_QUEUE,
+            declare=[tasks.RELEASE_EXCHANGE], serializer='json', retry=False)
+
+    @mock.patch('pulp.server.async.tasks.celery')
+    def test_publish_failure_ignored(self, mock_celery):
+        mock_celery.producer_or_acquire.side_effect = IOError()
+
+        tasks._notify_release(task_id='a')
+
+
+class TestIsWorker(unittest.TestCase):
 
     def test_is_worker(self):
         self.assertTrue(tasks._is_worker("a_worker@some.hostname"))
@@ -0,0 +1,132 @@
+import unittest
+
+import mock
+
+from pulp.server.auth import cache
+
+
+class TestCachedPrincipal(unittest.TestCase):
+
+    def test_authorizations(self):
+        """
+        Test that authorization decisions are remembered per resource and operation.
+        """
+        principal = cache.CachedPrincipal('user', 100)
+        self.assertTrue(principal.is_authorized('/v2/repos/', 1) is None)
+
+        principal.set_authorized('/v2/repos/', 1, False)
+        principal.set_authorized('/v2/repos/', 2, True)
+
+        self.assertEqual(principal.is_authorized('/v2/repos/', 1), False)
+        self.assertEqual(principal.is_authorized('/v2/repos/', 2), True)
+
+    @mock.patch('pulp.server.auth.cache.AUTHORIZATION_CACHE_SIZE', 2)
+    def test_authorizations_bounded(self):
+        """
+        Test that the decisions are discarded when there are too many of them.
+        """
+        principal = cache.CachedPrincipal('user', 100)
+        principal.set_authorized('/a/', 1, True)
+        principal.set_authorized('/b/', 1, True)
+        principal.set_authorized('/c/', 1, True)
+
+        self.assertTrue(principal.is_authorized('/a/', 1) is None)
+        self.assertEqual(principal.is_authorized('/c/', 1), True)
+
+
+class TestPrincipalCache(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = cache.PrincipalCache(ttl=30, size=2)
+
+    def test_add_get(self):
+        """
+        Test that a principal is found only with the credentials it was added with.
+        """
+        added = self.cache.add('user', 'password', 'user', self.cache.generation)
+
+        self.assertTrue(self.cache.get('user', 'password') is added)
+        self.assertEqual(added.login, 'user')
+        self.assertTrue(self.cache.get('user', 'other') is None)
+        self.assertTrue(self.cache.get('other', 'password') is None)
+        self.assertTrue(self.cache.get('userpass', 'word') is None)
+
+    def test_unicode(self):
+        """
+        Test that unicode credentials are found with their utf-8 encoding.
+        """
+        self.cache.add(u'us\xe9r', u'p\xe4ss', 'user', self.cache.generation)
+
+        self.assertTrue(self.cache.get(u'us\xe9r'.encode('utf-8'), u'p\xe4ss') is not None)
+
+    @mock.patch('pulp.server.auth.cache.time.time')
+    def test_expired(self, mock_time):
+        """
+        Test that a principal is discarded once its ttl has passed.
+        """
+        mock_time.return_value = 1000
+        self.cache.add('user', 'password', 'user', self.cache.generation)
+
+        mock_time.return_value = 1029
+        self.assertTrue(self.cache.get('user', 'password') is not None)
+        mock_time.return_value = 1030
+        self.assertTrue(self.cache.get('user', 'password') is None)
+
+    def test_size(self):
+        """
+        Test that the least recently added principals are discarded.
+        """
+        for login in ('a', 'b', 'c'):
+            self.cache.add(login, 'password', login, self.cache.generation)
+
+        self.assertTrue(self.cache.get('a', 'password') is None)
+        self.assertTrue(self.cache.get('b', 'password') is not None)
+        self.assertTrue(self.cache.get('c', 'password') is not None)
+
+    def test_add_after_invalidate(self):
+        """
+        Test that a principal checked before the cache was invalidated is not cached.
+        """
+        generation = self.cache.generation
+        self.cache.invalidate('other')
+        self.cache.add('user', 'password', 'user', generation)
+
+        self.assertTrue(self.cache.get('user', 'password') is None)
+
+    def test_invalidate(self):
+        """
+        Test that only the principals of the given user are discarded.
+        """
+        self.cache.add('a', 'password', 'a', self.cache.generation)
+        self.cache.add('b', 'password', 'b', self.cache.generation)
+
+        self.cache.invalidate('a')
+
+        self.assertTrue(self.cache.get('a', 'password') is None)
+        self.assertTrue(self.cache.get('b', 'password') is not None)
+
+        self.cache.invalidate()
+
+        self.assertTrue(self.cache.get('b', 'password') is None)
+
+    def test_invalidate_authorizations(self):
+        """
+        Test that the principals are kept without their authorization decisions.
+        """
+        a = self.cache.add('a', 'password', 'a', self.cache.generation)
+        b = self.cache.add('b', 'password', 'b', self.cache.generation)
+        a.user = mock.Mock()
+        a.set_authorized('/', 1, True)
+        b.set_authorized('/', 1, True)
+
+        self.cache.invalidate_authorizations('a')
+
+        principal = self.cache.get('a', 'password')
+        self.assertTrue(principal.is_authorized('/', 1) is None)
+        self.assertTrue(principal.user is a.user)
+        self.assertEqual(principal.expires, a.expires)
+        self.assertTrue(self.cache.get('b', 'password') is b)
+
+        self.cache.invalidate_authorizations()
+
+        self.assertTrue(self.cache.get('b', 'password').is_authorized('/', 1) is None)
@@ -0,0 +1,156 @@
+import unittest
+
+import mock
+
+from pulp.server.auth import authorization, permission_index
+from pulp.server.constants import SUPER_USER_ROLE
+
+
+PERMISSIONS = [
+    {'resource': '/', 'users': [{'username': 'root', 'permissions': [authorization.READ]}]},
+    {'resource': '/v2/consumers/', 'users': [
+        {'username': 'alice', 'permissions': [authorization.READ]}]},
+    {'resource': '/v2/consumers/c1/', 'users': [
+        {'username': 'bob', 'permissions': [authorization.READ, authorization.UPDATE]}]},
+    {'resource': '/v2/repositories', 'users': [
+        {'username': 'bob', 'permissions': [authorization.READ]}]},
+]
+
+USERS = [
+    {'login': 'admin', 'roles': [SUPER_USER_ROLE]},
+    {'login': 'alice', 'roles': []},
+    {'login': 'bob'},
+    {'login': 'root', 'roles': ['other']},
+]
+
+
+@mock.patch('pulp.server.auth.permission_index.principal_cache')
+@mock.patch('pulp.server.auth.permission_index.model.User._get_collection')
+@mock.patch('pulp.server.auth.permission_index.Permission.get_collection')
+@mock.patch('pulp.server.auth.permission_index.PermissionVersion.get_collection')
+class TestPermissionIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.index = permission_index.PermissionIndex(refresh_interval=30)
+
+    def _collections(self, version, permissions, users, principals):
+        version.return_value.find_one.return_value = {'version': 1}
+        permissions.return_value.find.return_value = PERMISSIONS
+        users.return_value.find.return_value = USERS
+
+    def test_is_authorized(self, version, permissions, users, principals):
+        """
+        Test that operations granted on a resource or its parents are authorized.
+        """
+        self._collections(version, permissions, users)
+        is_authorized = self.index.is_authorized
+
+        self.assertTrue(is_authorized('/v2/consumers/c1/profiles/', 'bob', authorization.UPDATE))
+        self.assertFalse(is_authorized('/v2/consumers/c1/', 'bob', authorization.DELETE))
+        self.assertFalse(is_authorized('/v2/consumers/c2/', 'bob', authorization.READ))
+        self.assertTrue(is_authorized('/v2/consumers/c2/', 'alice', authorization.READ))
+        self.assertFalse(is_authorized('/v2/', 'alice', authorization.READ))
+        self.assertTrue(is_authorized('/v2/tasks/', 'root', authorization.READ))
+        self.assertFalse(is_authorized('/v2/tasks/', 'root', authorization.CREATE))
+        self.assertTrue(is_authorized('/v2/tasks/', 'admin', authorization.DELETE))
+
+    def test_resource_without_slashes(self, version, permissions, users, principals):
+        """
+        Test that permissions on resources without a trailing slash are not used.
+        """
+        self._collections(version, permissions, users)
+
+        self.assertFalse(self.index.is_authorized('/v2/repositories/', 'bob', authorization.READ))
+
+    def test_unknown_user(self, version, permissions, users, principals):
+        """
+        Test that None is returned for a user that is not in the index.
+        """
+        self._collections(version, permissions, users)
+
+        self.assertTrue(self.index.is_authorized('/', 'carol', authorization.READ) is None)
+
+    def test_refresh_interval(self, version, permissions, users, principals):
+        """
+        Test that the version is only read once per refresh interval.
+        """
+        self._collections(version, permissions, users)
+
+        self.index.is_authorized('/', 'bob', authorization.READ)
+        self.index.is_authorized('/', 'bob', authorization.READ)
+
+        self.assertEqual(version.return_value.find_one.call_count, 1)
+        self.assertEqual(permissions.return_value.find.call_count, 1)
+        self.assertEqual(self.index.version, 1)
+
+    def test_refresh_incremental(self, version, permissions, users, principals):
+        """
+        Test that only the resources and users named in the changes are loaded.
+        """
+        self._collections(version, permissions, users)
+        self.index.refresh()
+
+        version.return_value.find_one.return_value = {'version': 3, 'changes': [
+            {'version': 1, 'resources': ['/'], 'logins': []},
+            {'version': 2, 'resources': ['/v2/consumers/c1/'], 'logins': []},
+            {'version': 3, 'resources': ['/v2/consumers/'], 'logins': ['alice']}]}
+        permissions.return_value.find.return_value = [
+            {'resource': '/v2/consumers/c1/', 'users': [
+                {'username': 'alice', 'permissions': [authorization.READ]}]}]
+        users.return_value.find.return_value = [{'login': 'alice', 'roles': [SUPER_USER_ROLE]}]
+        self.index.refresh(force=True)
+
+        permissions.return_value.find.assert_called_with(
+            {'resource': {'$in': mock.ANY}})
+        self.assertEqual(sorted(permissions.return_value.find.call_args[0][0]['resource']['$in']),
+                         ['/v2/consumers/', '/v2/consumers/c1/'])
+        users.return_value.find.assert_called_with({'login': {'$in': ['alice']}},
+                                                   {'login': 1, 'roles': 1})
+        self.assertEqual(self.index.version, 3)
+        self.assertFalse(self.index.is_authorized('/v2/consumers/c1/', 'bob', authorization.READ))
+        self.assertTrue(self.index.is_authorized('/v2/', 'alice', authorization.DELETE))
+        self.assertTrue(self.index.is_authorized('/v2/', 'root', authorization.READ))
+        # the principals of changed users are discarded, and the decisions of all users
+        principals.invalidate.assert_called_with('alice')
+        principals.invalidate_authorizations.assert_called_once_with()
+
+    def test_refresh_rebuild(self, version, permissions, users, principals):
+        """
+        Test that the index is rebuilt when changes are missing.
+        """
+        self._collections(version, permissions, users)
+        self.index.refresh()
+
+        version.return_value.find_one.return_value = {'version': 5, 'changes': [
+            {'version': 4, 'resources': ['/'], 'logins': []},
+            {'version': 5, 'resources': ['/'], 'logins': []}]}
+        permissions.return_value.find.return_value = []
+        users.return_value.find.return_value = [{'login': 'bob'}]
+        self.index.refresh(force=True)
+
+        permissions.return_value.find.assert_called_with({})
+        self.assertEqual(self.index.version, 5)
+        principals.invalidate.assert_called_with()
+        self.assertTrue(self.index.is_authorized('/', 'admin', authorization.READ) is None)
+        self.assertFalse(self.index.is_authorized('/v2/consumers/c1/', 'bob', authorization.READ))
+
+    def test_changed(self, version, permissions, users, principals):
+        """
+        Test that a change is recorded with the next version and applied to the index.
+        """
+        self._collections(version, permissions, users)
+        collection = version.return_value
+        collection.find_and_modify.return_value = {'version': 1}
+
+        self.index.changed(resources=['/v2/consumers/'], logins=['alice'])
+
+        collection.find_and_modify.assert_called_once_with(
+            query={'_id': permission_index.VERSION_ID}, update={'$inc': {'version': 1}},
+            upsert=True, new=True)
+        collection.update.assert_called_once_with(
+            {'_id': permission_index.VERSION_ID},
+            {'$push': {'changes': {
+                '$each': [{'version': 1, 'resources': ['/v2/consumers/'], 'logins': ['alice']}],
+                '$sort': {'version': 1},
+                '$slice': -permission_index.PERMISSION_CHANGES_KEPT}}})
+        self.assertEqual(self.index.version, 1)
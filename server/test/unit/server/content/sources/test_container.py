@@ -18,7 +18,8 @@ from mock import Mock, patch, call
 
 from pulp.server.content.sources.container import (
     ContentContainer, NectarListener, Item, RequestQueue, Batch, Threaded, Serial,
-    DownloadReport, NectarFeed, Tracker, DownloadFailed, DOWNLOAD_SUCCEEDED)
+    DownloadReport, NectarFeed, Tracker, DownloadFailed, DOWNLOAD_SUCCEEDED,
+    SourceResolver, resolve)
 from pulp.server.content.sources.model import ContentSource
 
 
@@ -313,10 +314,12 @@ class TestSerial(TestCase):
         self.assertEqual(batch.requests, requests)
         self.assertEqual(batch.listener, listener)
 
+    @patch(MODULE + '.managers.content_catalog_manager')
     @patch(MODULE + '.Started')
     @patch(MODULE + '.Succeeded')
     @patch(MODULE + '.Serial._download')
-    def test_download_succeeded(self, download, succeeded, started):
+    def test_download_succeeded(self, download, succeeded, started, fake_manager):
+        fake_manager.return_value.find_all.side_effect = lambda units: [[] for u in units]
         primary = Mock()
         sources = [
             Mock(id=1, url='u1'),
@@ -341,7 +344,7 @@ class TestSerial(TestCase):
         self.assertEqual(started.call_args_list, [call(r) for r in requests])
         self.assertEqual(started.return_value.call_count, len(requests))
         for r in requests:
-            r.find_sources.assert_called_once_with(primary, sources)
+            r.find_sources.assert_called_once_with(primary, sources, entries=[])
         self.assertEqual(
             download.call_args_list,
             [call(r.sources[0][1], r.destination, r.sources[0][0]) for r in requests])
@@ -356,10 +359,12 @@ class TestSerial(TestCase):
         self.assertEqual(details.total_succeeded, 1)
         self.assertEqual(details.total_failed, 0)
 
+    @patch(MODULE + '.managers.content_catalog_manager')
     @patch(MODULE + '.Started')
     @patch(MODULE + '.Failed')
     @patch(MODULE + '.Serial._download')
-    def test_download_failed(self, download, failed, started):
+    def test_download_failed(self, download, failed, started, fake_manager):
+        fake_manager.return_value.find_all.side_effect = lambda units: [[] for u in units]
         download.side_effect = DownloadFailed()
         primary = Mock()
         sources = [
@@ -385,7 +390,7 @@ class TestSerial(TestCase):
         self.assertEqual(started.call_args_list, [call(r) for r in requests])
         self.assertEqual(started.return_value.call_count, len(requests))
         for r in requests:
-            r.find_sources.assert_called_once_with(primary, sources)
+            r.find_sources.assert_called_once_with(primary, sources, entries=[])
         download_calls = []
         for r in requests:
             for s, u in r.sources:
@@ -559,9 +564,11 @@ class TestThreaded(TestCase):
         self.assertEqual(batch.queues[fake_source.id], fake_queue())
         self.assertEqual(queue, fake_queue())
 
+    @patch(MODULE + '.managers.content_catalog_manager')
     @patch(MODULE + '.Tracker.wait')
     @patch(MODULE + '.Threaded.dispatch')
-    def test_download(self, fake_dispatch, fake_wait):
+    def test_download(self, fake_dispatch, fake_wait, fake_manager):
+        fake_manager.return_value.find_all.side_effect = lambda units: [[] for u in units]
         primary = Mock()
         sources = [Mock(), Mock()]
         container = Mock(sources=sources)
@@ -586,7 +593,7 @@ class TestThreaded(TestCase):
         # validation
         # initial dispatch
         for request in requests:
-            request.find_sources.assert_called_with(primary, sources)
+            request.find_sources.assert_called_with(primary, sources, entries=[])
         calls = fake_dispatch.call_args_list
         self.assertEqual(len(calls), len(requests))
         for i, request in enumerate(requests):
@@ -606,9 +613,10 @@ class TestThreaded(TestCase):
         self.assertEqual(report.downloads['source-2'].total_succeeded, 200)
         self.assertEqual(report.downloads['source-2'].total_failed, 10)
 
+    @patch(MODULE + '.managers.content_catalog_manager')
     @patch(MODULE + '.Tracker.wait')
     @patch(MODULE + '.Threaded.dispatch')
-    def test_download_nothing(self, fake_dispatch, fake_wait):
+    def test_download_nothing(self, fake_dispatch, fake_wait, fake_manager):
         primary = Mock()
         container = Mock(sources=[])
         requests = []
@@ -626,9 +634,11 @@ class TestThreaded(TestCase):
         self.assertEqual(len(report.downloads), 0)
         fake_wait.assert_called_once_with(0)
 
+    @patch(MODULE + '.managers.content_catalog_manager')
     @patch(MODULE + '.Tracker.wait')
     @patch(MODULE + '.Threaded.dispatch')
-    def test_download_with_exception(self, fake_dispatch, fake_wait):
+    def test_download_with_exception(self, fake_dispatch, fake_wait, fake_manager):
+        fake_manager.return_value.find_all.side_effect = lambda units: [[] for u in units]
         primary = Mock()
         fake_dispatch.side_effect = ValueError()
         sources = [Mock(), Mock()]
@@ -648,6 +658,104 @@ class TestThreaded(TestCase):
             queue.join.assert_called_with()
 
 
+class TestResolve(TestCase):
+
+    @patch(MODULE + '.managers.content_catalog_manager')
+    def test_resolve(self, fake_manager):
+        primary = Mock()
+        sources = {'s-1': Mock()}
+        requests = [Mock(type_id='t', unit_key=n) for n in range(5)]
+        found = [['e-%d' % n] for n in range(5)]
+        fake_manager.return_value.find_all.side_effect = [found[0:2], found[2:4], found[4:]]
+
+        # test
+        resolved = list(resolve(primary, sources, iter(requests), batch_size=2))
+
+        # validation
+        self.assertEqual(resolved, requests)
+        self.assertEqual(
+            fake_manager.return_value.find_all.call_args_list,
+            [call([('t', 0), ('t', 1)]), call([('t', 2), ('t', 3)]), call([('t', 4)])])
+        for request, entries in zip(requests, found):
+            request.find_sources.assert_called_once_with(primary, sources, entries=entries)
+
+    @patch(MODULE + '.managers.content_catalog_manager')
+    def test_resolve_no_sources(self, fake_manager):
+        primary = Mock()
+        requests = [Mock(), Mock()]
+
+        # test
+        resolved = list(resolve(primary, {}, requests))
+
+        # validation
+        self.assertEqual(resolved, requests)
+        self.assertFalse(fake_manager.return_value.find_all.called)
+        for request in requests:
+            request.find_sources.assert_called_once_with(primary, {}, entries=[])
+
+
+class TestSourceResolver(TestCase):
+
+    def test_init(self):
+        batch = Mock()
+
+        # test
+        resolver = SourceResolver(batch)
+
+        # validation
+        self.assertEqual(resolver.batch, batch)
+        self.assertEqual(resolver.getName(), 'resolver')
+        self.assertTrue(resolver.isDaemon())
+        self.assertEqual(resolver.error, None)
+        self.assertFalse(resolver._halted)
+
+    @patch(MODULE + '.resolve')
+    def test_run(self, fake_resolve):
+        batch = Mock()
+        requests = [Mock(), Mock()]
+        fake_resolve.return_value = iter(requests)
+
+        # test
+        resolver = SourceResolver(batch)
+        resolver.run()
+
+        # validation
+        fake_resolve.assert_called_once_with(batch.primary, batch.sources, batch.requests)
+        self.assertEqual(list(resolver), requests)
+
+    @patch(MODULE + '.resolve')
+    def test_run_exception(self, fake_resolve):
+        requests = [Mock()]
+
+        def resolved(*unused):
+            for request in requests:
+                yield request
+            raise ValueError()
+
+        fake_resolve.side_effect = resolved
+
+        # test
+        resolver = SourceResolver(Mock())
+        resolver.run()
+
+        # validation
+        iterator = iter(resolver)
+        self.assertEqual(iterator.next(), requests[0])
+        self.assertRaises(ValueError, iterator.next)
+
+    @patch(MODULE + '.resolve')
+    def test_run_halted(self, fake_resolve):
+        fake_resolve.return_value = iter([Mock(), Mock()])
+
+        # test
+        resolver = SourceResolver(Mock())
+        resolver.halt()
+        resolver.run()
+
+        # validation
+        self.assertTrue(resolver.queue.empty())
+
+
 class TestRequestQueue(TestCase):
 
     @patch(MODULE + '.Thread', new=Mock())
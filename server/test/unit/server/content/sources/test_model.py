@@ -2,13 +2,13 @@ import os
 import sys
 from unittest import TestCase
 
-from mock import patch, Mock
+from mock import patch, Mock, MagicMock
 
 from pulp.common.constants import PRIMARY_ID
 from pulp.plugins.conduits.cataloger import CatalogerConduit
 from pulp.server.content.sources import constants
 from pulp.server.content.sources.model import Request, PrimarySource, ContentSource, RefreshReport
-from pulp.server.content.sources.model import DownloadDetails, DownloadReport
+from pulp.server.content.sources.model import DownloadDetails, DownloadReport, REFRESH_BATCH_SIZE
 from pulp.server.content.sources.descriptor import DEFAULT
 
 
@@ -147,6 +147,27 @@ class TestRequest(TestCase):
         self.assertEqual(request.sources[4][0].id, primary.id)
         self.assertEqual(request.sources[4][1], url)
 
+    @patch('pulp.server.content.sources.container.managers.content_catalog_manager')
+    def test_find_sources_with_entries(self, fake_manager):
+        url = 'http://redhat.com/repository'
+        primary = PrimarySource(None)
+        alternatives = dict([(s, ContentSource(s, d)) for s, d in DESCRIPTOR])
+
+        # test
+
+        request = Request('test_1', 1, url, '/tmp/123')
+        request.find_sources(primary, alternatives, entries=CATALOG[0:1])
+
+        # validation
+
+        self.assertFalse(fake_manager.called)
+        request.sources = list(request.sources)
+        self.assertEqual(len(request.sources), 2)
+        self.assertEqual(request.sources[0][0].id, 's-1')
+        self.assertEqual(request.sources[0][1], CATALOG[0][constants.URL])
+        self.assertEqual(request.sources[1][0].id, primary.id)
+        self.assertEqual(request.sources[1][1], url)
+
     def test_next_source(self):
         sources = [1, 2, 3]
         request = Request('', {}, '', '')
@@ -395,14 +416,17 @@ class TestContentSource(TestCase):
         self.assertEqual(downloader, fake_downloader)
         self.assertEqual(downloader.session, session)
 
+    @patch('pulp.server.content.sources.model.uuid4')
+    @patch('pulp.server.content.sources.model.managers.content_catalog_manager')
     @patch('pulp.server.content.sources.model.ContentSource.urls')
-    def test_refresh(self, fake_urls):
+    def test_refresh(self, fake_urls, fake_manager, fake_uuid):
         url = 'http://xyz.com'
         urls = ['url-1', 'url-2']
         fake_urls.__get__ = Mock(return_value=urls)
+        fake_uuid.return_value = 'gen-1'
 
-        conduit = Mock()
-        cataloger = Mock()
+        conduit = MagicMock()
+        cataloger = Mock(full_refresh=True)
         cataloger.refresh.side_effect = FakeRefresh()
 
         source = ContentSource('s-1', {constants.BASE_URL: url})
@@ -433,14 +457,43 @@ class TestContentSource(TestCase):
             deleted += 1
             n += 1
 
+        source.get_conduit.assert_called_once_with(
+            batch_size=REFRESH_BATCH_SIZE, generation='gen-1')
+        self.assertEqual(conduit.__exit__.call_count, len(urls))
+        fake_manager.return_value.retire.assert_called_once_with(source.id, 'gen-1')
+
+    @patch('pulp.server.content.sources.model.managers.content_catalog_manager')
     @patch('pulp.server.content.sources.model.ContentSource.urls')
-    def test_refresh_raised(self, fake_urls):
+    def test_refresh_incremental(self, fake_urls, fake_manager):
+        fake_urls.__get__ = Mock(return_value=['url-1', 'url-2'])
+
+        conduit = MagicMock()
+        cataloger = Mock(full_refresh=False)
+        cataloger.refresh.side_effect = FakeRefresh()
+
+        source = ContentSource('s-1', {constants.BASE_URL: 'http://xyz.com'})
+        source.get_conduit = Mock(return_value=conduit)
+        source.get_cataloger = Mock(return_value=cataloger)
+
+        # test
+
+        report = source.refresh()
+
+        # validation
+
+        self.assertTrue(all(r.succeeded for r in report))
+        # the entries added by earlier refreshes are kept
+        self.assertFalse(fake_manager.return_value.retire.called)
+
+    @patch('pulp.server.content.sources.model.managers.content_catalog_manager')
+    @patch('pulp.server.content.sources.model.ContentSource.urls')
+    def test_refresh_raised(self, fake_urls, fake_manager):
         url = 'http://xyz.com'
         urls = ['url-1', 'url-2']
         fake_urls.__get__ = Mock(return_value=urls)
 
-        conduit = Mock()
-        cataloger = Mock()
+        conduit = MagicMock()
+        cataloger = Mock(full_refresh=True)
         cataloger.refresh.side_effect = ValueError('just failed')
 
         source = ContentSource('s-1', {constants.BASE_URL: url})
@@ -467,6 +520,11 @@ class TestContentSource(TestCase):
             self.assertEqual(report[n].deleted_count, 0)
             n += 1
 
+        # entries buffered before the failure are flushed
+        self.assertEqual(conduit.__exit__.call_count, len(urls))
+        # the old generation is kept
+        self.assertFalse(fake_manager.return_value.retire.called)
+
     def test_dict(self):
         descriptor = {'A': 1, 'B': 2}
 
@@ -0,0 +1,77 @@
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+from mock import patch
+
+from pulp.server.content.web import cache
+
+
+class TestExpiringCache(TestCase):
+
+    @patch('pulp.server.content.web.cache.time.time')
+    def test_expired(self, mock_time):
+        mock_time.return_value = 1000
+        expiring = cache.ExpiringCache(10)
+        expiring.add('a', 1, 30)
+
+        mock_time.return_value = 1029
+        self.assertEqual(expiring.get('a'), 1)
+        mock_time.return_value = 1030
+        self.assertTrue(expiring.get('a') is None)
+
+    def test_size(self):
+        expiring = cache.ExpiringCache(2)
+        expiring.add('a', 1, 30)
+        expiring.add('b', 2, 30)
+        expiring.get('a')
+        expiring.add('c', 3, 30)
+
+        self.assertEqual(expiring.get('a'), 1)
+        self.assertTrue(expiring.get('b') is None)
+        self.assertEqual(expiring.get('c'), 3)
+
+    def test_clear(self):
+        expiring = cache.ExpiringCache(2)
+        expiring.add('a', 1, 30)
+        expiring.clear()
+
+        self.assertTrue(expiring.get('a') is None)
+
+
+class TestPublishStamp(TestCase):
+
+    def setUp(self):
+        self.storage_dir = tempfile.mkdtemp()
+        patcher = patch('pulp.server.content.web.cache.pulp_conf')
+        pulp_conf = patcher.start()
+        pulp_conf.get.return_value = self.storage_dir
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        shutil.rmtree(self.storage_dir)
+
+    def test_path(self):
+        self.assertEqual(cache.publish_stamp_path(),
+                         os.path.join(self.storage_dir, cache.PUBLISH_STAMP_FILENAME))
+
+    def test_missing(self):
+        self.assertTrue(cache.publish_stamp() is None)
+
+    def test_touch(self):
+        cache.touch_publish_stamp()
+        created = cache.publish_stamp()
+        os.utime(cache.publish_stamp_path(), (0, 0))
+        cache.touch_publish_stamp()
+
+        self.assertTrue(created is not None)
+        self.assertTrue(cache.publish_stamp() > 0)
+
+    @patch('pulp.server.content.web.cache._logger')
+    def test_touch_failed(self, logger):
+        shutil.rmtree(self.storage_dir)
+        cache.touch_publish_stamp()
+        os.makedirs(self.storage_dir)
+
+        self.assertEqual(logger.warning.call_count, 1)
@@ -2,9 +2,9 @@ import os
 
 from unittest import TestCase
 
-from mock import Mock, patch
+from mock import Mock, call, patch
 
-from pulp.server.content.web import views as content_views
+from pulp.server.content.web import cache, views as content_views
 from pulp.server.content.web.views import ContentView
 
 
@@ -44,6 +44,12 @@ class TestContentView(TestCase):
             'wsgi.run_once': False,
         }
 
+        # resolved paths, redirects and keys are kept for the life of the process
+        cache.path_cache.clear()
+        cache.redirect_cache.clear()
+        content_views._keys.clear()
+        content_views._safe_serving_paths.clear()
+
     @patch(MODULE + '.pulp_conf')
     @patch(MODULE + '.Key.load')
     def test_init(self, key_load, pulp_conf):
@@ -149,13 +155,128 @@ class TestContentView(TestCase):
         redirect.assert_called_once_with(str(url.return_value.sign.return_value))
         self.assertEqual(reply, redirect.return_value)
 
+    @patch(MODULE + '.URL')
+    @patch(MODULE + '.pulp_conf')
+    @patch(MODULE + '.HttpResponseRedirect')
+    def test_redirect_cached(self, redirect, pulp_conf, url):
+        conf = {
+            'lazy': {
+                'redirect_host': 'localhost',
+                'redirect_port': 443,
+                'redirect_path': '/streamer',
+            }
+        }
+        pulp_conf.get.side_effect = lambda s, p: conf.get(s).get(p)
+        url.return_value.sign.side_effect = ['signed', 'other']
+        self.environ['REMOTE_ADDR'] = '172.10.08.20'
+        request = Mock(environ=self.environ, path_info='/var/pulp/content/zoo/lion')
+        key = Mock()
+
+        # test
+        ContentView.redirect(request, key)
+        ContentView.redirect(request, key)
+        self.environ['REMOTE_ADDR'] = '172.10.08.21'
+        ContentView.redirect(request, key)
+
+        # validation
+        self.assertEqual(url.return_value.sign.call_count, 2)
+        self.assertEqual(redirect.call_args_list, [call('signed'), call('signed'), call('other')])
+
+    @patch(MODULE + '.Key.load')
+    @patch(MODULE + '.pulp_conf')
+    def test_init_key_cached(self, pulp_conf, key_load):
+        conf = {
+            'authentication': {'rsa_key': '/tmp/rsa.key'},
+            'server': {'storage_dir': '/var/lib/pulp'},
+        }
+        pulp_conf.get.side_effect = lambda s, p: conf.get(s).get(p)
+
+        # test
+        first = ContentView()
+        second = ContentView()
+
+        # validation
+        key_load.assert_called_once_with('/tmp/rsa.key')
+        self.assertEqual(first.key, second.key)
+        self.assertEqual(first.safe_serving_paths, second.safe_serving_paths)
+
+    def test_send_file(self):
+        path = '/my/path.rpm'
+        reply = ContentView.send_file(path, 'application/x-rpm')
+        self.assertEqual(reply['X-SENDFILE'], path)
+        self.assertEqual(reply['Content-Type'], 'application/x-rpm')
+
+    @patch('os.path.lexists', Mock(return_value=True))
+    @patch('os.path.isdir', Mock(return_value=False))
+    @patch('os.path.exists', Mock(return_value=True))
+    @patch('os.access', Mock(return_value=True))
+    @patch('os.path.realpath')
+    @patch(MODULE + '.cache.publish_stamp')
+    def test_resolve_cached(self, publish_stamp, realpath):
+        publish_stamp.return_value = 1
+        realpath.return_value = '/var/lib/pulp/published/zoo/lion.rpm'
+        path = '/var/www/pub/zoo/lion.rpm'
+
+        # test
+        first = ContentView.resolve(path)
+        second = ContentView.resolve(path)
+
+        # validation
+        realpath.assert_called_once_with(path)
+        self.assertTrue(second is first)
+        self.assertEqual(first, content_views.Resolved(
+            '/var/lib/pulp/published/zoo/lion.rpm', content_views.FILE, 'application/x-rpm'))
+
+    @patch('os.path.lexists', Mock(return_value=True))
+    @patch('os.path.isdir', Mock(return_value=False))
+    @patch('os.path.exists')
+    @patch('os.path.realpath', Mock(return_value='/var/lib/pulp/published/zoo/lion.rpm'))
+    @patch(MODULE + '.cache.publish_stamp')
+    def test_resolve_published(self, publish_stamp, exists):
+        publish_stamp.return_value = 1
+        exists.return_value = False
+        path = '/var/www/pub/zoo/lion.rpm'
+
+        # test
+        self.assertEqual(ContentView.resolve(path).state, content_views.LAZY)
+        exists.return_value = True
+        self.assertEqual(ContentView.resolve(path).state, content_views.LAZY)
+        publish_stamp.return_value = 2
+        resolved = ContentView.resolve(path)
+
+        # validation
+        self.assertEqual(resolved.state, content_views.FILE)
+        self.assertEqual(exists.call_count, 2)
+
+    @patch('os.path.lexists', Mock(return_value=True))
+    @patch('os.path.isdir', Mock(return_value=False))
+    @patch('os.path.exists', Mock(return_value=True))
+    @patch('os.access', Mock(return_value=False))
+    @patch('os.path.realpath', Mock(return_value='/var/lib/pulp/published/zoo/lion.rpm'))
+    @patch(MODULE + '.cache.publish_stamp', Mock(return_value=None))
+    @patch(MODULE + '.allow_access', Mock(return_value=True))
+    @patch(MODULE + '.HttpResponseForbidden')
+    @patch(MODULE + '.Key.load', Mock())
+    def test_get_cannot_read(self, forbidden):
+        request = Mock(path_info='/var/www/pub/zoo/lion.rpm', environ=self.environ)
+        request.get_host.return_value = 'localhost'
+
+        # test
+        view = ContentView()
+        reply = view.get(request)
+
+        # validation
+        forbidden.assert_called_once_with()
+        self.assertEqual(reply, forbidden.return_value)
+
     @patch('os.path.lexists', Mock(return_value=True))
     @patch('os.path.realpath')
     @patch('os.path.exists')
+    @patch('os.access', Mock(return_value=True))
     @patch(MODULE + '.allow_access')
-    @patch(MODULE + '.ContentView.x_send')
+    @patch(MODULE + '.ContentView.send_file')
     @patch(MODULE + '.Key.load', Mock())
-    def test_get_x_send(self, x_send, allow_access, exists, realpath):
+    def test_get_x_send(self, send_file, allow_access, exists, realpath):
         allow_access.return_value = True
         exists.return_value = True
         realpath.side_effect = lambda p: '/var/lib/pulp/published/content'
@@ -173,8 +294,9 @@ class TestContentView(TestCase):
         # validation
         allow_access.assert_called_once_with(request.environ, host)
         realpath.assert_called_with(path)
-        x_send.assert_called_once_with('/var/lib/pulp/published/content')
-        self.assertEqual(reply, x_send.return_value)
+        send_file.assert_called_once_with(
+            '/var/lib/pulp/published/content', 'application/octet-stream')
+        self.assertEqual(reply, send_file.return_value)
 
     @patch('os.path.lexists', Mock(return_value=False))
     @patch(MODULE + '.Key.load', Mock())
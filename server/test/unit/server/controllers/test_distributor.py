@@ -175,6 +175,7 @@ class TestAddDistributor(unittest.TestCase):
         self.assertTrue(result is new_dist)
 
 
+@mock.patch('pulp.server.controllers.distributor.rsync_index')
 @mock.patch('pulp.server.controllers.distributor.TaskResult')
 @mock.patch('pulp.server.controllers.distributor.PluginCallConfiguration')
 @mock.patch('pulp.server.controllers.distributor.plugin_api')
@@ -186,7 +187,8 @@ class TestDelete(unittest.TestCase):
     Tests for the deletion of a distributor.
     """
 
-    def test_expected(self, m_repo_qs, m_dist_qs, m_managers, m_plug_api, m_plug_call_conf, m_task):
+    def test_expected(self, m_repo_qs, m_dist_qs, m_managers, m_plug_api, m_plug_call_conf, m_task,
+                      m_rsync_index):
         """
         Test removal of a distributor with minimal valid arguments.
         """
@@ -203,11 +205,13 @@ class TestDelete(unittest.TestCase):
         m_repo_pub_sched_man.delete_by_distributor_id.assert_called_once_with('rid', 'did')
         m_dist_inst.distributor_removed.assert_called_once_with(
             m_repo_obj.to_transfer_repo.return_value, m_plug_call_conf.return_value)
+        m_rsync_index.remove_publish_index.assert_called_once_with('rid', 'did')
         m_dist_qs.get_or_404.return_value.delete.assert_called_once_with()
         m_task.assert_called_once_with(error=None, spawned_tasks=[])
         self.assertTrue(result is m_task.return_value)
 
-    def test_bindings(self, m_repo_qs, m_dist_qs, m_managers, m_plug_api, m_plug_call_conf, m_task):
+    def test_bindings(self, m_repo_qs, m_dist_qs, m_managers, m_plug_api, m_plug_call_conf, m_task,
+                      m_rsync_index):
         """
         Test that consumers are unbound after a distributor is removed.
         """
@@ -227,7 +231,7 @@ class TestDelete(unittest.TestCase):
         self.assertTrue(result is m_task.return_value)
 
     def test_unbind_w_spawned_tasks(self, m_repo_qs, m_dist_qs, m_managers, m_plug_api,
-                                    m_plug_call_conf, m_task):
+                                    m_plug_call_conf, m_task, m_rsync_index):
         """
         Ensure that when unbind spawns tasks, they are included in the result.
         """
@@ -248,7 +252,7 @@ class TestDelete(unittest.TestCase):
 
     @mock.patch('pulp.server.controllers.distributor.exceptions.PulpCodedException')
     def test_unbind_w_error(self, m_exception, m_repo_qs, m_dist_qs, m_managers, m_plug_api,
-                            m_plug_call_conf, m_task):
+                            m_plug_call_conf, m_task, m_rsync_index):
         """
         Test handling of errors raised by unbind.
         """
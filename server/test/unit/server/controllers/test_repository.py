@@ -5,6 +5,7 @@ from bson.objectid import InvalidId
 from mock import call, Mock, MagicMock, patch
 import mock
 import mongoengine
+from pymongo.errors import BulkWriteError
 
 from pulp.common import dateutils, error_codes
 from pulp.common.compat import unittest
@@ -101,18 +102,47 @@ class TestGetUnitModelQuerySets(unittest.TestCase):
         mock_get_ids.assert_called_once_with('repo1', 'demo_model', q)
 
 
+def _mock_rcu_queryset(mock_rcu_objects, rcu_list):
+    """
+    Make the RepositoryContentUnit.objects mock return a queryset that iterates over rcu_list
+    regardless of how it is ordered or paged.
+    """
+    qs = MagicMock()
+    qs.order_by.return_value = qs
+    qs.skip.return_value = qs
+    qs.limit.return_value = qs
+    qs.__iter__.side_effect = lambda: iter(rcu_list)
+    mock_rcu_objects.return_value = qs
+    return qs
+
+
 @patch('pulp.server.controllers.repository.model.RepositoryContentUnit.objects')
 class FindRepoContentUnitsTest(unittest.TestCase):
 
+    def _demo_units(self, count):
+        rcu_list = []
+        unit_list = []
+        for i in range(count):
+            unit_id = 'bar_%i' % i
+            unit_key = 'key_%i' % i
+            rcu = model.RepositoryContentUnit(repo_id='foo',
+                                              unit_type_id='demo_model',
+                                              unit_id=unit_id)
+            rcu_list.append(rcu)
+            unit_list.append(DemoModel(id=unit_id, key_field=unit_key))
+        return rcu_list, unit_list
+
     def test_repo_content_units_query(self, mock_rcu_objects):
         """
         Test the query parameters for the RepositoryContentUnit
         """
+        qs = _mock_rcu_queryset(mock_rcu_objects, [])
         repo = MagicMock(repo_id='foo')
         rcu_filter = mongoengine.Q(unit_type_id='demo_model')
         list(repo_controller.find_repo_content_units(repo, repo_content_unit_q=rcu_filter))
         self.assertEquals(mock_rcu_objects.call_args[1]['repo_id'], 'foo')
         self.assertEquals(mock_rcu_objects.call_args[1]['q_obj'], rcu_filter)
+        qs.order_by.assert_called_once_with('unit_type_id', 'unit_id')
 
     @patch.object(DemoModel, 'objects')
     @patch('pulp.server.controllers.repository.plugin_api.get_unit_model_by_id')
@@ -125,7 +155,7 @@ class FindRepoContentUnitsTest(unittest.TestCase):
         test_rcu = model.RepositoryContentUnit(repo_id='foo',
                                                unit_type_id='demo_model',
                                                unit_id='bar')
-        mock_rcu_objects.return_value = [test_rcu]
+        _mock_rcu_queryset(mock_rcu_objects, [test_rcu])
 
         u_filter = mongoengine.Q(key_field='baz')
         u_fields = ['key_field']
@@ -134,6 +164,8 @@ class FindRepoContentUnitsTest(unittest.TestCase):
         result = list(repo_controller.find_repo_content_units(repo, units_q=u_filter,
                                                               unit_fields=u_fields))
 
+        mock_demo_objects.assert_called_once_with(q_obj=u_filter,
+                                                  __raw__={'_id': {'$in': ['bar']}})
         mock_demo_objects.return_value.only.assert_called_once_with('key_field')
 
         # validate that the repo content unit was returned and that the unit is attached
@@ -152,7 +184,7 @@ class FindRepoContentUnitsTest(unittest.TestCase):
         test_rcu = model.RepositoryContentUnit(repo_id='foo',
                                                unit_type_id='demo_model',
                                                unit_id='bar')
-        mock_rcu_objects.return_value = [test_rcu]
+        _mock_rcu_queryset(mock_rcu_objects, [test_rcu])
 
         u_filter = mongoengine.Q(key_field='baz')
         u_fields = ['key_field']
@@ -167,6 +199,45 @@ class FindRepoContentUnitsTest(unittest.TestCase):
         # validate that the content unit was returned
         self.assertEquals(result, [test_unit])
 
+    @patch.object(DemoModel, 'objects')
+    @patch('pulp.server.controllers.repository.plugin_api.get_unit_model_by_id')
+    def test_units_not_matching_units_q(self, mock_get_model, mock_demo_objects,
+                                        mock_rcu_objects):
+        """
+        Test that associations whose unit is filtered out by units_q are not returned
+        """
+        repo = MagicMock(repo_id='foo')
+        rcu_list, unit_list = self._demo_units(3)
+        _mock_rcu_queryset(mock_rcu_objects, rcu_list)
+        mock_get_model.return_value = DemoModel
+        mock_demo_objects.return_value = [unit_list[1]]
+
+        result = list(repo_controller.find_repo_content_units(
+            repo, units_q=mongoengine.Q(key_field='key_1')))
+
+        self.assertEquals(result, [rcu_list[1]])
+
+    @patch(MODULE + 'FIND_UNITS_PAGE_SIZE', 4)
+    @patch.object(DemoModel, 'objects')
+    @patch('pulp.server.controllers.repository.plugin_api.get_unit_model_by_id')
+    def test_paged_unit_queries(self, mock_get_model, mock_demo_objects, mock_rcu_objects):
+        """
+        Test that units are fetched one page of associations at a time, in association order
+        """
+        repo = MagicMock(repo_id='foo')
+        rcu_list, unit_list = self._demo_units(10)
+        _mock_rcu_queryset(mock_rcu_objects, rcu_list)
+        mock_get_model.return_value = DemoModel
+        # the database returns the units of each page in no particular order
+        mock_demo_objects.side_effect = lambda q_obj, __raw__: [
+            u for u in reversed(unit_list) if u.id in __raw__['_id']['$in']]
+
+        result = list(repo_controller.find_repo_content_units(repo))
+
+        self.assertEquals(mock_demo_objects.call_count, 3)
+        self.assertEquals([rcu.unit_id for rcu in result], [u.id for u in unit_list])
+        self.assertEquals([rcu.unit for rcu in result], unit_list)
+
     @patch.object(DemoModel, 'objects')
     @patch('pulp.server.controllers.repository.plugin_api.get_unit_model_by_id')
     def test_limit(self, mock_get_model, mock_demo_objects, mock_rcu_objects):
@@ -174,18 +245,8 @@ class FindRepoContentUnitsTest(unittest.TestCase):
         Test that limits are applied properly to the results
         """
         repo = MagicMock(repo_id='foo')
-        rcu_list = []
-        unit_list = []
-        for i in range(10):
-            unit_id = 'bar_%i' % i
-            unit_key = 'key_%i' % i
-            rcu = model.RepositoryContentUnit(repo_id='foo',
-                                              unit_type_id='demo_model',
-                                              unit_id=unit_id)
-            rcu_list.append(rcu)
-            unit_list.append(DemoModel(id=unit_id, key_field=unit_key))
-
-        mock_rcu_objects.return_value = rcu_list
+        rcu_list, unit_list = self._demo_units(10)
+        qs = _mock_rcu_queryset(mock_rcu_objects, rcu_list)
 
         mock_get_model.return_value = DemoModel
         mock_demo_objects.return_value = unit_list
@@ -194,26 +255,19 @@ class FindRepoContentUnitsTest(unittest.TestCase):
         self.assertEquals(5, len(result))
         self.assertEquals(result[0].unit_id, 'bar_0')
         self.assertEquals(result[4].unit_id, 'bar_4')
+        qs.limit.assert_called_once_with(5)
+        self.assertFalse(qs.skip.called)
 
     @patch.object(DemoModel, 'objects')
     @patch('pulp.server.controllers.repository.plugin_api.get_unit_model_by_id')
     def test_skip(self, mock_get_model, mock_demo_objects, mock_rcu_objects):
         """
-        Test that the skip parameter is applied properly
+        Test that the skip parameter is passed to the database when there is no unit query
         """
         repo = MagicMock(repo_id='foo')
-        rcu_list = []
-        unit_list = []
-        for i in range(10):
-            unit_id = 'bar_%i' % i
-            unit_key = 'key_%i' % i
-            rcu = model.RepositoryContentUnit(repo_id='foo',
-                                              unit_type_id='demo_model',
-                                              unit_id=unit_id)
-            rcu_list.append(rcu)
-            unit_list.append(DemoModel(id=unit_id, key_field=unit_key))
-
-        mock_rcu_objects.return_value = rcu_list
+        rcu_list, unit_list = self._demo_units(10)
+        # the database has already skipped the first five associations
+        qs = _mock_rcu_queryset(mock_rcu_objects, rcu_list[5:])
 
         mock_get_model.return_value = DemoModel
         mock_demo_objects.return_value = unit_list
@@ -222,6 +276,29 @@ class FindRepoContentUnitsTest(unittest.TestCase):
         self.assertEquals(5, len(result))
         self.assertEquals(result[0].unit_id, 'bar_5')
         self.assertEquals(result[4].unit_id, 'bar_9')
+        qs.skip.assert_called_once_with(5)
+        qs.limit.assert_called_once_with(5)
+
+    @patch.object(DemoModel, 'objects')
+    @patch('pulp.server.controllers.repository.plugin_api.get_unit_model_by_id')
+    def test_skip_with_units_q(self, mock_get_model, mock_demo_objects, mock_rcu_objects):
+        """
+        Test that skip and limit are applied to the matching units when there is a unit query
+        """
+        repo = MagicMock(repo_id='foo')
+        rcu_list, unit_list = self._demo_units(10)
+        qs = _mock_rcu_queryset(mock_rcu_objects, rcu_list)
+
+        mock_get_model.return_value = DemoModel
+        mock_demo_objects.return_value = unit_list
+        result = list(repo_controller.find_repo_content_units(
+            repo, units_q=mongoengine.Q(key_field__exists=True), limit=5, skip=5))
+
+        self.assertEquals(5, len(result))
+        self.assertEquals(result[0].unit_id, 'bar_5')
+        self.assertEquals(result[4].unit_id, 'bar_9')
+        self.assertFalse(qs.skip.called)
+        self.assertFalse(qs.limit.called)
 
 
 class FindUnitsNotDownloadedTests(unittest.TestCase):
@@ -360,6 +437,67 @@ class AssociateSingleUnitTests(unittest.TestCase):
             upsert=True)
 
 
+@patch(MODULE + 'model.RepositoryContentUnit._get_collection')
+@patch(MODULE + 'dateutils.format_iso8601_utc_timestamp', return_value='foo_tstamp')
+class AssociateUnitsTests(unittest.TestCase):
+
+    def test_bulk_upserts(self, mock_get_timestamp, mock_get_collection):
+        units = [DemoModel(id='a', key_field='a'), DemoModel(id='b', key_field='b')]
+        result = mock_get_collection.return_value.bulk_write.return_value
+        result.upserted_count = 1
+        result.matched_count = 1
+
+        ret = repo_controller.associate_units(MagicMock(repo_id='foo'), iter(units))
+
+        self.assertEqual(ret, (1, 1))
+        requests = mock_get_collection.return_value.bulk_write.call_args[0][0]
+        self.assertEqual(mock_get_collection.return_value.bulk_write.call_args[1],
+                         {'ordered': False})
+        self.assertEqual([r._filter for r in requests],
+                         [{'repo_id': 'foo', 'unit_id': 'a', 'unit_type_id': 'demo_model'},
+                          {'repo_id': 'foo', 'unit_id': 'b', 'unit_type_id': 'demo_model'}])
+        self.assertEqual(requests[0]._doc, {'$setOnInsert': {'created': 'foo_tstamp'},
+                                            '$set': {'updated': 'foo_tstamp'}})
+        self.assertTrue(all(r._upsert for r in requests))
+
+    def test_batches(self, mock_get_timestamp, mock_get_collection):
+        result = mock_get_collection.return_value.bulk_write.return_value
+        result.upserted_count = 2
+        result.matched_count = 0
+
+        ret = repo_controller.associate_unit_ids('foo', 'demo_model', ['a', 'b', 'c', 'd'],
+                                                 batch_size=2)
+
+        self.assertEqual(ret, (4, 0))
+        self.assertEqual(mock_get_collection.return_value.bulk_write.call_count, 2)
+
+    def test_no_units(self, mock_get_timestamp, mock_get_collection):
+        ret = repo_controller.associate_unit_ids('foo', 'demo_model', [])
+
+        self.assertEqual(ret, (0, 0))
+        self.assertFalse(mock_get_collection.return_value.bulk_write.called)
+
+    def test_concurrent_duplicate(self, mock_get_timestamp, mock_get_collection):
+        """
+        Test that an association created concurrently is counted as an update
+        """
+        mock_get_collection.return_value.bulk_write.side_effect = BulkWriteError({
+            'writeErrors': [{'code': 11000}], 'writeConcernErrors': [],
+            'nUpserted': 1, 'nMatched': 0})
+
+        ret = repo_controller.associate_unit_ids('foo', 'demo_model', ['a', 'b'])
+
+        self.assertEqual(ret, (1, 1))
+
+    def test_write_error(self, mock_get_timestamp, mock_get_collection):
+        mock_get_collection.return_value.bulk_write.side_effect = BulkWriteError({
+            'writeErrors': [{'code': 2}], 'writeConcernErrors': [],
+            'nUpserted': 1, 'nMatched': 0})
+
+        self.assertRaises(BulkWriteError, repo_controller.associate_unit_ids,
+                          'foo', 'demo_model', ['a', 'b'])
+
+
 class TestDisassociateUnits(unittest.TestCase):
     @patch('pulp.server.controllers.repository.update_last_unit_removed')
     @patch('pulp.server.controllers.repository.model.RepositoryContentUnit.objects')
@@ -28,6 +28,15 @@ class DemoModelWithSerializer(model.ContentUnit):
 
 class FindUnitsTests(unittest.TestCase):
 
+    def setUp(self):
+        super(FindUnitsTests, self).setUp()
+        DemoModel.objects.reset_mock()
+        DemoModel.objects.side_effect = None
+        DemoModel.objects.return_value = MagicMock()
+        # no units without a digest
+        DemoModel.objects.return_value.only.return_value.first.return_value = None
+        DemoModel.objects.return_value.__iter__.return_value = iter([])
+
     @patch('pulp.server.controllers.units.misc.paginate')
     def test_paginate(self, mock_paginate):
         """
@@ -40,7 +49,7 @@ class FindUnitsTests(unittest.TestCase):
         # turn into list so the generator will be evaluated
         list(units_controller.find_units(units_iterable))
 
-        mock_paginate.assert_called_once_with(units_iterable, 50)
+        mock_paginate.assert_called_once_with(units_iterable, 1000)
 
     def test_query(self):
         """
@@ -52,24 +61,48 @@ class FindUnitsTests(unittest.TestCase):
 
         # turn into list so the generator will be evaluated
         list(units_controller.find_units(units_iterable))
-        query_dict = DemoModel.objects.call_args[0][0].to_query(DemoModel)
-        expected_result = {'$or': [{'key_field': u'a'}, {'key_field': u'B'}]}
-        self.assertDictEqual(query_dict, expected_result)
+
+        self.assertEqual(DemoModel.objects.call_count, 2)
+        DemoModel.objects.assert_any_call(_unit_key_digest=None)
+        digests = DemoModel.objects.call_args[1]['_unit_key_digest__in']
+        expected = [model_1.unit_key_lookup_digest(), model_2.unit_key_lookup_digest()]
+        self.assertEqual(sorted(digests), sorted(expected))
 
     def test_results(self):
         """
-        Test that the mongo query generated is the one we expect
+        Test that the units found by digest are returned
         """
         model_1 = DemoModel(key_field='a')
         model_2 = DemoModel(key_field='B')
         units_iterable = (model_1, model_2)
-        model_2_defined = DemoModel(key_field='B', id='foo')
-        DemoModel.objects.return_value = [model_2_defined]
+        model_2_defined = DemoModel(key_field='B', id='foo',
+                                    _unit_key_digest=model_2.unit_key_lookup_digest())
+        DemoModel.objects.return_value.__iter__.return_value = iter([model_2_defined])
 
         # turn into list so the generator will be evaluated
         result = list(units_controller.find_units(units_iterable))
         self.assertEqual(result, [model_2_defined])
 
+    def test_units_without_digest(self):
+        """
+        Test that units without a stored digest are matched on their unit keys
+        """
+        model_1 = DemoModel(key_field='a')
+        model_2 = DemoModel(key_field='B')
+        model_1_defined = DemoModel(key_field='a', id='foo',
+                                    _unit_key_digest=model_1.unit_key_lookup_digest())
+        model_2_defined = DemoModel(key_field='B', id='bar')
+        legacy_query = MagicMock()
+        legacy_query.only.return_value.first.return_value = model_2_defined
+        DemoModel.objects.side_effect = [legacy_query, [model_1_defined], [model_2_defined]]
+
+        result = list(units_controller.find_units((model_1, model_2)))
+
+        self.assertEqual(result, [model_1_defined, model_2_defined])
+        query_dict = DemoModel.objects.call_args[0][0].to_query(DemoModel)
+        expected_result = {'_unit_key_digest': None, 'key_field': u'B'}
+        self.assertDictEqual(query_dict, expected_result)
+
 
 @patch('pulp.plugins.loader.api.get_unit_model_by_id', spec_set=True)
 @patch('pulp.plugins.types.database.type_definition', spec_set=True)
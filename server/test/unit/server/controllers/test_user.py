@@ -9,6 +9,7 @@ import logging
 log = logging.getLogger(__name__)
 
 
+@mock.patch('pulp.server.controllers.user.permission_index')
 @mock.patch('pulp.server.controllers.user.model.User')
 @mock.patch('pulp.server.controllers.user.manager_factory')
 class TestCreateUser(unittest.TestCase):
@@ -16,7 +17,7 @@ class TestCreateUser(unittest.TestCase):
     Tests for the creation of a user.
     """
 
-    def test_duplicate_user(self, mock_f, mock_model):
+    def test_duplicate_user(self, mock_f, mock_model, mock_index):
         """
         Test handling of Mongoengine's NotUniqueError.
         """
@@ -30,7 +31,7 @@ class TestCreateUser(unittest.TestCase):
             raise AssertionError('Duplicate resource should be raised if user is not unique.')
         self.assertDictEqual({'resource_id': 'new_user'}, e.data_dict())
 
-    def test_validation_error(self, mock_f, mock_model):
+    def test_validation_error(self, mock_f, mock_model, mock_index):
         """
         Test handling of Mongoengine's ValidationError.
         """
@@ -38,17 +39,19 @@ class TestCreateUser(unittest.TestCase):
         mock_user.save.side_effect = ValidationError()
         self.assertRaises(pulp_exceptions.InvalidValue, user_controller.create_user, 'invalid&')
 
-    def test_as_expected(self, mock_f, mock_model):
+    def test_as_expected(self, mock_f, mock_model, mock_index):
         """
         Test the creatation of a new users that works as expected.
         """
         mock_perm_manager = mock_f.permission_manager()
         user = user_controller.create_user('curiosity', password='pahump_hills')
         mock_perm_manager.grant_automatic_permissions_for_user.assert_called_once_with(user.login)
+        mock_index.changed.assert_called_once_with(logins=['curiosity'])
         user.set_password.assert_called_once_with('pahump_hills')
         self.assertTrue(user is mock_model.return_value)
 
 
+@mock.patch('pulp.server.controllers.user.permission_index')
 @mock.patch('pulp.server.controllers.user.model.User')
 @mock.patch('pulp.server.controllers.user.manager_factory')
 class TestUpdateUser(unittest.TestCase):
@@ -56,7 +59,7 @@ class TestUpdateUser(unittest.TestCase):
     Tests for updating a user.
     """
 
-    def test_update_as_expected(self, mock_f, mock_model):
+    def test_update_as_expected(self, mock_f, mock_model, mock_index):
         """
         Test the expected path of a successful update.
         """
@@ -72,8 +75,9 @@ class TestUpdateUser(unittest.TestCase):
         m_user.save.assert_called_once_with()
         m_user.roles = ['analyze', 'photograph']
         self.assertTrue(updated is m_user)
+        mock_index.changed.assert_called_once_with(logins=['curiosity'])
 
-    def test_invalid_value(self, mock_f, mock_model):
+    def test_invalid_value(self, mock_f, mock_model, mock_index):
         """
         Test the handling of a Mongoengine Validation error on update.
         """
@@ -83,7 +87,7 @@ class TestUpdateUser(unittest.TestCase):
         self.assertRaises(pulp_exceptions.InvalidValue, user_controller.update_user,
                           'curiosity', delta)
 
-    def test_extra_param(self, mock_f, mock_model):
+    def test_extra_param(self, mock_f, mock_model, mock_index):
         """
         Test the handling of a Mongoengine Validation error on update.
         """
@@ -91,7 +95,7 @@ class TestUpdateUser(unittest.TestCase):
         self.assertRaises(pulp_exceptions.InvalidValue, user_controller.update_user,
                           'curiosity', delta)
 
-    def test_invalid_roles(self, mock_f, mock_model):
+    def test_invalid_roles(self, mock_f, mock_model, mock_index):
         """
         Test the handling of non-list of roles.
         """
@@ -100,6 +104,7 @@ class TestUpdateUser(unittest.TestCase):
                           'curiosity', delta)
 
 
+@mock.patch('pulp.server.controllers.user.permission_index')
 @mock.patch('pulp.server.controllers.user.is_last_super_user')
 @mock.patch('pulp.server.controllers.user.model.User')
 @mock.patch('pulp.server.controllers.user.manager_factory')
@@ -108,7 +113,7 @@ class TestDeleteUser(unittest.TestCase):
     Tests for deleting a user.
     """
 
-    def test_as_expected(self, mock_f, mock_model, mock_last_su):
+    def test_as_expected(self, mock_f, mock_model, mock_last_su, mock_index):
         """
         Test delete that works as expected.
         """
@@ -118,8 +123,9 @@ class TestDeleteUser(unittest.TestCase):
 
         m_permission_manager.revoke_all_permissions_from_user.assert_called_once_with('curiosity')
         mock_model.objects.get_or_404.return_value.delete.assert_called_once_with()
+        mock_index.changed.assert_called_once_with(logins=['curiosity'])
 
-    def test_last_super_user(self, mock_f, mock_model, mock_last_su):
+    def test_last_super_user(self, mock_f, mock_model, mock_last_su, mock_index):
         """
         Test an attempted delete of the last super user.
         """
@@ -169,85 +175,64 @@ class TestIsLastSuperUser(unittest.TestCase):
         self.assertTrue(user_controller.is_last_super_user('test'))
 
 
-@mock.patch('pulp.server.controllers.user.manager_factory')
+@mock.patch('pulp.server.controllers.user.permission_index')
 @mock.patch('pulp.server.controllers.user.model.User')
 class TestIsAuthorized(unittest.TestCase):
     """
     Tests for determining whether a user is authorized to view a resource.
     """
 
-    def test_super_user(self, mock_model, mock_f):
+    def test_indexed(self, mock_model, mock_index):
         """
-        Ensure that super users have access to everything.
+        Ensure that the decision is taken from the permission index.
         """
-        m_user = mock_model.objects.get_or_404.return_value
-        m_user.is_superuser.return_value = True
-        self.assertTrue(m_user.is_superuser('some_resource', 'superuser', 'op'))
+        mock_index.is_authorized.return_value = True
+
+        self.assertTrue(user_controller.is_authorized('/mock/resource/', 'test-user', 'op'))
+        mock_index.is_authorized.assert_called_once_with('/mock/resource/', 'test-user', 'op')
+        self.assertFalse(mock_index.refresh.called)
+        self.assertFalse(mock_model.objects.get_or_404.called)
 
-    def test_explicit_access(self, mock_model, mock_f):
+    def test_denied(self, mock_model, mock_index):
         """
-        Ensure that a user with access to a resource url is authorized for it.
+        Ensure that the index is refreshed before the operation is denied.
         """
-        m_user = mock_model.objects.get_or_404.return_value
-        m_user.is_superuser.return_value = False
-        mock_pqm = mock_f.permission_query_manager.return_value
-        mock_pqm.find_by_resource.return_value = '/mock/resource/'
-        mock_pqm.find_user_permission.return_value = ['op']
+        mock_index.is_authorized.return_value = False
 
-        self.assertTrue(user_controller.is_authorized('/mock/resource/', 'testuser', 'op'))
-        mock_pqm.find_by_resource.assert_called_once_with('/mock/resource/')
-        mock_pqm.find_user_permission.assert_called_once_with('/mock/resource/', 'testuser')
+        self.assertFalse(user_controller.is_authorized('/mock/resource/', 'test-user', 'op'))
+        mock_index.refresh.assert_called_once_with(force=True)
+        self.assertEqual(mock_index.is_authorized.call_count, 2)
+        self.assertFalse(mock_model.objects.get_or_404.called)
 
-    def test_subdomain_access(self, mock_model, mock_f):
+    def test_granted_since_refresh(self, mock_model, mock_index):
         """
-        Ensure that a user with access to the subdomain of a url has access to the url.
+        Ensure that a permission granted since the index was refreshed is honored.
         """
-
-        def base_only(permission, login):
-            """
-            Simulate permission over a subdomain, but nothing else.
-            """
-            if permission == '/mock/':
-                return ['op']
-            else:
-                return []
-
-        m_user = mock_model.objects.get_or_404.return_value
-        m_user.is_superuser.return_value = False
-        mock_pqm = mock_f.permission_query_manager.return_value
-        mock_pqm.find_by_resource.side_effect = lambda x: x
-        mock_pqm.find_user_permission.side_effect = base_only
+        mock_index.is_authorized.side_effect = [False, True]
 
         self.assertTrue(user_controller.is_authorized('/mock/resource/', 'test-user', 'op'))
-        self.assertTrue(user_controller.is_authorized('/mock/other_resource/', 'test-user', 'op'))
-        self.assertFalse(user_controller.is_authorized('/other/', 'test-user', 'op'))
-        self.assertFalse(user_controller.is_authorized('/', 'test-user', 'op'))
+        mock_index.refresh.assert_called_once_with(force=True)
 
-    @mock.patch('pulp.server.controllers.user.Permission.get_collection')
-    def test_root_access(self, mock_perm_collection, mock_model, mock_f):
+    def test_unknown_user(self, mock_model, mock_index):
         """
-        Ensure that a user that has access to the root domain '/' has access to everything.
+        Ensure that the index is refreshed when the user is not in it.
         """
+        mock_index.is_authorized.side_effect = [None, True]
 
-        def root_only(permission, login):
-            """
-            Simulate permission over root domain, but nothing else.
-            """
-            if permission == '/':
-                return ['op']
-            else:
-                return []
+        self.assertTrue(user_controller.is_authorized('/mock/resource/', 'test-user', 'op'))
+        mock_model.objects.get_or_404.assert_called_once_with(login='test-user')
+        mock_index.refresh.assert_called_once_with(force=True)
 
-        m_user = mock_model.objects.get_or_404.return_value
-        m_user.is_superuser.return_value = False
-        mock_pqm = mock_f.permission_query_manager.return_value
-        mock_pqm.find_by_resource.side_effect = lambda x: x
-        mock_pqm.find_user_permission.side_effect = root_only
-        mock_perm_collection.return_value.find_one.return_value = '/'
+    def test_missing_user(self, mock_model, mock_index):
+        """
+        Ensure that a user that does not exist is reported.
+        """
+        mock_index.is_authorized.return_value = None
+        mock_model.objects.get_or_404.side_effect = pulp_exceptions.MissingResource('test-user')
 
-        self.assertTrue(user_controller.is_authorized('/mock/resource/', 'test-user', 'op'))
-        self.assertTrue(user_controller.is_authorized('/mock/other_resource/', 'test-user', 'op'))
-        self.assertTrue(user_controller.is_authorized('/', 'test-user', 'op'))
+        self.assertRaises(pulp_exceptions.MissingResource, user_controller.is_authorized,
+                          '/mock/resource/', 'test-user', 'op')
+        self.assertFalse(mock_index.refresh.called)
 
 
 @mock.patch('pulp.server.controllers.user.Role.get_collection')
@@ -0,0 +1,51 @@
+from unittest import TestCase
+
+from mock import MagicMock, patch
+import mongoengine
+
+from pulp.server.db import model
+from pulp.server.db.migrate.models import MigrationModule
+
+MIGRATION = 'pulp.server.db.migrations.0029_unit_key_digest'
+
+
+class DemoModel(model.ContentUnit):
+    key_field = mongoengine.StringField()
+    unit_key_fields = ('key_field',)
+    _content_type_id = mongoengine.StringField(default='demo_model')
+
+
+class TestMigration(TestCase):
+    """
+    Test the migration.
+    """
+
+    @patch.object(DemoModel, '_get_collection')
+    @patch.object(DemoModel, 'objects')
+    @patch('.'.join((MIGRATION, 'PluginManager')))
+    def test_migrate(self, m_plugin_manager, m_objects, m_get_collection):
+        """
+        Test the digest is stored on units that do not have one.
+        """
+        units = [DemoModel(id='a', key_field='a'), DemoModel(id='b', key_field='b'),
+                 DemoModel(id='c', key_field='c')]
+        m_plugin_manager.return_value.unit_models = {'demo_model': DemoModel}
+        query = MagicMock()
+        query.count.return_value = len(units)
+        query.__iter__.return_value = iter(units)
+        m_objects.return_value.only.return_value = query
+
+        # test
+        module = MigrationModule(MIGRATION)._module
+        with patch.object(module, 'BATCH_SIZE', 2):
+            module.migrate()
+
+        # validation
+        m_objects.assert_called_once_with(_unit_key_digest=None)
+        m_objects.return_value.only.assert_called_once_with('key_field')
+        bulk_write = m_get_collection.return_value.bulk_write
+        self.assertEqual(bulk_write.call_count, 2)
+        requests = bulk_write.call_args_list[0][0][0] + bulk_write.call_args_list[1][0][0]
+        self.assertEqual([r._filter for r in requests], [{'_id': 'a'}, {'_id': 'b'}, {'_id': 'c'}])
+        self.assertEqual(requests[0]._doc,
+                         {'$set': {'_unit_key_digest': units[0].unit_key_lookup_digest()}})
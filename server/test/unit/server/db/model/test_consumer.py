@@ -40,6 +40,7 @@ class TestRepoProfileApplicability(PulpServerTests):
         self.assertEqual(applicability.applicability, applicability_data)
         # Since we didn't set an _id, it should be None
         self.assertEqual(applicability._id, None)
+        self.assertEqual(applicability.last_updated, None)
 
     def test___init___with__id(self):
         """
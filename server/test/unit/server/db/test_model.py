@@ -113,6 +113,7 @@ class TestContentUnit(unittest.TestCase):
         self.assertTrue(model.ContentUnit._last_updated.required)
         self.assertTrue(isinstance(model.ContentUnit._storage_path, StringField))
         self.assertTrue(isinstance(model.ContentUnit.pulp_user_metadata, DictField))
+        self.assertTrue(isinstance(model.ContentUnit._unit_key_digest, StringField))
 
     def test_unit_key_as_digest(self):
         unit = ContentUnitHelper()
@@ -134,6 +135,28 @@ class TestContentUnit(unittest.TestCase):
                 _hash.update(value)
         self.assertEqual(digest, _hash.hexdigest())
 
+    def test_unit_key_as_digest_unicode(self):
+        """
+        Test that unicode values are hashed as UTF-8, so that ASCII values hash the same as their
+        str equivalent.
+        """
+        unit = ContentUnitHelper(apple=u'red', pear=u'p\xe9ar', age=21)
+        same_unit = ContentUnitHelper(apple='red', pear=u'p\xe9ar'.encode('utf-8'), age=21)
+
+        self.assertEqual(unit.unit_key_as_digest(), same_unit.unit_key_as_digest())
+
+    def test_unit_key_lookup_digest(self):
+        """
+        Test that unit keys that only differ in how their values are split between fields have
+        different digests, and that unicode and UTF-8 encoded values have the same digest.
+        """
+        unit = ContentUnitHelper(apple='xpeara', pear='b', age=21)
+        other_unit = ContentUnitHelper(apple='x', pear='apearb', age=21)
+        same_unit = ContentUnitHelper(apple=u'xpeara', pear=u'b', age=21)
+
+        self.assertNotEqual(unit.unit_key_lookup_digest(), other_unit.unit_key_lookup_digest())
+        self.assertEqual(unit.unit_key_lookup_digest(), same_unit.unit_key_lookup_digest())
+
     def test__hash__(self):
         unit = ContentUnitHelper()
         unit.apple = 'red'
@@ -184,6 +207,8 @@ class TestContentUnit(unittest.TestCase):
 
         # make sure the last updated time has been updated
         self.assertEquals(helper._last_updated, 'foo')
+        # make sure the unit key digest has been stored
+        self.assertEquals(helper._unit_key_digest, helper.unit_key_lookup_digest())
 
     @patch('pulp.server.db.model.Repository.objects')
     @patch('pulp.server.db.model.RepositoryContentUnit.objects')
@@ -1491,17 +1516,52 @@ class TestUserAuth(unittest.TestCase):
         password = 1
         self.assertRaises(exceptions.InvalidValue, self.user.set_password, password)
 
-    @patch('pulp.server.db.model.User._pbkdf_sha256')
+    @patch('pulp.server.db.model.pbkdf2_hmac')
     @patch('pulp.server.db.model.User._random_bytes')
-    def test_hash_password(self, mock_rand, mock_sha):
+    def test_hash_password(self, mock_rand, mock_pbkdf2):
         """
         Test hashing a password.
         """
         password = "some password"
         mock_rand.return_value.encode.return_value.strip.return_value = 'mock_salt'
-        mock_sha.return_value.encode.return_value.strip.return_value = 'mock_hash'
+        mock_pbkdf2.return_value.encode.return_value.strip.return_value = 'mock_hash'
         salted = self.user._hash_password(password)
-        self.assertEqual(salted, 'mock_salt,mock_hash')
+        self.assertEqual(salted, 'pbkdf2_sha256$5000$mock_salt$mock_hash')
+        mock_pbkdf2.assert_called_once_with('sha256', password, mock_rand.return_value, 5000)
+
+    def test_hash_password_unicode(self):
+        """
+        Test that unicode passwords are hashed as utf-8.
+        """
+        self.user.set_password(u'p\xe4ssword')
+        self.assertTrue(self.user.check_password(u'p\xe4ssword'))
+        self.assertTrue(self.user.check_password(u'p\xe4ssword'.encode('utf-8')))
+
+    def test_check_password_legacy(self):
+        """
+        Test checking a password hashed with the original salted HMAC scheme.
+        """
+        salt = 'saltsalt'
+        hashed = self.user._pbkdf_sha256('mock_password', salt, model.PASSWORD_ITERATIONS)
+        self.user.password = salt.encode('base64').strip() + ',' + \
+            hashed.encode('base64').strip()
+
+        self.assertTrue(self.user.check_password('mock_password'))
+        self.assertFalse(self.user.check_password('new_password'))
+
+    def test_password_needs_rehash(self):
+        """
+        Test that passwords hashed with the original scheme or another iteration count need to
+        be hashed again.
+        """
+        self.user.password = 'c2FsdHNhbHQ=,aGFzaA=='
+        self.assertTrue(self.user.password_needs_rehash())
+
+        self.user.password = 'pbkdf2_sha256$1000$c2FsdHNhbHQ=$aGFzaA=='
+        self.assertTrue(self.user.password_needs_rehash())
+
+        self.user.set_password('mock_password')
+        self.assertFalse(self.user.password_needs_rehash())
 
     @patch('pulp.server.db.model.random')
     def test_rand_bytes(self, mock_rand):
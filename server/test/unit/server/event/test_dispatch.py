@@ -0,0 +1,162 @@
+import threading
+import unittest
+
+import mock
+
+from pulp.server.event import dispatch
+
+
+MODULE_PATH = 'pulp.server.event.dispatch.'
+
+
+def listener(listener_id, notifier_type_id='notifier', notifier_config=None):
+    return {'_id': listener_id, 'notifier_type_id': notifier_type_id,
+            'notifier_config': notifier_config or {}}
+
+
+class TestDispatcher(unittest.TestCase):
+
+    @mock.patch(MODULE_PATH + 'notifiers')
+    def test_dispatch(self, mock_notifiers):
+        """Assert events are delivered to each listener's notifier, in order."""
+        delivered = []
+        mock_notifiers.get_notifier_function.return_value = \
+            lambda config, event: delivered.append((config['n'], event))
+        dispatcher = dispatch.Dispatcher(workers=2)
+
+        for event in range(5):
+            dispatcher.dispatch(listener('l-1', notifier_config={'n': 1}), event)
+            dispatcher.dispatch(listener('l-2', notifier_config={'n': 2}), event)
+
+        self.assertTrue(dispatcher.join(5))
+        self.assertEqual([e for n, e in delivered if n == 1], range(5))
+        self.assertEqual([e for n, e in delivered if n == 2], range(5))
+        mock_notifiers.get_notifier_function.assert_called_with('notifier')
+        self.assertEqual(dispatcher._pending, {})
+        self.assertEqual(dispatcher._pending_count, 0)
+
+    @mock.patch(MODULE_PATH + 'notifiers')
+    def test_dispatch_slow_listener(self, mock_notifiers):
+        """Assert a blocked listener does not hold up deliveries to other listeners."""
+        blocked = threading.Event()
+        delivered = []
+
+        def notify(config, event):
+            if config.get('slow'):
+                blocked.wait(5)
+            delivered.append(event)
+
+        mock_notifiers.get_notifier_function.return_value = notify
+        dispatcher = dispatch.Dispatcher(workers=2)
+
+        dispatcher.dispatch(listener('slow', notifier_config={'slow': True}), 'a')
+        dispatcher.dispatch(listener('slow', notifier_config={'slow': True}), 'b')
+        dispatcher.dispatch(listener('fast'), 'c')
+
+        self.assertFalse(dispatcher.join(1))
+        self.assertEqual(delivered, ['c'])
+        blocked.set()
+        self.assertTrue(dispatcher.join(5))
+        self.assertEqual(delivered, ['c', 'a', 'b'])
+
+    @mock.patch(MODULE_PATH + '_logger')
+    def test_dispatch_full(self, mock_logger):
+        """Assert events are dropped when too many deliveries are pending."""
+        dispatcher = dispatch.Dispatcher(size=1)
+        dispatcher._start = mock.Mock()
+        event = mock.Mock(event_type='repo.sync.start')
+
+        self.assertTrue(dispatcher.dispatch(listener('l-1'), event))
+        self.assertFalse(dispatcher.dispatch(listener('l-1'), event))
+
+        self.assertEqual(dispatcher.dropped, 1)
+        self.assertEqual(mock_logger.error.call_count, 1)
+
+    @mock.patch(MODULE_PATH + 'time')
+    @mock.patch(MODULE_PATH + 'notifiers')
+    def test_deliver_retry(self, mock_notifiers, mock_time):
+        """Assert failed deliveries are retried with an exponential backoff."""
+        notifier = mock_notifiers.get_notifier_function.return_value
+        notifier.side_effect = [Exception(), Exception(), None]
+        dispatcher = dispatch.Dispatcher(retries=3, backoff=2)
+
+        dispatcher._deliver('notifier', {'a': 1}, 'event')
+
+        self.assertEqual(notifier.call_count, 3)
+        notifier.assert_called_with({'a': 1}, 'event')
+        self.assertEqual(mock_time.sleep.call_args_list, [mock.call(2), mock.call(4)])
+
+    @mock.patch(MODULE_PATH + '_logger')
+    @mock.patch(MODULE_PATH + 'time')
+    @mock.patch(MODULE_PATH + 'notifiers')
+    def test_deliver_failed(self, mock_notifiers, mock_time, mock_logger):
+        """Assert a delivery is given up and logged after the last retry."""
+        notifier = mock_notifiers.get_notifier_function.return_value
+        notifier.side_effect = Exception()
+        dispatcher = dispatch.Dispatcher(retries=2, backoff=1)
+
+        dispatcher._deliver('notifier', {}, 'event')
+
+        self.assertEqual(notifier.call_count, 3)
+        self.assertEqual(mock_time.sleep.call_count, 2)
+        mock_logger.exception.assert_called_once_with(
+            'Exception from notifier of type [notifier]')
+
+
+class TestGetDispatcher(unittest.TestCase):
+
+    def setUp(self):
+        dispatch._dispatcher = None
+
+    def tearDown(self):
+        dispatch._dispatcher = None
+
+    @mock.patch(MODULE_PATH + 'atexit')
+    def test_reused(self, mock_atexit):
+        dispatcher = dispatch.get_dispatcher()
+
+        self.assertTrue(dispatch.get_dispatcher() is dispatcher)
+        mock_atexit.register.assert_called_once_with(dispatcher.join, dispatch.EXIT_TIMEOUT)
+
+    @mock.patch(MODULE_PATH + 'atexit')
+    @mock.patch(MODULE_PATH + 'os')
+    def test_forked(self, mock_os, mock_atexit):
+        mock_os.getpid.return_value = 1
+        dispatcher = dispatch.get_dispatcher()
+        mock_os.getpid.return_value = 2
+
+        self.assertFalse(dispatch.get_dispatcher() is dispatcher)
+
+
+class TestDrain(unittest.TestCase):
+
+    def setUp(self):
+        dispatch._dispatcher = None
+
+    def tearDown(self):
+        dispatch._dispatcher = None
+
+    def test_no_dispatcher(self):
+        self.assertTrue(dispatch.drain())
+
+    def test_drained(self):
+        dispatch._dispatcher = mock.Mock(pid=dispatch.os.getpid())
+        dispatch._dispatcher.join.return_value = True
+
+        self.assertTrue(dispatch.drain(5))
+        dispatch._dispatcher.join.assert_called_once_with(5)
+
+    @mock.patch(MODULE_PATH + '_logger')
+    def test_timed_out(self, mock_logger):
+        dispatch._dispatcher = mock.Mock(pid=dispatch.os.getpid())
+        dispatch._dispatcher.join.return_value = False
+
+        self.assertFalse(dispatch.drain())
+        dispatch._dispatcher.join.assert_called_once_with(dispatch.DRAIN_TIMEOUT)
+        self.assertEqual(mock_logger.warning.call_count, 1)
+
+    def test_forked(self):
+        dispatch._dispatcher = mock.Mock(pid=-1)
+
+        self.assertTrue(dispatch.drain())
+        self.assertFalse(dispatch._dispatcher.join.called)
@@ -14,7 +14,9 @@ import mock
 from pulp.server.compat import json
 from pulp.server.config import config
 from pulp.server.event import data, mail
+from pulp.server.event.dispatch import get_dispatcher
 from pulp.server.managers import factory
+from pulp.server.managers.event.fire import listener_cache
 
 
 class TestSendEmail(unittest.TestCase):
@@ -115,6 +117,7 @@ class TestSystem(unittest.TestCase):
             'addresses': ['user1@some.domain', 'user2@some.domain']
         }
         self.event_doc = {
+            '_id': 'listener-1',
             'notifier_type_id': mail.TYPE_ID,
             'event_types': data.TYPE_REPO_SYNC_FINISHED,
             'notifier_config': self.notifier_config,
@@ -137,7 +140,9 @@ class TestSystem(unittest.TestCase):
         mock_task_ser.return_value = 'serialized task'
         event = data.Event(data.TYPE_REPO_SYNC_FINISHED, 'stuff')
         factory.initialize()
+        listener_cache.invalidate()
         factory.event_fire_manager()._do_fire(event)
+        get_dispatcher().join(5)
 
         # verify that the mail event handler was called and processed something
         self.assertEqual(mock_smtp.return_value.sendmail.call_count, 2)
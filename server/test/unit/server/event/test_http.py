@@ -1,6 +1,8 @@
+import threading
 import unittest
 
 import mock
+from requests import RequestException
 
 from pulp.server.event import http
 from pulp.server.event.data import Event
@@ -27,8 +29,10 @@ class TestHTTPNotifierTests(unittest.TestCase):
             mock_json.dumps.return_value
         )
 
-    @mock.patch(MODULE_PATH + 'post')
-    def test_send_post_no_auth(self, mock_post):
+    @mock.patch(MODULE_PATH + '_get_session')
+    def test_send_post_no_auth(self, mock_session):
+        mock_post = mock_session.return_value.post
+        mock_post.return_value.status_code = 200
         notifier_config = {'url': 'https://localhost/api/'}
         data = {'head': 'feet'}
 
@@ -42,8 +46,10 @@ class TestHTTPNotifierTests(unittest.TestCase):
         )
 
     @mock.patch(MODULE_PATH + 'HTTPBasicAuth')
-    @mock.patch(MODULE_PATH + 'post')
-    def test_send_post_auth(self, mock_post, mock_basic_auth):
+    @mock.patch(MODULE_PATH + '_get_session')
+    def test_send_post_auth(self, mock_session, mock_basic_auth):
+        mock_post = mock_session.return_value.post
+        mock_post.return_value.status_code = 200
         notifier_config = {
             'url': 'https://localhost/api/',
             'username': 'jcline',
@@ -63,9 +69,10 @@ class TestHTTPNotifierTests(unittest.TestCase):
 
     @mock.patch(MODULE_PATH + '_logger')
     @mock.patch(MODULE_PATH + 'HTTPBasicAuth')
-    @mock.patch(MODULE_PATH + 'post')
-    def test_send_post_no_url(self, mock_post, mock_basic_auth, mock_log):
+    @mock.patch(MODULE_PATH + '_get_session')
+    def test_send_post_no_url(self, mock_session, mock_basic_auth, mock_log):
         """Assert attempting to post to no url fails."""
+        mock_post = mock_session.return_value.post
         expected_log = 'HTTP notifier configured without a URL; cannot fire event'
         http._send_post({}, {})
         mock_log.error.assert_called_once_with(expected_log)
@@ -73,9 +80,10 @@ class TestHTTPNotifierTests(unittest.TestCase):
 
     @mock.patch(MODULE_PATH + '_logger')
     @mock.patch(MODULE_PATH + 'HTTPBasicAuth')
-    @mock.patch(MODULE_PATH + 'post')
-    def test_send_post_bad_response(self, mock_post, mock_basic_auth, mock_log):
+    @mock.patch(MODULE_PATH + '_get_session')
+    def test_send_post_bad_response(self, mock_session, mock_basic_auth, mock_log):
         """Assert non-200 posts get logged."""
+        mock_post = mock_session.return_value.post
         expected_log = 'Received HTTP 404 from HTTP notifier to https://localhost/api/.'
         notifier_config = {
             'url': 'https://localhost/api/',
@@ -94,3 +102,42 @@ class TestHTTPNotifierTests(unittest.TestCase):
             timeout=15
         )
         mock_log.error.assert_called_once_with(expected_log)
+
+    @mock.patch(MODULE_PATH + '_get_session')
+    def test_send_post_server_error(self, mock_session):
+        """Assert 5xx responses raise so the delivery is retried."""
+        notifier_config = {'url': 'https://localhost/api/'}
+        response = mock_session.return_value.post.return_value
+        response.status_code = 503
+        response.raise_for_status.side_effect = RequestException()
+
+        self.assertRaises(RequestException, http._send_post, notifier_config, {})
+
+    @mock.patch(MODULE_PATH + '_get_session')
+    def test_send_post_connection_error(self, mock_session):
+        """Assert failed requests raise so the delivery is retried."""
+        notifier_config = {'url': 'https://localhost/api/'}
+        mock_session.return_value.post.side_effect = RequestException()
+
+        self.assertRaises(RequestException, http._send_post, notifier_config, {})
+
+    @mock.patch(MODULE_PATH + '_local', new_callable=threading.local)
+    @mock.patch(MODULE_PATH + 'Session')
+    def test_get_session(self, mock_session_class, mock_local):
+        """Assert each thread reuses its own session."""
+        sessions = []
+
+        def get():
+            sessions.append(http._get_session())
+            sessions.append(http._get_session())
+
+        mock_session_class.side_effect = [mock.Mock(), mock.Mock()]
+        get()
+        thread = threading.Thread(target=get)
+        thread.start()
+        thread.join()
+
+        self.assertEqual(mock_session_class.call_count, 2)
+        self.assertTrue(sessions[0] is sessions[1])
+        self.assertTrue(sessions[2] is sessions[3])
+        self.assertFalse(sessions[0] is sessions[2])
@@ -1,6 +1,10 @@
+import unittest
+
 import mock
+from pymongo.errors import BulkWriteError
 
 from .... import base
+from pulp.common import dateutils
 from pulp.devel import mock_plugins
 from pulp.plugins.loader import api as plugins
 from pulp.server.controllers import distributor as dist_controller
@@ -432,19 +436,367 @@ class ApplicabilityRegenerationManagerTests(base.PulpServerTests):
 
     @mock.patch('pulp.server.managers.consumer.applicability.model.Repository.objects')
     @mock.patch('pulp.server.db.model.consumer.RepoProfileApplicability.get_collection')
-    def test_linear_regen_applicability_for_repos_batch_size(self, mock_get_collection,
-                                                             mock_objects):
+    @mock.patch.object(ApplicabilityRegenerationManager, 'batch_regenerate_applicability')
+    def test_linear_regen_applicability_for_repos_batch_size(self, mock_batch_regenerate,
+                                                             mock_get_collection, mock_objects):
 
         factory.initialize()
         applicability_manager = ApplicabilityRegenerationManager()
         repo_criteria = {'filters': None, 'sort': None, 'limit': None,
                          'skip': None, 'fields': None}
         mock_objects.find_by_criteria.return_value = [Repository(repo_id='fake-repo')]
+        profile_hashes = [{'profile_hash': 'hash-%d' % i} for i in range(150)]
+        mock_get_collection.return_value.find.return_value = iter(profile_hashes)
 
         applicability_manager.regenerate_applicability_for_repos(repo_criteria)
 
-        # validate that batch size of 5 is used
-        mock_get_collection.return_value.find.return_value.batch_size.assert_called_with(5)
+        # validate that the profiles are regenerated in batches
+        mock_get_collection.return_value.find.assert_called_once_with(
+            {'repo_id': 'fake-repo'}, {'profile_hash': 1})
+        self.assertEqual(mock_batch_regenerate.call_args_list,
+                         [mock.call('fake-repo', tuple(profile_hashes[:100]), False),
+                          mock.call('fake-repo', tuple(profile_hashes[100:]), False)])
+
+    @mock.patch.object(ApplicabilityRegenerationManager, 'regenerate_applicability_for_profiles')
+    @mock.patch('pulp.server.db.model.consumer.RepoProfileApplicability.get_collection')
+    def test_batch_regenerate_applicability_full(self, mock_get_collection, mock_regenerate):
+        """
+        Test that the existing applicability is not patched when a full regeneration is requested.
+        """
+        mock_get_collection.return_value.find.return_value = [
+            {'profile_hash': 'hash-1', 'profile': ['profile-1']}]
+
+        ApplicabilityRegenerationManager.batch_regenerate_applicability(
+            'fake-repo', ({'profile_hash': 'hash-1'},), True)
+
+        mock_regenerate.assert_called_once_with('fake-repo', {'hash-1': ['profile-1']}, None)
+
+
+class RegenerateApplicabilityForProfilesTests(unittest.TestCase):
+
+    def setUp(self):
+        self.profiles = {'hash-1': ['profile-1'], 'hash-2': ['profile-2']}
+        self.unit_profiles = [
+            {'profile_hash': 'hash-1', 'content_type': 'rpm'},
+            {'profile_hash': 'hash-1', 'content_type': 'rpm'},
+            {'profile_hash': 'hash-2', 'content_type': 'rpm'}]
+        self.profiler = mock.Mock()
+        self.profiler.metadata.return_value = {'types': ['rpm', 'erratum']}
+        self.profiler.calculate_applicable_units_batch.side_effect = \
+            lambda profiles, r, c, x: dict((h, {'rpm': [h]}) for h in profiles)
+
+    @mock.patch.object(ApplicabilityRegenerationManager, '_get_existing_repo_content_types')
+    @mock.patch.object(ApplicabilityRegenerationManager, '_profiler')
+    @mock.patch('pulp.server.db.model.consumer.RepoProfileApplicability.get_collection')
+    @mock.patch('pulp.server.db.model.consumer.UnitProfile.get_collection')
+    def test_batch(self, mock_unit_profile_collection, mock_rpa_collection, mock_profiler,
+                   mock_content_types):
+        """
+        Test that the deduplicated profiles are calculated in one call and upserted in bulk.
+        """
+        mock_unit_profile_collection.return_value.find.return_value = self.unit_profiles
+        mock_profiler.return_value = (self.profiler, {})
+        mock_content_types.return_value = ['rpm']
+
+        ApplicabilityRegenerationManager.regenerate_applicability_for_profiles(
+            'repo-1', self.profiles)
+
+        mock_unit_profile_collection.return_value.find.assert_called_once_with(
+            {'profile_hash': {'$in': self.profiles.keys()}},
+            projection=['profile_hash', 'content_type'])
+        self.assertEqual(self.profiler.calculate_applicable_units_batch.call_count, 1)
+        self.assertEqual(self.profiler.calculate_applicable_units_batch.call_args[0][:2],
+                         (self.profiles, 'repo-1'))
+        self.assertEqual(self.profiler.calculate_applicable_units.call_count, 0)
+        bulk_write = mock_rpa_collection.return_value.bulk_write
+        self.assertEqual(bulk_write.call_count, 1)
+        requests = sorted(bulk_write.call_args[0][0], key=lambda r: r._filter['profile_hash'])
+        self.assertEqual([r._filter for r in requests],
+                         [{'repo_id': 'repo-1', 'profile_hash': 'hash-1'},
+                          {'repo_id': 'repo-1', 'profile_hash': 'hash-2'}])
+        self.assertEqual(requests[0]._doc, {'$set': {'profile': ['profile-1'],
+                                                     'applicability': {'rpm': ['hash-1']},
+                                                     'last_updated': mock.ANY}})
+        self.assertTrue(requests[0]._upsert)
+        self.assertEqual(bulk_write.call_args[1], {'ordered': False})
+
+    @mock.patch.object(ApplicabilityRegenerationManager, '_get_existing_repo_content_types')
+    @mock.patch.object(ApplicabilityRegenerationManager, '_profiler')
+    @mock.patch('pulp.server.db.model.consumer.RepoProfileApplicability.get_collection')
+    @mock.patch('pulp.server.db.model.consumer.UnitProfile.get_collection')
+    def test_per_profile_fallback(self, mock_unit_profile_collection, mock_rpa_collection,
+                                  mock_profiler, mock_content_types):
+        """
+        Test that profilers without the batch method are called once per profile.
+        """
+        mock_unit_profile_collection.return_value.find.return_value = self.unit_profiles
+        mock_profiler.return_value = (self.profiler, {})
+        mock_content_types.return_value = ['rpm']
+        self.profiler.calculate_applicable_units_batch.side_effect = NotImplementedError()
+        self.profiler.calculate_applicable_units.side_effect = \
+            lambda p, r, c, x: {'rpm': p}
+
+        ApplicabilityRegenerationManager.regenerate_applicability_for_profiles(
+            'repo-1', self.profiles)
+
+        self.assertEqual(self.profiler.calculate_applicable_units.call_count, 2)
+        requests = mock_rpa_collection.return_value.bulk_write.call_args[0][0]
+        self.assertEqual(
+            sorted(r._doc['$set']['applicability']['rpm'] for r in requests),
+            [['profile-1'], ['profile-2']])
+
+    @mock.patch.object(ApplicabilityRegenerationManager, '_get_existing_repo_content_types')
+    @mock.patch.object(ApplicabilityRegenerationManager, '_profiler')
+    @mock.patch('pulp.server.db.model.consumer.RepoProfileApplicability.get_collection')
+    @mock.patch('pulp.server.db.model.consumer.UnitProfile.get_collection')
+    def test_not_supported(self, mock_unit_profile_collection, mock_rpa_collection,
+                           mock_profiler, mock_content_types):
+        """
+        Test that nothing is saved when the profiler does not support applicability.
+        """
+        mock_unit_profile_collection.return_value.find.return_value = self.unit_profiles
+        mock_profiler.return_value = (self.profiler, {})
+        mock_content_types.return_value = ['rpm']
+        self.profiler.calculate_applicable_units_batch.side_effect = NotImplementedError()
+        self.profiler.calculate_applicable_units.side_effect = NotImplementedError()
+
+        ApplicabilityRegenerationManager.regenerate_applicability_for_profiles(
+            'repo-1', self.profiles)
+
+        self.assertFalse(mock_rpa_collection.return_value.bulk_write.called)
+
+    @mock.patch.object(ApplicabilityRegenerationManager, '_get_existing_repo_content_types')
+    @mock.patch.object(ApplicabilityRegenerationManager, '_profiler')
+    @mock.patch('pulp.server.db.model.consumer.RepoProfileApplicability.get_collection')
+    @mock.patch('pulp.server.db.model.consumer.UnitProfile.get_collection')
+    def test_no_repo_content_types(self, mock_unit_profile_collection, mock_rpa_collection,
+                                   mock_profiler, mock_content_types):
+        """
+        Test that profiles are skipped when the repo has no units of the profiler's types.
+        """
+        mock_unit_profile_collection.return_value.find.return_value = self.unit_profiles
+        mock_profiler.return_value = (self.profiler, {})
+        mock_content_types.return_value = ['iso']
+
+        ApplicabilityRegenerationManager.regenerate_applicability_for_profiles(
+            'repo-1', self.profiles)
+
+        self.assertFalse(self.profiler.calculate_applicable_units_batch.called)
+        self.assertFalse(mock_rpa_collection.return_value.bulk_write.called)
+
+    @mock.patch('pulp.server.db.model.consumer.RepoProfileApplicability.get_collection')
+    @mock.patch('pulp.server.db.model.consumer.UnitProfile.get_collection')
+    def test_missing_unit_profiles(self, mock_unit_profile_collection, mock_rpa_collection):
+        """
+        Test that profile hashes without a unit profile are skipped.
+        """
+        mock_unit_profile_collection.return_value.find.return_value = []
+
+        ApplicabilityRegenerationManager.regenerate_applicability_for_profiles(
+            'repo-1', self.profiles)
+
+        self.assertFalse(mock_rpa_collection.return_value.bulk_write.called)
+
+    @mock.patch('pulp.server.managers.consumer.applicability.model.Repository.objects')
+    @mock.patch('pulp.server.managers.consumer.applicability.model.RepositoryContentUnit.objects')
+    @mock.patch.object(ApplicabilityRegenerationManager, '_get_existing_repo_content_types')
+    @mock.patch.object(ApplicabilityRegenerationManager, '_profiler')
+    @mock.patch('pulp.server.db.model.consumer.RepoProfileApplicability.get_collection')
+    @mock.patch('pulp.server.db.model.consumer.UnitProfile.get_collection')
+    @mock.patch.object(ApplicabilityRegenerationManager, '_units_updated')
+    def _regenerate_with_delta(self, existing, added, last_unit_removed, associated,
+                               mock_units_updated, mock_unit_profile_collection,
+                               mock_rpa_collection, mock_profiler, mock_content_types,
+                               mock_rcu_objects, mock_repo_objects, units_updated=False):
+        """
+        Regenerate the applicability of the test profiles from the given existing applicability,
+        with the given associations created since then.
+
+        :return: the upserts written to the database, sorted by profile hash
+        :rtype:  list
+        """
+        mock_unit_profile_collection.return_value.find.return_value = self.unit_profiles
+        mock_profiler.return_value = (self.profiler, {})
+        mock_content_types.return_value = ['rpm']
+        mock_rcu_objects.return_value.only.return_value.limit.return_value = [
+            model.RepositoryContentUnit(unit_type_id=type_id, unit_id=unit_id)
+            for type_id, unit_id in added]
+        mock_rcu_objects.return_value.distinct.return_value = associated
+        mock_repo_objects.only.return_value.get.return_value.last_unit_removed = \
+            last_unit_removed
+        mock_units_updated.return_value = units_updated
+        self.mock_rcu_objects = mock_rcu_objects
+        self.mock_units_updated = mock_units_updated
+
+        ApplicabilityRegenerationManager.regenerate_applicability_for_profiles(
+            'repo-1', self.profiles, existing)
+
+        bulk_write = mock_rpa_collection.return_value.bulk_write
+        if not bulk_write.called:
+            return []
+        return sorted(bulk_write.call_args[0][0], key=lambda r: r._filter['profile_hash'])
+
+    def _existing(self, last_updated='2016-01-01T00:00:00Z'):
+        return {
+            'hash-1': {'profile_hash': 'hash-1', 'profile': ['profile-1'],
+                       'applicability': {'rpm': ['rpm-1', 'rpm-2']}, 'last_updated': last_updated},
+            'hash-2': {'profile_hash': 'hash-2', 'profile': ['profile-2'],
+                       'applicability': {'rpm': ['rpm-2']}, 'last_updated': last_updated}}
+
+    def test_delta_added_units(self):
+        """
+        Test that the applicability of the added units is merged into the existing applicability.
+        """
+        self.profiler.calculate_applicable_units_delta.return_value = {
+            'hash-1': {'rpm': ['rpm-3'], 'erratum': ['errata-1']}}
+
+        requests = self._regenerate_with_delta(
+            self._existing(), [('rpm', 'rpm-3'), ('erratum', 'errata-1'), ('iso', 'iso-1')],
+            None, [])
+
+        self.mock_rcu_objects.assert_called_once_with(repo_id='repo-1',
+                                                      created__gte='2016-01-01T00:00:00Z')
+        self.assertEqual(self.profiler.calculate_applicable_units_delta.call_args[0][:3],
+                         (self.profiles, 'repo-1', {'rpm': ['rpm-3'], 'erratum': ['errata-1']}))
+        self.assertFalse(self.profiler.calculate_applicable_units_batch.called)
+        self.assertEqual(requests[0]._doc['$set']['applicability'],
+                         {'rpm': ['rpm-1', 'rpm-2', 'rpm-3'], 'erratum': ['errata-1']})
+        self.assertEqual(requests[1]._doc['$set']['applicability'], {'rpm': ['rpm-2']})
+        self.assertTrue(requests[0]._doc['$set']['last_updated'] > '2016-01-01T00:00:00Z')
+
+    def test_delta_removed_units(self):
+        """
+        Test that units that are no longer in the repo are dropped from the applicability.
+        """
+        self.profiler.calculate_applicable_units_delta.return_value = {}
+        last_unit_removed = dateutils.parse_iso8601_datetime('2016-02-01T00:00:00Z')
+
+        requests = self._regenerate_with_delta(self._existing(), [], last_unit_removed,
+                                               ['rpm-1'])
+
+        self.mock_rcu_objects.assert_called_with(repo_id='repo-1',
+                                                 unit_id__in=mock.ANY)
+        self.assertEqual(sorted(self.mock_rcu_objects.call_args[1]['unit_id__in']),
+                         ['rpm-1', 'rpm-2'])
+        self.assertEqual(requests[0]._doc['$set']['applicability'], {'rpm': ['rpm-1']})
+        self.assertEqual(requests[1]._doc['$set']['applicability'], {'rpm': []})
+
+    def test_delta_unchanged_repo(self):
+        """
+        Test that the existing applicability is kept when the repo has not changed.
+        """
+        last_unit_removed = dateutils.parse_iso8601_datetime('2015-12-01T00:00:00Z')
+
+        requests = self._regenerate_with_delta(self._existing(), [], last_unit_removed, [])
+
+        self.mock_units_updated.assert_called_once_with('repo-1', mock.ANY,
+                                                        '2016-01-01T00:00:00Z')
+        self.assertFalse(self.profiler.calculate_applicable_units_delta.called)
+        self.assertFalse(self.profiler.calculate_applicable_units_batch.called)
+        self.assertEqual(requests[0]._doc['$set']['applicability'],
+                         {'rpm': ['rpm-1', 'rpm-2']})
+        self.assertEqual(requests[1]._doc['$set']['applicability'], {'rpm': ['rpm-2']})
+        self.assertTrue(requests[0]._doc['$set']['last_updated'] > '2016-01-01T00:00:00Z')
+
+    def test_delta_updated_units(self):
+        """
+        Test that the applicability is calculated from scratch when units in the repo were updated.
+        """
+        requests = self._regenerate_with_delta(self._existing(), [], None, [],
+                                               units_updated=True)
+
+        self.assertFalse(self.profiler.calculate_applicable_units_delta.called)
+        self.assertEqual(requests[0]._doc['$set']['applicability'], {'rpm': ['hash-1']})
+
+    def test_delta_unknown(self):
+        """
+        Test that the applicability is calculated from scratch when it was never timestamped.
+        """
+        requests = self._regenerate_with_delta(self._existing(last_updated=None), [], None, [])
+
+        self.assertFalse(self.profiler.calculate_applicable_units_delta.called)
+        self.assertEqual(requests[0]._doc['$set']['applicability'], {'rpm': ['hash-1']})
+
+    @mock.patch('pulp.server.managers.consumer.applicability.INCREMENTAL_APPLICABILITY_MAX_UNITS',
+                1)
+    def test_delta_too_large(self):
+        """
+        Test that the applicability is calculated from scratch when many units were added.
+        """
+        requests = self._regenerate_with_delta(
+            self._existing(), [('rpm', 'rpm-3'), ('rpm', 'rpm-4')], None, [])
+
+        self.mock_rcu_objects.return_value.only.return_value.limit.assert_called_once_with(2)
+        self.assertFalse(self.profiler.calculate_applicable_units_delta.called)
+        self.assertEqual(requests[0]._doc['$set']['applicability'], {'rpm': ['hash-1']})
+
+    def test_delta_not_supported(self):
+        """
+        Test that the applicability is calculated from scratch by profilers without delta support.
+        """
+        self.profiler.calculate_applicable_units_delta.side_effect = NotImplementedError()
+
+        requests = self._regenerate_with_delta(self._existing(), [('rpm', 'rpm-3')], None, [])
+
+        self.assertTrue(self.profiler.calculate_applicable_units_batch.called)
+        self.assertEqual(requests[0]._doc['$set']['applicability'], {'rpm': ['hash-1']})
+
+    @mock.patch('pulp.server.managers.consumer.applicability.model.RepositoryContentUnit.objects')
+    @mock.patch('pulp.server.managers.consumer.applicability.types_db.type_units_collection')
+    def test_units_updated(self, mock_units_collection, mock_rcu_objects):
+        """
+        Test that units updated since the given time are looked up among the repo's units.
+        """
+        mock_units_collection.return_value.find.return_value = [{'_id': 'rpm-1'}]
+        mock_rcu_objects.return_value.count.return_value = 1
+
+        self.assertTrue(ApplicabilityRegenerationManager._units_updated(
+            'repo-1', ['rpm'], '2016-01-01T00:00:00Z'))
+
+        mock_units_collection.assert_called_once_with('rpm')
+        mock_units_collection.return_value.find.assert_called_once_with(
+            {'_last_updated': {'$gte': 1451606400}}, projection=['_id'])
+        mock_rcu_objects.assert_called_once_with(repo_id='repo-1', unit_id__in=['rpm-1'],
+                                                 created__lt='2016-01-01T00:00:00Z')
+
+    @mock.patch('pulp.server.managers.consumer.applicability.model.RepositoryContentUnit.objects')
+    @mock.patch('pulp.server.managers.consumer.applicability.types_db.type_units_collection')
+    def test_units_updated_elsewhere(self, mock_units_collection, mock_rcu_objects):
+        """
+        Test that units updated outside of the repo are ignored.
+        """
+        mock_units_collection.return_value.find.return_value = [{'_id': 'rpm-1'}]
+        mock_rcu_objects.return_value.count.return_value = 0
+
+        self.assertFalse(ApplicabilityRegenerationManager._units_updated(
+            'repo-1', ['rpm'], '2016-01-01T00:00:00Z'))
+
+    @mock.patch('pulp.server.db.model.consumer.RepoProfileApplicability.get_collection')
+    def test_save_retries_duplicate_keys(self, mock_get_collection):
+        """
+        Test that upserts that lost a race with a concurrent insert are repeated.
+        """
+        requests = ['upsert-1', 'upsert-2', 'upsert-3']
+        details = {'writeErrors': [{'index': 1, 'code': 11000}], 'writeConcernErrors': []}
+        bulk_write = mock_get_collection.return_value.bulk_write
+        bulk_write.side_effect = [BulkWriteError(details), None]
+
+        ApplicabilityRegenerationManager._save_applicabilities(requests)
+
+        self.assertEqual(bulk_write.call_args_list,
+                         [mock.call(requests, ordered=False),
+                          mock.call(['upsert-2'], ordered=False)])
+
+    @mock.patch('pulp.server.db.model.consumer.RepoProfileApplicability.get_collection')
+    def test_save_other_errors_raise(self, mock_get_collection):
+        """
+        Test that write errors other than duplicate keys are raised.
+        """
+        details = {'writeErrors': [{'index': 0, 'code': 2}], 'writeConcernErrors': []}
+        mock_get_collection.return_value.bulk_write.side_effect = BulkWriteError(details)
+
+        self.assertRaises(BulkWriteError, ApplicabilityRegenerationManager._save_applicabilities,
+                          ['upsert-1'])
 
 
 class TestRepoProfileApplicabilityManager(base.PulpServerTests):
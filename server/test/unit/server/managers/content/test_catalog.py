@@ -150,6 +150,31 @@ class TestCatalogManager(PulpServerTests):
         self.assertEqual(collection.find({'source_id': source_a}).count(), 0)
         self.assertEqual(collection.find({'source_id': source_b}).count(), 10)
 
+    def test_add_entries(self):
+        units = self.units(0, 10)
+        manager = ContentCatalogManager()
+        entries = [(TYPE_ID, unit_key, url) for unit_key, url in units]
+        added = manager.add_entries(SOURCE_ID, EXPIRATION, entries, generation='gen-1')
+        collection = ContentCatalog.get_collection()
+        self.assertEqual(added, len(units))
+        self.assertEqual(len(units), collection.find({'generation': 'gen-1'}).count())
+        self.assertEqual(manager.add_entries(SOURCE_ID, EXPIRATION, []), 0)
+
+    def test_retire(self):
+        source_a = 'A'
+        source_b = 'B'
+        manager = ContentCatalogManager()
+        for unit_key, url in self.units(0, 10):
+            manager.add_entry(source_a, EXPIRATION, TYPE_ID, unit_key, url)
+            manager.add_entry(source_b, EXPIRATION, TYPE_ID, unit_key, url)
+        for unit_key, url in self.units(10, 5):
+            manager.add_entry(source_a, EXPIRATION, TYPE_ID, unit_key, url, generation='gen-2')
+        retired = manager.retire(source_a, 'gen-2')
+        collection = ContentCatalog.get_collection()
+        self.assertEqual(retired, 10)
+        self.assertEqual(collection.find({'source_id': source_a}).count(), 5)
+        self.assertEqual(collection.find({'source_id': source_b}).count(), 10)
+
     def test_find(self):
         units = self.units(0, 10)
         manager = ContentCatalogManager()
@@ -171,6 +196,23 @@ class TestCatalogManager(PulpServerTests):
             self.assertEqual(entry['unit_key'], unit_key)
             self.assertEqual(entry['url'], url)
 
+    def test_find_all(self):
+        units = self.units(0, 10)
+        manager = ContentCatalogManager()
+        for unit_key, url in units:
+            manager.add_entry(SOURCE_ID, EXPIRATION, TYPE_ID, unit_key, url)
+        missing = self.units(10, 1)[0]
+        keys = [(TYPE_ID, unit_key) for unit_key, url in units + [missing]]
+        found = manager.find_all(keys)
+        self.assertEqual(len(found), len(keys))
+        for (unit_key, url), entries in zip(units, found):
+            self.assertEqual(len(entries), 1)
+            entry = entries[0]
+            self.assertEqual(entry['type_id'], TYPE_ID)
+            self.assertEqual(entry['unit_key'], unit_key)
+            self.assertEqual(entry['url'], url)
+        self.assertEqual(found[-1], [])
+
     def test_expired(self):
         units = self.units(0, 10)
         manager = ContentCatalogManager()
@@ -15,7 +15,7 @@ from pulp.plugins.types.model import TypeDefinition
 from pulp.server import exceptions as pulp_exceptions
 from pulp.server.db.model.repository import RepoContentUnit
 from pulp.server.managers import factory as manager_factory
-from pulp.server.managers.content.orphan import OrphanManager
+from pulp.server.managers.content.orphan import OrphanManager, OrphanScanProgress
 
 
 MODULE_PATH = 'pulp.server.managers.content.orphan.'
@@ -281,18 +281,19 @@ class OrphanManagerGeneratorTests(OrphanManagerTests):
     @patch(MODULE_PATH + 'model.LazyCatalogEntry.objects')
     @patch(MODULE_PATH + 'OrphanManager.delete_orphaned_file')
     @patch(MODULE_PATH + 'model.RepositoryContentUnit.objects')
+    @patch(MODULE_PATH + 'OrphanManager.generate_orphans_by_type')
     @patch(MODULE_PATH + 'plugin_api.get_unit_model_by_id')
     def test_delete_content_unit_by_type(
-            self, m_get_model, m_rcu_objects, m_del_orphan, mock_lazy_catalog_objects):
+            self, m_get_model, m_generate, m_rcu_objects, m_del_orphan,
+            mock_lazy_catalog_objects):
         orphan = Mock(_storage_path='test_foo_path', id='orphan')
-        non_orphan = Mock(_storage_path='test_foo_path', id='non_orphan')
-        m_get_model.return_value.objects.only.return_value = [
-            orphan,
-            non_orphan
-        ]
+        m_generate.return_value = [{'_id': 'orphan'}, {'_id': 'non_orphan'}]
+        m_get_model.return_value.objects.return_value.only.return_value = [orphan]
+        # 'non_orphan' was associated after the scan
         m_rcu_objects.return_value.distinct.return_value = ['non_orphan']
 
         self.orphan_manager.delete_orphan_content_units_by_type('foo_type')
+        m_get_model.return_value.objects.assert_called_once_with(id__in=('orphan',))
         mock_lazy_catalog_objects.assert_called_once_with(
             unit_id='orphan',
             unit_type_id='foo_type'
@@ -309,6 +310,113 @@ class OrphanManagerGeneratorTests(OrphanManagerTests):
         mock_get_model.return_value.objects.assert_called_once_with(id__in=('orphan2',))
 
 
+class TestGenerateOrphansByType(TestCase):
+
+    def setUp(self):
+        super(TestGenerateOrphansByType, self).setUp()
+        self.units = [{'_id': unit_id} for unit_id in ('a', 'b', 'c', 'd', 'e')]
+        self.associations = [{'unit_id': unit_id} for unit_id in ('0', 'b', 'b', 'd', 'f')]
+
+    def _patch_collections(self, mock_type_collection, mock_rcu_collection):
+        units_cursor = mock_type_collection.return_value.find.return_value
+        units_cursor.sort.return_value.batch_size.return_value = iter(self.units)
+        rcu_cursor = mock_rcu_collection.return_value.find.return_value
+        rcu_cursor.sort.return_value.hint.return_value.batch_size.return_value = \
+            iter(self.associations)
+
+    @patch(MODULE_PATH + 'RepoContentUnit.get_collection')
+    @patch(MODULE_PATH + 'content_types_db.type_units_collection')
+    def test_merge(self, mock_type_collection, mock_rcu_collection):
+        """
+        Assert that units without an association are yielded, and that duplicate associations
+        and associations of missing units are skipped.
+        """
+        self._patch_collections(mock_type_collection, mock_rcu_collection)
+
+        orphans = list(OrphanManager.generate_orphans_by_type('foo', fields=['_id', 'name']))
+
+        self.assertEqual(orphans, [{'_id': 'a'}, {'_id': 'c'}, {'_id': 'e'}])
+        mock_type_collection.return_value.find.assert_called_once_with(
+            {}, projection=['_id', 'name'])
+        mock_rcu_collection.return_value.find.assert_called_once_with(
+            {'unit_type_id': 'foo'}, projection={'unit_id': 1, '_id': 0})
+        mock_rcu_collection.return_value.find.return_value.sort.return_value.hint\
+            .assert_called_once_with([('unit_type_id', 1), ('unit_id', 1)])
+
+    @patch(MODULE_PATH + 'RepoContentUnit.get_collection')
+    @patch(MODULE_PATH + 'content_types_db.type_units_collection')
+    def test_no_associations(self, mock_type_collection, mock_rcu_collection):
+        self.associations = []
+        self._patch_collections(mock_type_collection, mock_rcu_collection)
+
+        orphans = list(OrphanManager.generate_orphans_by_type('foo'))
+
+        self.assertEqual(orphans, self.units)
+
+    @patch(MODULE_PATH + 'RepoContentUnit.get_collection')
+    @patch(MODULE_PATH + 'content_types_db.type_units_collection')
+    def test_progress(self, mock_type_collection, mock_rcu_collection):
+        self._patch_collections(mock_type_collection, mock_rcu_collection)
+        progress = Mock()
+
+        list(OrphanManager.generate_orphans_by_type('foo', progress=progress))
+
+        progress.started.assert_called_once_with('foo')
+        self.assertEqual(progress.scanned.call_args_list,
+                         [call('foo', True), call('foo', False), call('foo', True),
+                          call('foo', False), call('foo', True)])
+        progress.finished.assert_called_once_with('foo')
+
+    @patch(MODULE_PATH + 'model.TaskStatus.objects')
+    @patch(MODULE_PATH + 'RepoContentUnit.get_collection')
+    @patch(MODULE_PATH + 'content_types_db.type_units_collection')
+    def test_no_progress(self, mock_type_collection, mock_rcu_collection, mock_task_objects):
+        """
+        Assert that the progress report of the calling task is left alone without a tracker.
+        """
+        self._patch_collections(mock_type_collection, mock_rcu_collection)
+
+        list(OrphanManager.generate_orphans_by_type('foo'))
+
+        self.assertFalse(mock_task_objects.called)
+
+
+class TestOrphanScanProgress(TestCase):
+
+    @patch(MODULE_PATH + 'get_current_task_id', return_value=None)
+    @patch(MODULE_PATH + 'model.TaskStatus.objects')
+    def test_no_task(self, mock_task_objects, mock_task_id):
+        progress = OrphanScanProgress()
+
+        progress.started('foo')
+        progress.scanned('foo', True)
+        progress.finished('foo')
+
+        self.assertFalse(mock_task_objects.called)
+        self.assertEqual(progress.types['foo']['orphans_found'], 1)
+
+    @patch(MODULE_PATH + 'time.time', return_value=10)
+    @patch(MODULE_PATH + 'get_current_task_id', return_value='task')
+    @patch(MODULE_PATH + 'model.TaskStatus.objects')
+    def test_report_throttled(self, mock_task_objects, mock_task_id, mock_time):
+        progress = OrphanScanProgress()
+
+        progress.started('foo')
+        progress.scanned('foo', True)
+        progress.scanned('foo', False)
+        progress.finished('foo')
+
+        # started and finished are forced, the scanned updates fall in the same second
+        self.assertEqual(mock_task_objects.return_value.update_one.call_count, 2)
+        mock_task_objects.assert_called_with(task_id='task')
+        # only the orphan scan key of the progress report is set
+        update = mock_task_objects.return_value.update_one.call_args[1]
+        self.assertEqual(update.keys(), ['set__progress_report__orphan_scan'])
+        report = update['set__progress_report__orphan_scan']
+        self.assertEqual(report['foo']['units_scanned'], 2)
+        self.assertEqual(report['foo']['state'], 'FINISHED')
+
+
 class TestDelete(TestCase):
 
     @patch('shutil.rmtree')
@@ -1,9 +1,12 @@
+import unittest
+
 import mock
 
 from .... import base
 from pulp.server.db.model.event import EventListener
-from pulp.server.event import data as event_data, notifiers
+from pulp.server.event import data as event_data, dispatch, notifiers
 from pulp.server.managers import factory as manager_factory
+from pulp.server.managers.event import fire
 
 
 class EventFireManagerTests(base.PulpServerTests):
@@ -14,9 +17,16 @@ class EventFireManagerTests(base.PulpServerTests):
         self.manager = manager_factory.event_fire_manager()
         self.event_manager = manager_factory.event_listener_manager()
 
+        fire.listener_cache.invalidate()
+        self.dispatcher = dispatch.Dispatcher(retries=0)
+        self.dispatcher_patch = mock.patch(
+            'pulp.server.managers.event.fire.dispatch.get_dispatcher', return_value=self.dispatcher)
+        self.dispatcher_patch.start()
+
     def tearDown(self):
         super(EventFireManagerTests, self).tearDown()
 
+        self.dispatcher_patch.stop()
         EventListener.get_collection().remove()
         notifiers.reset()
 
@@ -41,6 +51,7 @@ class EventFireManagerTests(base.PulpServerTests):
         # Test
         event = event_data.Event(event_data.TYPE_REPO_SYNC_STARTED, 'payload')
         self.manager._do_fire(event)
+        self.dispatcher.join()
 
         # Verify
         self.assertEqual(1, notifier_1.fire.call_count)
@@ -66,6 +77,7 @@ class EventFireManagerTests(base.PulpServerTests):
         # Test
         event = event_data.Event(event_data.TYPE_REPO_SYNC_STARTED, 'payload')
         self.manager._do_fire(event)
+        self.dispatcher.join()
 
         # Verify
         self.assertEqual(1, notifier_1.fire.call_count)
@@ -88,6 +100,7 @@ class EventFireManagerTests(base.PulpServerTests):
         # Test
         event = event_data.Event(event_data.TYPE_REPO_SYNC_STARTED, 'payload')
         self.manager._do_fire(event)
+        self.dispatcher.join()
 
         # Verify
 
@@ -113,6 +126,7 @@ class EventFireManagerTests(base.PulpServerTests):
         # Test
         repo_id = 'test-repo'
         self.manager.fire_repo_sync_started(repo_id)
+        self.dispatcher.join()
 
         # Verify
         self.assertEqual(1, notifier.fire.call_count)
@@ -134,6 +148,7 @@ class EventFireManagerTests(base.PulpServerTests):
         # so make up a fake dict here to simulate that.
         result = {'repo_id': 'test-repo', 'result': 'success'}
         self.manager.fire_repo_sync_finished(result)
+        self.dispatcher.join()
 
         # Verify
         self.assertEqual(1, notifier.fire.call_count)
@@ -141,3 +156,59 @@ class EventFireManagerTests(base.PulpServerTests):
 
         self.assertEqual(event.event_type, event_data.TYPE_REPO_SYNC_FINISHED)
         self.assertEqual(event.payload, result)
+
+
+class ListenerCacheTests(unittest.TestCase):
+
+    def setUp(self):
+        self.listeners = [
+            {'_id': 1, 'event_types': [event_data.TYPE_REPO_SYNC_STARTED]},
+            {'_id': 2, 'event_types': ['*']},
+            {'_id': 3, 'event_types': [event_data.TYPE_REPO_SYNC_FINISHED]},
+        ]
+
+    @mock.patch('pulp.server.managers.event.fire.EventListener.get_collection')
+    def test_get(self, mock_get_collection):
+        mock_get_collection.return_value.find.return_value = self.listeners
+        cache = fire.ListenerCache()
+
+        listeners = cache.get(event_data.TYPE_REPO_SYNC_STARTED)
+        listeners = cache.get(event_data.TYPE_REPO_SYNC_STARTED)
+
+        self.assertEqual([l['_id'] for l in listeners], [1, 2])
+        self.assertEqual(mock_get_collection.return_value.find.call_count, 1)
+
+    @mock.patch('pulp.server.managers.event.fire.EventListener.get_collection')
+    def test_get_invalidated(self, mock_get_collection):
+        mock_get_collection.return_value.find.return_value = self.listeners
+        cache = fire.ListenerCache()
+
+        cache.get(event_data.TYPE_REPO_SYNC_STARTED)
+        cache.invalidate()
+        cache.get(event_data.TYPE_REPO_SYNC_STARTED)
+
+        self.assertEqual(mock_get_collection.return_value.find.call_count, 2)
+
+    @mock.patch('pulp.server.managers.event.fire.time')
+    @mock.patch('pulp.server.managers.event.fire.EventListener.get_collection')
+    def test_get_expired(self, mock_get_collection, mock_time):
+        mock_get_collection.return_value.find.return_value = self.listeners
+        mock_time.time.side_effect = [100, 100 + fire.LISTENER_CACHE_TTL]
+        cache = fire.ListenerCache()
+
+        cache.get(event_data.TYPE_REPO_SYNC_STARTED)
+        cache.get(event_data.TYPE_REPO_SYNC_STARTED)
+
+        self.assertEqual(mock_get_collection.return_value.find.call_count, 2)
+
+    @mock.patch('pulp.server.managers.event.fire.dispatch.get_dispatcher')
+    @mock.patch('pulp.server.managers.event.fire.listener_cache')
+    def test_do_fire_dispatched(self, mock_cache, mock_get_dispatcher):
+        mock_cache.get.return_value = self.listeners[0:2]
+        event = mock.Mock(event_type=event_data.TYPE_REPO_SYNC_STARTED)
+
+        fire.EventFireManager()._do_fire(event)
+
+        mock_cache.get.assert_called_once_with(event_data.TYPE_REPO_SYNC_STARTED)
+        self.assertEqual(mock_get_dispatcher.return_value.dispatch.call_args_list,
+                         [mock.call(l, event) for l in self.listeners[0:2]])
@@ -136,8 +136,9 @@ class RepoUnitAssociationManagerTests(base.PulpServerTests):
         self.assertEqual(1, len(repo_units))
         self.assertEqual('unit-1', repo_units[0]['unit_id'])
 
-    @mock.patch('pulp.server.managers.repo.unit_association.repo_controller')
-    def test_associate_all(self, mock_ctrl, mock_repo):
+    @mock.patch.object(association_manager.repo_controller, 'update_last_unit_added')
+    @mock.patch.object(association_manager.repo_controller, 'update_unit_count')
+    def test_associate_all(self, mock_update_count, mock_update_last, mock_repo):
         """
         Tests making multiple associations in a single call.
         """
@@ -305,19 +306,23 @@ class RepoUnitAssociationManagerTests(base.PulpServerTests):
         self.manager.associate_unit_by_id(self.repo_id, 'type-1', 'unit-1')
         self.assertEqual(mock_ctrl.update_unit_count.call_count, 1)  # only from first associate
 
-    @mock.patch('pulp.server.managers.repo.unit_association.repo_controller')
-    def test_associate_all_by_ids_calls_update_unit_count(self, mock_ctrl, mock_repo):
+    @mock.patch.object(association_manager.repo_controller, 'update_last_unit_added')
+    @mock.patch.object(association_manager.repo_controller, 'update_unit_count')
+    def test_associate_all_by_ids_calls_update_unit_count(self, mock_update_count,
+                                                          mock_update_last, mock_repo):
         IDS = ('foo', 'bar', 'baz')
         self.manager.associate_all_by_ids(self.repo_id, 'type-1', IDS)
-        mock_ctrl.update_unit_count.assert_called_once_with(self.repo_id, 'type-1', len(IDS))
+        mock_update_count.assert_called_once_with(self.repo_id, 'type-1', len(IDS))
+        mock_update_last.assert_called_once_with(self.repo_id)
 
     @mock.patch('pulp.server.managers.repo.unit_association.repo_controller')
     def test_associate_all_by_id_calls_update_last_unit_added(self, mock_ctrl, mock_repo_qs):
         self.manager.associate_unit_by_id(self.repo_id, 'type-1', 'unit-1')
         mock_ctrl.update_last_unit_added.assert_called_once_with(self.repo_id)
 
-    @mock.patch('pulp.server.managers.repo.unit_association.repo_controller')
-    def test_associate_all_non_unique(self, mock_ctrl, mock_repo):
+    @mock.patch.object(association_manager.repo_controller, 'update_last_unit_added')
+    @mock.patch.object(association_manager.repo_controller, 'update_unit_count')
+    def test_associate_all_non_unique(self, mock_update_count, mock_update_last, mock_repo):
         """
         Makes sure when two identical associations are requested, they only
         get counted once.
@@ -325,7 +330,12 @@ class RepoUnitAssociationManagerTests(base.PulpServerTests):
         IDS = ('foo', 'bar', 'foo')
 
         self.manager.associate_all_by_ids(self.repo_id, 'type-1', IDS)
-        mock_ctrl.update_unit_count.assert_called_once_with(self.repo_id, 'type-1', 2)
+        mock_update_count.assert_called_once_with(self.repo_id, 'type-1', 2)
+
+        # associating them again updates the existing associations without counting them
+        mock_update_count.reset_mock()
+        self.assertEqual(self.manager.associate_all_by_ids(self.repo_id, 'type-1', IDS), 0)
+        self.assertFalse(mock_update_count.called)
 
     # This test is skipped for now because it needs to be reworked to reflect the changes from this
     # commit, and we don't have time to do that at the moment.
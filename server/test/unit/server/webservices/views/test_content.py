@@ -327,8 +327,8 @@ class TestContentUnitSearch(unittest.TestCase):
         content_search = ContentUnitSearch()
         mock_query = mock.MagicMock()
         mock_search = mock.MagicMock(return_value=['result_1', 'result_2'])
-        serialized_results = content_search.get_results(mock_query, mock_search, {},
-                                                        type_id='mock_type')
+        serialized_results = list(content_search.get_results(mock_query, mock_search, {},
+                                                             type_id='mock_type'))
         mock_process.assert_has_calls([mock.call('result_1', 'mock_type'),
                                        mock.call('result_2', 'mock_type')])
         self.assertEqual(serialized_results, [mock_process.return_value, mock_process.return_value])
@@ -343,9 +343,9 @@ class TestContentUnitSearch(unittest.TestCase):
         content_search = ContentUnitSearch()
         mock_query = mock.MagicMock()
         mock_search = mock.MagicMock(return_value=['result_1', 'result_2'])
-        serialized_results = content_search.get_results(
+        serialized_results = list(content_search.get_results(
             mock_query, mock_search, {'include_repos': True}, type_id='mock_type'
-        )
+        ))
         mock_process.assert_has_calls([mock.call('result_1', 'mock_type'),
                                        mock.call('result_2', 'mock_type')])
         self.assertEqual(serialized_results, [mock_process.return_value, mock_process.return_value])
@@ -362,9 +362,9 @@ class TestContentUnitSearch(unittest.TestCase):
         content_search = ContentUnitSearch()
         mock_query = {}
         mock_search = mock.MagicMock(return_value=['result_1', 'result_2'])
-        serialized_results = content_search.get_results(
+        serialized_results = list(content_search.get_results(
             mock_query, mock_search, {'include_repos': True}, type_id='mock_type'
-        )
+        ))
         self.assertEqual(m_serializer.translate_filters.call_count, 0)
         mock_process.assert_has_calls([mock.call('result_1', 'mock_type'),
                                        mock.call('result_2', 'mock_type')])
@@ -382,9 +382,9 @@ class TestContentUnitSearch(unittest.TestCase):
         content_search = ContentUnitSearch()
         mock_query = {'filters': {'mock': 'filters'}}
         mock_search = mock.MagicMock(return_value=['result_1', 'result_2'])
-        serialized_results = content_search.get_results(
+        serialized_results = list(content_search.get_results(
             mock_query, mock_search, {'include_repos': True}, type_id='mock_type'
-        )
+        ))
         m_serial.translate_filters.assert_called_once_with(m_serial.model, {'mock': 'filters'})
         self.assertEqual(m_serial.translate_filters.call_count, 1)
         mock_process.assert_has_calls([mock.call('result_1', 'mock_type'),
@@ -4,6 +4,7 @@ This module contains tests for the pulp.server.webservices.views.decorators modu
 import mock
 
 from .... import base
+from pulp.server.auth import cache
 from pulp.server.exceptions import PulpCodedAuthenticationException
 from pulp.server.webservices.views import decorators
 
@@ -24,9 +25,10 @@ class TestAuthenticationMethods(base.PulpServerTests):
         self.assertRaises(PulpCodedAuthenticationException, decorators.check_preauthenticated)
         mock_request_info.assert_called_once_with('REMOTE_USER')
 
+    @mock.patch('pulp.server.webservices.views.decorators.permission_index')
     @mock.patch('pulp.server.managers.factory.authentication_manager', autospec=True)
     @mock.patch('pulp.server.webservices.http.username_password', autospec=True)
-    def test_password_authentication_failed(self, mock_user_pass, mock_auth_manager):
+    def test_password_authentication_failed(self, mock_user_pass, mock_auth_manager, *unused):
         # Setup a mock check to ensure failure
         mock_user_pass.return_value = ('notauser', 'notapass')
         mock_auth_manager.return_value.check_username_password.return_value = None
@@ -36,6 +38,73 @@ class TestAuthenticationMethods(base.PulpServerTests):
         mock_auth_manager.return_value.check_username_password.assert_called_once_with('notauser',
                                                                                        'notapass')
 
+    @mock.patch('pulp.server.webservices.views.decorators.permission_index')
+    @mock.patch('pulp.server.webservices.views.decorators.principal_cache',
+                new_callable=cache.PrincipalCache)
+    @mock.patch('pulp.server.managers.factory.authentication_manager', autospec=True)
+    @mock.patch('pulp.server.webservices.http.username_password', autospec=True)
+    def test_password_authentication_cached(self, mock_user_pass, mock_auth_manager, mock_cache,
+                                            mock_index):
+        """
+        Test that the password is only checked the first time the credentials are used.
+        """
+        mock_user_pass.return_value = ('user', 'pass')
+        mock_auth_manager.return_value.check_username_password.return_value = 'user'
+
+        self.assertEqual(decorators.password_authentication(), 'user')
+        self.assertEqual(decorators.password_authentication(), 'user')
+
+        mock_auth_manager.return_value.check_username_password.assert_called_once_with('user',
+                                                                                       'pass')
+        # changes made by other processes are applied before each use of the cache
+        self.assertEqual(mock_index.refresh.call_count, 2)
+
+    @mock.patch('pulp.server.webservices.views.decorators.permission_index')
+    @mock.patch('pulp.server.webservices.views.decorators.principal_cache',
+                new_callable=cache.PrincipalCache)
+    @mock.patch('pulp.server.managers.factory.authentication_manager', autospec=True)
+    @mock.patch('pulp.server.webservices.http.username_password', autospec=True)
+    def test_password_authentication_failed_not_cached(self, mock_user_pass, mock_auth_manager,
+                                                       mock_cache, *unused):
+        """
+        Test that failed authentications are not cached.
+        """
+        mock_user_pass.return_value = ('user', 'pass')
+        mock_auth_manager.return_value.check_username_password.return_value = None
+
+        self.assertRaises(PulpCodedAuthenticationException, decorators.password_authentication)
+        self.assertTrue(mock_cache.get('user', 'pass') is None)
+
+    @mock.patch('pulp.server.webservices.views.decorators.model.User.objects')
+    def test_get_user_cached(self, mock_user_qs):
+        """
+        Test that the user is looked up once for a cached principal.
+        """
+        principal = cache.CachedPrincipal('user', 100)
+
+        user = decorators._get_user('user', principal)
+
+        self.assertTrue(decorators._get_user('user', principal) is user)
+        self.assertTrue(principal.user is user)
+        mock_user_qs.get.assert_called_once_with(login='user')
+
+    @mock.patch('pulp.server.webservices.http.resource_path', autospec=True, return_value='/a/')
+    @mock.patch('pulp.server.webservices.views.decorators.user_controller.is_authorized',
+                return_value=True)
+    def test_is_authorized_cached(self, mock_is_authorized, mock_resource_path):
+        """
+        Test that the authorization decision is made once for a cached principal.
+        """
+        principal = cache.CachedPrincipal('user', 100)
+
+        self.assertTrue(decorators._is_authorized('user', 1, principal))
+        self.assertTrue(decorators._is_authorized('user', 1, principal))
+        self.assertTrue(decorators._is_authorized('user', 1))
+
+        self.assertEqual(mock_is_authorized.call_count, 2)
+        mock_is_authorized.assert_called_with('/a/', 'user', 1)
+        self.assertEqual(principal.is_authorized('/a/', 1), True)
+
     @mock.patch('pulp.server.webservices.http.ssl_client_cert', autospec=True, return_value='cert')
     @mock.patch('pulp.server.webservices.http.http_authorization', autospec=True, return_value=None)
     @mock.patch('pulp.server.webservices.http.request_info', autospec=True, return_value=None)
@@ -668,44 +668,89 @@ class TestRepoUnitSearch(unittest.TestCase):
     Tests for RepoUnitSearch.
     """
 
+    @mock.patch('pulp.server.webservices.views.repositories.content')
     @mock.patch(
         'pulp.server.webservices.views.repositories.generate_json_response_with_pulp_encoder')
     @mock.patch('pulp.server.webservices.views.repositories.manager_factory.'
                 'repo_unit_association_query_manager')
     @mock.patch('pulp.server.webservices.views.repositories.UnitAssociationCriteria')
     @mock.patch('pulp.server.webservices.views.repositories.model.Repository.objects')
-    def test__generate_response_one_type(self, mock_repo_qs, mock_crit, mock_uqm, mock_resp):
+    def test__generate_response_one_type(self, mock_repo_qs, mock_crit, mock_uqm, mock_resp,
+                                         mock_content):
         """
         Test that responses are created using `get_units_by_type` if there is only one type.
         """
         mock_repo_qs.get_repo_or_missing_resource.return_value = 'exists'
         criteria = mock_crit.from_client_input.return_value
         criteria.type_ids = ['one_type']
+        units = [{'metadata': 'unit_1'}, {'metadata': 'unit_2'}]
+        mock_uqm().get_units_by_type.return_value = iter(units)
         repo_unit_search = RepoUnitSearch()
         repo_unit_search._generate_response('mock_q', {}, repo_id='mock_repo')
         mock_crit.from_client_input.assert_called_once_with('mock_q')
         mock_uqm().get_units_by_type.assert_called_once_with('mock_repo', 'one_type',
-                                                             criteria=criteria)
-        mock_resp.assert_called_once_with(mock_uqm().get_units_by_type.return_value)
+                                                             criteria=criteria, as_generator=True)
+        mock_content.serialize_unit_with_serializer.assert_has_calls([mock.call('unit_1'),
+                                                                      mock.call('unit_2')])
+        mock_resp.assert_called_once_with(units)
 
+    @mock.patch('pulp.server.webservices.views.repositories.manager_factory.'
+                'repo_unit_association_query_manager')
+    @mock.patch('pulp.server.webservices.views.repositories.model.Repository.objects')
+    def test__generate_response_continuation(self, mock_repo_qs, mock_uqm):
+        """
+        Test that a continuation is rejected rather than ignored.
+        """
+        repo_unit_search = RepoUnitSearch()
+        try:
+            repo_unit_search._generate_response('mock_q', {'continuation': ''},
+                                                repo_id='mock_repo')
+            self.fail('Expected exception was not raised')
+        except exceptions.InvalidValue, response:
+            self.assertEqual(response.property_names, ['continuation'])
+        self.assertEqual(mock_uqm.call_count, 0)
+
+    @mock.patch('pulp.server.webservices.views.repositories.content')
     @mock.patch(
         'pulp.server.webservices.views.repositories.generate_json_response_with_pulp_encoder')
     @mock.patch('pulp.server.webservices.views.repositories.manager_factory.'
                 'repo_unit_association_query_manager')
     @mock.patch('pulp.server.webservices.views.repositories.UnitAssociationCriteria')
     @mock.patch('pulp.server.webservices.views.repositories.model.Repository.objects')
-    def test__generate_response_multiple_types(self, mock_repo_qs, mock_crit, mock_uqm, mock_resp):
+    def test__generate_response_multiple_types(self, mock_repo_qs, mock_crit, mock_uqm, mock_resp,
+                                               mock_content):
         """
         Test that responses are created using `get_units` if there are multiple types.
         """
         mock_repo_qs.get_repo_or_missing_resource.return_value = 'exists'
         criteria = mock_crit.from_client_input.return_value
         criteria.type_ids = ['one_type', 'two_types']
+        units = [{'metadata': 'unit_1'}]
+        mock_uqm().get_units.return_value = iter(units)
         repo_unit_search = RepoUnitSearch()
         repo_unit_search._generate_response('mock_q', {}, repo_id='mock_repo')
         mock_crit.from_client_input.assert_called_once_with('mock_q')
-        mock_uqm().get_units.assert_called_once_with('mock_repo', criteria=criteria)
-        mock_resp.assert_called_once_with(mock_uqm().get_units.return_value)
+        mock_uqm().get_units.assert_called_once_with('mock_repo', criteria=criteria,
+                                                     as_generator=True)
+        mock_resp.assert_called_once_with(units)
+
+    @mock.patch('pulp.server.webservices.views.repositories.content')
+    @mock.patch('pulp.server.webservices.views.search.STREAM_BATCH_SIZE', 2)
+    @mock.patch('pulp.server.webservices.views.repositories.manager_factory.'
+                'repo_unit_association_query_manager')
+    @mock.patch('pulp.server.webservices.views.repositories.UnitAssociationCriteria')
+    @mock.patch('pulp.server.webservices.views.repositories.model.Repository.objects')
+    def test__generate_response_streamed(self, mock_repo_qs, mock_crit, mock_uqm, mock_content):
+        """
+        Test that large responses are streamed.
+        """
+        criteria = mock_crit.from_client_input.return_value
+        criteria.type_ids = None
+        mock_uqm().get_units.return_value = iter([{'metadata': i} for i in range(3)])
+        response = RepoUnitSearch()._generate_response('mock_q', {}, repo_id='mock_repo')
+        self.assertTrue(response.streaming)
+        self.assertEqual(''.join(response.streaming_content),
+                         '[{"metadata": 0}, {"metadata": 1}, {"metadata": 2}]')
 
 
 class TestRepoImportersView(unittest.TestCase):
@@ -1425,7 +1470,36 @@ class TestContentApplicabilityRegenerationView(unittest.TestCase):
             raise AssertionError('OperationPostponed should be raised for a regenerate task')
 
         self.assertEqual(response.http_status_code, 202)
-        mock_regen.assert_called_once_with(mock_crit.return_value.as_dict())
+        mock_regen.assert_called_once_with(mock_crit.return_value.as_dict(), False)
+
+    @mock.patch('pulp.server.webservices.views.decorators._verify_auth', new=assert_auth_CREATE())
+    @mock.patch('pulp.server.webservices.views.repositories.regenerate_applicability_for_repos')
+    @mock.patch('pulp.server.webservices.views.repositories.tags')
+    @mock.patch('pulp.server.webservices.views.repositories.Criteria.from_client_input')
+    def test_post_full(self, mock_crit, mock_tags, mock_regen):
+        """
+        Test that a full regeneration is passed on to the task.
+        """
+        mock_request = mock.MagicMock()
+        mock_request.body = json.dumps({'repo_criteria': {}, 'full': True})
+        content_app_regen = ContentApplicabilityRegenerationView()
+
+        self.assertRaises(exceptions.OperationPostponed, content_app_regen.post, mock_request)
+
+        self.assertEqual(mock_regen.apply_async_with_reservation.call_args[0][2],
+                         (mock_crit.return_value.as_dict(), True))
+
+    @mock.patch('pulp.server.webservices.views.decorators._verify_auth', new=assert_auth_CREATE())
+    @mock.patch('pulp.server.webservices.views.repositories.Criteria.from_client_input')
+    def test_post_with_invalid_full(self, mock_crit):
+        """
+        Test regenerate content applicability with a full flag that is not a boolean.
+        """
+        mock_request = mock.MagicMock()
+        mock_request.body = json.dumps({'repo_criteria': {}, 'full': 'yes'})
+        content_app_regen = ContentApplicabilityRegenerationView()
+
+        self.assertRaises(exceptions.InvalidValue, content_app_regen.post, mock_request)
 
     @mock.patch('pulp.server.webservices.views.decorators._verify_auth', new=assert_auth_CREATE())
     @mock.patch('pulp.server.webservices.views.repositories.Criteria.from_client_input')
@@ -335,7 +335,7 @@ class TestSearchView(unittest.TestCase):
         m_method = mock.MagicMock(return_value=['list', 'of', 'things'])
 
         results = FakeSearchView.get_results({'search': 'q'}, m_method, {'additional': 'options'})
-        self.assertEqual(results, [m_serial(), m_serial(), m_serial()])
+        self.assertEqual(list(results), [m_serial(), m_serial(), m_serial()])
 
     def test_get_results_model_serializer(self):
         """
@@ -348,11 +348,29 @@ class TestSearchView(unittest.TestCase):
             model.SERIALIZER = m_serial
 
         m_method = mock.MagicMock(return_value=['list', 'of', 'things'])
+        m_serial.return_value.data = ['serialized']
 
         results = FakeSearchView.get_results({'search': 'q'}, m_method, {'additional': 'options'})
-        self.assertEqual(results, m_serial.return_value.data)
+        self.assertEqual(list(results), ['serialized'])
         m_serial.assert_called_once_with(['list', 'of', 'things'], multiple=True)
 
+    @mock.patch('pulp.server.webservices.views.search.STREAM_BATCH_SIZE', 2)
+    def test_get_results_batches(self):
+        """
+        Ensure that results are serialized in batches.
+        """
+        m_serial = mock.MagicMock()
+
+        class FakeSearchView(search.SearchView):
+            model = mock.MagicMock()
+            model.SERIALIZER = m_serial
+
+        m_method = mock.MagicMock(return_value=iter(['list', 'of', 'things']))
+
+        list(FakeSearchView.get_results({}, m_method, {}))
+        self.assertEqual(m_serial.mock_calls[0], mock.call(['list', 'of'], multiple=True))
+        self.assertEqual(m_serial.mock_calls[1], mock.call(['things'], multiple=True))
+
     @mock.patch('pulp.server.webservices.views.search._trim_results')
     def test_get_results_model_restricted_fields(self, m_trim):
         """
@@ -366,12 +384,101 @@ class TestSearchView(unittest.TestCase):
             model.SERIALIZER = m_serial
 
         m_method = mock.MagicMock(return_value=['list', 'of', 'things'])
+        m_serial.return_value.data = ['serialized']
 
         results = FakeSearchView.get_results({'fields': ['f1', 'f2']}, m_method, {})
-        self.assertEqual(results, m_serial.return_value.data)
+        self.assertEqual(list(results), ['serialized'])
         m_serial.assert_called_once_with(['list', 'of', 'things'], multiple=True)
         m_trim.assert_called_once_with(m_model, m_serial().data, ['f1', 'f2'])
 
+    @mock.patch('pulp.server.webservices.views.search.STREAM_BATCH_SIZE', 2)
+    def test__generate_response_streamed(self):
+        """
+        Test that results that do not fit in one batch are streamed.
+        """
+        class FakeSearchView(search.SearchView):
+            manager = mock.MagicMock()
+
+        FakeSearchView.manager.find_by_criteria.return_value = iter(['a', 'b', 'c'])
+
+        results = FakeSearchView._generate_response({}, {})
+
+        self.assertEqual(type(results), http.StreamingHttpResponse)
+        self.assertEqual(''.join(results.streaming_content), '["a", "b", "c"]')
+
+    def test__generate_response_continuation_first_page(self):
+        """
+        Test that a keyset search is sorted by _id and returns the token for the next page.
+        """
+        class FakeSearchView(search.SearchView):
+            manager = mock.MagicMock()
+
+        FakeSearchView.manager.find_by_criteria.return_value = iter(
+            [{'_id': 'a'}, {'_id': 'b'}])
+
+        results = FakeSearchView._generate_response({'limit': 2}, {'continuation': ''})
+
+        self.assertEqual(FakeSearchView.manager.find_by_criteria.call_count, 1)
+        query = FakeSearchView.manager.find_by_criteria.mock_calls[0][1][0]
+        self.assertEqual(query.sort, [('_id', 1)])
+        self.assertEqual(query.filters, None)
+        self.assertEqual(type(results), http.HttpResponse)
+        token = results[search.CONTINUATION_HEADER]
+        self.assertEqual(search.json_util.loads(search.base64.urlsafe_b64decode(token)), 'b')
+
+    def test__generate_response_continuation_next_page(self):
+        """
+        Test that a continuation token restricts the search to the results after it.
+        """
+        class FakeSearchView(search.SearchView):
+            manager = mock.MagicMock()
+
+        FakeSearchView.manager.find_by_criteria.return_value = [{'_id': 'c'}]
+        token = search.base64.urlsafe_b64encode(search.json_util.dumps('b'))
+
+        results = FakeSearchView._generate_response(
+            {'limit': 2, 'filters': {'money': 1}}, {'continuation': token})
+
+        query = FakeSearchView.manager.find_by_criteria.mock_calls[0][1][0]
+        self.assertEqual(query.filters, {'$and': [{'money': 1}, {'_id': {'$gt': 'b'}}]})
+        self.assertFalse(results.has_header(search.CONTINUATION_HEADER))
+
+    @mock.patch('pulp.server.webservices.views.search.STREAM_BATCH_SIZE', 1)
+    def test__generate_response_continuation_model(self):
+        """
+        Test that the token of a full page is the _id of its last result, even when the page is
+        larger than a batch.
+        """
+        class FakeSearchView(search.SearchView):
+            model = mock.MagicMock()
+            del model.SERIALIZER
+
+        FakeSearchView.model.objects.find_by_criteria.return_value = iter(
+            [mock.Mock(pk='a'), mock.Mock(pk='b')])
+
+        with mock.patch.object(FakeSearchView, '_serialize_results',
+                               side_effect=lambda batch, only: [r.pk for r in batch]):
+            results = FakeSearchView._generate_response({'limit': 2}, {'continuation': ''})
+
+        self.assertEqual(type(results), http.HttpResponse)
+        self.assertEqual(results.content, '["a", "b"]')
+        token = results[search.CONTINUATION_HEADER]
+        self.assertEqual(search.json_util.loads(search.base64.urlsafe_b64decode(token)), 'b')
+
+    def test__generate_response_continuation_invalid(self):
+        """
+        Test that invalid tokens, skips and sorts are rejected for keyset searches.
+        """
+        class FakeSearchView(search.SearchView):
+            manager = mock.MagicMock()
+
+        self.assertRaises(exceptions.InvalidValue, FakeSearchView._generate_response,
+                          {}, {'continuation': 'not a token'})
+        self.assertRaises(exceptions.InvalidValue, FakeSearchView._generate_response,
+                          {'skip': 10}, {'continuation': ''})
+        self.assertRaises(exceptions.InvalidValue, FakeSearchView._generate_response,
+                          {'sort': [['name', 'ascending']]}, {'continuation': ''})
+
 
 class TestParseArgs(unittest.TestCase):
     class FakeSearchView(search.SearchView):
@@ -444,6 +551,14 @@ class TestParseArgs(unittest.TestCase):
 
         self.assertTrue(options['opt_bool'] is False)
 
+    def test_parse_args_continuation(self):
+        args = {'continuation': 'token', 'limit': 10}
+
+        params, options = self.fake_search._parse_args(args)
+
+        self.assertEqual(params, {'limit': 10})
+        self.assertEqual(options, {'continuation': 'token'})
+
 
 class TestTrimResults(unittest.TestCase):
     """
@@ -2,7 +2,7 @@ import httplib
 import json
 import mock
 
-from django.http import HttpResponse, HttpResponseNotFound
+from django.http import HttpResponse, HttpResponseNotFound, StreamingHttpResponse
 
 from pulp.common.compat import unittest
 from pulp.server.exceptions import InputEncodingError, PulpCodedValidationException
@@ -58,6 +58,26 @@ class TestResponseGenerators(unittest.TestCase):
         util.generate_json_response_with_pulp_encoder(test_content)
         mock_json.dumps.assert_called_once_with(test_content, default=pulp_json_encoder)
 
+    def test_generate_streaming_json_response(self):
+        """
+        Ensure that the items of an iterable are streamed as a JSON list.
+        """
+        response = util.generate_streaming_json_response(iter([{'foo': 'bar'}, 1]))
+        self.assertTrue(isinstance(response, StreamingHttpResponse))
+        self.assertEqual(response._headers.get('content-type'),
+                         ('Content-Type', 'application/json; charset=utf-8'))
+        self.assertEqual(json.loads(''.join(response.streaming_content)), [{'foo': 'bar'}, 1])
+
+    @mock.patch('pulp.server.webservices.views.util.STREAM_CHUNK_SIZE', 1)
+    def test_generate_streaming_json_response_chunks(self):
+        """
+        Ensure that the list is sent in chunks, and that an empty iterable is an empty list.
+        """
+        chunks = list(util.generate_streaming_json_response(['a', 'b']).streaming_content)
+        self.assertEqual(chunks, ['["a"', ', "b"', ']'])
+        response = util.generate_streaming_json_response(iter([]))
+        self.assertEqual(''.join(response.streaming_content), '[]')
+
     @mock.patch('pulp.server.webservices.views.util.iri_to_uri')
     def test_generate_redirect_response(self, mock_iri_to_uri):
         """
@@ -1,8 +1,9 @@
 import sys
 
+from collections import OrderedDict
 from gettext import gettext as _
 from logging import getLogger
-from threading import RLock
+from threading import Lock, RLock
 from datetime import datetime, timedelta
 
 log = getLogger(__name__)
@@ -112,6 +113,157 @@ class Cache(object):
         return key in self._inventory
 
 
+class LRUCache(object):
+    """
+    Bounded object cache with least-recently-used and time-to-live eviction.
+
+    The inventory is kept in request order, least recently requested first, so
+    both a lookup and an addition are O(1) and the expired items are always at
+    the front.  Each operation only evicts the expired items it finds there,
+    rather than walking the whole inventory.  An expired item that is still
+    busy is treated as requested and moved to the back.
+
+    Attributes:
+        eviction_threshold (timedelta): How long an unrequested item will be cached.
+        max_size (int): The maximum number of cached objects.
+        hits (int): The number of lookups that found the object cached.
+        misses (int): The number of lookups that did not find the object cached.
+        evictions (int): The number of objects evicted from the cache.
+        _lock (Lock): The inventory mutex.
+        _inventory (OrderedDict): The inventory of cached objects.
+            Each value is an Item.
+    """
+
+    def __init__(self, eviction_threshold=None, max_size=1000):
+        """
+        Args:
+            eviction_threshold (timedelta): How long an unrequested item will be cached.
+            max_size (int): The maximum number of cached objects.
+        """
+        self.eviction_threshold = eviction_threshold or timedelta(hours=4)
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = Lock()
+        self._inventory = OrderedDict()
+
+    def add(self, key, object_):
+        """
+        Add an object to the cache.
+        The least recently requested objects that are not busy are evicted when
+        the cache is full.  The cache exceeds max_size while too many objects
+        are busy.
+
+        Args:
+            key (hashable): The caching key.
+            object_ (object): An object to be cached.
+        """
+        with self._lock:
+            self._inventory.pop(key, None)
+            self._inventory[key] = Item(object_)
+            self._evict(Item.now())
+            excess = len(self._inventory) - self.max_size
+            if excess <= 0:
+                return
+            idle = []
+            for key, item in self._inventory.iteritems():
+                if item.busy:
+                    continue
+                idle.append(key)
+                if len(idle) == excess:
+                    break
+            for key in idle:
+                del self._inventory[key]
+            self.evictions += len(idle)
+
+    def purge(self, key):
+        """
+        Purge (delete) objects cached using the specified key.
+
+        Args:
+            key (hashable): The caching key.
+        """
+        with self._lock:
+            return self._inventory.pop(key)
+
+    def get(self, key):
+        """
+        Get a cached object by key.
+
+        Args:
+            key (hashable): The caching key.
+
+        Returns:
+            object: The requested cached object.
+
+        Raises:
+            NotCached: When not found in the cache.
+        """
+        with self._lock:
+            now = Item.now()
+            self._evict(now)
+            try:
+                item = self._inventory.pop(key)
+            except KeyError:
+                self.misses += 1
+                raise NotCached()
+            self._inventory[key] = item
+            item.last_requested = now
+            self.hits += 1
+            return item.object
+
+    def evict(self):
+        """
+        Evict all expired cached objects that are not busy.
+
+        Returns:
+            list: The evicted objects.
+        """
+        with self._lock:
+            evicted = self._evict(Item.now())
+        log.debug(
+            _('LRUCache.evict(): %(t)d total, %(e)d evicted'),
+            {
+                't': len(self._inventory),
+                'e': len(evicted)
+            })
+        return evicted
+
+    def _evict(self, now):
+        """
+        Evict the expired objects at the front of the inventory.
+        Must be called with the lock held.
+
+        Args:
+            now (datetime): The current UTC naive timestamp.
+
+        Returns:
+            list: The evicted objects.
+        """
+        evicted = []
+        busy = 0
+        while self._inventory and busy < len(self._inventory):
+            key, item = next(self._inventory.iteritems())
+            if now - item.last_requested < self.eviction_threshold:
+                break
+            del self._inventory[key]
+            if item.busy:
+                busy += 1
+                item.last_requested = now
+                self._inventory[key] = item
+                continue
+            evicted.append(item.object)
+        self.evictions += len(evicted)
+        return evicted
+
+    def __contains__(self, key):
+        return key in self._inventory
+
+    def __len__(self):
+        return len(self._inventory)
+
+
 class Item(object):
     """
     A cached item.
@@ -2,14 +2,18 @@ import logging
 
 from gettext import gettext as _
 from httplib import NOT_FOUND, INTERNAL_SERVER_ERROR
+from tempfile import TemporaryFile
+from threading import Condition, Lock
 from urlparse import urlparse
 
 from mongoengine import DoesNotExist, NotUniqueError
 from nectar.listener import AggregatingEventListener
 from requests import Session
 from twisted.internet import reactor
+from twisted.internet.interfaces import IPushProducer
 from twisted.web.resource import Resource
 from twisted.web.server import NOT_DONE_YET
+from zope.interface import implementer
 
 from pulp.plugins.loader import api as plugin_api
 from pulp.server.constants import PULP_STREAM_REQUEST_HEADER
@@ -18,7 +22,7 @@ from pulp.server.content.sources.model import Request as ContainerRequest
 from pulp.server.db.model import DeferredDownload, LazyCatalogEntry
 from pulp.server.controllers import repository as repo_controller
 from pulp.plugins.loader.exceptions import PluginNotFound
-from pulp.streamer.cache import Cache, NotCached
+from pulp.streamer.cache import LRUCache, NotCached
 
 logger = logging.getLogger(__name__)
 
@@ -40,6 +44,13 @@ HOP_BY_HOP_HEADERS = [
     'upgrade',
 ]
 
+# The size of the chunks in which a shared download is read from its spool.
+SPOOL_READ_SIZE = 64 * 1024
+
+# The maximum number of bytes a request following a shared download may have waiting in the
+# reactor to be written to the client.
+FOLLOW_WRITE_AHEAD = 1024 * 1024
+
 
 class DownloadFailed(Exception):
     """
@@ -113,6 +124,8 @@ class Streamer(Resource):
         Resource.__init__(self)
         self.config = config
         self.session_cache = SessionCache()
+        self.in_flight = {}
+        self._in_flight_lock = Lock()
 
     def render_GET(self, request):
         """
@@ -131,9 +144,68 @@ class Streamer(Resource):
         :param request: The original twisted client HTTP request being handled by the streamer.
         :type  request: twisted.web.server.Request
         """
-        reactor.callInThread(self._handle_get, request)
+        reactor.callInThread(self._handle_shared_get, request)
         return NOT_DONE_YET
 
+    def _handle_shared_get(self, request):
+        """
+        Handle a GET request, sharing the download with concurrent requests for the same path.
+
+        The first request for a path downloads the content and records the response in a
+        SharedDownload.  Requests for the path made while that download is in flight do not
+        query the catalog or download anything; they are streamed the recorded response.
+        A request that joins after content has been written, before any other request
+        joined, downloads the content itself since the content was not recorded.
+
+        :param request: The original twisted client HTTP request being handled by the streamer.
+        :type  request: twisted.web.server.Request
+        """
+        path = urlparse(request.uri).path
+        with self._in_flight_lock:
+            download = self.in_flight.get(path)
+            leader = download is None
+            if leader:
+                download = SharedDownload()
+                self.in_flight[path] = download
+        if not leader:
+            if download.join():
+                self._follow(request, download)
+            else:
+                self._handle_get(request)
+            return
+        try:
+            self._handle_get(SharingRequest(request, download))
+        finally:
+            with self._in_flight_lock:
+                del self.in_flight[path]
+
+    @staticmethod
+    def _follow(request, download):
+        """
+        Stream the response of a shared download to the request, no faster than the
+        client reads it.
+
+        :param request: The original twisted client HTTP request being handled by the streamer.
+        :type  request: twisted.web.server.Request
+        :param download: The download shared with the request.
+        :type  download: SharedDownload
+        """
+        with ThrottledResponder(request) as responder:
+            offset = 0
+            while not responder.stopped:
+                data = download.read(offset)
+                if offset == 0:
+                    # The response code and headers are complete once content is written,
+                    # or once the download is finished without content.
+                    if download.code is not None:
+                        request.setResponseCode(download.code)
+                    for key, value in download.headers:
+                        request.setHeader(key, value)
+                if not data:
+                    break
+                responder.write(data)
+                offset += len(data)
+
     def _handle_get(self, request):
         """
         Download the requested content using the content unit catalog and dispatch
@@ -376,10 +448,274 @@ class Responder(object):
         reactor.callFromThread(self.request.write, data)
 
 
-class SessionCache(Cache):
+@implementer(IPushProducer)
+class ThrottledResponder(Responder):
+    """
+    A Responder that does not run ahead of the client.  It is registered as a streaming
+    producer of the request, and a write waits while the transport has paused it or while
+    FOLLOW_WRITE_AHEAD bytes are waiting in the reactor to be written.
+
+    :ivar stopped: The client is gone, so nothing more is written.
+    :type stopped: bool
+    """
+
+    def __init__(self, request):
+        """
+        :param request: The original twisted client HTTP request being handled by the streamer.
+        :type  request: twisted.web.server.Request
+        """
+        super(ThrottledResponder, self).__init__(request)
+        self.stopped = False
+        self._paused = False
+        self._waiting = 0
+        self._condition = Condition()
+        reactor.callFromThread(self.register)
+
+    def register(self):
+        """
+        Register as the producer of the request.
+        Called in the reactor thread.
+        """
+        try:
+            self.request.registerProducer(self, True)
+        except Exception as e:
+            # the client disconnected before the producer was registered
+            logger.debug(str(e))
+            self.stopProducing()
+
+    def finish(self):
+        """
+        Unregister as the producer of the request, and finish the request.
+        Called in the reactor thread.
+        """
+        try:
+            self.request.unregisterProducer()
+        except Exception as e:
+            logger.debug(str(e))
+        super(ThrottledResponder, self).finish()
+
+    def write(self, data):
+        """
+        Forward the data to the request.write method once the client is ready for it.
+        The data is discarded when the client is gone.
+
+        :param data: A string to write to the response.
+        :type  data: str
+        """
+        with self._condition:
+            while not self.stopped and (self._paused or self._waiting >= FOLLOW_WRITE_AHEAD):
+                self._condition.wait()
+            if self.stopped:
+                return
+            self._waiting += len(data)
+        reactor.callFromThread(self._write, data)
+
+    def _write(self, data):
+        """
+        Write the data to the request.
+        Called in the reactor thread.
+
+        :param data: A string to write to the response.
+        :type  data: str
+        """
+        try:
+            self.request.write(data)
+        finally:
+            with self._condition:
+                self._waiting -= len(data)
+                self._condition.notify_all()
+
+    def pauseProducing(self):
+        """
+        The transport buffer is full.
+        """
+        with self._condition:
+            self._paused = True
+
+    def resumeProducing(self):
+        """
+        The transport buffer has been written to the client.
+        """
+        with self._condition:
+            self._paused = False
+            self._condition.notify_all()
+
+    def stopProducing(self):
+        """
+        The client is gone.
+        """
+        with self._condition:
+            self.stopped = True
+            self._condition.notify_all()
+
+
+class SharedDownload(object):
+    """
+    The response of a download shared by concurrent requests for the same path.
+    The content is spooled to a temporary file as it is written once another request
+    has joined the download, so requests that join later can catch up from the
+    beginning.  The spool is deleted once the last request streaming from it is
+    finished.
+
+    :ivar code: The HTTP response code, if set.
+    :type code: int
+    :ivar headers: The HTTP response headers as (name, value) tuples.
+    :type headers: list
+    :ivar finished: The download is finished.
+    :type finished: bool
+    """
+
+    def __init__(self):
+        self.code = None
+        self.headers = []
+        self.finished = False
+        self._length = 0
+        self._spool = None
+        self._condition = Condition()
+
+    def join(self):
+        """
+        Join the download, starting the spool when needed.
+
+        :return: True if the response can be read, False if content was written
+            before the spool was started.
+        :rtype: bool
+        """
+        with self._condition:
+            if self._spool is None:
+                if self._length:
+                    return False
+                self._spool = TemporaryFile()
+            return True
+
+    def set_code(self, code):
+        """
+        Record the response code.
+
+        :param code: The HTTP response code.
+        :type  code: int
+        """
+        self.code = code
+
+    def set_header(self, name, value):
+        """
+        Record a response header.
+
+        :param name: The header name.
+        :type  name: str
+        :param value: The header value.
+        :type  value: str
+        """
+        self.headers.append((name, value))
+
+    def write(self, data):
+        """
+        Append content to the spool, once a request has joined.
+
+        :param data: The content.
+        :type  data: str
+        """
+        with self._condition:
+            if self._spool is not None:
+                self._spool.seek(0, 2)
+                self._spool.write(data)
+                self._spool.flush()
+            self._length += len(data)
+            self._condition.notify_all()
+
+    def finish(self):
+        """
+        Mark the download finished.
+        """
+        with self._condition:
+            self.finished = True
+            self._condition.notify_all()
+
+    def read(self, offset):
+        """
+        Read content from the spool, waiting for it to be written when needed.
+        Only called once the download has been joined.
+
+        :param offset: The offset of the content in the response.
+        :type  offset: int
+        :return: The content at the offset, or an empty string when the download
+            is finished and there is no more content.
+        :rtype: str
+        """
+        with self._condition:
+            while offset >= self._length and not self.finished:
+                self._condition.wait()
+            self._spool.seek(offset)
+            return self._spool.read(min(SPOOL_READ_SIZE, self._length - offset))
+
+
+class SharingRequest(object):
+    """
+    Wraps the request that performs a shared download, recording its
+    response in the SharedDownload as it is written.
+    """
+
+    def __init__(self, request, download):
+        """
+        :param request: The original twisted client HTTP request being handled by the streamer.
+        :type  request: twisted.web.server.Request
+        :param download: The shared download.
+        :type  download: SharedDownload
+        """
+        self.request = request
+        self.download = download
+
+    def setResponseCode(self, code, message=None):
+        """
+        Set the response code.
+
+        :param code: The HTTP response code.
+        :type  code: int
+        :param message: The HTTP response message.
+        :type  message: str
+        """
+        self.download.set_code(code)
+        self.request.setResponseCode(code, message)
+
+    def setHeader(self, name, value):
+        """
+        Set a response header.
+
+        :param name: The header name.
+        :type  name: str
+        :param value: The header value.
+        :type  value: str
+        """
+        self.download.set_header(name, value)
+        self.request.setHeader(name, value)
+
+    def write(self, data):
+        """
+        Write content to the response.
+
+        :param data: The content.
+        :type  data: str
+        """
+        self.download.write(data)
+        self.request.write(data)
+
+    def finish(self):
+        """
+        Finish the response and the shared download.
+        """
+        try:
+            self.request.finish()
+        finally:
+            self.download.finish()
+
+    def __getattr__(self, name):
+        return getattr(self.request, name)
+
+
+class SessionCache(LRUCache):
     """
     Session cache.
-    Extends generic cache to derive the key using the URL and
+    Extends the LRU cache to derive the key using the URL and
     downloader configuration.
     """
 
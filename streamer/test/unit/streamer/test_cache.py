@@ -2,7 +2,7 @@ from unittest import TestCase
 
 from mock import Mock, patch
 
-from pulp.streamer.cache import Cache, Item, NotCached
+from pulp.streamer.cache import Cache, Item, LRUCache, NotCached
 
 MODULE = 'pulp.streamer.cache'
 
@@ -77,6 +77,117 @@ class TestCache(TestCase):
         self.assertTrue('t1' in cache)
 
 
+class TestLRUCache(TestCase):
+
+    def test_basic_operation(self):
+        t1 = Mock()
+        t2 = Mock()
+        cache = LRUCache()
+        cache.add('t1', t1)
+        cache.add('t2', t2)
+        for n in range(10):
+            self.assertEqual(t1, cache.get('t1'))
+        for n in range(10):
+            self.assertEqual(t2, cache.get('t2'))
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.hits, 20)
+
+    def test_purge(self):
+        cache = LRUCache()
+        cache.add('t1', Mock())
+        cache.purge('t1')
+        self.assertFalse('t1' in cache)
+
+    @patch(MODULE + '.Item.now')
+    def test_get(self, now):
+        t1 = Mock()
+        now.side_effect = [1, 1, 2, 3]
+        cache = LRUCache(3)
+        cache.add('t1', t1)
+        gotten = cache.get('t1')
+        self.assertEqual(cache._inventory['t1'].last_requested, 2)
+        self.assertEqual(gotten, t1)
+        self.assertRaises(NotCached, cache.get, 'xx')
+        self.assertEqual(cache.hits, 1)
+        self.assertEqual(cache.misses, 1)
+
+    def test_get_moves_to_back(self):
+        cache = LRUCache()
+        cache.add('t1', Mock())
+        cache.add('t2', Mock())
+        cache.get('t1')
+        self.assertEqual(list(cache._inventory), ['t2', 't1'])
+
+    def test_max_size(self):
+        t1 = Mock()
+        cache = LRUCache(max_size=2)
+        cache.add('t1', t1)
+        cache.add('t2', Mock())
+        cache.get('t1')
+        cache.add('t3', Mock())
+        self.assertEqual(list(cache._inventory), ['t1', 't3'])
+        self.assertEqual(cache.evictions, 1)
+
+    def test_max_size_busy(self):
+        t1 = Mock()  # hold refs to make them busy.
+        t2 = Mock()
+        cache = LRUCache(max_size=1)
+        cache.add('t1', t1)
+        cache.add('t2', t2)
+        self.assertEqual(list(cache._inventory), ['t1', 't2'])
+        self.assertEqual(cache.evictions, 0)
+        del t1
+        cache.add('t3', Mock())
+        self.assertEqual(list(cache._inventory), ['t2', 't3'])
+        self.assertEqual(cache.evictions, 1)
+
+    def test_add_existing(self):
+        t2 = Mock()
+        cache = LRUCache()
+        cache.add('t1', Mock())
+        cache.add('t1', t2)
+        self.assertEqual(len(cache), 1)
+        self.assertEqual(cache.get('t1'), t2)
+
+    @patch(MODULE + '.Item.now')
+    def test_evict(self, now):
+        now.side_effect = [1, 1, 2, 2, 3, 4]
+        cache = LRUCache(3)
+        cache.add('t1', Mock(key='t1'))
+        cache.add('t2', Mock(key='t2'))
+        evicted = cache.evict()
+        self.assertEqual(evicted, [])
+        evicted = cache.evict()
+        self.assertEqual([obj.key for obj in evicted], ['t1'])
+        self.assertFalse('t1' in cache)
+        self.assertTrue('t2' in cache)
+        self.assertEqual(cache.evictions, 1)
+
+    @patch(MODULE + '.Item.now')
+    def test_evict_busy(self, now):
+        now.side_effect = [1, 1, 1, 1, 2]
+        t1 = Mock()  # hold ref to make it busy.
+        cache = LRUCache(1)
+        cache.add('t1', t1)
+        cache.add('t2', Mock())
+        evicted = cache.evict()
+        self.assertTrue('t1' in cache)
+        self.assertFalse('t2' in cache)
+        self.assertEqual(len(evicted), 1)
+        self.assertEqual(cache._inventory['t1'].last_requested, 2)
+
+    @patch(MODULE + '.Item.now')
+    def test_get_evicts_expired(self, now):
+        now.side_effect = [1, 1, 2, 2, 5]
+        cache = LRUCache(3)
+        cache.add('t1', Mock())
+        cache.add('t2', Mock())
+        self.assertRaises(NotCached, cache.get, 't1')
+        self.assertEqual(len(cache), 0)
+        self.assertEqual(cache.misses, 1)
+        self.assertEqual(cache.evictions, 2)
+
+
 class TestItem(TestCase):
 
     @patch(MODULE + '.datetime')
@@ -9,7 +9,8 @@ from pulp.devel.unit.util import SideEffect
 from pulp.plugins.loader.exceptions import PluginNotFound
 from pulp.server import constants
 from pulp.streamer.server import (
-    Responder, SessionCache, Streamer, DownloadListener, DownloadFailed, HOP_BY_HOP_HEADERS
+    Responder, SessionCache, Streamer, DownloadListener, DownloadFailed, HOP_BY_HOP_HEADERS,
+    SharedDownload, SharingRequest, ThrottledResponder
 )
 
 
@@ -84,7 +85,135 @@ class TestStreamer(unittest.TestCase):
         streamer.render_GET(request)
 
         # validation
-        reactor.callInThread.assert_called_once_with(streamer._handle_get, request)
+        reactor.callInThread.assert_called_once_with(streamer._handle_shared_get, request)
+
+    @patch(MODULE_PREFIX + 'Streamer._follow')
+    @patch(MODULE_PREFIX + 'Streamer._handle_get')
+    def test_handle_shared_get_first(self, _handle_get, _follow):
+        request = Mock(uri='http://content-world.com/content/bear.rpm?policy=1')
+        streamer = Streamer(Mock())
+
+        def handle_get(sharing_request):
+            self.assertTrue(isinstance(sharing_request, SharingRequest))
+            self.assertEqual(sharing_request.request, request)
+            self.assertEqual(streamer.in_flight['/content/bear.rpm'], sharing_request.download)
+
+        _handle_get.side_effect = handle_get
+
+        # test
+        streamer._handle_shared_get(request)
+
+        # validation
+        self.assertEqual(_handle_get.call_count, 1)
+        self.assertFalse(_follow.called)
+        self.assertEqual(streamer.in_flight, {})
+
+    @patch(MODULE_PREFIX + 'Streamer._follow')
+    @patch(MODULE_PREFIX + 'Streamer._handle_get')
+    def test_handle_shared_get_in_flight(self, _handle_get, _follow):
+        request = Mock(uri='http://content-world.com/content/bear.rpm?policy=2')
+        download = Mock()
+        streamer = Streamer(Mock())
+        streamer.in_flight['/content/bear.rpm'] = download
+
+        # test
+        streamer._handle_shared_get(request)
+
+        # validation
+        _follow.assert_called_once_with(request, download)
+        self.assertFalse(_handle_get.called)
+        self.assertEqual(streamer.in_flight, {'/content/bear.rpm': download})
+
+    @patch(MODULE_PREFIX + 'Streamer._follow')
+    @patch(MODULE_PREFIX + 'Streamer._handle_get')
+    def test_handle_shared_get_joined_late(self, _handle_get, _follow):
+        request = Mock(uri='http://content-world.com/content/bear.rpm')
+        download = SharedDownload()
+        download.write('abc')
+        streamer = Streamer(Mock())
+        streamer.in_flight['/content/bear.rpm'] = download
+
+        # test
+        streamer._handle_shared_get(request)
+
+        # validation
+        _handle_get.assert_called_once_with(request)
+        self.assertFalse(_follow.called)
+        self.assertEqual(streamer.in_flight, {'/content/bear.rpm': download})
+
+    @patch(MODULE_PREFIX + 'Streamer._handle_get')
+    def test_handle_shared_get_failed(self, _handle_get):
+        request = Mock(uri='http://content-world.com/content/bear.rpm')
+        _handle_get.side_effect = ValueError()
+        streamer = Streamer(Mock())
+
+        # test
+        self.assertRaises(ValueError, streamer._handle_shared_get, request)
+
+        # validation
+        self.assertEqual(streamer.in_flight, {})
+
+    @patch(MODULE_PREFIX + 'ThrottledResponder')
+    def test_follow(self, responder):
+        request = Mock()
+        responder.return_value.__enter__.return_value = responder.return_value
+        responder.return_value.stopped = False
+        download = SharedDownload()
+        download.join()
+        download.set_header('Content-Length', '6')
+        download.write('abc')
+        download.write('def')
+        download.finish()
+
+        # test
+        with patch(MODULE_PREFIX + 'SPOOL_READ_SIZE', 4):
+            Streamer._follow(request, download)
+
+        # validation
+        responder.assert_called_once_with(request)
+        self.assertFalse(request.setResponseCode.called)
+        request.setHeader.assert_called_once_with('Content-Length', '6')
+        self.assertEqual(responder.return_value.write.call_args_list, [call('abcd'), call('ef')])
+
+    @patch(MODULE_PREFIX + 'ThrottledResponder')
+    def test_follow_stopped(self, responder):
+        request = Mock()
+        responder.return_value.__enter__.return_value = responder.return_value
+        responder.return_value.stopped = False
+        download = SharedDownload()
+        download.join()
+        download.write('abcdef')
+
+        def write(data):
+            responder.return_value.stopped = True
+
+        responder.return_value.write.side_effect = write
+
+        # test
+        with patch(MODULE_PREFIX + 'SPOOL_READ_SIZE', 4):
+            Streamer._follow(request, download)
+
+        # validation
+        self.assertEqual(responder.return_value.write.call_args_list, [call('abcd')])
+
+    @patch(MODULE_PREFIX + 'ThrottledResponder')
+    def test_follow_failed(self, responder):
+        request = Mock()
+        responder.return_value.__enter__.return_value = responder.return_value
+        responder.return_value.stopped = False
+        download = SharedDownload()
+        download.join()
+        download.set_code(NOT_FOUND)
+        download.set_header('Content-Length', '0')
+        download.finish()
+
+        # test
+        Streamer._follow(request, download)
+
+        # validation
+        request.setResponseCode.assert_called_once_with(NOT_FOUND)
+        request.setHeader.assert_called_once_with('Content-Length', '0')
+        self.assertFalse(responder.return_value.write.called)
 
     @patch(MODULE_PREFIX + 'Responder')
     @patch(MODULE_PREFIX + 'Streamer._on_succeeded')
@@ -489,6 +618,146 @@ class TestResponder(unittest.TestCase):
         self.assertEqual((r.finish,), mock_calls[1][0])
 
 
+class TestThrottledResponder(unittest.TestCase):
+
+    @patch(MODULE_PREFIX + 'reactor')
+    def test_register(self, mock_reactor):
+        responder = ThrottledResponder(Mock())
+        mock_reactor.callFromThread.assert_called_once_with(responder.register)
+        responder.register()
+        responder.request.registerProducer.assert_called_once_with(responder, True)
+        self.assertFalse(responder.stopped)
+
+    @patch(MODULE_PREFIX + 'reactor', Mock())
+    def test_register_disconnected(self):
+        responder = ThrottledResponder(Mock())
+        responder.request.registerProducer.side_effect = AttributeError()
+        responder.register()
+        self.assertTrue(responder.stopped)
+
+    @patch(MODULE_PREFIX + 'reactor', Mock())
+    def test_finish(self):
+        responder = ThrottledResponder(Mock())
+        responder.finish()
+        responder.request.unregisterProducer.assert_called_once_with()
+        responder.request.finish.assert_called_once_with()
+
+    @patch(MODULE_PREFIX + 'reactor')
+    def test_write(self, mock_reactor):
+        responder = ThrottledResponder(Mock())
+        responder.write('abc')
+        mock_reactor.callFromThread.assert_called_with(responder._write, 'abc')
+        self.assertEqual(responder._waiting, 3)
+        responder._write('abc')
+        responder.request.write.assert_called_once_with('abc')
+        self.assertEqual(responder._waiting, 0)
+
+    @patch(MODULE_PREFIX + 'reactor', Mock())
+    def test_write_paused(self):
+        responder = ThrottledResponder(Mock())
+        responder.pauseProducing()
+        responder._condition.wait = Mock(side_effect=responder.resumeProducing)
+        responder.write('abc')
+        self.assertEqual(responder._condition.wait.call_count, 1)
+        self.assertEqual(responder._waiting, 3)
+
+    @patch(MODULE_PREFIX + 'FOLLOW_WRITE_AHEAD', 4)
+    @patch(MODULE_PREFIX + 'reactor', Mock())
+    def test_write_ahead(self):
+        responder = ThrottledResponder(Mock())
+        responder.write('abcd')
+        responder._condition.wait = Mock(side_effect=lambda: responder._write('abcd'))
+        responder.write('ef')
+        self.assertEqual(responder._condition.wait.call_count, 1)
+        self.assertEqual(responder._waiting, 2)
+
+    @patch(MODULE_PREFIX + 'reactor')
+    def test_write_stopped(self, mock_reactor):
+        responder = ThrottledResponder(Mock())
+        responder.pauseProducing()
+        responder._condition.wait = Mock(side_effect=responder.stopProducing)
+        responder.write('abc')
+        self.assertTrue(responder.stopped)
+        self.assertEqual(mock_reactor.callFromThread.call_count, 1)
+        self.assertEqual(responder._waiting, 0)
+
+
+class TestSharedDownload(unittest.TestCase):
+
+    def test_join(self):
+        download = SharedDownload()
+        self.assertTrue(download.join())
+        download.write('abc')
+        self.assertTrue(download.join())
+
+    def test_join_late(self):
+        download = SharedDownload()
+        download.write('abc')
+        self.assertFalse(download.join())
+        self.assertEqual(download._spool, None)
+
+    def test_read(self):
+        download = SharedDownload()
+        download.join()
+        download.write('abc')
+        self.assertEqual(download.read(0), 'abc')
+        self.assertEqual(download.read(1), 'bc')
+        download.write('def')
+        download.finish()
+        self.assertEqual(download.read(3), 'def')
+        self.assertEqual(download.read(6), '')
+
+    def test_read_waits(self):
+        download = SharedDownload()
+        download.join()
+        download.write('abc')
+
+        def wait():
+            download.write('def')
+            download.finish()
+
+        download._condition.wait = Mock(side_effect=wait)
+        self.assertEqual(download.read(3), 'def')
+        self.assertEqual(download._condition.wait.call_count, 1)
+
+    def test_code_and_headers(self):
+        download = SharedDownload()
+        download.set_code(NOT_FOUND)
+        download.set_header('A', '1')
+        download.set_header('B', '2')
+        self.assertEqual(download.code, NOT_FOUND)
+        self.assertEqual(download.headers, [('A', '1'), ('B', '2')])
+
+
+class TestSharingRequest(unittest.TestCase):
+
+    def test_record(self):
+        request = Mock(uri='http://content-world.com/content/bear.rpm')
+        download = Mock()
+        sharing_request = SharingRequest(request, download)
+        sharing_request.setResponseCode(NOT_FOUND)
+        sharing_request.setHeader('A', '1')
+        sharing_request.write('abc')
+        sharing_request.finish()
+        download.set_code.assert_called_once_with(NOT_FOUND)
+        request.setResponseCode.assert_called_once_with(NOT_FOUND, None)
+        download.set_header.assert_called_once_with('A', '1')
+        request.setHeader.assert_called_once_with('A', '1')
+        download.write.assert_called_once_with('abc')
+        request.write.assert_called_once_with('abc')
+        request.finish.assert_called_once_with()
+        download.finish.assert_called_once_with()
+        self.assertEqual(sharing_request.uri, request.uri)
+
+    def test_finish_failed(self):
+        request = Mock()
+        request.finish.side_effect = RuntimeError()
+        download = Mock()
+        sharing_request = SharingRequest(request, download)
+        self.assertRaises(RuntimeError, sharing_request.finish)
+        download.finish.assert_called_once_with()
+
+
 class TestSessionCache(unittest.TestCase):
 
     def test_key(self):